@@ -5,7 +5,7 @@ FastAPIで使用するPydanticモデル
 """
 from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import date, datetime
 import time
 from app.config_simplified import get_settings
 
@@ -337,6 +337,14 @@ class SQLExecutionLogResponse(BaseModel):
     total_count: int = Field(..., description="総件数")
 
 
+class LogExportRequest(BaseModel):
+    """SQL実行ログのエクスポートリクエスト"""
+    format: str = Field(default="csv", description="エクスポート形式（csv）")
+    start_date: Optional[date] = Field(default=None, description="対象期間の開始日（省略時は履歴の表示期間の開始日）")
+    end_date: Optional[date] = Field(default=None, description="対象期間の終了日（この日を含む。省略時は今日）")
+    user_id: Optional[str] = Field(default=None, description="対象ユーザー（管理者用エクスポートのみ有効）")
+
+
 class VisibilitySetting(BaseModel):
     object_name: str = Field(..., description="オブジェクト名（スキーマ名またはテーブル名）")
     role_name: str = Field(..., description="ロール名")
@@ -426,6 +434,9 @@ class CacheSQLRequest(BaseModel):
     sql: str = Field(..., description="実行するSQL")
     limit: Optional[int] = Field(default=None, description="結果の最大件数")
     editor_id: Optional[str] = Field(default=None, description="エディタID")
+    bypass_cache: bool = Field(default=False, description="結果再利用キャッシュを使用せず必ず実行する")
+    lane: str = Field(default="interactive", description="実行レーン（interactive: 画面表示, bulk: 一括ダウンロード）")
+    confirmed: bool = Field(default=False, description="コストゲートの確認要求を承認して実行する")
 
 
 class CacheSQLResponse(BaseModel):
@@ -438,6 +449,9 @@ class CacheSQLResponse(BaseModel):
     message: Optional[str] = Field(default=None, description="メッセージ")
     error_message: Optional[str] = Field(default=None, description="エラーメッセージ")
     status: Optional[str] = Field(default=None, description="処理状態（processing, completed, error）")
+    cache_hit: bool = Field(default=False, description="結果再利用キャッシュから応答したかどうか")
+    queue_position: Optional[int] = Field(default=None, description="実行待ち順位（0=実行中/即時実行）")
+    cost_estimate: Optional[Dict[str, Any]] = Field(default=None, description="EXPLAINによるコスト見積もりとゲートの判定（policy, message, partitions_total, partitions_assigned, bytes_assigned, estimated_rows など）")
 
 
 class DummyDataRequest(BaseModel):
@@ -491,6 +505,9 @@ class SessionStatusResponse(BaseModel):
     progress_percentage: Optional[float] = Field(default=None, description="進捗率")
     is_complete: bool = Field(default=False, description="完了フラグ")
     error_message: Optional[str] = Field(default=None, description="エラーメッセージ")
+    phase: Optional[str] = Field(default=None, description="処理段階（queued, executing, downloading）")
+    queue_position: Optional[int] = Field(default=None, description="実行待ち順位（0=実行中、未登録時はNone）")
+    message: Optional[str] = Field(default=None, description="メッセージ")
 
 
 class CancelRequest(BaseModel):
@@ -503,6 +520,9 @@ class CancelResponse(BaseModel):
     success: bool = Field(..., description="キャンセル成功フラグ")
     message: Optional[str] = Field(default=None, description="メッセージ")
     error_message: Optional[str] = Field(default=None, description="エラーメッセージ")
+    server_cancelled: Optional[bool] = Field(default=None, description="ウェアハウス側で実行中クエリを中断できたか")
+    cancel_method: Optional[str] = Field(default=None, description="中断方法（cursor_cancel / abort_statement）")
+    query_id: Optional[str] = Field(default=None, description="中断したクエリID")
 
 
 class CacheUniqueValuesRequest(BaseModel):
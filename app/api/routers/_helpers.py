@@ -1,20 +1,16 @@
 # -*- coding: utf-8 -*-
 """共通ユーティリティ（スレッドプール実行など）"""
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-
 from app.dependencies import (
     get_query_executor_di,
     get_metadata_cache_di,
     get_metadata_service_di,
-    get_connection_manager_di
+    get_connection_manager_di,
+    get_workload_executors_di
 )
 from app.services.master_data_service import MasterDataService
 from app.services.scheduler_service import SchedulerService
 from app.services.master_search_preference_service import MasterSearchPreferenceService
-
-# グローバル ThreadPoolExecutor（オリジナル互換: max_workers=4）
-_thread_pool = ThreadPoolExecutor(max_workers=4)
+from app.services.workload_executor import WORKLOAD_INTERACTIVE
 
 # サービスインスタンス（シングルトン）
 _master_data_service = None
@@ -23,9 +19,18 @@ _master_search_preference_service = None
 
 
 def run_in_threadpool(func, *args, **kwargs):
-    """関数をスレッドプールで実行する（同期関数を非同期にラップ）"""
-    loop = asyncio.get_event_loop()
-    return loop.run_in_executor(_thread_pool, lambda: func(*args, **kwargs))
+    """関数を対話的処理用スレッドプールで実行する（同期関数を非同期にラップ）"""
+    return run_in_workload(WORKLOAD_INTERACTIVE, func, *args, **kwargs)
+
+
+def run_in_workload(workload: str, func, *args, **kwargs):
+    """関数を指定ワークロード（interactive / ingest / export / metadata）のスレッドプールで実行する"""
+    return get_workload_executors_di().run(workload, func, *args, **kwargs)
+
+
+def iterate_in_workload(workload: str, iterator):
+    """同期イテレーターを指定ワークロードのスレッドプールで進める非同期イテレーターに変換する"""
+    return get_workload_executors_di().iterate(workload, iterator)
 
 
 def maybe_await(maybe):
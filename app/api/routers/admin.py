@@ -1,9 +1,8 @@
 # -*- coding: utf-8 -*-
 from fastapi import APIRouter, HTTPException, Body
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 
-from app.config_simplified import get_settings
 from app.api.models import (
     TemplateRequest, TemplateResponse, PartRequest, PartResponse,
     UserRefreshResponse, BusinessUserListResponse, BusinessUserRefreshResponse, UserInfo,
@@ -18,7 +17,8 @@ from app.dependencies import (
     CurrentUserDep, UserPreferenceServiceDep, MetadataServiceDep, SQLLogServiceDep
 )
 from app.logger import Logger
-from ._helpers import run_in_threadpool
+from app.services.workload_executor import WORKLOAD_METADATA
+from ._helpers import run_in_threadpool, run_in_workload
 
 logger = Logger(__name__)
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -208,31 +208,22 @@ async def get_visible_parts_for_dropdown(current_user: CurrentUserDep, user_pref
 
 
 @user_router.get("/history")
-async def get_user_history(current_user: CurrentUserDep, sql_log_service: SQLLogServiceDep):
-    """ユーザーの直近6か月のSQL履歴を返す。
+async def get_user_history(current_user: CurrentUserDep, sql_log_service: SQLLogServiceDep,
+                           limit: Optional[int] = None, cursor: Optional[str] = None):
+    """ユーザーの直近（history_retention_days 日）のSQL履歴を新しい順に返す。
 
-    応答は { "history": [...], "total_count": n } 形式。
+    応答は { "history": [...], "total_count": n, "next_cursor": str | null } 形式。
+    期間の絞り込みはログストア側で行い、続きは next_cursor を cursor に指定して取得する。
     """
-    six_months_ago = datetime.now() - timedelta(days=180)
-    settings = get_settings()
-    result = sql_log_service.get_logs(user_id=current_user["user_id"], limit=settings.max_history_logs, offset=0)
-    history = []
-    for log in result.get("logs", []):
-        ts = log.get("timestamp")
-        try:
-            dt = datetime.fromisoformat(ts) if isinstance(ts, str) else ts
-            if isinstance(dt, datetime) and dt >= six_months_ago:
-                history.append({
-                    "sql": log.get("sql"),
-                    "execution_time": log.get("execution_time"),
-                    "row_count": log.get("row_count"),
-                    "timestamp": dt.isoformat() if isinstance(dt, datetime) else str(ts),
-                })
-        except Exception:
-            # タイムスタンプ不正はスキップ
-            continue
+    result = await run_in_threadpool(sql_log_service.get_history, current_user["user_id"], limit, cursor)
+    history = [{
+        "sql": log.get("sql"),
+        "execution_time": log.get("execution_time"),
+        "row_count": log.get("row_count"),
+        "timestamp": log.get("timestamp"),
+    } for log in result.get("logs", [])]
     # フロント互換のため logs と history の両方を返す
-    return {"logs": history, "history": history, "total_count": len(history)}
+    return {"logs": history, "history": history, "total_count": len(history), "next_cursor": result.get("next_cursor")}
 
 
 # Admin logs endpoints under /admin to match original paths
@@ -324,7 +315,7 @@ async def get_business_users(current_admin: CurrentAdminDep, user_service: UserS
 @router.post("/business-users/refresh", response_model=BusinessUserRefreshResponse)
 async def refresh_business_users(current_admin: CurrentAdminDep, user_service: UserServiceDep):
     try:
-        updated_count = await run_in_threadpool(user_service.refresh_users_from_db)
+        updated_count = await run_in_workload(WORKLOAD_METADATA, user_service.refresh_users_from_db)
         return BusinessUserRefreshResponse(
             success=True,
             updated_count=updated_count,
@@ -6,7 +6,7 @@ from datetime import datetime
 import csv
 import io
 import inspect
-import asyncio
+from functools import partial
 
 from app.config_simplified import get_settings
 from app.api.models import (
@@ -15,11 +15,14 @@ from app.api.models import (
     DummyDataRequest, DummyDataResponse
 )
 from app.dependencies import (
-    HybridSQLServiceDep, CurrentUserDep, SQLLogServiceDep,
-    StreamingStateServiceDep, SessionServiceDep
+    HybridSQLServiceDep, CurrentUserDep, CurrentAdminDep, SQLLogServiceDep,
+    StreamingStateServiceDep, SessionServiceDep, ResultCacheServiceDep,
+    ExecutionSchedulerDep, QueryCostGateDep
 )
 from app.services.cache_cleanup_service import CacheCleanupService
+from app.services.workload_executor import WORKLOAD_INGEST, WORKLOAD_EXPORT
 from app.logger import Logger
+from ._helpers import run_in_threadpool, run_in_workload
 
 logger = Logger(__name__)
 router = APIRouter(prefix="/sql/cache", tags=["cache"])
@@ -36,13 +39,20 @@ async def execute_sql_with_cache_endpoint(
         raise HTTPException(status_code=400, detail="SQLクエリが無効です")
     start_time = datetime.now()
     try:
-        maybe = hybrid_sql_service.execute_sql_with_cache(request.sql, current_user["user_id"], request.limit)
+        # 件数確認・実行枠の待機・データ取得はイベントループを止めないよう、待機分を見込んだ ingest プールで行う
+        maybe = await run_in_workload(
+            WORKLOAD_INGEST, hybrid_sql_service.execute_sql_with_cache,
+            request.sql, current_user["user_id"], request.limit,
+            scope=current_user.get("role", "DEFAULT"), bypass_cache=request.bypass_cache, lane=request.lane,
+            confirmed=request.confirmed
+        )
         result = await maybe if inspect.isawaitable(maybe) else maybe
     except Exception as e:
         logger.error(f"キャッシュ付きSQL実行エラー: {e}")
         raise HTTPException(status_code=400, detail=str(e))
     if result.get("status") == "requires_confirmation":
-        return CacheSQLResponse(success=False, session_id=None, total_count=result["total_count"], processed_rows=0, execution_time=0, message=result["message"], error_message=None)
+        return CacheSQLResponse(success=False, session_id=None, total_count=result["total_count"], processed_rows=0, execution_time=0, message=result["message"], error_message=None,
+                                status="requires_confirmation", cost_estimate=result.get("cost_estimate"))
     response = CacheSQLResponse(
         success=result["success"],
         session_id=result["session_id"],
@@ -51,6 +61,9 @@ async def execute_sql_with_cache_endpoint(
         execution_time=result["execution_time"],
         message=result["message"],
         error_message=result.get("error_message"),
+        status=result.get("status"),
+        cache_hit=result.get("cache_hit", False),
+        cost_estimate=result.get("cost_estimate"),
     )
     maybe_log = sql_log_service.add_log_to_db(
         current_user["user_id"], request.sql, result["execution_time"], start_time, result["processed_rows"], result["success"], result.get("error_message")
@@ -77,8 +90,11 @@ async def execute_sql_with_cache_async_endpoint(
     
     try:
         # 軽量検証を実行し、即座にsession_idを取得
+        scope = current_user.get("role", "DEFAULT")
         maybe_prepare = hybrid_sql_service.prepare_sql_execution(
-            request.sql, current_user["user_id"], request.limit
+            request.sql, current_user["user_id"], request.limit,
+            scope=scope, bypass_cache=request.bypass_cache, lane=request.lane,
+            confirmed=request.confirmed
         )
         prepare_result = await maybe_prepare if inspect.isawaitable(maybe_prepare) else maybe_prepare
         
@@ -91,7 +107,9 @@ async def execute_sql_with_cache_async_endpoint(
                 processed_rows=0, 
                 execution_time=0, 
                 message=prepare_result["message"], 
-                error_message=None
+                error_message=None,
+                status="requires_confirmation",
+                cost_estimate=prepare_result.get("cost_estimate")
             )
         
         if not prepare_result.get("success", True):
@@ -106,26 +124,55 @@ async def execute_sql_with_cache_async_endpoint(
             )
         
         session_id = prepare_result["session_id"]
+
+        # 結果再利用キャッシュにヒットした場合は実行不要のため即座に完了を返却
+        if prepare_result.get("cache_hit"):
+            maybe_log = sql_log_service.add_log_to_db(
+                current_user["user_id"], request.sql, prepare_result["execution_time"], start_time,
+                prepare_result["processed_rows"], True, None
+            )
+            if inspect.isawaitable(maybe_log):
+                await maybe_log
+            return CacheSQLResponse(
+                success=True,
+                session_id=session_id,
+                total_count=prepare_result["total_count"],
+                processed_rows=prepare_result["processed_rows"],
+                execution_time=prepare_result["execution_time"],
+                message=prepare_result["message"],
+                error_message=None,
+                status="completed",
+                cache_hit=True
+            )
         
-        # バックグラウンドタスクでSQL実行を開始
-        background_tasks.add_task(
-            hybrid_sql_service.execute_sql_background,
-            request.sql,
-            session_id,
-            current_user["user_id"],
-            request.limit
-        )
-        
-        # バックグラウンドタスクでログ記録も追加
-        background_tasks.add_task(
-            log_sql_execution_async,
-            sql_log_service,
-            current_user["user_id"],
-            request.sql,
-            start_time,
-            session_id
-        )
-        
+        try:
+            # 完了・エラー・キャンセル時にログを記録（実行開始前に登録し、取りこぼしを防ぐ）
+            maybe_hooked = hybrid_sql_service.add_completion_hook(
+                session_id,
+                partial(log_sql_execution_on_finish, sql_log_service, current_user["user_id"], request.sql, start_time)
+            )
+            if inspect.isawaitable(maybe_hooked):
+                maybe_hooked = await maybe_hooked
+            if maybe_hooked is False:
+                logger.warning(f"完了フックを登録できないため実行ログは記録されません: {session_id}")
+
+            # バックグラウンドタスクでSQL実行を開始（取り込み専用スレッドプールで実行）
+            background_tasks.add_task(
+                execute_sql_in_background,
+                hybrid_sql_service,
+                request.sql,
+                session_id,
+                current_user["user_id"],
+                request.limit,
+                scope
+            )
+        except Exception:
+            # 実行待ちキューに登録済みのチケットが残ると、後続の実行がタイムアウトまで待たされるため解放する
+            maybe_cleaned = hybrid_sql_service.cleanup_session(session_id)
+            if inspect.isawaitable(maybe_cleaned):
+                await maybe_cleaned
+            raise
+
         # 即座にsession_idとprocessing状態を返却
         return CacheSQLResponse(
             success=True,
@@ -135,7 +182,9 @@ async def execute_sql_with_cache_async_endpoint(
             execution_time=0,
             message=prepare_result["message"],
             error_message=None,
-            status="processing"
+            status="processing",
+            queue_position=prepare_result.get("queue_position"),
+            cost_estimate=prepare_result.get("cost_estimate")
         )
         
     except Exception as e:
@@ -143,47 +192,45 @@ async def execute_sql_with_cache_async_endpoint(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-async def log_sql_execution_async(
-    sql_log_service, 
-    user_id: str, 
-    sql: str, 
-    start_time: datetime, 
-    session_id: str
+async def execute_sql_in_background(hybrid_sql_service, sql: str, session_id: str, user_id: str,
+                                    limit: Optional[int], scope: Optional[str]):
+    """バックグラウンドタスク本体（取り込み専用スレッドプールでSQLを実行し、完了まで待つ）
+
+    BackgroundTasks は同期関数の戻り値を await しないため、コルーチンを返す run_in_workload は
+    直接登録せず、この async 関数の中で await する。
+    """
+    await run_in_workload(
+        WORKLOAD_INGEST, hybrid_sql_service.execute_sql_background, sql, session_id, user_id, limit, scope
+    )
+
+
+def log_sql_execution_on_finish(
+    sql_log_service,
+    user_id: str,
+    sql: str,
+    start_time: datetime,
+    state: dict
 ):
-    """バックグラウンドでのSQL実行ログ記録"""
+    """バックグラウンド実行の終了時（完了・エラー・キャンセル）にSQL実行ログを記録する完了フック
+
+    実行時間の長さに関係なく一度だけ呼ばれる。ログの書き込みは SQLLogService（非同期書き込み有効時はキュー投入のみ）に任せる。
+    """
+    session_id = state.get('session_id')
     try:
-        # セッション完了まで待機（最大5分）
-        max_wait_time = 300  # 5分
-        wait_interval = 1    # 1秒間隔
-        
-        for _ in range(max_wait_time):
-            # セッション情報を取得してチェック
-            from app.dependencies import get_cache_service_di
-            cache_service = get_cache_service_di()
-            session_info = cache_service.get_session_info(session_id)
-            
-            if session_info and session_info.get('is_complete', False):
-                # 完了していればログ記録
-                execution_time = session_info.get('execution_time', 0)
-                processed_rows = session_info.get('processed_rows', 0)
-                
-                maybe_log = sql_log_service.add_log_to_db(
-                    user_id, sql, execution_time, start_time, processed_rows, True, None
-                )
-                if inspect.isawaitable(maybe_log):
-                    await maybe_log
-                
-                logger.info(f"バックグラウンドログ記録完了: {session_id}")
-                break
-            
-            # 1秒待機
-            await asyncio.sleep(wait_interval)
-        else:
-            # タイムアウトの場合
-            logger.warning(f"ログ記録タイムアウト: {session_id}")
-            
+        status = state.get('status')
+        success = status == 'completed'
+        error_message = None
+        if status == 'error':
+            error_message = state.get('error_message') or "SQL実行に失敗しました"
+        elif status == 'cancelled':
+            error_message = "ユーザーによりキャンセルされました"
+        sql_log_service.add_log_to_db(
+            user_id, sql, state.get('execution_time', 0), start_time,
+            state.get('processed_count', 0), success, error_message
+        )
+        logger.info(f"バックグラウンドログ記録完了: {session_id}, 状態: {status}")
     except Exception as e:
-        logger.error(f"バックグラウンドログ記録エラー: {e}")
+        logger.error(f"バックグラウンドログ記録エラー: {session_id}, {e}")
 
 
 @router.post("/read", response_model=CacheReadResponse)
@@ -217,31 +264,43 @@ async def read_cached_data_endpoint(request: CacheReadRequest = Body(...), hybri
 
 
 @router.get("/status/{session_id}", response_model=SessionStatusResponse)
-async def get_session_status_endpoint(session_id: str, streaming_state_service: StreamingStateServiceDep):
+async def get_session_status_endpoint(session_id: str, streaming_state_service: StreamingStateServiceDep, execution_scheduler: ExecutionSchedulerDep):
     state = streaming_state_service.get_state(session_id)
     if not state:
         raise HTTPException(status_code=404, detail="セッションが見つかりません")
     progress = (state["processed_count"] / state["total_count"]) * 100 if state["total_count"] > 0 else 0
+    queue_position = execution_scheduler.get_queue_position(session_id)
+    message = f"実行待ちです（{queue_position}番目）" if queue_position else None
     return SessionStatusResponse(
         session_id=state["session_id"],
         status=state["status"],
         total_count=state["total_count"],
         processed_count=state["processed_count"],
         progress_percentage=progress,
-        is_complete=state["status"] == "completed",
+        # エラー・キャンセルも終端状態として扱い、クライアントのポーリングを終了させる
+        is_complete=state["status"] in ("completed", "error", "cancelled"),
         error_message=state.get("error_message"),
+        phase=state.get("phase"),
+        queue_position=queue_position,
+        message=message,
     )
 
 
 @router.post("/cancel", response_model=CancelResponse)
-async def cancel_streaming_endpoint(request: CancelRequest, streaming_state_service: StreamingStateServiceDep, hybrid_sql_service: HybridSQLServiceDep):
-    success = streaming_state_service.cancel_streaming(request.session_id)
-    if success:
-        maybe = hybrid_sql_service.cleanup_session(request.session_id)
-        if inspect.isawaitable(maybe):
-            await maybe
-        return CancelResponse(success=True, message="ストリーミングをキャンセルしました")
-    return CancelResponse(success=False, error_message="キャンセルできませんでした")
+async def cancel_streaming_endpoint(request: CancelRequest, hybrid_sql_service: HybridSQLServiceDep):
+    # 実行中のクエリはウェアハウス側でも中断する（cursor.cancel / SYSTEM$CANCEL_QUERY）
+    result = await run_in_threadpool(hybrid_sql_service.cancel_execution, request.session_id)
+    if inspect.isawaitable(result):
+        result = await result
+    if result.get("success"):
+        return CancelResponse(
+            success=True,
+            message="ストリーミングをキャンセルしました",
+            server_cancelled=result.get("server_cancelled"),
+            cancel_method=result.get("cancel_method"),
+            query_id=result.get("query_id"),
+        )
+    return CancelResponse(success=False, error_message=result.get("message") or "キャンセルできませんでした")
 
 
 @router.delete("/session/{session_id}")
@@ -301,7 +360,9 @@ async def download_cached_csv_endpoint(request: CacheReadRequest = Body(...), hy
         raise HTTPException(status_code=400, detail="session_idが必要です")
     try:
         settings = get_settings()
-        result = hybrid_sql_service.get_cached_data(
+        result = await run_in_workload(
+            WORKLOAD_EXPORT,
+            hybrid_sql_service.get_cached_data,
             request.session_id,
             page=1,
             page_size=settings.max_records_for_csv_download,
@@ -334,6 +395,24 @@ async def get_cache_unique_values(request: CacheUniqueValuesRequest, hybrid_sql_
         raise HTTPException(status_code=500, detail=f"ユニーク値の取得に失敗しました: {str(e)}")
 
 
+@router.get("/queue/stats")
+async def get_execution_queue_stats(current_admin: CurrentAdminDep, execution_scheduler: ExecutionSchedulerDep):
+    """管理者用：実行待ちキューの状況（実行中/待機中件数、平均待ち時間等）を取得"""
+    return execution_scheduler.get_stats()
+
+
+@router.get("/result-cache/metrics")
+async def get_result_cache_metrics(current_admin: CurrentAdminDep, result_cache_service: ResultCacheServiceDep):
+    """管理者用：結果再利用キャッシュのヒット/ミス等のメトリクスを取得"""
+    return result_cache_service.get_metrics()
+
+
+@router.get("/cost-gate/metrics")
+async def get_query_cost_gate_metrics(current_admin: CurrentAdminDep, query_cost_gate: QueryCostGateDep):
+    """管理者用：実行前コストゲートのEXPLAIN実行数・見積もりキャッシュヒット数・判定件数を取得"""
+    return query_cost_gate.get_metrics()
+
+
 @router.post("/admin/cleanup")
 async def manual_cache_cleanup():
     """管理者用：手動キャッシュクリーンアップ実行"""
@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException
 import time
 from app import __version__
 from app.api.models import HealthCheckResponse, PerformanceMetricsResponse
-from app.dependencies import QueryExecutorDep, PerformanceServiceDep
+from app.dependencies import QueryExecutorDep, PerformanceServiceDep, WorkloadExecutorsDep
 from app.logger import Logger
 
 logger = Logger(__name__)
@@ -31,3 +31,9 @@ async def get_performance_metrics_route(performance_service: PerformanceServiceD
         return PerformanceMetricsResponse(timestamp=time.time(), metrics=metrics)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/performance/executors")
+async def get_executor_metrics_route(workload_executors: WorkloadExecutorsDep):
+    """ワークロード別スレッドプールのキュー滞留数・稼働スレッド数を取得"""
+    return {"timestamp": time.time(), "executors": workload_executors.get_metrics()}
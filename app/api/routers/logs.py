@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 from fastapi import APIRouter, HTTPException
-from typing import List
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import csv
+import io
 
 from app.config_simplified import get_settings
-from app.api.models import SQLExecutionLog, SQLExecutionLogResponse
-from app.dependencies import CurrentUserDep, CurrentAdminDep, SQLLogServiceDep
+from app.api.models import SQLExecutionLog, SQLExecutionLogResponse, LogExportRequest
+from app.dependencies import CurrentUserDep, CurrentAdminDep, SQLLogServiceDep, LogAnalyticsServiceDep
+from app.services.log_analytics_service import GRAIN_DAY, GRAINS
+from app.services.workload_executor import WORKLOAD_EXPORT
 from app.logger import Logger
+from ._helpers import run_in_threadpool, iterate_in_workload
 
 logger = Logger(__name__)
 router = APIRouter(prefix="/logs", tags=["logs"])
@@ -50,26 +56,95 @@ async def get_all_sql_logs(current_admin: CurrentAdminDep, sql_log_service: SQLL
     return SQLExecutionLogResponse(logs=logs, total_count=result["total_count"])
 
 
+# 分析の既定の対象期間（日数）
+DEFAULT_ANALYTICS_DAYS = 30
+
+# エクスポートするCSVの列
+LOG_EXPORT_COLUMNS = ["timestamp", "user_id", "sql", "execution_time"]
+
+# エクスポートでまとめて送る行数
+LOG_EXPORT_FLUSH_ROWS = 1000
+
+
 @router.get("/analytics")
-async def get_log_analytics(current_user: CurrentUserDep):
-    raise HTTPException(status_code=501, detail="ログ分析APIは未実装です")
+async def get_log_analytics(current_user: CurrentUserDep, log_analytics: LogAnalyticsServiceDep,
+                            start_date: Optional[date] = None, end_date: Optional[date] = None,
+                            grain: str = GRAIN_DAY):
+    """自分のSQL実行の件数・実行時間（p50/p95）・取得行数の推移と上位SQL（ロールアップから集計）"""
+    return await _get_analytics(log_analytics, start_date, end_date, grain, current_user["user_id"], False)
+
+
+@router.get("/admin/analytics")
+async def get_all_log_analytics(current_admin: CurrentAdminDep, log_analytics: LogAnalyticsServiceDep,
+                                start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                grain: str = GRAIN_DAY, user_id: Optional[str] = None):
+    """全体（user_id 指定時はそのユーザー）の分析と、実行件数の多いユーザーの一覧"""
+    return await _get_analytics(log_analytics, start_date, end_date, grain, user_id, True)
+
+
+async def _get_analytics(log_analytics, start_date: Optional[date], end_date: Optional[date], grain: str,
+                         user_id: Optional[str], include_users: bool):
+    if log_analytics is None:
+        raise HTTPException(status_code=503, detail="ログ分析は無効化されています")
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain は {', '.join(GRAINS)} のいずれかを指定してください")
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date は end_date 以前の日付を指定してください")
+    return await run_in_threadpool(log_analytics.get_analytics, start_date, end_date, grain, user_id, include_users)
 
 
 @router.post("/export")
-async def export_logs(current_user: CurrentUserDep):
-    raise HTTPException(status_code=501, detail="ログエクスポートAPIは未実装です")
+async def export_logs(request: LogExportRequest, current_user: CurrentUserDep, sql_log_service: SQLLogServiceDep):
+    """自分のSQL実行ログをCSVでストリーミングダウンロード"""
+    return _stream_logs_csv(sql_log_service, request, current_user["user_id"])
+
+
+@router.post("/admin/export")
+async def export_all_logs(request: LogExportRequest, current_admin: CurrentAdminDep, sql_log_service: SQLLogServiceDep):
+    """全ユーザー（user_id 指定時はそのユーザー）のSQL実行ログをCSVでストリーミングダウンロード"""
+    return _stream_logs_csv(sql_log_service, request, request.user_id)
+
+
+def _stream_logs_csv(sql_log_service, request: LogExportRequest, user_id: Optional[str]) -> StreamingResponse:
+    """期間内のログをログストアから keyset で読み進めながらCSVで返す（全件をメモリに載せない）"""
+    if request.format != "csv":
+        raise HTTPException(status_code=400, detail="エクスポート形式は csv のみ対応しています")
+    end_date = request.end_date or date.today()
+    start_date = request.start_date or end_date - timedelta(days=get_settings().history_retention_days)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date は end_date 以前の日付を指定してください")
+    since = datetime.combine(start_date, datetime.min.time())
+    until = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    def csv_stream_generator():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(LOG_EXPORT_COLUMNS)
+        exported = 0
+        for log in sql_log_service.iter_logs(user_id, since, until):
+            writer.writerow([log.get(column) for column in LOG_EXPORT_COLUMNS])
+            exported += 1
+            if exported % LOG_EXPORT_FLUSH_ROWS == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+        logger.info(f"SQL実行ログのエクスポート完了: {exported}件, 対象ユーザー: {user_id or '全員'}")
+
+    filename = f"sql_logs_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv"
+    return StreamingResponse(
+        iterate_in_workload(WORKLOAD_EXPORT, csv_stream_generator()),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 
 @router.get("/user-history")
-async def get_user_history(current_user: CurrentUserDep, sql_log_service: SQLLogServiceDep):
-    six_months_ago = datetime.now() - timedelta(days=180)
-    settings = get_settings()
-    result = sql_log_service.get_logs(user_id=current_user["user_id"], limit=settings.max_history_logs, offset=0)
-    filtered = []
-    for log in result["logs"]:
-        try:
-            if datetime.fromisoformat(log["timestamp"]) >= six_months_ago:
-                filtered.append(log)
-        except Exception:
-            continue
-    return {"logs": filtered, "total_count": len(filtered)}
+async def get_user_history(current_user: CurrentUserDep, sql_log_service: SQLLogServiceDep,
+                           limit: Optional[int] = None, cursor: Optional[str] = None):
+    """直近の履歴を新しい順に返す（続きは next_cursor を cursor に指定して取得）"""
+    result = await run_in_threadpool(sql_log_service.get_history, current_user["user_id"], limit, cursor)
+    logs = result.get("logs", [])
+    return {"logs": logs, "total_count": len(logs), "next_cursor": result.get("next_cursor")}
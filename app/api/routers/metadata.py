@@ -1,25 +1,37 @@
 # -*- coding: utf-8 -*-
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Depends, Query, Response
+from fastapi.responses import JSONResponse
 import asyncio
 from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 
 from app.api.models import UserInfo
-from app.dependencies import MetadataServiceDep, VisibilityControlServiceDep, CurrentUserDep
-from ._helpers import run_in_threadpool, get_master_data_service
+from app.dependencies import (
+    MetadataServiceDep, VisibilityControlServiceDep, CurrentUserDep, MetadataSearchServiceDep,
+    get_workload_executors_di, get_current_user_optional
+)
+from app.services.workload_executor import WORKLOAD_METADATA
+from ._helpers import run_in_threadpool, run_in_workload, get_master_data_service
 from app.logger import Logger
 from app.exceptions import BaseAppException, MetadataError
 
 logger = Logger(__name__)
 router = APIRouter(prefix="/metadata", tags=["metadata"])
 
+# 階層別エンドポイントの1ページあたりの最大件数
+MAX_PAGE_SIZE = 5000
+# メタデータ検索の最大件数
+MAX_SEARCH_RESULTS = 200
+
 
 @router.get("/all", response_model=List[Dict[str, Any]])
 async def get_all_metadata_endpoint(
     metadata_service: MetadataServiceDep, visibility_service: VisibilityControlServiceDep, current_user: CurrentUserDep
 ):
     logger.info("全メタデータ取得要求（キャッシュ利用）")
-    all_metadata = await run_in_threadpool(metadata_service.get_all_metadata)
+    snapshot = await run_in_threadpool(metadata_service.get_metadata_snapshot)
+    # スナップショットが空の場合はモックデータへのフォールバックを含む get_all_metadata を使う
+    all_metadata = snapshot if not snapshot.is_empty else await run_in_threadpool(metadata_service.get_all_metadata)
     user_role = current_user.get("role", "DEFAULT")
     filtered = await run_in_threadpool(visibility_service.filter_metadata, all_metadata, user_role)
     return filtered
@@ -58,10 +70,12 @@ async def get_all_metadata_raw_admin_endpoint(visibility_service: VisibilityCont
 @router.post("/refresh", response_model=List[Dict[str, Any]])
 async def refresh_all_metadata_endpoint(
     metadata_service: MetadataServiceDep,
-    master_data_service=Depends(get_master_data_service)
+    master_data_service=Depends(get_master_data_service),
+    full: bool = False
 ):
     """メタデータとマスター情報の強制更新。
 
+    メタデータは前回同期以降の変更分のみを差分同期する（full=true で全件再同期）。
     重い処理のため、即時にレスポンスを返す方針。
     - まずバックグラウンドでメタデータとマスター情報の更新を開始
     - 可能なら短時間だけ待機して完了を待つ
@@ -70,7 +84,10 @@ async def refresh_all_metadata_endpoint(
     logger.info("メタデータとマスター情報の強制更新要求(非同期起動)")
     loop = asyncio.get_running_loop()
     # バックグラウンドで開始（メタデータとマスター情報の両方を更新）
-    future = loop.run_in_executor(None, metadata_service.refresh_full_metadata_and_master_cache, master_data_service)
+    future = loop.run_in_executor(
+        get_workload_executors_di().get(WORKLOAD_METADATA),
+        metadata_service.refresh_full_metadata_and_master_cache, master_data_service, full
+    )
     try:
         # 短時間だけ待機（例: 2.5秒）
         await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=2.5)
@@ -85,13 +102,47 @@ async def refresh_all_metadata_endpoint(
     return await run_in_threadpool(metadata_service.get_all_metadata)
 
 
+def _user_role(current_user: Optional[dict]) -> str:
+    """表示制御に使うロール（未ログインの場合は DEFAULT の設定を適用）"""
+    return (current_user or {}).get("role", "DEFAULT")
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match が現在のETagと一致する場合は 304 を返す"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _paged_response(items: List[Dict[str, Any]], limit: Optional[int], offset: int, etag: str) -> JSONResponse:
+    """ページングを適用した一覧を返す（本文は従来どおり配列、総件数はヘッダーで返す）"""
+    page = items[offset:offset + limit] if limit is not None else items[offset:]
+    headers = {"ETag": etag, "X-Total-Count": str(len(items))}
+    if limit is not None and offset + limit < len(items):
+        headers["X-Next-Offset"] = str(offset + limit)
+    return JSONResponse(content=page, headers=headers)
+
+
 @router.get("/schemas")
-async def get_schemas_endpoint(metadata_service: MetadataServiceDep, request: Request):
+async def get_schemas_endpoint(
+    metadata_service: MetadataServiceDep,
+    visibility_service: VisibilityControlServiceDep,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
     try:
-        schemas = await run_in_threadpool(metadata_service.get_schemas)
+        user_role = _user_role(current_user)
+        etag = await run_in_threadpool(metadata_service.get_metadata_etag, user_role, visibility_service)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        schemas = await run_in_threadpool(metadata_service.get_schemas, user_role, visibility_service)
         if request.query_params.get("compat") == "1":
             return {"schemas": schemas}
-        return schemas
+        return _paged_response(schemas, limit, offset, etag)
     except MetadataError as e:
         # テスト要件: MetadataError は 400 で返す
         raise HTTPException(status_code=400, detail=str(e))
@@ -104,23 +155,74 @@ async def get_schemas_endpoint(metadata_service: MetadataServiceDep, request: Re
 
 
 @router.get("/schemas/{schema_name}/tables", response_model=List[Dict[str, Any]])
-async def get_tables_endpoint(schema_name: str, metadata_service: MetadataServiceDep):
+async def get_tables_endpoint(
+    schema_name: str,
+    metadata_service: MetadataServiceDep,
+    visibility_service: VisibilityControlServiceDep,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
     try:
-        return await run_in_threadpool(metadata_service.get_tables, schema_name)
+        user_role = _user_role(current_user)
+        etag = await run_in_threadpool(metadata_service.get_metadata_etag, user_role, visibility_service)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        tables = await run_in_threadpool(metadata_service.get_tables, schema_name, user_role, visibility_service)
+        return _paged_response(tables, limit, offset, etag)
     except Exception as e:
         logger.error(f"メタデータ取得エラー(テーブル): {e}")
         raise HTTPException(status_code=500, detail="メタデータ取得に失敗しました")
 
 
 @router.get("/schemas/{schema_name}/tables/{table_name}/columns", response_model=List[Dict[str, Any]])
-async def get_columns_endpoint(schema_name: str, table_name: str, metadata_service: MetadataServiceDep):
+async def get_columns_endpoint(
+    schema_name: str,
+    table_name: str,
+    metadata_service: MetadataServiceDep,
+    visibility_service: VisibilityControlServiceDep,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
     try:
-        return await run_in_threadpool(metadata_service.get_columns, schema_name, table_name)
+        user_role = _user_role(current_user)
+        etag = await run_in_threadpool(metadata_service.get_metadata_etag, user_role, visibility_service)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        columns = await run_in_threadpool(
+            metadata_service.get_columns, schema_name, table_name, user_role, visibility_service
+        )
+        return _paged_response(columns, limit, offset, etag)
     except Exception as e:
         logger.error(f"メタデータ取得エラー(カラム): {e}")
         raise HTTPException(status_code=500, detail="メタデータ取得に失敗しました")
 
 
+@router.get("/search", response_model=List[Dict[str, Any]])
+async def search_metadata_endpoint(
+    search_service: MetadataSearchServiceDep,
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="カンマ区切りの対象種別（schema,table,column）"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+):
+    """スキーマ・テーブル・カラムの名前とコメントを検索（関連度順、表示設定を適用）"""
+    object_types = [t.strip().lower() for t in types.split(",") if t.strip()] if types else None
+    invalid = [t for t in object_types or [] if t not in search_service.OBJECT_TYPES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不正な検索対象です: {', '.join(invalid)}")
+    try:
+        return await run_in_threadpool(search_service.search, q, _user_role(current_user), object_types, limit)
+    except Exception as e:
+        logger.error(f"メタデータ検索エラー: {e}")
+        raise HTTPException(status_code=500, detail="メタデータ検索に失敗しました")
+
+
 @router.get("/visibility-settings")
 async def get_visibility_settings_for_user(visibility_service: VisibilityControlServiceDep):
     get_fn = getattr(visibility_service, "get_all_visibility_settings", None) or visibility_service.get_all_settings
@@ -131,14 +233,14 @@ async def get_visibility_settings_for_user(visibility_service: VisibilityControl
 @router.post("/refresh-cache")
 async def refresh_all_metadata_normalized_endpoint(metadata_service: MetadataServiceDep):
     logger.info("メタデータキャッシュ更新要求")
-    await run_in_threadpool(metadata_service.refresh_full_metadata_cache)
+    await run_in_workload(WORKLOAD_METADATA, metadata_service.refresh_full_metadata_cache)
     return {"message": "メタデータキャッシュが更新されました"}
 
 
 @router.delete("/cache")
 async def clear_cache_endpoint(metadata_service: MetadataServiceDep):
     logger.info("メタデータキャッシュクリア要求")
-    await run_in_threadpool(metadata_service.clear_cache)
+    await run_in_workload(WORKLOAD_METADATA, metadata_service.clear_cache)
     return {"message": "メタデータキャッシュがクリアされました"}
 
 
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 from datetime import datetime
 import csv
 import io
 import re
+import threading
+import uuid
 from typing import Optional
 from fastapi import BackgroundTasks
+from starlette.background import BackgroundTask
 from openpyxl import Workbook
 from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 
@@ -17,18 +20,21 @@ from app.api.models import (
 )
 from app.dependencies import (
     SQLValidatorDep, CompletionServiceDep,
-    ConnectionManagerDep, ExportServiceDep, QueryExecutorDep,
+    ConnectionManagerDep, ExportServiceDep, QueryExecutorDep, ExecutionSchedulerDep,
     get_current_user_optional, get_sql_log_service_di,
     get_hybrid_sql_service_di,
 )
 from app.services.sql_log_service import SQLLogService
+from app.services.completion_channel import CompletionChannel
 from typing import Annotated
 
-from ._helpers import run_in_threadpool
+from ._helpers import run_in_threadpool, run_in_workload, iterate_in_workload
 from app.logger import Logger, get_logger
 from app.exceptions import SQLValidationError, SQLExecutionError
 from app.config_simplified import get_settings
 from app.sql_validator import get_validator
+from app.services.execution_scheduler import LANE_BULK
+from app.services.workload_executor import WORKLOAD_EXPORT
 import time
 
 logger = get_logger(__name__)
@@ -61,16 +67,42 @@ async def format_sql_endpoint(request: SQLFormatRequest, sql_validator: SQLValid
 
 
 @router.post("/suggest", response_model=SQLCompletionResponse)
-async def suggest_sql_endpoint(request: SQLCompletionRequest, completion_service: CompletionServiceDep):
+async def suggest_sql_endpoint(
+    request: SQLCompletionRequest,
+    completion_service: CompletionServiceDep,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+):
     if not request.sql:
         raise HTTPException(status_code=400, detail="SQLクエリが空です")
+    user_id = current_user.get("user_id") if current_user else None
     try:
-        return await run_in_threadpool(completion_service.get_completions, request.sql, request.position, request.context)
+        return await run_in_threadpool(
+            completion_service.get_completions, request.sql, request.position, request.context, user_id
+        )
     except Exception as e:
         logger.error(f"SQL補完候補取得エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.websocket("/suggest/ws")
+async def suggest_sql_websocket(websocket: WebSocket, completion_service: CompletionServiceDep):
+    """エディタ接続ごとの補完チャネル（入力中のリクエストをデバウンスし、古いリクエストは取り消す）"""
+    await websocket.accept()
+    user = websocket.session.get("user") if "session" in websocket.scope else None
+    channel = CompletionChannel(
+        completion_service,
+        send=websocket.send_json,
+        run=run_in_threadpool,
+        user_id=user.get("user_id") if user else None,
+        debounce_seconds=get_settings().completion_ws_debounce_ms / 1000,
+    )
+    try:
+        await channel.serve(websocket.receive_json)
+    except WebSocketDisconnect:
+        pass
+    logger.debug(f"補完チャネルを終了しました: {channel.stats}")
+
+
 # /sql/connection/status エンドポイントは削除されました
 # 代替: /api/v1/health、/api/v1/connection/status（utils.py）
 
@@ -93,7 +125,10 @@ def _sanitize_filename(raw: str, default_prefix: str, extension: str) -> str:
 @router.post("/download/csv")  # 認証不要
 async def download_csv_endpoint(
     request: SQLRequest,
+    http_request: Request,
     connection_manager: ConnectionManagerDep,
+    execution_scheduler: ExecutionSchedulerDep,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
 ):
     """CSVダウンロード
     テスト要件:
@@ -124,6 +159,32 @@ async def download_csv_endpoint(
             headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
         )
 
+    # --- 一括ダウンロードは bulk レーンで実行枠を待機（スレッドを占有せずイベントループ上で待つ） ---
+    ticket_id = f"csv_{uuid.uuid4().hex}"
+    user_id = _download_user_id(http_request, current_user)
+    acquired = await execution_scheduler.acquire_async(ticket_id, user_id, LANE_BULK)
+    if not acquired:
+        raise unified_error(503, "QUEUE_TIMEOUT", "CSVダウンロードに失敗しました: 実行待ちがタイムアウトしました")
+    try:
+        return await run_in_workload(
+            WORKLOAD_EXPORT, _start_csv_download, request, connection_manager, execution_scheduler, ticket_id, user_id
+        )
+    except Exception:
+        execution_scheduler.release(ticket_id)
+        raise
+
+
+def _download_user_id(http_request: Request, current_user: Optional[dict]) -> str:
+    """実行枠のユーザー単位の上限に使うID（未ログイン時は接続元ごとに分ける）"""
+    if current_user and current_user.get("user_id"):
+        return current_user["user_id"]
+    client_host = http_request.client.host if http_request.client else "unknown"
+    return f"anonymous@{client_host}"
+
+
+def _start_csv_download(request: SQLRequest, connection_manager, execution_scheduler, ticket_id: str,
+                        user_id: str) -> StreamingResponse:
+    """件数確認・SQL実行を行い、CSVストリーミングレスポンスを返す（実行枠はレスポンス終了時に解放）"""
     # --- 通常フロー: 件数取得 ---
     count_sql = f"SELECT COUNT(*) FROM ({request.sql}) as count_query"
     try:
@@ -132,39 +193,56 @@ async def download_csv_endpoint(
     except Exception:
         raise unified_error(500, "INTERNAL_ERROR", "CSVダウンロードに失敗しました: 接続確立に失敗しました")
 
-    try:
-        cursor.execute(count_sql)
-        result = cursor.fetchone()
-        total_count = result[0] if result else 0
-    except Exception:
-        # テスト期待: 500 かつ メッセージに "CSVダウンロードに失敗しました" を含む
-        raise unified_error(500, "INTERNAL_ERROR", "CSVダウンロードに失敗しました: 行数取得に失敗しました")
+    release_lock = threading.Lock()
+    released = []
 
-    settings = get_settings()
-    if total_count == 0:
-        # 既存テストは "データが見つかりません" を期待
-        raise unified_error(404, "NO_DATA", "データが見つかりません")
-    if total_count > settings.max_records_for_csv_download:
-        # メッセージに "データが大きすぎます" を含める (部分一致テスト)
-        message = f"データが大きすぎます: 行数が上限({settings.max_records_for_csv_download:,})を超えています"
-        raise unified_error(
-            400,
-            "LIMIT_EXCEEDED",
-            message,
-            limit=settings.max_records_for_csv_download,
-            total_count=total_count,
-        )
+    def release_resources():
+        """接続と実行枠を解放（ストリームの終了時とレスポンスの終了時の両方から呼ばれるため一度だけ行う）"""
+        with release_lock:
+            if released:
+                return
+            released.append(True)
+        try:
+            if conn_id:
+                connection_manager.release_connection(conn_id)
+        except Exception:
+            pass
+        execution_scheduler.release(ticket_id)
 
-    filename = _sanitize_filename(getattr(request, 'filename', None), 'query_result', 'csv')
     try:
-        cursor.execute(request.sql)
-        columns = [c[0] for c in cursor.description]
-    except Exception:
-        # テスト期待: SQL実行エラー時 500 かつ "CSVダウンロードに失敗しました"
-        raise unified_error(500, "INTERNAL_ERROR", "CSVダウンロードに失敗しました: SQL実行でエラーが発生しました")
+        try:
+            cursor.execute(count_sql)
+            result = cursor.fetchone()
+            total_count = result[0] if result else 0
+        except Exception:
+            # テスト期待: 500 かつ メッセージに "CSVダウンロードに失敗しました" を含む
+            raise unified_error(500, "INTERNAL_ERROR", "CSVダウンロードに失敗しました: 行数取得に失敗しました")
+
+        settings = get_settings()
+        if total_count == 0:
+            # 既存テストは "データが見つかりません" を期待
+            raise unified_error(404, "NO_DATA", "データが見つかりません")
+        if total_count > settings.max_records_for_csv_download:
+            # メッセージに "データが大きすぎます" を含める (部分一致テスト)
+            message = f"データが大きすぎます: 行数が上限({settings.max_records_for_csv_download:,})を超えています"
+            raise unified_error(
+                400,
+                "LIMIT_EXCEEDED",
+                message,
+                limit=settings.max_records_for_csv_download,
+                total_count=total_count,
+            )
 
-    # 認証不要: ユーザーが未ログインでも利用可能
-    user_label = "anonymous"
+        filename = _sanitize_filename(getattr(request, 'filename', None), 'query_result', 'csv')
+        try:
+            cursor.execute(request.sql)
+            columns = [c[0] for c in cursor.description]
+        except Exception:
+            # テスト期待: SQL実行エラー時 500 かつ "CSVダウンロードに失敗しました"
+            raise unified_error(500, "INTERNAL_ERROR", "CSVダウンロードに失敗しました: SQL実行でエラーが発生しました")
+    except Exception:
+        release_resources()
+        raise
 
     def csv_stream_generator():
         try:
@@ -182,18 +260,16 @@ async def download_csv_endpoint(
                 for row in chunk:
                     writer.writerow(row); processed_rows += 1
                 yield output.getvalue(); output.seek(0); output.truncate()
-            logger.info(f"CSVダウンロード完了: {processed_rows}件, ユーザー: {user_label}")
+            logger.info(f"CSVダウンロード完了: {processed_rows}件, ユーザー: {user_id}")
         finally:
-            try:
-                if conn_id:
-                    connection_manager.release_connection(conn_id)
-            except Exception:
-                pass
+            release_resources()
 
+    # クライアントの切断でストリームが開始されなかった場合も、レスポンス終了後の BackgroundTask で解放する
     return StreamingResponse(
-        csv_stream_generator(),
+        iterate_in_workload(WORKLOAD_EXPORT, csv_stream_generator()),
         media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
+        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""},
+        background=BackgroundTask(release_resources)
     )
 
 
@@ -227,7 +303,7 @@ async def cache_clipboard_tsv_endpoint(
     # 既存の get_cached_data を利用するため巨大 page_size を指定
     # ※本番では専用メソッド最適化を検討
     page_size = settings.max_records_for_clipboard_copy + 1  # 超過検知用に +1
-    data = sql_service.get_cached_data(session_id, page=1, page_size=page_size, filters=filters, sort_by=sort_by, sort_order=sort_order)
+    data = await run_in_workload(WORKLOAD_EXPORT, sql_service.get_cached_data, session_id, page=1, page_size=page_size, filters=filters, sort_by=sort_by, sort_order=sort_order)
     rows = data.get("data", []) if isinstance(data, dict) else []
     columns = data.get("columns", []) if isinstance(data, dict) else []
     total = len(rows)
@@ -261,7 +337,7 @@ async def cache_clipboard_tsv_endpoint(
 
     filename = _sanitize_filename(filename_raw, 'query_result', 'tsv')
     return StreamingResponse(
-        tsv_stream(),
+        iterate_in_workload(WORKLOAD_EXPORT, tsv_stream()),
         media_type="text/tab-separated-values; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
     )
@@ -291,7 +367,7 @@ async def cache_download_excel_endpoint(
     chart_config = request.get("chart_config")  # グラフ設定（SimpleChartConfig相当）
 
     page_size = settings.max_records_for_excel_download + 1
-    data = sql_service.get_cached_data(session_id, page=1, page_size=page_size, filters=filters, sort_by=sort_by, sort_order=sort_order)
+    data = await run_in_workload(WORKLOAD_EXPORT, sql_service.get_cached_data, session_id, page=1, page_size=page_size, filters=filters, sort_by=sort_by, sort_order=sort_order)
     rows = data.get("data", []) if isinstance(data, dict) else []
     columns = data.get("columns", []) if isinstance(data, dict) else []
     total = len(rows)
@@ -425,7 +501,7 @@ async def cache_download_excel_endpoint(
 
     filename = _sanitize_filename(filename_raw, 'query_result', 'xlsx')
     return StreamingResponse(
-        excel_stream(),
+        iterate_in_workload(WORKLOAD_EXPORT, excel_stream()),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
     )
@@ -5,6 +5,8 @@ from datetime import datetime
 
 from app.api.models import SQLRequest, ConnectionStatusResponse
 from app.dependencies import QueryExecutorDep, ExportServiceDep
+from app.services.workload_executor import WORKLOAD_EXPORT
+from ._helpers import iterate_in_workload
 
 router = APIRouter(tags=["utils"])
 
@@ -33,6 +35,6 @@ async def export_data_endpoint(request: SQLRequest, export_service: ExportServic
                 yield chunk
 
         filename = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        return StreamingResponse(stream_generator(), media_type="text/csv; charset=utf-8", headers={"Content-Disposition": f"attachment; filename={filename}"})
+        return StreamingResponse(iterate_in_workload(WORKLOAD_EXPORT, stream_generator()), media_type="text/csv; charset=utf-8", headers={"Content-Disposition": f"attachment; filename={filename}"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"エクスポートに失敗しました: {str(e)}")
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite一括永続化モジュール
+シャドウテーブルに一括ロードし、1トランザクションで本番テーブルと差し替える
+"""
+import re
+import sqlite3
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from app.logger import get_logger
+
+
+@dataclass
+class TableLoad:
+    """1テーブル分のロード内容"""
+    table: str
+    columns: Sequence[str]
+    rows: Iterable[tuple]
+    on_conflict: Optional[str] = None  # "IGNORE" / "REPLACE" など（None の場合は通常の INSERT）
+
+
+class ShadowTableLoader:
+    """シャドウテーブル方式の一括ロード
+
+    1. 本番テーブルと同じ定義のシャドウテーブルを作成し、executemany でバッチ単位にロード
+    2. 本番テーブルと同じインデックスをシャドウテーブル上に作成
+    3. 1トランザクションで本番テーブルを削除し、シャドウテーブルをリネームして差し替え
+
+    ロード中も読み取り側は差し替え前の本番テーブルを参照するため、書き込み途中の状態は見えない。
+    ロードはバッチ単位でコミットするため、行の取得に時間がかかっても他の書き込みを待たせない。
+    その代わりシャドウテーブル名は固定のため、同じテーブルへのロードは呼び出し側で直列化すること（MetadataCache._replace_tables）。
+    FTS5 などの仮想テーブルも同じ手順で差し替えられる（付随するシャドウテーブルは SQLite が追従する）。
+    """
+
+    SHADOW_SUFFIX = "__shadow"
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = 5000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.logger = get_logger(__name__)
+
+    def replace_tables(self, loads: List[TableLoad],
+                       on_swap: Optional[Callable[[sqlite3.Cursor], None]] = None,
+                       batches: Optional[Iterable[Tuple[str, Sequence[tuple]]]] = None) -> List[int]:
+        """指定テーブルの内容を一括で置き換える
+
+        batches には (テーブル名, 行リスト) を逐次渡せる（取得しながらロードする場合）。
+        各 TableLoad の rows をロードした後、batches の行を該当するシャドウテーブルへ追加する。
+        on_swap は差し替えと同じトランザクション内で実行される（同期状態の更新など）。
+        戻り値: テーブルごとのロード件数
+        """
+        cursor = self.conn.cursor()
+        shadows: List[str] = []
+        try:
+            counts = []
+            index_definitions = []
+            for load in loads:
+                shadow = load.table + self.SHADOW_SUFFIX
+                table_sql, index_sqls = self._get_definitions(cursor, load.table)
+                cursor.execute(f'DROP TABLE IF EXISTS "{shadow}"')
+                cursor.execute(self._rename_in_ddl(table_sql, load.table, shadow))
+                shadows.append(shadow)
+                counts.append(self._load_rows(cursor, shadow, load))
+                index_definitions.append(index_sqls)
+            if batches is not None:
+                positions = {load.table: i for i, load in enumerate(loads)}
+                for table, rows in batches:
+                    i = positions[table]
+                    counts[i] += self._load_rows(cursor, shadows[i], TableLoad(
+                        table, loads[i].columns, rows, on_conflict=loads[i].on_conflict
+                    ))
+            # インデックスはロード後にまとめて作成する
+            for load, shadow, index_sqls in zip(loads, shadows, index_definitions):
+                for index_name, index_sql in index_sqls:
+                    shadow_index = self._shadow_index_name(index_name)
+                    cursor.execute(self._rename_index_ddl(index_sql, index_name, shadow_index, load.table, shadow))
+            self.conn.commit()
+
+            # 差し替え（本番テーブルの削除とリネームを1トランザクションで実行）
+            cursor.execute("BEGIN IMMEDIATE")
+            for load, shadow in zip(loads, shadows):
+                cursor.execute(f'DROP TABLE "{load.table}"')
+                cursor.execute(f'ALTER TABLE "{shadow}" RENAME TO "{load.table}"')
+            if on_swap:
+                on_swap(cursor)
+            self.conn.commit()
+            self.logger.debug("シャドウテーブルを差し替えました",
+                              tables=[load.table for load in loads], rows=counts)
+            return counts
+        except Exception:
+            self.conn.rollback()
+            for shadow in shadows:
+                try:
+                    cursor.execute(f'DROP TABLE IF EXISTS "{shadow}"')
+                except sqlite3.Error:
+                    pass
+            self.conn.commit()
+            raise
+
+    def _load_rows(self, cursor: sqlite3.Cursor, shadow: str, load: TableLoad) -> int:
+        verb = f"INSERT OR {load.on_conflict}" if load.on_conflict else "INSERT"
+        column_list = ", ".join(load.columns)
+        placeholders = ", ".join("?" for _ in load.columns)
+        sql = f'{verb} INTO "{shadow}" ({column_list}) VALUES ({placeholders})'
+        total = 0
+        rows = iter(load.rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return total
+            cursor.executemany(sql, batch)
+            # シャドウテーブルは読み取り側から参照されないため、バッチごとにコミットしてよい。
+            # 次の行の取得（Snowflake からの読み出しなど）の間に書き込みロックを保持しない
+            self.conn.commit()
+            total += len(batch)
+
+    @staticmethod
+    def _get_definitions(cursor: sqlite3.Cursor, table: str) -> Tuple[str, List[Tuple[str, str]]]:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        row = cursor.fetchone()
+        if row is None:
+            raise sqlite3.OperationalError(f"テーブル {table} が存在しません")
+        # 主キー・UNIQUE制約の自動インデックス（sql が NULL）はテーブル定義から再作成される
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        )
+        return row[0], [(name, sql) for name, sql in cursor.fetchall()]
+
+    @classmethod
+    def _shadow_index_name(cls, index_name: str) -> str:
+        # 差し替え後はシャドウ側の名前が本番インデックス名になるため、接尾辞を付け外しして交互に使う
+        if index_name.endswith(cls.SHADOW_SUFFIX):
+            return index_name[:-len(cls.SHADOW_SUFFIX)]
+        return index_name + cls.SHADOW_SUFFIX
+
+    @staticmethod
+    def _rename_in_ddl(table_sql: str, table: str, shadow: str) -> str:
+        pattern = r'^(\s*CREATE\s+(?:VIRTUAL\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)["`\[]?' + re.escape(table) + r'["`\]]?'
+        return re.sub(pattern, lambda m: f'{m.group(1)}"{shadow}"', table_sql, count=1, flags=re.IGNORECASE)
+
+    @staticmethod
+    def _rename_index_ddl(index_sql: str, index_name: str, shadow_index: str, table: str, shadow: str) -> str:
+        pattern = (
+            r'^(\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?)["`\[]?' + re.escape(index_name)
+            + r'["`\]]?(\s+ON\s+)["`\[]?' + re.escape(table) + r'["`\]]?'
+        )
+        return re.sub(pattern, lambda m: f'{m.group(1)}"{shadow_index}"{m.group(2)}"{shadow}"',
+                      index_sql, count=1, flags=re.IGNORECASE)
@@ -79,6 +79,43 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices('LOG_STORAGE_TYPE', 'log_storage_type')
     )
 
+    # SQL実行ログの非同期一括書き込み設定
+    sql_log_async_enabled: bool = Field(
+        default=True,
+        description="SQL実行ログをキューに積みバックグラウンドでまとめて書き込むかどうか（無効時はリクエスト処理中に直接書き込む）",
+        validation_alias=AliasChoices('SQL_LOG_ASYNC_ENABLED', 'sql_log_async_enabled')
+    )
+    sql_log_queue_size: int = Field(
+        default=10000,
+        description="書き込み待ちログのキュー上限（満杯時は呼び出し元で直接書き込む）",
+        validation_alias=AliasChoices('SQL_LOG_QUEUE_SIZE', 'sql_log_queue_size')
+    )
+    sql_log_batch_size: int = Field(
+        default=100,
+        description="1回にまとめて書き込むログの最大件数",
+        validation_alias=AliasChoices('SQL_LOG_BATCH_SIZE', 'sql_log_batch_size')
+    )
+    sql_log_flush_interval_seconds: float = Field(
+        default=1.0,
+        description="件数に達しなくても書き込むまでの最大待ち時間（秒）",
+        validation_alias=AliasChoices('SQL_LOG_FLUSH_INTERVAL_SECONDS', 'sql_log_flush_interval_seconds')
+    )
+    sql_log_max_retries: int = Field(
+        default=3,
+        description="書き込み失敗時の再試行回数（超えたらログを破棄）",
+        validation_alias=AliasChoices('SQL_LOG_MAX_RETRIES', 'sql_log_max_retries')
+    )
+    sql_log_retry_backoff_seconds: float = Field(
+        default=0.5,
+        description="再試行までの初回待ち時間（秒）。再試行ごとに2倍にする",
+        validation_alias=AliasChoices('SQL_LOG_RETRY_BACKOFF_SECONDS', 'sql_log_retry_backoff_seconds')
+    )
+    sql_log_shutdown_timeout_seconds: float = Field(
+        default=10.0,
+        description="終了時に残ったログを書き込む最大時間（秒）",
+        validation_alias=AliasChoices('SQL_LOG_SHUTDOWN_TIMEOUT_SECONDS', 'sql_log_shutdown_timeout_seconds')
+    )
+
     # Snowflakeログ用接続設定（キーペア認証）
     snowflake_log_account: Optional[str] = Field(default=None, description="Snowflakeログ用アカウント")
     snowflake_log_user: Optional[str] = Field(default=None, description="Snowflakeログ用ユーザー名")
@@ -113,6 +150,31 @@ class Settings(BaseSettings):
         description="カーソル方式での一度に取得する行数",
         validation_alias=AliasChoices('CURSOR_CHUNK_SIZE', 'cursor_chunk_size')
     )
+    cursor_chunk_adaptive: bool = Field(
+        default=True,
+        description="行の幅と取得・挿入レイテンシに応じて取得行数を自動調整するかどうか（初期値はcursor_chunk_size）",
+        validation_alias=AliasChoices('CURSOR_CHUNK_ADAPTIVE', 'cursor_chunk_adaptive')
+    )
+    cursor_chunk_min_size: int = Field(
+        default=100,
+        description="自動調整時の取得行数の下限",
+        validation_alias=AliasChoices('CURSOR_CHUNK_MIN_SIZE', 'cursor_chunk_min_size')
+    )
+    cursor_chunk_max_size: int = Field(
+        default=20000,
+        description="自動調整時の取得行数の上限",
+        validation_alias=AliasChoices('CURSOR_CHUNK_MAX_SIZE', 'cursor_chunk_max_size')
+    )
+    cursor_chunk_target_bytes: int = Field(
+        default=8 * 1024 * 1024,
+        description="1チャンクあたりのメモリ使用量の目安（バイト）",
+        validation_alias=AliasChoices('CURSOR_CHUNK_TARGET_BYTES', 'cursor_chunk_target_bytes')
+    )
+    cursor_chunk_target_seconds: float = Field(
+        default=1.0,
+        description="1チャンクあたりの処理時間（取得+挿入）の目安（秒）。進捗更新の間隔にも影響",
+        validation_alias=AliasChoices('CURSOR_CHUNK_TARGET_SECONDS', 'cursor_chunk_target_seconds')
+    )
     
     # バッチCOMMIT設定
     cache_batch_size: int = Field(
@@ -158,13 +220,74 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices('MAX_ROWS_FOR_EXCEL_CHART', 'max_rows_for_excel_chart')
     )
     
+    # SQLバリデーション設定
+    sql_validation_cache_size: int = Field(
+        default=256,
+        description="SQLのハッシュをキーにしたバリデーション・整形結果のLRUキャッシュ件数（0で無効）",
+        validation_alias=AliasChoices('SQL_VALIDATION_CACHE_SIZE', 'sql_validation_cache_size')
+    )
+    sql_validation_rule_sets_raw: str = Field(
+        default="forbidden,security,where_required,performance",
+        description="有効にするSQL検証ルールセットのカンマ区切り文字列（forbidden / security / where_required / performance）",
+        validation_alias=AliasChoices('SQL_VALIDATION_RULE_SETS', 'sql_validation_rule_sets')
+    )
+    sql_validation_extra_forbidden_keywords_raw: str = Field(
+        default="",
+        description="既定の禁止キーワードに追加するキーワードのカンマ区切り文字列",
+        validation_alias=AliasChoices('SQL_VALIDATION_EXTRA_FORBIDDEN_KEYWORDS', 'sql_validation_extra_forbidden_keywords')
+    )
+
     # 履歴関連設定
     max_history_logs: int = Field(
         default=1000, 
         description="SQL履歴表示の最大件数",
         validation_alias=AliasChoices('MAX_HISTORY_LOGS', 'max_history_logs')
     )
+    history_retention_days: int = Field(
+        default=180,
+        description="SQL履歴として表示する期間（日数。ログストアへのクエリで絞り込む）",
+        validation_alias=AliasChoices('HISTORY_RETENTION_DAYS', 'history_retention_days')
+    )
+
+    # ログ分析（ロールアップ）設定
+    log_analytics_enabled: bool = Field(
+        default=True,
+        description="SQL実行ログの書き込み時にユーザー別・時間/日別・SQL別のロールアップを更新し、分析APIを提供するかどうか",
+        validation_alias=AliasChoices('LOG_ANALYTICS_ENABLED', 'log_analytics_enabled')
+    )
+    log_analytics_hourly_retention_days: int = Field(
+        default=90,
+        description="時間単位のロールアップを保持する日数（日単位のロールアップは削除しない）",
+        validation_alias=AliasChoices('LOG_ANALYTICS_HOURLY_RETENTION_DAYS', 'log_analytics_hourly_retention_days')
+    )
+    log_analytics_top_n: int = Field(
+        default=20,
+        description="分析結果に含める上位ユーザー・上位SQLの件数",
+        validation_alias=AliasChoices('LOG_ANALYTICS_TOP_N', 'log_analytics_top_n')
+    )
     
+    # 補完候補の利用状況ランキング設定
+    completion_usage_enabled: bool = Field(
+        default=True,
+        description="SQL実行履歴から集計した利用頻度・最終利用日時で補完候補を並べ替えるかどうか",
+        validation_alias=AliasChoices('COMPLETION_USAGE_ENABLED', 'completion_usage_enabled')
+    )
+    completion_usage_sync_interval_seconds: int = Field(
+        default=300,
+        description="SQL実行履歴から利用状況を差分集計する間隔（秒）",
+        validation_alias=AliasChoices('COMPLETION_USAGE_SYNC_INTERVAL_SECONDS', 'completion_usage_sync_interval_seconds')
+    )
+    completion_usage_half_life_days: float = Field(
+        default=30.0,
+        description="利用状況スコアの半減期（日）。最後に使われてからこの日数で重みが半分になる",
+        validation_alias=AliasChoices('COMPLETION_USAGE_HALF_LIFE_DAYS', 'completion_usage_half_life_days')
+    )
+    completion_ws_debounce_ms: int = Field(
+        default=30,
+        description="WebSocket 補完チャネルのデバウンス時間（ミリ秒）。この間に次の入力が届いたリクエストは計算せずに取り消す",
+        validation_alias=AliasChoices('COMPLETION_WS_DEBOUNCE_MS', 'completion_ws_debounce_ms')
+    )
+
     # キャッシュセッション自動クリーンアップ設定
     cache_cleanup_enabled: bool = Field(
         default=True, 
@@ -187,6 +310,126 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices('CACHE_SESSION_CLEANUP_HOURS', 'cache_session_cleanup_hours')
     )
 
+    # 実行スケジューラー設定（同時実行数超過時はキューで待機）
+    execution_global_limit: int = Field(
+        default=5,
+        description="全体のSQL同時実行数の上限",
+        validation_alias=AliasChoices('EXECUTION_GLOBAL_LIMIT', 'execution_global_limit')
+    )
+    execution_per_user_limit: int = Field(
+        default=2,
+        description="ユーザーごとのSQL同時実行数の上限",
+        validation_alias=AliasChoices('EXECUTION_PER_USER_LIMIT', 'execution_per_user_limit')
+    )
+    execution_bulk_limit: int = Field(
+        default=2,
+        description="一括ダウンロード（bulkレーン）の同時実行数の上限",
+        validation_alias=AliasChoices('EXECUTION_BULK_LIMIT', 'execution_bulk_limit')
+    )
+    execution_queue_timeout_seconds: int = Field(
+        default=600,
+        description="実行待ちキューでの最大待機時間（秒）",
+        validation_alias=AliasChoices('EXECUTION_QUEUE_TIMEOUT_SECONDS', 'execution_queue_timeout_seconds')
+    )
+    execution_max_queue_length: int = Field(
+        default=50,
+        description="実行待ちキューの最大件数（超過時は受付拒否）",
+        validation_alias=AliasChoices('EXECUTION_MAX_QUEUE_LENGTH', 'execution_max_queue_length')
+    )
+
+    # 結果再利用キャッシュ設定
+    result_cache_enabled: bool = Field(
+        default=True,
+        description="同一SQL（正規化後）の完了済み結果を再利用するかどうか",
+        validation_alias=AliasChoices('RESULT_CACHE_ENABLED', 'result_cache_enabled')
+    )
+    result_cache_ttl_seconds: int = Field(
+        default=300,
+        description="完了済み結果を再利用できる期間（秒）",
+        validation_alias=AliasChoices('RESULT_CACHE_TTL_SECONDS', 'result_cache_ttl_seconds')
+    )
+    result_cache_max_entries: int = Field(
+        default=200,
+        description="結果再利用キャッシュの最大エントリ数",
+        validation_alias=AliasChoices('RESULT_CACHE_MAX_ENTRIES', 'result_cache_max_entries')
+    )
+
+    # 実行前コストゲート設定（EXPLAIN の見積もりで重いクエリを判定。バイト数の閾値は 0 で無効）
+    query_cost_gate_enabled: bool = Field(
+        default=True,
+        description="実行前にEXPLAINでコストを見積もるかどうか（無効時は従来どおりCOUNT(*)で件数を確認）",
+        validation_alias=AliasChoices('QUERY_COST_GATE_ENABLED', 'query_cost_gate_enabled')
+    )
+    query_cost_warn_bytes: int = Field(
+        default=10 * 1024 ** 3,
+        description="スキャン量がこのバイト数を超えたら警告を返す",
+        validation_alias=AliasChoices('QUERY_COST_WARN_BYTES', 'query_cost_warn_bytes')
+    )
+    query_cost_bulk_bytes: int = Field(
+        default=50 * 1024 ** 3,
+        description="スキャン量がこのバイト数を超えたら一括処理の実行レーンで実行する",
+        validation_alias=AliasChoices('QUERY_COST_BULK_BYTES', 'query_cost_bulk_bytes')
+    )
+    query_cost_confirm_bytes: int = Field(
+        default=200 * 1024 ** 3,
+        description="スキャン量がこのバイト数を超えたら実行前に確認を求める",
+        validation_alias=AliasChoices('QUERY_COST_CONFIRM_BYTES', 'query_cost_confirm_bytes')
+    )
+    query_cost_reject_bytes: int = Field(
+        default=1024 ** 4,
+        description="スキャン量がこのバイト数を超えたら実行を拒否する",
+        validation_alias=AliasChoices('QUERY_COST_REJECT_BYTES', 'query_cost_reject_bytes')
+    )
+    query_cost_explain_timeout_seconds: int = Field(
+        default=10,
+        description="EXPLAINのタイムアウト（秒）。超えた場合はゲートを通過させる（0で無制限）",
+        validation_alias=AliasChoices('QUERY_COST_EXPLAIN_TIMEOUT_SECONDS', 'query_cost_explain_timeout_seconds')
+    )
+    query_cost_cache_ttl_seconds: int = Field(
+        default=600,
+        description="SQLごとのコスト見積もりを再利用する期間（秒）",
+        validation_alias=AliasChoices('QUERY_COST_CACHE_TTL_SECONDS', 'query_cost_cache_ttl_seconds')
+    )
+    query_cost_cache_max_entries: int = Field(
+        default=500,
+        description="コスト見積もりキャッシュの最大エントリ数",
+        validation_alias=AliasChoices('QUERY_COST_CACHE_MAX_ENTRIES', 'query_cost_cache_max_entries')
+    )
+
+    # ワークロード別スレッドプール設定
+    executor_interactive_workers: int = Field(
+        default=8,
+        description="対話的処理（補完・整形・メタデータ参照など）用スレッド数",
+        validation_alias=AliasChoices('EXECUTOR_INTERACTIVE_WORKERS', 'executor_interactive_workers')
+    )
+    executor_ingest_workers: int = Field(
+        default=5,
+        description="SQL実行結果の取り込み（キャッシュ書き込み）用スレッド数（実行待ちキュー長分は自動で上乗せ）",
+        validation_alias=AliasChoices('EXECUTOR_INGEST_WORKERS', 'executor_ingest_workers')
+    )
+    executor_export_workers: int = Field(
+        default=2,
+        description="CSV/Excel等のエクスポート用スレッド数",
+        validation_alias=AliasChoices('EXECUTOR_EXPORT_WORKERS', 'executor_export_workers')
+    )
+    executor_metadata_workers: int = Field(
+        default=2,
+        description="メタデータ・マスター情報の更新用スレッド数",
+        validation_alias=AliasChoices('EXECUTOR_METADATA_WORKERS', 'executor_metadata_workers')
+    )
+
+    # メタデータ全件取得の並列化設定
+    metadata_extraction_workers: int = Field(
+        default=4,
+        description="メタデータ全件取得時に INFORMATION_SCHEMA を同時に問い合わせる専用接続数（1で従来どおり順次取得）",
+        validation_alias=AliasChoices('METADATA_EXTRACTION_WORKERS', 'metadata_extraction_workers')
+    )
+    metadata_extraction_split_columns: bool = Field(
+        default=False,
+        description="COLUMNS の取得をスキーマ単位に分割して並列実行するかどうか",
+        validation_alias=AliasChoices('METADATA_EXTRACTION_SPLIT_COLUMNS', 'metadata_extraction_split_columns')
+    )
+
     @field_validator('snowflake_account')
     @classmethod
     def validate_snowflake_account(cls, v):
@@ -245,6 +488,16 @@ class Settings(BaseSettings):
             raise ValueError(f'ログストレージタイプは{valid_types}のいずれかである必要があります')
         return v.lower()
 
+    @property
+    def sql_validation_rule_sets(self) -> List[str]:
+        parts = [p.strip().lower() for p in (self.sql_validation_rule_sets_raw or "").split(',')]
+        return [p for p in parts if p]
+
+    @property
+    def sql_validation_extra_forbidden_keywords(self) -> List[str]:
+        parts = [p.strip() for p in (self.sql_validation_extra_forbidden_keywords_raw or "").split(',')]
+        return [p for p in parts if p]
+
     @property
     def cors_origins(self) -> List[str]:
         s = (self.cors_origins_raw or "").strip()
@@ -3,7 +3,7 @@
 FastAPI依存性注入用の関数
 """
 from functools import lru_cache
-from typing import Annotated
+from typing import Annotated, Optional
 
 from fastapi import Depends, Request, HTTPException, status
 
@@ -21,18 +21,27 @@ from app.services.metadata_service import MetadataService
 from app.services.performance_service import PerformanceService
 from app.services.export_service import ExportService
 from app.services.completion_service import CompletionService
+from app.services.completion_usage_service import CompletionUsageService
 from app.services.user_service import UserService
 from app.services.template_service import TemplateService
 from app.services.part_service import PartService
-from app.services.sql_log_service import SQLLogService
+from app.services.sql_log_service import SQLLogService, create_log_handler
+from app.services.sql_log_writer import SQLLogWriter
+from app.services.log_analytics_service import LogAnalyticsService
 from app.services.admin_service import AdminService
 from app.services.visibility_control_service import VisibilityControlService
+from app.services.metadata_search_service import MetadataSearchService
 from app.services.connection_manager_oracle import ConnectionManagerOracle
 from app.services.user_preference_service import UserPreferenceService
 from app.services.cache_service import CacheService
 from app.services.hybrid_sql_service import HybridSQLService
 from app.services.session_service import SessionService
 from app.services.streaming_state_service import StreamingStateService
+from app.services.result_cache_service import ResultCacheService
+from app.services.execution_scheduler import ExecutionScheduler
+from app.services.query_cost_gate import QueryCostGate
+from app.services.query_cancellation_service import QueryCancellationService
+from app.services.workload_executor import WorkloadExecutorRegistry
 from app.services.master_data_service import MasterDataService
 from app.services.scheduler_service import SchedulerService
 
@@ -119,6 +128,13 @@ def get_export_service_di(
     return ExportService(query_executor)
 
 
+# 補完候補の利用状況ランキングサービスの依存性注入
+@lru_cache()
+def get_completion_usage_service_di() -> CompletionUsageService:
+    """補完候補の利用状況ランキングサービスを取得（シングルトン）"""
+    return CompletionUsageService(get_metadata_cache_di())
+
+
 # 補完サービスのシングルトンインスタンス
 _completion_service_instance = None
 
@@ -129,7 +145,8 @@ def get_completion_service_di(
     """補完サービスを取得（シングルトン）"""
     global _completion_service_instance
     if _completion_service_instance is None:
-        _completion_service_instance = CompletionService(metadata_service)
+        usage_service = get_completion_usage_service_di() if get_settings().completion_usage_enabled else None
+        _completion_service_instance = CompletionService(metadata_service, usage_service)
     return _completion_service_instance
 
 
@@ -185,14 +202,59 @@ def get_streaming_state_service_di() -> StreamingStateService:
     return StreamingStateService()
 
 
+# 結果再利用キャッシュサービスの依存性注入
+@lru_cache()
+def get_result_cache_service_di() -> ResultCacheService:
+    """結果再利用キャッシュサービスを取得"""
+    return ResultCacheService()
+
+
+# 実行スケジューラーの依存性注入
+@lru_cache()
+def get_execution_scheduler_di() -> ExecutionScheduler:
+    """SQL実行スケジューラーを取得"""
+    return ExecutionScheduler()
+
+
+# 実行前コストゲートの依存性注入
+@lru_cache()
+def get_query_cost_gate_di() -> QueryCostGate:
+    """実行前コストゲートを取得（見積もりキャッシュを共有するためシングルトン）"""
+    return QueryCostGate()
+
+
+# クエリキャンセルサービスの依存性注入
+@lru_cache()
+def get_query_cancellation_service_di() -> QueryCancellationService:
+    """クエリキャンセルサービスを取得"""
+    return QueryCancellationService()
+
+
+# ワークロード別スレッドプールの依存性注入
+@lru_cache()
+def get_workload_executors_di() -> WorkloadExecutorRegistry:
+    """ワークロード別スレッドプールを取得"""
+    return WorkloadExecutorRegistry()
+
+
 # ハイブリッドSQLサービスの依存性注入
 def get_hybrid_sql_service_di(
     cache_service: Annotated[CacheService, Depends(get_cache_service_di)],
     connection_manager: Annotated[ConnectionManagerODBC, Depends(get_connection_manager_di)],
-    streaming_state_service: Annotated[StreamingStateService, Depends(get_streaming_state_service_di)]
+    streaming_state_service: Annotated[StreamingStateService, Depends(get_streaming_state_service_di)],
+    result_cache_service: Annotated[ResultCacheService, Depends(get_result_cache_service_di)],
+    execution_scheduler: Annotated[ExecutionScheduler, Depends(get_execution_scheduler_di)],
+    query_cancellation_service: Annotated[QueryCancellationService, Depends(get_query_cancellation_service_di)],
+    query_cost_gate: Annotated[QueryCostGate, Depends(get_query_cost_gate_di)]
 ) -> HybridSQLService:
     """ハイブリッドSQLサービスを取得"""
-    return HybridSQLService(cache_service, connection_manager, streaming_state_service)
+    return HybridSQLService(
+        cache_service, connection_manager, streaming_state_service,
+        result_cache_service=result_cache_service,
+        execution_scheduler=execution_scheduler,
+        query_cancellation_service=query_cancellation_service,
+        query_cost_gate=query_cost_gate
+    )
 
 
 # 認証チェックの依存性注入
@@ -282,19 +344,48 @@ def get_query_executor_for_snowflake_log_di(
     return QueryExecutorSnowflakeLog(connection_manager)
 
 # --- SQLLogServiceのDIを修正 ---
-def get_sql_log_service_di() -> SQLLogService:
+def _get_sql_log_query_executor() -> QueryExecutor:
     settings = get_settings()
-    
     if settings.log_storage_type == "snowflake":
         # Snowflakeログ用のQueryExecutorを使用
-        connection_manager = get_connection_manager_snowflake_log_di()
-        query_executor = QueryExecutorSnowflakeLog(connection_manager)
-    else:
-        # Oracleログ用のQueryExecutorを使用
-        connection_manager = get_connection_manager_oracle_di()
-        query_executor = QueryExecutor(connection_manager)
-    
-    return SQLLogService(query_executor=query_executor, log_storage_type=settings.log_storage_type)
+        return QueryExecutorSnowflakeLog(get_connection_manager_snowflake_log_di())
+    # Oracleログ用のQueryExecutorを使用
+    return QueryExecutor(get_connection_manager_oracle_di())
+
+
+# SQL実行ログ書き込みワーカーの依存性注入（キューを共有するためシングルトン）
+@lru_cache()
+def get_sql_log_writer_di() -> Optional[SQLLogWriter]:
+    """SQL実行ログの書き込みワーカーを取得（非同期書き込みが無効の場合は None）"""
+    settings = get_settings()
+    if not settings.sql_log_async_enabled:
+        return None
+    handler = create_log_handler(_get_sql_log_query_executor(), settings.log_storage_type)
+    writer = SQLLogWriter(handler)
+    log_analytics = get_log_analytics_service_di()
+    if log_analytics is not None:
+        # 書き込みに成功したバッチでロールアップを更新
+        writer.add_listener(log_analytics.record_logs)
+    return writer
+
+
+# ログ分析サービスの依存性注入（ロールアップを共有するためシングルトン）
+@lru_cache()
+def get_log_analytics_service_di() -> Optional[LogAnalyticsService]:
+    """ログ分析サービスを取得（ログ分析が無効の場合は None）"""
+    if not get_settings().log_analytics_enabled:
+        return None
+    return LogAnalyticsService(get_metadata_cache_di())
+
+
+def get_sql_log_service_di() -> SQLLogService:
+    settings = get_settings()
+    return SQLLogService(
+        query_executor=_get_sql_log_query_executor(),
+        log_storage_type=settings.log_storage_type,
+        log_writer=get_sql_log_writer_di(),
+        log_analytics=get_log_analytics_service_di()
+    )
 
 
 # AdminServiceの依存性注入を追加
@@ -307,10 +398,20 @@ def get_admin_service_di(
 
 # VisibilityControlServiceの依存性注入を追加
 def get_visibility_control_service_di(
-    metadata_cache: Annotated[MetadataCache, Depends(get_metadata_cache_di)]
+    metadata_cache: Annotated[MetadataCache, Depends(get_metadata_cache_di)],
+    result_cache_service: Annotated[ResultCacheService, Depends(get_result_cache_service_di)]
 ) -> VisibilityControlService:
     """VisibilityControlServiceのインスタンスを取得"""
-    return VisibilityControlService(metadata_cache)
+    return VisibilityControlService(metadata_cache, result_cache_service)
+
+
+# メタデータ検索サービスの依存性注入
+def get_metadata_search_service_di(
+    metadata_cache: Annotated[MetadataCache, Depends(get_metadata_cache_di)],
+    visibility_service: Annotated[VisibilityControlService, Depends(get_visibility_control_service_di)]
+) -> MetadataSearchService:
+    """メタデータ検索サービスを取得"""
+    return MetadataSearchService(metadata_cache, visibility_service)
 
 
 # 型エイリアス（使用例）
@@ -330,12 +431,19 @@ MetadataCacheDep = Annotated[MetadataCache, Depends(get_metadata_cache_di)]
 CurrentUserDep = Annotated[dict, Depends(get_current_user)]
 CurrentAdminDep = Annotated[bool, Depends(get_current_admin)]
 SQLLogServiceDep = Annotated[SQLLogService, Depends(get_sql_log_service_di)]
+LogAnalyticsServiceDep = Annotated[Optional[LogAnalyticsService], Depends(get_log_analytics_service_di)]
 AdminServiceDep = Annotated[AdminService, Depends(get_admin_service_di)]
 UserPreferenceServiceDep = Annotated[UserPreferenceService, Depends(get_user_preference_service_di)]
 VisibilityControlServiceDep = Annotated[VisibilityControlService, Depends(get_visibility_control_service_di)]
+MetadataSearchServiceDep = Annotated[MetadataSearchService, Depends(get_metadata_search_service_di)]
 HybridSQLServiceDep = Annotated[HybridSQLService, Depends(get_hybrid_sql_service_di)]
 SessionServiceDep = Annotated[SessionService, Depends(get_session_service_di)]
 StreamingStateServiceDep = Annotated[StreamingStateService, Depends(get_streaming_state_service_di)]
+ResultCacheServiceDep = Annotated[ResultCacheService, Depends(get_result_cache_service_di)]
+ExecutionSchedulerDep = Annotated[ExecutionScheduler, Depends(get_execution_scheduler_di)]
+QueryCostGateDep = Annotated[QueryCostGate, Depends(get_query_cost_gate_di)]
+QueryCancellationServiceDep = Annotated[QueryCancellationService, Depends(get_query_cancellation_service_di)]
+WorkloadExecutorsDep = Annotated[WorkloadExecutorRegistry, Depends(get_workload_executors_di)]
 
 
 # MasterDataServiceの依存性注入
@@ -3,6 +3,7 @@
 FastAPIアプリケーションのメインファイル
 """
 from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
@@ -19,7 +20,10 @@ from app import __version__
 from app.app_factory import create_app
 from app.services.connection_manager_odbc import ConnectionManagerODBC
 from app.services.cache_cleanup_service import CacheCleanupService
-from app.dependencies import get_connection_manager_di
+from app.dependencies import (
+    get_connection_manager_di, get_workload_executors_di, get_completion_usage_service_di, get_sql_log_service_di,
+    get_sql_log_writer_di,
+)
 
 from starlette.middleware.sessions import SessionMiddleware
 
@@ -52,6 +56,26 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error("マスター検索履歴テーブル初期化エラー", exception=e)
     
+    # SQL実行ログの書き込みワーカーを開始（無効設定時は None）
+    sql_log_writer = None
+    try:
+        sql_log_writer = get_sql_log_writer_di()
+        if sql_log_writer is not None:
+            sql_log_writer.start()
+    except Exception as e:
+        logger.error("SQL実行ログの書き込みワーカーの開始に失敗", exception=e)
+    
+    # 補完候補の利用状況（SQL実行履歴の差分集計）タスクを開始
+    completion_usage_service = None
+    if settings.completion_usage_enabled:
+        try:
+            completion_usage_service = get_completion_usage_service_di()
+            await completion_usage_service.start_sync_task(
+                get_sql_log_service_di, settings.completion_usage_sync_interval_seconds
+            )
+        except Exception as e:
+            logger.error("補完候補の利用状況集計タスクの開始に失敗", exception=e)
+    
     # スケジューラーサービスを開始（一時的に無効化）
     # try:
     #     from app.api.routers._helpers import get_scheduler_service
@@ -74,7 +98,13 @@ async def lifespan(app: FastAPI):
     #     logger.error("スケジューラーサービスの停止に失敗", exception=e)
     
     await cache_cleanup_service.stop_cleanup_task()
+    if completion_usage_service is not None:
+        await completion_usage_service.stop_sync_task()
+    if sql_log_writer is not None:
+        # キューに残ったログを書き切ってから停止
+        await asyncio.to_thread(sql_log_writer.stop, settings.sql_log_shutdown_timeout_seconds)
     connection_manager.close_all_connections()
+    get_workload_executors_di().shutdown()
     logger.info("アプリケーション終了")
 
 
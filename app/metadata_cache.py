@@ -2,17 +2,63 @@
 """
 メタデータSQLiteキャッシュ管理モジュール
 """
+import re
 import sqlite3
 import json
+import threading
+from contextlib import ExitStack
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from app.logger import get_logger
+from app.bulk_persistence import ShadowTableLoader, TableLoad
+from app.metadata_search_index import MetadataSearchIndex
+
+
+def parse_sync_timestamp(value: Any) -> Optional[datetime]:
+    """LAST_ALTERED/CREATED の値（datetime または文字列）を UTC の datetime に変換
+
+    Snowflake の既定の出力形式（"2024-01-01 10:00:00.000 +0900"）や ISO-8601 を受け付ける。
+    タイムゾーンのない値は UTC とみなす。解釈できない値は None を返す
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value or "").strip()
+        if not text or text == "None":
+            return None
+        text = re.sub(r"\s+([+-]\d{2}):?(\d{2})$", r"\1:\2", text)
+        text = re.sub(r"(\.\d{6})\d+", r"\1", text)
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def format_sync_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """ウォーターマークを保存・バインド用の ISO-8601（UTC）文字列に変換"""
+    return value.astimezone(timezone.utc).isoformat() if value else None
+
 
 class MetadataCache:
     """SQLiteを使用したメタデータの永続的キャッシュ（正規化形式）"""
 
+    SYNC_WATERMARK_KEY = "last_altered_watermark"
+
+    _SCHEMA_COLUMNS = ("name", "owner", "created_on")
+    _TABLE_COLUMNS = ("name", "schema_name", "table_type", "row_count", "created_on", "last_altered", "comment")
+    _COLUMN_COLUMNS = ("name", "table_name", "schema_name", "data_type", "is_nullable", "comment")
+
+    # シャドウテーブル（"<テーブル名>__shadow"）への一括ロードはバッチごとにコミットするため、
+    # 同じテーブルへのロードが重なると互いのシャドウテーブルを作り直してしまう。DB・テーブル単位でプロセス内で直列化する
+    _replace_locks: Dict[Tuple[str, str], threading.Lock] = {}
+    _replace_locks_guard = threading.Lock()
+
     def __init__(self, db_path: str = "metadata_cache.db", expires_hours: int = 24):
         self.db_path = Path(db_path)
         self.expires_delta = timedelta(hours=expires_hours)
@@ -23,11 +69,23 @@ class MetadataCache:
         """DB接続を取得"""
         return sqlite3.connect(self.db_path)
 
+    def _replace_tables(self, conn: sqlite3.Connection, loads: List[TableLoad], **kwargs) -> List[int]:
+        """対象テーブルのロックを取得してシャドウテーブル方式で一括置換（ロックは名前順に取得してデッドロックを防ぐ）"""
+        keys = sorted({(str(self.db_path.resolve()), load.table) for load in loads})
+        with MetadataCache._replace_locks_guard:
+            locks = [MetadataCache._replace_locks.setdefault(key, threading.Lock()) for key in keys]
+        with ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            return ShadowTableLoader(conn).replace_tables(loads, **kwargs)
+
     def _init_db(self):
         """データベースとテーブルを初期化"""
         try:
             with self._get_conn() as conn:
                 cursor = conn.cursor()
+                # WALモード: 一括保存（シャドウテーブルの差し替え）中も読み取り側をブロックしない
+                cursor.execute("PRAGMA journal_mode=WAL")
                 
                 # スキーマ情報を保存するテーブル
                 cursor.execute("""
@@ -67,6 +125,20 @@ class MetadataCache:
                     PRIMARY KEY (schema_name, table_name, name)
                 )
                 """)
+
+                # メタデータ同期状態（差分同期のウォーターマーク等）を保存するテーブル
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS metadata_sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+
+                # メタデータ検索インデックス（名前・コメントの全文検索）
+                MetadataSearchIndex.create_tables(cursor)
+                if MetadataSearchIndex.backfill_if_empty(cursor):
+                    self.logger.info("既存のメタデータキャッシュから検索インデックスを作成しました")
                 
                 # ユーザー情報を保存するテーブル (roleカラムを追加)
                 cursor.execute("""
@@ -225,66 +297,187 @@ class MetadataCache:
         except Exception as e:
             self.logger.error("メタデータキャッシュDBの初期化に失敗", exception=e)
 
-    def save_all_metadata_normalized(self, all_metadata: List[Dict[str, Any]]):
-        """全てのメタデータを正規化してDBに保存"""
+    def save_all_metadata_normalized(self, all_metadata: Iterable[Dict[str, Any]],
+                                     sync_watermark: Union[datetime, str, Callable[[], Optional[datetime]], None] = None):
+        """全てのメタデータを正規化してDBに保存
+
+        シャドウテーブルへ一括ロードしてから1トランザクションで差し替えるため、
+        読み取り側が更新途中（空や一部のみ）の状態を参照することはない。
+        all_metadata はスキーマ単位のイテラブルでよく、取り出したスキーマから順にシャドウテーブルへロードする
+        （取得中のメタデータをそのまま渡せる。途中で例外が発生した場合は差し替えずに破棄する）。
+        sync_watermark を指定した場合、差分同期の起点として同じトランザクションで保存する
+        （関数を渡した場合はロード完了後に評価する）
+        """
+        counts = {'schemas': 0, 'tables': 0, 'columns': 0}
+        item_ids = count(1)
+
+        def batches():
+            for schema_data in all_metadata:
+                schema_name = schema_data.get('name')
+                table_rows = []
+                column_rows = []
+                for table_data in schema_data.get('tables', []):
+                    table_rows.append(self._table_row(schema_name, table_data))
+                    column_rows.extend(self._column_rows(schema_name, table_data))
+                counts['schemas'] += 1
+                counts['tables'] += len(table_rows)
+                counts['columns'] += len(column_rows)
+                yield "schemas", [(schema_name, schema_data.get('owner'), schema_data.get('created_on'))]
+                yield "tables", table_rows
+                yield "columns", column_rows
+                yield from MetadataSearchIndex.schema_batches(schema_data, item_ids)
+
+        def on_swap(cursor):
+            watermark = sync_watermark() if callable(sync_watermark) else sync_watermark
+            self._set_sync_watermark(cursor, watermark)
+
+        try:
+            with self._get_conn() as conn:
+                self._replace_tables(
+                    conn,
+                    [
+                        TableLoad("schemas", self._SCHEMA_COLUMNS, (), on_conflict="IGNORE"),
+                        TableLoad("tables", self._TABLE_COLUMNS, (), on_conflict="IGNORE"),
+                        TableLoad("columns", self._COLUMN_COLUMNS, (), on_conflict="IGNORE"),
+                    ] + MetadataSearchIndex.table_loads(),
+                    on_swap=on_swap,
+                    batches=batches(),
+                )
+                self.logger.debug("メタデータキャッシュを更新しました", **counts)
+        except Exception as e:
+            self.logger.error(f"メタデータキャッシュの保存に失敗: {str(e)}")
+            raise
+
+    def apply_metadata_diff(self, schemas: List[Dict[str, Any]], upsert_tables: List[Dict[str, Any]],
+                            drop_tables: List[tuple], sync_watermark: Union[datetime, str, None]) -> None:
+        """差分同期の結果を1トランザクションで反映
+
+        - schemas: 現在の全スキーマ（一覧にないスキーマは配下のテーブル・カラムごと削除）
+        - upsert_tables: 追加・変更されたテーブル（columns を含む。既存カラムは置き換え）
+        - drop_tables: 削除された (schema_name, table_name) の一覧
+        """
         try:
             with self._get_conn() as conn:
                 cursor = conn.cursor()
-                # 全データを一度削除
-                cursor.execute("DELETE FROM schemas")
-                cursor.execute("DELETE FROM tables")
-                cursor.execute("DELETE FROM columns")
+                schema_names = {schema.get('name') for schema in schemas}
+                cursor.execute("SELECT name FROM schemas")
+                old_schema_names = [row[0] for row in cursor.fetchall()]
+                dropped_schemas = [(name,) for name in old_schema_names if name not in schema_names]
+                cursor.executemany("DELETE FROM columns WHERE schema_name = ?", dropped_schemas)
+                cursor.executemany("DELETE FROM tables WHERE schema_name = ?", dropped_schemas)
+                cursor.executemany("DELETE FROM schemas WHERE name = ?", dropped_schemas)
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO schemas (name, owner, created_on) VALUES (?, ?, ?)",
+                    [(schema.get('name'), schema.get('owner'), schema.get('created_on')) for schema in schemas]
+                )
+
+                table_keys = list(drop_tables) + [(t.get('schema_name'), t.get('name')) for t in upsert_tables]
+                cursor.executemany("DELETE FROM columns WHERE schema_name = ? AND table_name = ?", table_keys)
+                cursor.executemany("DELETE FROM tables WHERE schema_name = ? AND name = ?", table_keys)
+                for table_data in upsert_tables:
+                    self._insert_table(cursor, table_data.get('schema_name'), table_data)
+                MetadataSearchIndex.replace_schemas(cursor, old_schema_names, schemas)
+                MetadataSearchIndex.replace_tables(cursor, table_keys, upsert_tables)
 
-                for schema_data in all_metadata:
-                    # スキーマ情報を保存
-                    schema_sql = "INSERT OR IGNORE INTO schemas (name, owner, created_on) VALUES (?, ?, ?)"
-                    schema_params = (schema_data.get('name'), schema_data.get('owner'), schema_data.get('created_on'))
-                    cursor.execute(schema_sql, schema_params)
-                    
-                    for table_data in schema_data.get('tables', []):
-                        # row_count, created_on, last_altered, comment型変換
-                        row_count = table_data.get('row_count')
-                        if row_count is not None:
-                            try:
-                                row_count = int(row_count)
-                            except Exception:
-                                row_count = None
-                        table_sql = """INSERT OR IGNORE INTO tables (name, schema_name, table_type, row_count, created_on, last_altered, comment) 
-                                      VALUES (?, ?, ?, ?, ?, ?, ?)"""
-                        table_params = (
-                            table_data.get('name'),
-                            schema_data.get('name'),
-                            table_data.get('table_type'),
-                            row_count,
-                            table_data.get('created_on'),
-                            table_data.get('last_altered'),
-                            table_data.get('comment')
-                        )
-                        cursor.execute(table_sql, table_params)
-                        
-                        for column_data in table_data.get('columns', []):
-                            # is_nullable型変換
-                            is_nullable = column_data.get('is_nullable')
-                            if is_nullable is not None:
-                                is_nullable = bool(is_nullable)
-                            # ordinal_position, default_valueは保存しない
-                            column_sql = """INSERT OR IGNORE INTO columns (name, table_name, schema_name, data_type, is_nullable, comment)
-                                          VALUES (?, ?, ?, ?, ?, ?)"""
-                            column_params = (
-                                column_data.get('name'),
-                                table_data.get('name'),
-                                schema_data.get('name'),
-                                column_data.get('data_type'),
-                                is_nullable,
-                                column_data.get('comment')
-                            )
-                            cursor.execute(column_sql, column_params)
+                self._set_sync_watermark(cursor, sync_watermark)
                 conn.commit()
-                self.logger.debug("メタデータキャッシュを更新しました")
+                self.logger.debug("メタデータキャッシュに差分を反映しました",
+                                  upserted=len(upsert_tables), dropped=len(drop_tables),
+                                  dropped_schemas=len(dropped_schemas))
         except Exception as e:
-            self.logger.error(f"メタデータキャッシュの保存に失敗: {str(e)}")
+            self.logger.error(f"メタデータキャッシュへの差分反映に失敗: {str(e)}")
             raise
 
+    def load_table_sync_index(self) -> Dict[tuple, Optional[str]]:
+        """キャッシュ済みテーブルの (schema_name, name) → last_altered を取得"""
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT schema_name, name, last_altered FROM tables")
+                return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        except Exception as e:
+            self.logger.error("テーブル同期インデックスの取得に失敗", exception=e)
+            return {}
+
+    def get_sync_watermark(self) -> Optional[datetime]:
+        """差分同期のウォーターマーク（前回同期時点の LAST_ALTERED/CREATED の最大値、UTC）を取得
+
+        正規化前の形式で保存された値も解釈して返す
+        """
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT value FROM metadata_sync_state WHERE key = ?", (self.SYNC_WATERMARK_KEY,))
+                row = cursor.fetchone()
+                return parse_sync_timestamp(row[0]) if row else None
+        except Exception as e:
+            self.logger.error("同期ウォーターマークの取得に失敗", exception=e)
+            return None
+
+    def _set_sync_watermark(self, cursor: sqlite3.Cursor, watermark: Union[datetime, str, None]) -> None:
+        """ウォーターマークを ISO-8601（UTC）に正規化して保存"""
+        self._set_sync_state(cursor, self.SYNC_WATERMARK_KEY, format_sync_timestamp(parse_sync_timestamp(watermark)))
+
+    def _set_sync_state(self, cursor: sqlite3.Cursor, key: str, value: Optional[str]) -> None:
+        if value is None:
+            cursor.execute("DELETE FROM metadata_sync_state WHERE key = ?", (key,))
+        else:
+            cursor.execute(
+                "INSERT OR REPLACE INTO metadata_sync_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                (key, value)
+            )
+
+    def _insert_table(self, cursor: sqlite3.Cursor, schema_name: str, table_data: Dict[str, Any]) -> None:
+        """テーブルとそのカラムを保存"""
+        placeholders = ", ".join("?" for _ in self._TABLE_COLUMNS)
+        cursor.execute(
+            f"INSERT OR IGNORE INTO tables ({', '.join(self._TABLE_COLUMNS)}) VALUES ({placeholders})",
+            self._table_row(schema_name, table_data)
+        )
+        placeholders = ", ".join("?" for _ in self._COLUMN_COLUMNS)
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO columns ({', '.join(self._COLUMN_COLUMNS)}) VALUES ({placeholders})",
+            self._column_rows(schema_name, table_data)
+        )
+
+    @staticmethod
+    def _table_row(schema_name: str, table_data: Dict[str, Any]) -> tuple:
+        # row_count, created_on, last_altered, comment型変換
+        row_count = table_data.get('row_count')
+        if row_count is not None:
+            try:
+                row_count = int(row_count)
+            except Exception:
+                row_count = None
+        return (
+            table_data.get('name'),
+            schema_name,
+            table_data.get('table_type'),
+            row_count,
+            table_data.get('created_on'),
+            table_data.get('last_altered'),
+            table_data.get('comment')
+        )
+
+    @staticmethod
+    def _column_rows(schema_name: str, table_data: Dict[str, Any]) -> List[tuple]:
+        rows = []
+        for column_data in table_data.get('columns', []):
+            # is_nullable型変換
+            is_nullable = column_data.get('is_nullable')
+            if is_nullable is not None:
+                is_nullable = bool(is_nullable)
+            # ordinal_position, default_valueは保存しない
+            rows.append((
+                column_data.get('name'),
+                table_data.get('name'),
+                schema_name,
+                column_data.get('data_type'),
+                is_nullable,
+                column_data.get('comment')
+            ))
+        return rows
+
     def load_schemas(self) -> List[Dict[str, Any]]:
         """SQLiteからスキーマ一覧を取得"""
         try:
@@ -327,23 +520,45 @@ class MetadataCache:
             return []
 
     def load_all_metadata_hierarchical(self) -> Optional[List[Dict[str, Any]]]:
-        """正規化キャッシュから階層構造のメタデータを取得"""
+        """正規化キャッシュから階層構造のメタデータを取得
+
+        スキーマ・テーブル・カラムをそれぞれ1回の一括クエリで読み込み、1パスで階層を組み立てる
+        （テーブル・カラムごとのクエリ発行は行わない）
+        """
         try:
-            schemas = self.load_schemas()
-            all_metadata = []
-            
-            for schema in schemas:
-                schema_name = schema['name']
-                tables = self.load_tables(schema_name)
-                
-                for table in tables:
-                    table_name = table['name']
-                    columns = self.load_columns(schema_name, table_name)
-                    table['columns'] = columns
-                
-                schema['tables'] = tables
-                all_metadata.append(schema)
-            
+            with self._get_conn() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute("SELECT * FROM schemas ORDER BY name")
+                names = [d[0] for d in cursor.description]
+                all_metadata = []
+                tables_by_schema: Dict[str, List[Dict[str, Any]]] = {}
+                for row in cursor:
+                    schema = dict(zip(names, row))
+                    schema['tables'] = tables_by_schema.setdefault(schema['name'], [])
+                    all_metadata.append(schema)
+
+                # 主キー (schema_name, name) の順に読み込むため、スキーマ内のテーブルは名前順に並ぶ
+                cursor.execute("SELECT * FROM tables ORDER BY schema_name, name")
+                names = [d[0] for d in cursor.description]
+                tables_by_key: Dict[tuple, Dict[str, Any]] = {}
+                for row in cursor:
+                    table = dict(zip(names, row))
+                    schema_tables = tables_by_schema.get(table['schema_name'])
+                    if schema_tables is None:
+                        continue
+                    table['columns'] = []
+                    schema_tables.append(table)
+                    tables_by_key[(table['schema_name'], table['name'])] = table
+
+                cursor.execute("SELECT * FROM columns ORDER BY schema_name, table_name, name")
+                names = [d[0] for d in cursor.description]
+                for row in cursor:
+                    column = dict(zip(names, row))
+                    table = tables_by_key.get((column['schema_name'], column['table_name']))
+                    if table is not None:
+                        table['columns'].append(column)
+
             return all_metadata
         except Exception as e:
             self.logger.error("階層構造メタデータの取得に失敗", exception=e)
@@ -361,11 +576,23 @@ class MetadataCache:
                 cursor.execute("DELETE FROM schemas")
                 cursor.execute("DELETE FROM tables")
                 cursor.execute("DELETE FROM columns")
+                cursor.execute("DELETE FROM metadata_sync_state")
+                MetadataSearchIndex.clear(cursor)
                 conn.commit()
                 self.logger.info("メタデータキャッシュをクリアしました。")
         except Exception as e:
             self.logger.error("キャッシュのクリアに失敗", exception=e)
 
+    def search_metadata(self, query: str, object_types: Optional[List[str]] = None,
+                        limit: int = 50) -> List[Dict[str, Any]]:
+        """スキーマ・テーブル・カラムの名前とコメントを検索（関連度順）"""
+        try:
+            with self._get_conn() as conn:
+                return MetadataSearchIndex.search(conn.cursor(), query, object_types, limit)
+        except sqlite3.Error as e:
+            self.logger.error("メタデータ検索に失敗", exception=e, query=query)
+            return []
+
     def is_cache_valid(self) -> bool:
         """キャッシュが有効かどうかをチェック"""
         try:
@@ -381,171 +608,133 @@ class MetadataCache:
     # ▼▼▼ マスターデータ操作メソッド ▼▼▼
     
     def save_station_master(self, data: List[Dict[str, Any]]) -> int:
-        try:
-            with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM station_master")
-                
-                for i, row in enumerate(data):
-                    # デバッグ: 最初の行の詳細を出力
-                    if i == 0:
-                        self.logger.info(f"保存データサンプル: {row}")
-                        self.logger.info(f"使用可能なキー: {list(row.keys())}")
-                    
-                    # SQLクエリ結果の小文字キーに対応
-                    cursor.execute("""
-                        INSERT INTO station_master 
-                        (sta_no1, place_name, sta_no2_first_digit, sta_no2, line_name, sta_no3, st_name)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('place_name'),
-                        row.get('sta_no2_first_digit'),
-                        row.get('sta_no2'),
-                        row.get('line_name'),
-                        row.get('sta_no3'),
-                        row.get('st_name')
-                    ))
-                conn.commit()
-                self.logger.info(f"STATION_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
-        except Exception as e:
-            self.logger.error("STATION_MASTERデータの保存に失敗", exception=e)
-            raise
+        if data:
+            # デバッグ: 最初の行の詳細を出力
+            self.logger.info(f"保存データサンプル: {data[0]}")
+            self.logger.info(f"使用可能なキー: {list(data[0].keys())}")
+        # SQLクエリ結果の小文字キーに対応
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('place_name'),
+                row.get('sta_no2_first_digit'),
+                row.get('sta_no2'),
+                row.get('line_name'),
+                row.get('sta_no3'),
+                row.get('st_name')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "station_master", "STATION_MASTER",
+            ("sta_no1", "place_name", "sta_no2_first_digit", "sta_no2", "line_name", "sta_no3", "st_name"),
+            rows
+        )
 
     def save_measure_master(self, data: List[Dict[str, Any]]) -> int:
-        try:
-            with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM measure_master")
-                
-                for row in data:
-                    cursor.execute("""
-                        INSERT INTO measure_master 
-                        (sta_no1, sta_no2, sta_no3, step, measure, item_name, division_figure, measure_info)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('sta_no2'),
-                        row.get('sta_no3'),
-                        int(row.get('step')) if row.get('step') is not None else None,
-                        row.get('measure'),
-                        row.get('item_name'),
-                        int(row.get('division_figure')) if row.get('division_figure') is not None else None,
-                        row.get('measure_info')
-                    ))
-                conn.commit()
-                self.logger.info(f"MEASURE_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
-        except Exception as e:
-            self.logger.error("MEASURE_MASTERデータの保存に失敗", exception=e)
-            raise
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('sta_no2'),
+                row.get('sta_no3'),
+                int(row.get('step')) if row.get('step') is not None else None,
+                row.get('measure'),
+                row.get('item_name'),
+                int(row.get('division_figure')) if row.get('division_figure') is not None else None,
+                row.get('measure_info')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "measure_master", "MEASURE_MASTER",
+            ("sta_no1", "sta_no2", "sta_no3", "step", "measure", "item_name", "division_figure", "measure_info"),
+            rows
+        )
 
     def save_set_master(self, data: List[Dict[str, Any]]):
         """SET_MASTERデータを保存"""
-        try:
-            with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM set_master")
-                
-                for row in data:
-                    cursor.execute("""
-                        INSERT INTO set_master 
-                        (sta_no1, sta_no2, sta_no3, step, setdata, item_name)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('sta_no2'),
-                        row.get('sta_no3'),
-                        int(row.get('step')) if row.get('step') is not None else None,
-                        row.get('setdata'),
-                        row.get('item_name')
-                    ))
-                conn.commit()
-                self.logger.info(f"SET_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
-        except Exception as e:
-            self.logger.error("SET_MASTERデータの保存に失敗", exception=e)
-            raise
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('sta_no2'),
+                row.get('sta_no3'),
+                int(row.get('step')) if row.get('step') is not None else None,
+                row.get('setdata'),
+                row.get('item_name')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "set_master", "SET_MASTER",
+            ("sta_no1", "sta_no2", "sta_no3", "step", "setdata", "item_name"),
+            rows
+        )
 
     def save_free_master(self, data: List[Dict[str, Any]]):
         """FREE_MASTERデータを保存"""
-        try:
-            with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM free_master")
-                
-                for row in data:
-                    cursor.execute("""
-                        INSERT INTO free_master 
-                        (sta_no1, sta_no2, sta_no3, step, freedata, item_name)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('sta_no2'),
-                        row.get('sta_no3'),
-                        int(row.get('step')) if row.get('step') is not None else None,
-                        row.get('freedata'),
-                        row.get('item_name')
-                    ))
-                conn.commit()
-                self.logger.info(f"FREE_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
-        except Exception as e:
-            self.logger.error("FREE_MASTERデータの保存に失敗", exception=e)
-            raise
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('sta_no2'),
+                row.get('sta_no3'),
+                int(row.get('step')) if row.get('step') is not None else None,
+                row.get('freedata'),
+                row.get('item_name')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "free_master", "FREE_MASTER",
+            ("sta_no1", "sta_no2", "sta_no3", "step", "freedata", "item_name"),
+            rows
+        )
 
     def save_parts_master(self, data: List[Dict[str, Any]]):
         """PARTS_MASTERデータを保存"""
-        try:
-            with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM parts_master")
-                
-                for row in data:
-                    cursor.execute("""
-                        INSERT INTO parts_master 
-                        (sta_no1, sta_no2, sta_no3, main_parts_name, sub_parts, sub_parts_name)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('sta_no2'),
-                        row.get('sta_no3'),
-                        row.get('main_parts_name'),
-                        row.get('sub_parts'),
-                        row.get('sub_parts_name')
-                    ))
-                conn.commit()
-                self.logger.info(f"PARTS_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
-        except Exception as e:
-            self.logger.error("PARTS_MASTERデータの保存に失敗", exception=e)
-            raise
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('sta_no2'),
+                row.get('sta_no3'),
+                row.get('main_parts_name'),
+                row.get('sub_parts'),
+                row.get('sub_parts_name')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "parts_master", "PARTS_MASTER",
+            ("sta_no1", "sta_no2", "sta_no3", "main_parts_name", "sub_parts", "sub_parts_name"),
+            rows
+        )
 
     def save_trouble_master(self, data: List[Dict[str, Any]]):
         """TROUBLE_MASTERデータを保存"""
+        rows = [
+            (
+                row.get('sta_no1'),
+                row.get('sta_no2'),
+                row.get('sta_no3'),
+                int(row.get('code_no')) if row.get('code_no') is not None else None,
+                row.get('trouble_ng_info')
+            )
+            for row in data
+        ]
+        return self._replace_master_rows(
+            "trouble_master", "TROUBLE_MASTER",
+            ("sta_no1", "sta_no2", "sta_no3", "code_no", "trouble_ng_info"),
+            rows
+        )
+
+    def _replace_master_rows(self, table: str, label: str, columns: tuple, rows: List[tuple]) -> int:
+        """マスターテーブルの内容をシャドウテーブル経由で一括置換"""
         try:
             with self._get_conn() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM trouble_master")
-                
-                for row in data:
-                    cursor.execute("""
-                        INSERT INTO trouble_master 
-                        (sta_no1, sta_no2, sta_no3, code_no, trouble_ng_info)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        row.get('sta_no1'),
-                        row.get('sta_no2'),
-                        row.get('sta_no3'),
-                        int(row.get('code_no')) if row.get('code_no') is not None else None,
-                        row.get('trouble_ng_info')
-                    ))
-                conn.commit()
-                self.logger.info(f"TROUBLE_MASTERデータを保存しました: {len(data)}件")
-                return len(data)
+                self._replace_tables(conn, [TableLoad(table, columns, rows)])
+                self.logger.info(f"{label}データを保存しました: {len(rows)}件")
+                return len(rows)
         except Exception as e:
-            self.logger.error("TROUBLE_MASTERデータの保存に失敗", exception=e)
+            self.logger.error(f"{label}データの保存に失敗", exception=e)
             raise
 
     # マスターデータ取得メソッド
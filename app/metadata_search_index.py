@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ検索インデックスモジュール
+スキーマ・テーブル・カラムの名前とコメントを FTS5（trigram）で索引付けし、
+部分一致検索と名前の前方一致検索を提供する
+"""
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.bulk_persistence import TableLoad
+
+
+class MetadataSearchIndex:
+    """metadata_cache.db 内の検索用テーブル群
+
+    - metadata_search_items: 検索対象（1行 = スキーマ・テーブル・カラムのいずれか）。名前の前方一致用インデックスを持つ
+    - metadata_search_fts: metadata_search_items を外部コンテンツとする FTS5（trigram）インデックス
+
+    名前の完全一致・前方一致は B-tree（COLLATE NOCASE）で、名前・コメントの部分一致は FTS5 で検索する。
+    trigram は3文字未満の語を索引検索できないため、短い語は LIKE による絞り込み条件として扱う。
+    """
+
+    ITEMS_TABLE = "metadata_search_items"
+    FTS_TABLE = "metadata_search_fts"
+    ITEM_COLUMNS = ("id", "object_type", "schema_name", "table_name", "name", "type_name", "comment")
+    FTS_COLUMNS = ("rowid", "name", "comment")
+    OBJECT_TYPES = ("schema", "table", "column")
+
+    # trigram トークナイザで検索できる最短の語長
+    MIN_TRIGRAM_LENGTH = 3
+    # bm25 の列の重み（名前, コメント）
+    RANK_WEIGHTS = (10.0, 1.0)
+    # 部分一致検索で順位付けする候補の最大件数
+    CANDIDATE_WINDOW = 500
+
+    _RESULT_COLUMNS = "i.object_type, i.schema_name, i.table_name, i.name, i.type_name, i.comment"
+
+    @classmethod
+    def create_tables(cls, cursor: sqlite3.Cursor) -> None:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {cls.ITEMS_TABLE} (
+            id INTEGER PRIMARY KEY,
+            object_type TEXT NOT NULL,
+            schema_name TEXT NOT NULL,
+            table_name TEXT,
+            name TEXT NOT NULL COLLATE NOCASE,
+            type_name TEXT,
+            comment TEXT
+        )
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_search_items_name ON {cls.ITEMS_TABLE} (name)")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_search_items_table ON {cls.ITEMS_TABLE} (schema_name, table_name)"
+        )
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {cls.FTS_TABLE} USING fts5(
+            name, comment,
+            content='{cls.ITEMS_TABLE}', content_rowid='id',
+            tokenize='trigram'
+        )
+        """)
+
+    @classmethod
+    def backfill_if_empty(cls, cursor: sqlite3.Cursor) -> bool:
+        """検索インデックス導入前のキャッシュDB向けに、既存のメタデータから索引を作成する"""
+        cursor.execute(f"SELECT 1 FROM {cls.ITEMS_TABLE} LIMIT 1")
+        if cursor.fetchone():
+            return False
+        cursor.execute("SELECT 1 FROM schemas LIMIT 1")
+        if not cursor.fetchone():
+            return False
+        cursor.execute(f"""
+        INSERT INTO {cls.ITEMS_TABLE} (object_type, schema_name, table_name, name, type_name, comment)
+        SELECT 'schema', name, NULL, name, NULL, NULL FROM schemas
+        UNION ALL
+        SELECT 'table', schema_name, name, name, table_type, comment FROM tables
+        UNION ALL
+        SELECT 'column', schema_name, table_name, name, data_type, comment FROM columns
+        """)
+        cursor.execute(f"INSERT INTO {cls.FTS_TABLE} ({cls.FTS_TABLE}) VALUES ('rebuild')")
+        return True
+
+    @classmethod
+    def table_loads(cls) -> List[TableLoad]:
+        """全件保存（シャドウテーブルの差し替え）の対象テーブル（行は schema_batches で渡す）"""
+        return [TableLoad(cls.ITEMS_TABLE, cls.ITEM_COLUMNS, ()), TableLoad(cls.FTS_TABLE, cls.FTS_COLUMNS, ())]
+
+    @classmethod
+    def schema_batches(cls, schema_data: Dict[str, Any], item_ids: Iterator[int]) -> List[Tuple[str, List[tuple]]]:
+        """1スキーマ分の検索対象行（全件保存用）。item_ids は保存全体で共有する採番イテレータ"""
+        schema_name = schema_data.get('name')
+        items = [cls._schema_item(schema_name)]
+        for table_data in schema_data.get('tables', []):
+            items.extend(cls._table_items(schema_name, table_data))
+        item_rows = [(next(item_ids),) + item for item in items]
+        return [
+            (cls.ITEMS_TABLE, item_rows),
+            (cls.FTS_TABLE, [(row[0], row[4], row[6]) for row in item_rows]),
+        ]
+
+    @classmethod
+    def replace_schemas(cls, cursor: sqlite3.Cursor, old_schema_names: Iterable[str],
+                        schemas: List[Dict[str, Any]]) -> None:
+        """スキーマ行を置き換える（削除されたスキーマは配下の行ごと削除）"""
+        schema_names = {schema.get('name') for schema in schemas}
+        for schema_name in old_schema_names:
+            if schema_name in schema_names:
+                cls._delete_items(cursor, "schema_name = ? AND table_name IS NULL", (schema_name,))
+            else:
+                cls._delete_items(cursor, "schema_name = ?", (schema_name,))
+        cls._insert_items(cursor, [cls._schema_item(schema.get('name')) for schema in schemas])
+
+    @classmethod
+    def replace_tables(cls, cursor: sqlite3.Cursor, table_keys: Sequence[Tuple[str, str]],
+                       upsert_tables: List[Dict[str, Any]]) -> None:
+        """指定テーブル（とそのカラム）の行を削除し、追加・変更されたテーブルの行を登録する"""
+        for schema_name, table_name in table_keys:
+            cls._delete_items(cursor, "schema_name = ? AND table_name = ?", (schema_name, table_name))
+        for table_data in upsert_tables:
+            cls._insert_items(cursor, cls._table_items(table_data.get('schema_name'), table_data))
+
+    @classmethod
+    def clear(cls, cursor: sqlite3.Cursor) -> None:
+        cursor.execute(f"DELETE FROM {cls.ITEMS_TABLE}")
+        cursor.execute(f"INSERT INTO {cls.FTS_TABLE} ({cls.FTS_TABLE}) VALUES ('delete-all')")
+
+    @classmethod
+    def search(cls, cursor: sqlite3.Cursor, query: str, object_types: Optional[Sequence[str]] = None,
+               limit: int = 50) -> List[Dict[str, Any]]:
+        """名前・コメントを検索し、関連度順に最大 limit 件返す
+
+        空白区切りの語はすべて（名前またはコメントに）含まれる必要がある。
+        並び順は 1) 先頭の語と名前が完全一致 2) 名前が先頭の語で始まる 3) その他の部分一致（bm25 順）。
+        1) 2) は名前のインデックス、3) は FTS5 で検索し、3) は絞り込み後の bm25 上位 CANDIDATE_WINDOW 件だけを
+        並べ替えの対象にする。
+        """
+        terms = query.split()
+        if not terms or limit <= 0:
+            return []
+        first_term, other_terms = terms[0], terms[1:]
+        type_filter, type_params = cls._type_filter(object_types)
+        filters, filter_params = cls._term_filters(other_terms)
+        filters += type_filter
+        filter_params += type_params
+
+        results: List[tuple] = []
+        # 1) 名前の完全一致
+        cursor.execute(
+            f"SELECT {cls._RESULT_COLUMNS}, 0.0 FROM {cls.ITEMS_TABLE} i WHERE i.name = ?{filters} "
+            "ORDER BY CASE i.object_type WHEN 'schema' THEN 0 WHEN 'table' THEN 1 ELSE 2 END, "
+            "i.schema_name, i.table_name LIMIT ?",
+            [first_term] + filter_params + [limit]
+        )
+        results.extend(cursor.fetchall())
+
+        # 2) 名前の前方一致（インデックス順にそのまま読み出す）
+        if len(results) < limit:
+            cursor.execute(
+                f"SELECT {cls._RESULT_COLUMNS}, 0.0 FROM {cls.ITEMS_TABLE} i "
+                f"WHERE i.name > ? AND i.name < ?{filters} ORDER BY i.name LIMIT ?",
+                [first_term, first_term + "\U0010ffff"] + filter_params + [limit - len(results)]
+            )
+            results.extend(cursor.fetchall())
+
+        # 3) 名前・コメントの部分一致（FTS5 trigram）
+        fts_terms = [term for term in terms if len(term) >= cls.MIN_TRIGRAM_LENGTH]
+        if len(results) < limit and fts_terms:
+            short_filters, short_params = cls._term_filters(
+                [term for term in terms if len(term) < cls.MIN_TRIGRAM_LENGTH]
+            )
+            match = " AND ".join('"' + term.replace('"', '""') + '"' for term in fts_terms)
+            weights = ", ".join(str(weight) for weight in cls.RANK_WEIGHTS)
+            # 候補は絞り込み条件を満たすものに限定し、bm25 順の上位 CANDIDATE_WINDOW 件を取る
+            # （rowid 順で打ち切ると、後から登録された強い一致が候補から漏れる）
+            cursor.execute(
+                f"SELECT {cls._RESULT_COLUMNS}, f.score FROM ("
+                f"SELECT i.id, bm25({cls.FTS_TABLE}, {weights}) AS score FROM {cls.FTS_TABLE} "
+                f"JOIN {cls.ITEMS_TABLE} i ON i.id = {cls.FTS_TABLE}.rowid "
+                f"WHERE {cls.FTS_TABLE} MATCH ? AND NOT (i.name >= ? AND i.name < ?){short_filters}{type_filter} "
+                "ORDER BY score LIMIT ?"
+                f") f JOIN {cls.ITEMS_TABLE} i ON i.id = f.id "
+                "ORDER BY f.score, length(i.name), i.name LIMIT ?",
+                [match, first_term, first_term + "\U0010ffff"] + short_params + type_params
+                + [cls.CANDIDATE_WINDOW, limit - len(results)]
+            )
+            results.extend(cursor.fetchall())
+
+        return [
+            {
+                "object_type": row[0],
+                "schema_name": row[1],
+                "table_name": row[2],
+                "name": row[3],
+                "type_name": row[4],
+                "comment": row[5],
+                "score": round(-row[6], 4) or 0.0,
+            }
+            for row in results
+        ]
+
+    @classmethod
+    def _term_filters(cls, terms: Sequence[str]) -> Tuple[str, List[Any]]:
+        sql, params = "", []
+        for term in terms:
+            sql += " AND (i.name LIKE ? ESCAPE '\\' OR i.comment LIKE ? ESCAPE '\\')"
+            pattern = "%" + cls._escape_like(term) + "%"
+            params.extend([pattern, pattern])
+        return sql, params
+
+    @staticmethod
+    def _type_filter(object_types: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+        if not object_types:
+            return "", []
+        return f" AND i.object_type IN ({', '.join('?' for _ in object_types)})", list(object_types)
+
+    @classmethod
+    def _delete_items(cls, cursor: sqlite3.Cursor, condition: str, params: tuple) -> None:
+        # 外部コンテンツ方式のため、FTS5 側は削除前の値を指定して 'delete' する
+        cursor.execute(f"SELECT id, name, comment FROM {cls.ITEMS_TABLE} WHERE {condition}", params)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        cursor.executemany(
+            f"INSERT INTO {cls.FTS_TABLE} ({cls.FTS_TABLE}, rowid, name, comment) VALUES ('delete', ?, ?, ?)", rows
+        )
+        cursor.executemany(f"DELETE FROM {cls.ITEMS_TABLE} WHERE id = ?", [(row[0],) for row in rows])
+
+    @classmethod
+    def _insert_items(cls, cursor: sqlite3.Cursor, rows: List[tuple]) -> None:
+        columns = ", ".join(cls.ITEM_COLUMNS[1:])
+        placeholders = ", ".join("?" for _ in cls.ITEM_COLUMNS[1:])
+        for row in rows:
+            cursor.execute(f"INSERT INTO {cls.ITEMS_TABLE} ({columns}) VALUES ({placeholders})", row)
+            cursor.execute(
+                f"INSERT INTO {cls.FTS_TABLE} (rowid, name, comment) VALUES (?, ?, ?)",
+                (cursor.lastrowid, row[3], row[5])
+            )
+
+    @staticmethod
+    def _schema_item(schema_name: str) -> tuple:
+        return ("schema", schema_name, None, schema_name, None, None)
+
+    @staticmethod
+    def _table_items(schema_name: str, table_data: Dict[str, Any]) -> List[tuple]:
+        table_name = table_data.get('name')
+        items = [("table", schema_name, table_name, table_name, table_data.get('table_type'), table_data.get('comment'))]
+        for column_data in table_data.get('columns', []):
+            items.append(("column", schema_name, table_name, column_data.get('name'),
+                          column_data.get('data_type'), column_data.get('comment')))
+        return items
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+適応的チャンクサイズ制御
+観測した1行あたりのバイト数・取得レイテンシ・挿入レイテンシから fetchmany の行数を調整する
+"""
+import sys
+from typing import Optional, Dict, Any, List, Sequence
+
+
+class AdaptiveChunkSizer:
+    """fetchmany の行数を上下限の範囲で調整するコントローラー
+
+    - 1チャンクのメモリ量が target_chunk_bytes を超えないよう、幅の広い行では行数を減らす
+    - 1チャンクの処理時間（取得+挿入）が target_chunk_seconds に近づくよう、幅の狭い行では行数を増やす
+    - 増加は1回あたり最大2倍、減少は即時（メモリスパイクを優先的に回避）
+    - 行の幅が分からない最初の1回は少ない行数（probe_size）で取得し、幅の広い結果でのスパイクを防ぐ
+    """
+
+    _GROWTH_LIMIT = 2.0
+    _SMOOTHING = 0.5       # 観測値の指数移動平均の重み
+    _SAMPLE_ROWS = 20      # バイト数推定に使う行数
+    _HISTORY_LIMIT = 50    # 診断用に保持するサイズ履歴の件数
+
+    def __init__(self, initial_size: int, min_size: int, max_size: int,
+                 target_chunk_bytes: int, target_chunk_seconds: float, enabled: bool = True,
+                 probe_size: int = 100):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target_chunk_bytes = target_chunk_bytes
+        self.target_chunk_seconds = target_chunk_seconds
+        self.enabled = enabled
+        self._initial_size = self._clamp(initial_size)
+        self.size = self._clamp(min(initial_size, probe_size)) if enabled else self._initial_size
+        self._row_bytes: Optional[float] = None
+        self._row_seconds: Optional[float] = None
+        self._history: List[int] = [self.size]
+        self._chunks = 0
+        self._adjustments = 0
+
+    def observe(self, rows: Sequence, fetch_seconds: float, insert_seconds: float) -> int:
+        """1チャンク分の観測値を反映し、次回の fetchmany 行数を返す"""
+        if not rows:
+            return self.size
+        self._chunks += 1
+        row_bytes = self.estimate_row_bytes(rows)
+        row_seconds = (fetch_seconds + insert_seconds) / len(rows)
+        self._row_bytes = self._ewma(self._row_bytes, row_bytes)
+        self._row_seconds = self._ewma(self._row_seconds, row_seconds)
+        if not self.enabled:
+            return self.size
+
+        target = self.target_chunk_bytes / max(self._row_bytes, 1.0)
+        if self._row_seconds > 0:
+            target = min(target, self.target_chunk_seconds / self._row_seconds)
+        # 初回（probe）の後は初期値を基準に増加幅を制限する
+        base = self.size if self._chunks > 1 else max(self.size, self._initial_size)
+        target = min(target, base * self._GROWTH_LIMIT)
+        new_size = self._clamp(int(target))
+        if new_size != self.size:
+            self.size = new_size
+            self._adjustments += 1
+            self._history.append(new_size)
+            if len(self._history) > self._HISTORY_LIMIT:
+                self._history.pop(1)  # 初期値は残す
+        return self.size
+
+    def get_diagnostics(self) -> Dict[str, Any]:
+        """選択したチャンクサイズと観測値（セッション進捗の診断情報用）"""
+        return {
+            'adaptive': self.enabled,
+            'chunk_size': self.size,
+            'chunk_size_history': list(self._history),
+            'chunks': self._chunks,
+            'adjustments': self._adjustments,
+            'avg_row_bytes': round(self._row_bytes, 1) if self._row_bytes is not None else None,
+            'avg_row_ms': round(self._row_seconds * 1000, 4) if self._row_seconds is not None else None,
+        }
+
+    @classmethod
+    def estimate_row_bytes(cls, rows: Sequence) -> float:
+        """先頭・中間・末尾から抜き出した行のメモリサイズの平均"""
+        count = len(rows)
+        step = max(1, count // cls._SAMPLE_ROWS)
+        sample = rows[::step][:cls._SAMPLE_ROWS]
+        total = 0
+        for row in sample:
+            total += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+        return total / len(sample)
+
+    def _ewma(self, current: Optional[float], observed: float) -> float:
+        if current is None:
+            return observed
+        return current + self._SMOOTHING * (observed - current)
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
@@ -27,7 +27,10 @@ class CacheService:
         self.batch_size = settings.cache_batch_size
         self._lock = threading.Lock()
         self._active_sessions = {}  # セッションID -> セッション情報（メモリ復活）
-        self._max_concurrent_sessions = 5
+        # 実行枠の制御はExecutionSchedulerが担当するため、ここでは登録可能なセッション数（実行中+待機中）の上限のみ
+        self._max_concurrent_sessions = (
+            getattr(settings, 'execution_global_limit', 5) + getattr(settings, 'execution_max_queue_length', 50)
+        )
         self._last_sync_time = {}   # セッションID -> 最終同期時刻
         
         # バッチCOMMIT用の管理変数
@@ -173,6 +176,38 @@ class CacheService:
         logger.info(f"セッション専用DBにテーブル作成: {session_db_path} / {table_name}")
         return table_name
     
+    def get_session_db_path(self, session_id: str) -> str:
+        """セッション専用DBファイルパスを取得"""
+        return self._get_session_db_path(session_id)
+
+    def clone_session_data(self, source_session_id: str, target_session_id: str) -> bool:
+        """完了済みセッションのキャッシュDBを新セッションへ複製（結果再利用のcopy-on-read）"""
+        source_path = self._get_session_db_path(source_session_id)
+        target_path = self._get_session_db_path(target_session_id)
+        try:
+            import os
+            if not os.path.exists(source_path):
+                return False
+            # SQLiteのオンラインバックアップAPIで一貫性のあるコピーを作成
+            src = sqlite3.connect(source_path)
+            dst = sqlite3.connect(target_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+            logger.info(f"キャッシュ結果を複製: {source_session_id} -> {target_session_id}")
+            return True
+        except Exception as e:
+            logger.error(f"キャッシュ結果複製エラー: {e}")
+            try:
+                import os
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+            except Exception:
+                pass
+            return False
+
     def insert_chunk(self, table_name: str, data: List[List[Any]], session_id: Optional[str] = None) -> int:
         """データチャンクを挿入（バッチCOMMIT対応 - セッション専用DB使用）"""
         if not data:
@@ -267,8 +302,12 @@ class CacheService:
                 
         return None
     
-    def update_session_progress(self, session_id: str, processed_rows: int, is_complete: bool = False, execution_time: Optional[float] = None):
-        """セッションの進捗を更新（改良ハイブリッド管理）"""
+    def update_session_progress(self, session_id: str, processed_rows: int, is_complete: bool = False, execution_time: Optional[float] = None,
+                                fetch_diagnostics: Optional[Dict[str, Any]] = None):
+        """セッションの進捗を更新（改良ハイブリッド管理）
+
+        fetch_diagnostics: 取得チャンクサイズ等の診断情報（メモリ上のセッション情報にのみ保持）
+        """
         with self._lock:
             now = datetime.now()
             
@@ -279,6 +318,8 @@ class CacheService:
                 self._active_sessions[session_id]['is_complete'] = is_complete
                 if execution_time is not None:
                     self._active_sessions[session_id]['execution_time'] = execution_time
+                if fetch_diagnostics is not None:
+                    self._active_sessions[session_id]['fetch_diagnostics'] = fetch_diagnostics
             
             # 重要な変更の場合は即座にDB同期
             should_sync = is_complete or execution_time is not None
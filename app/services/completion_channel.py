@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完の WebSocket チャネル
+1つのエディタ接続ごとに SQL テキストと版を保持し、入力中の連続したリクエストを
+サーバー側でデバウンスして、新しいリクエストで置き換えられた古いリクエストは計算せずに取り消す
+"""
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.logger import get_logger
+
+# 応答メッセージの種類
+#   {"id": n, "suggestions": [...], "is_incomplete": bool}  補完候補
+#   {"id": n, "cancelled": true}                          新しいリクエストで置き換えられた
+#   {"id": n, "error": "..."}                             不正なメッセージ・補完処理のエラー（JSON でない場合 id は null）
+
+
+class CompletionChannel:
+    """1つの WebSocket 接続に対応する補完チャネル
+
+    クライアントは {"id", "position", "sql"?, "version"?} を送る。sql を省略した場合は直前に受け取った
+    SQL をそのまま使う（カーソル移動だけのリクエスト）。最後のメッセージから debounce_seconds 秒
+    次のメッセージが来なかった時点で最新のリクエストだけを計算し、それより前の未処理・計算中のリクエストには
+    cancelled を返す。文脈解析のセッションは接続ごとに固定するため、入力のたびに差分解析が効く。
+    """
+
+    def __init__(
+        self,
+        completion_service,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        run: Callable[..., Awaitable[Any]],
+        user_id: Optional[str] = None,
+        debounce_seconds: float = 0.03,
+    ):
+        self.completion_service = completion_service
+        self.user_id = user_id
+        self.debounce_seconds = debounce_seconds
+        self.session_id = f"ws-{uuid.uuid4().hex}"
+        self.logger = get_logger(__name__)
+        self._send = send
+        self._run = run
+        self._send_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._sql = ""
+        self._version: Any = None
+        self._pending: Optional[Dict[str, Any]] = None
+        self._latest_id: Any = None
+        self._received_at = 0.0
+        self.stats = {"received": 0, "completed": 0, "cancelled": 0, "errors": 0}
+
+    async def serve(self, receive: Callable[[], Awaitable[Any]]) -> None:
+        """接続が閉じるまでメッセージを受け取り続ける
+
+        JSON として解釈できないメッセージ（receive が ValueError を送出）にはエラーを返して受信を続け、
+        それ以外の receive の例外（切断など）はそのまま送出する。
+        """
+        worker = asyncio.create_task(self._worker())
+        try:
+            while True:
+                try:
+                    message = await receive()
+                except ValueError:
+                    await self._reply({"id": None, "error": "メッセージを JSON として解釈できません"})
+                    continue
+                await self.submit(message)
+        finally:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, message: Any) -> None:
+        """リクエストを受け付ける（未処理のリクエストがあれば取り消す）"""
+        if not isinstance(message, dict) or "id" not in message:
+            await self._reply({"id": None, "error": "id が指定されていません"})
+            return
+        position = message.get("position")
+        sql = message.get("sql", self._sql)
+        if not isinstance(position, int) or isinstance(position, bool) or not isinstance(sql, str):
+            await self._reply({"id": message["id"], "error": "position または sql が不正です"})
+            return
+
+        self.stats["received"] += 1
+        if "sql" in message:
+            self._sql = sql
+            self._version = message.get("version")
+        superseded, self._pending = self._pending, {"id": message["id"], "position": position}
+        self._latest_id = message["id"]
+        self._received_at = asyncio.get_running_loop().time()
+        self._wakeup.set()
+        if superseded is not None:
+            await self._cancelled(superseded["id"])
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            # デバウンス: 最後のメッセージから debounce_seconds 秒経過するまで待つ
+            while True:
+                delay = self._received_at + self.debounce_seconds - loop.time()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self._wakeup.clear()
+            request, self._pending = self._pending, None
+            if request is None or not self._sql:
+                if request is not None:
+                    await self._reply({"id": request["id"], "suggestions": [], "is_incomplete": False})
+                continue
+
+            context = {"session_id": self.session_id, "version": self._version}
+            try:
+                response = await self._run(
+                    self.completion_service.get_completions, self._sql, request["position"], context, self.user_id
+                )
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.logger.error(f"SQL補完候補取得エラー（WebSocket）: {e}")
+                await self._reply({"id": request["id"], "error": str(e)})
+                continue
+
+            # 計算中に新しいリクエストが届いていれば、古い結果は返さない
+            if self._latest_id != request["id"]:
+                await self._cancelled(request["id"])
+                continue
+            self.stats["completed"] += 1
+            await self._reply({"id": request["id"], **response.model_dump()})
+
+    async def _cancelled(self, request_id: Any) -> None:
+        self.stats["cancelled"] += 1
+        await self._reply({"id": request_id, "cancelled": True})
+
+    async def _reply(self, payload: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self._send(payload)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完用インデックス
+メタデータのバージョンごとに1回だけ構築し、キー入力ごとの候補検索を二分探索で行う
+"""
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.api.models import SQLCompletionItem
+
+
+class PrefixIndex:
+    """大文字キーでソートした配列による前方一致インデックス
+
+    lookup は bisect で先頭位置を求め、前方一致する範囲だけを返す（O(log n + k)）。
+    """
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]]):
+        ordered = sorted(entries, key=lambda entry: entry[0])
+        self._keys = [key for key, _ in ordered]
+        self._values = [value for _, value in ordered]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, prefix: str, limit: Optional[int] = None) -> List[Any]:
+        """prefix（大文字）で始まるキーの値をキー順に返す"""
+        if not prefix:
+            return self._values[:limit] if limit is not None else list(self._values)
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return self._values[start:end]
+
+
+class CompletionIndex:
+    """補完候補インデックス（スキーマ・テーブル・テーブル別カラム・キーワード・関数）
+
+    MetadataSnapshot.get_derived で生成し、スナップショットと同じ寿命で共有する。
+    候補の SQLCompletionItem は構築時（カラムはテーブルの初回参照時）に作成して使い回す。
+    """
+
+    def __init__(self, all_metadata: Iterable[Dict[str, Any]], keywords: Dict[str, str],
+                 functions: Dict[str, str]):
+        schema_entries = []
+        table_entries = []
+        self._tables_by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for schema_data in all_metadata:
+            schema_name = schema_data.get("name", "")
+            if schema_name:
+                schema_entries.append((schema_name.upper(), schema_data))
+            for table_data in schema_data.get("tables", []):
+                table_name = table_data.get("name", "")
+                if not table_name:
+                    continue
+                self._tables_by_name.setdefault(table_name.upper(), []).append(table_data)
+                table_entries.append((table_name.upper(), self._table_item(table_data, schema_name)))
+        self.schemas = PrefixIndex(schema_entries)
+        self.tables = PrefixIndex(table_entries)
+        self.keywords = PrefixIndex(
+            (keyword, SQLCompletionItem(label=keyword, kind="keyword", detail=desc,
+                                        insert_text=keyword, sort_text=f"3_{keyword}"))
+            for keyword, desc in keywords.items()
+        )
+        self.functions = PrefixIndex(
+            (func, SQLCompletionItem(label=func, kind="function", detail=desc,
+                                     insert_text=f"{func}($1)", sort_text=f"2_{func}"))
+            for func, desc in functions.items()
+        )
+        # テーブル名（大文字）→ カラムの PrefixIndex（初回参照時に作成）
+        self._columns_by_table: Dict[str, PrefixIndex] = {}
+
+    @classmethod
+    def builder(cls, keywords: Dict[str, str], functions: Dict[str, str]) -> Callable[[Any], "CompletionIndex"]:
+        """MetadataSnapshot.get_derived に渡すビルダーを返す"""
+        return lambda snapshot: cls(snapshot.schemas, keywords, functions)
+
+    def get_tables(self, table_name: str) -> List[Dict[str, Any]]:
+        """テーブル名（大文字小文字を区別しない）に一致するテーブル情報（スキーマ違いを含む）"""
+        return self._tables_by_name.get(table_name.upper(), [])
+
+    def columns_for(self, table_name: str) -> PrefixIndex:
+        """テーブル名に一致する全テーブルのカラムインデックス（エイリアス解決後の検索用）"""
+        key = table_name.upper()
+        index = self._columns_by_table.get(key)
+        if index is None:
+            index = PrefixIndex(
+                (column_data["name"].upper(), self._column_item(column_data, table_data.get("name", "")))
+                for table_data in self._tables_by_name.get(key, [])
+                for column_data in table_data.get("columns", [])
+                if column_data.get("name")
+            )
+            # 同時に作成されても内容は同じため、後勝ちで問題ない
+            self._columns_by_table[key] = index
+        return index
+
+    @staticmethod
+    def _table_item(table_data: Dict[str, Any], schema_name: str) -> SQLCompletionItem:
+        table_name = table_data.get("name", "")
+        comment = table_data.get("comment")
+        table_type = table_data.get("table_type", "TABLE")
+        # コメントがある場合はコメントを優先、なければデフォルト形式
+        detail = comment if comment else f"{table_type} in {schema_name}"
+        return SQLCompletionItem(
+            label=table_name,
+            kind="table" if table_type == "TABLE" else "view",
+            detail=detail,
+            documentation=comment,  # ドキュメントにもコメントを設定
+            insert_text=table_name,
+            sort_text=f"1_{table_name}"
+        )
+
+    @staticmethod
+    def _column_item(column_data: Dict[str, Any], table_name: str) -> SQLCompletionItem:
+        column_name = column_data.get("name", "")
+        comment = column_data.get("comment")
+        data_type = column_data.get("data_type", "")
+        # コメントがある場合はコメントを優先、なければデフォルト形式
+        detail = comment if comment else f"{data_type} in {table_name}"
+        return SQLCompletionItem(
+            label=column_name,
+            kind="column",
+            detail=detail,
+            documentation=comment,  # ドキュメントにもコメントを設定
+            insert_text=column_name,
+            sort_text=f"0_{column_name}"
+        )
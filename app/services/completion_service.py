@@ -5,12 +5,14 @@ SQL Completion Service
 Provides SQL autocompletion for Monaco Editor.
 """
 from typing import List, Dict, Any, Optional
-import re
-import sqlparse
-from sqlparse.sql import Identifier, IdentifierList
 
 from app.api.models import SQLCompletionItem, SQLCompletionResponse
+from app.services.completion_index import CompletionIndex
+from app.services.completion_usage_service import (
+    OBJECT_COLUMN, OBJECT_JOIN, OBJECT_TABLE, CompletionUsageService, UsageRanking, join_key,
+)
 from app.services.metadata_service import MetadataService
+from app.services.sql_context_analyzer import SqlContextAnalyzer
 from app.config_simplified import get_settings
 from app.logger import get_logger
 
@@ -18,11 +20,17 @@ from app.logger import get_logger
 class CompletionService:
     """SQL Completion Service"""
 
-    def __init__(self, metadata_service: MetadataService):
+    # 結合ペアの利用状況をテーブル候補のスコアに加える倍率
+    JOIN_WEIGHT = 2.0
+
+    def __init__(self, metadata_service: MetadataService, usage_service: Optional[CompletionUsageService] = None):
         self.metadata_service = metadata_service
+        self.usage_service = usage_service  # 利用状況ランキング（Noneの場合は固定の優先度のみで並べる）
         self.logger = get_logger(__name__)
         self.settings = get_settings()
-        self._all_metadata = None  # メモリ内キャッシュ
+        self._metadata_version = None  # 読み込み済みスナップショットのバージョン
+        self._index: Optional[CompletionIndex] = None  # 補完候補インデックス（バージョンごとに構築）
+        self.context_analyzer = SqlContextAnalyzer()  # エディタセッションごとの文脈解析キャッシュ
 
         self.sql_keywords = {
             "SELECT": "テーブルから列を取得します。", "FROM": "データを取得するテーブルを指定します。",
@@ -51,17 +59,28 @@ class CompletionService:
         }
 
     def _load_metadata_if_needed(self):
-        """パフォーマンス改善のため、メタデータをメモリにキャッシュする"""
-        if self._all_metadata is None:
-            self.logger.info("CompletionService: メタデータをメモリに読み込みます...")
-            try:
-                self._all_metadata = self.metadata_service.get_all_metadata()
-                self.logger.info(f"CompletionService: メタデータ読み込み完了。スキーマ数: {len(self._all_metadata)}")
-            except Exception as e:
-                self.logger.error(f"CompletionService: メタデータの読み込みに失敗: {e}", exc_info=True)
-                self._all_metadata = []
+        """メタデータスナップショットのバージョンが変わった場合のみ、補完用インデックスを差し替える"""
+        try:
+            snapshot = self.metadata_service.get_metadata_snapshot()
+            if snapshot.version == self._metadata_version:
+                return
+            self.logger.info(f"CompletionService: メタデータを読み込みます（バージョン: {snapshot.version}）")
+            if snapshot.is_empty:
+                index = CompletionIndex(self.metadata_service.get_all_metadata(), self.sql_keywords, self.sql_functions)
+            else:
+                index = snapshot.get_derived(
+                    "completion.index", CompletionIndex.builder(self.sql_keywords, self.sql_functions)
+                )
+            self._index = index
+            self._metadata_version = snapshot.version
+            self.logger.info(f"CompletionService: メタデータ読み込み完了。スキーマ数: {len(index.schemas)}")
+        except Exception as e:
+            self.logger.error(f"CompletionService: メタデータの読み込みに失敗: {e}", exc_info=True)
+            if self._index is None:
+                self._index = CompletionIndex([], self.sql_keywords, self.sql_functions)
 
-    def get_completions(self, sql: str, position: int, context: Optional[Dict[str, Any]] = None) -> SQLCompletionResponse:
+    def get_completions(self, sql: str, position: int, context: Optional[Dict[str, Any]] = None,
+                        user_id: Optional[str] = None) -> SQLCompletionResponse:
         """SQL補完候補を文脈に応じて生成するメイン機能"""
         try:
             self._load_metadata_if_needed() # メタデータを読み込み
@@ -69,7 +88,7 @@ class CompletionService:
             current_word = self._get_current_word(sql, position)
             suggestions = []
             
-            context_type, tables_in_query = self._get_sql_context(sql, position)
+            context_type, tables_in_query = self._get_sql_context(sql, position, context)
             self.logger.debug(f"SQL Context: {context_type}, Tables in Query: {tables_in_query}")
 
             if context_type == 'TABLE':
@@ -87,6 +106,8 @@ class CompletionService:
 
             seen = set()
             unique_suggestions = [s for s in suggestions if s.label not in seen and not seen.add(s.label)]
+            if self.usage_service is not None:
+                unique_suggestions = self._apply_usage_ranking(unique_suggestions, user_id, tables_in_query)
             
             unique_suggestions.sort(key=lambda x: (x.sort_text or f"9_{x.label}"))
             return SQLCompletionResponse(suggestions=unique_suggestions, is_incomplete=False)
@@ -94,39 +115,53 @@ class CompletionService:
             self.logger.error(f"SQL completion error: {str(e)}", exc_info=True)
             return SQLCompletionResponse(suggestions=[])
 
-    def _get_sql_context(self, sql: str, position: int) -> tuple[Optional[str], List[str]]:
-        """sqlparseを使い、カーソル位置の文脈（テーブル候補か、カラム候補か）を判断する"""
-        tables_in_query = self._extract_table_names_from_sql(sql)
-        sql_to_cursor = sql[:position]
-        
-        # ドット直後の場合をチェック
-        if position > 0 and sql[position - 1] == '.':
-            # ドット直前の単語（テーブル名/エイリアス）を取得
-            table_alias = self._get_table_alias_before_dot(sql, position - 1)
-            if table_alias:
-                # エイリアスから実際のテーブル名を解決
-                actual_table = self._resolve_table_alias(sql, table_alias)
-                if actual_table:
-                    self.logger.debug(f"ドット補完: {table_alias} -> {actual_table}")
-                    return 'COLUMN_SPECIFIC', [actual_table]
-                else:
-                    # エイリアスが解決できない場合は、エイリアス名をテーブル名として扱う
-                    return 'COLUMN_SPECIFIC', [table_alias]
-        
-        # カーソル直前の単語のさらに前のキーワードで判断
-        tokens = list(sqlparse.parse(sql_to_cursor)[0].flatten())
-        
-        last_keyword = None
-        # 末尾から遡ってキーワードを探す
-        for token in reversed(tokens):
-            if token.is_keyword:
-                last_keyword = token.normalized
-                break
-        
-        if last_keyword in ('FROM', 'JOIN'):
-            return 'TABLE', tables_in_query
-            
-        return 'COLUMN', tables_in_query
+    def _get_sql_context(self, sql: str, position: int,
+                         context: Optional[Dict[str, Any]] = None) -> tuple[Optional[str], List[str]]:
+        """カーソル位置の文脈（テーブル候補か、カラム候補か）と、クエリ内のテーブル名を判断する
+
+        context に session_id（エディタごとのID）と version（ドキュメントの版）があれば、
+        前回の解析結果から編集範囲だけを再解析する。
+        """
+        context = context or {}
+        return self.context_analyzer.analyze(
+            sql, position, session_id=context.get("session_id"), version=context.get("version")
+        )
+
+    def _apply_usage_ranking(self, suggestions: List[SQLCompletionItem], user_id: Optional[str],
+                             tables_in_query: List[str]) -> List[SQLCompletionItem]:
+        """利用状況のあるテーブル・カラムを、同じ種類の候補の中で利用スコア順に先頭へ並べる
+
+        候補アイテムはインデックスで共有しているため、並べ替える候補だけ sort_text を変えたコピーを返す。
+        sort_text は「種類_!順位」とし、'!' が識別子に使われる文字より前に並ぶことを利用する。
+        """
+        ranking: UsageRanking = self.usage_service.get_ranking()
+        if ranking.is_empty:
+            return suggestions
+        query_tables = [t.upper() for t in tables_in_query]
+        scored = []
+        for position, item in enumerate(suggestions):
+            if item.kind == "column":
+                score = max((ranking.score(user_id, OBJECT_COLUMN, f"{t}.{item.label}") for t in query_tables),
+                            default=0.0)
+            elif item.kind in ("table", "view"):
+                score = ranking.score(user_id, OBJECT_TABLE, item.label) + self.JOIN_WEIGHT * sum(
+                    ranking.score(user_id, OBJECT_JOIN, join_key(t, item.label))
+                    for t in query_tables if t != item.label.upper()
+                )
+            else:
+                continue
+            if score > 0:
+                scored.append((score, position))
+        if not scored:
+            return suggestions
+
+        ranked = list(suggestions)
+        scored.sort(key=lambda entry: (-entry[0], suggestions[entry[1]].label))
+        for rank, (_, position) in enumerate(scored):
+            item = suggestions[position]
+            group = (item.sort_text or "9").split("_", 1)[0]
+            ranked[position] = item.model_copy(update={"sort_text": f"{group}_!{rank:04d}"})
+        return ranked
 
     def _get_current_word(self, sql: str, position: int) -> str:
         """カーソル位置の単語を取得"""
@@ -141,159 +176,26 @@ class CompletionService:
 
     def _get_keyword_suggestions(self, current_word: str) -> List[SQLCompletionItem]:
         """キーワードの候補を生成する"""
-        return [
-            SQLCompletionItem(
-                label=kw, kind="keyword", detail=desc,
-                insert_text=kw, sort_text=f"3_{kw}"
-            )
-            for kw, desc in self.sql_keywords.items() if kw.startswith(current_word)
-        ]
+        return self._index.keywords.lookup(current_word)
 
     def _get_function_suggestions(self, current_word: str) -> List[SQLCompletionItem]:
         """関数の候補を生成する"""
-        return [
-            SQLCompletionItem(
-                label=f"{func}", kind="function", detail=desc,
-                insert_text=f"{func}($1)", sort_text=f"2_{func}"
-            )
-            for func, desc in self.sql_functions.items() if func.startswith(current_word)
-        ]
+        return self._index.functions.lookup(current_word)
 
     def _get_table_suggestions(self, current_word: str) -> List[SQLCompletionItem]:
         """テーブルとビューの候補を生成する"""
-        suggestions = []
-        if not self._all_metadata: return suggestions
-
-        for schema_data in self._all_metadata:
-            for table_data in schema_data.get("tables", []):
-                table_name = table_data.get("name", "")
-                if table_name and table_name.upper().startswith(current_word):
-                    comment = table_data.get("comment")
-                    table_type = table_data.get("table_type", "TABLE")
-                    schema_name = schema_data.get("name", "")
-                    
-                    # コメントがある場合はコメントを優先、なければデフォルト形式
-                    if comment:
-                        detail = comment
-                    else:
-                        detail = f"{table_type} in {schema_name}"
-                    
-                    suggestions.append(SQLCompletionItem(
-                        label=table_name,
-                        kind="table" if table_type == "TABLE" else "view",
-                        detail=detail,
-                        documentation=comment,  # ドキュメントにもコメントを設定
-                        insert_text=table_name,
-                        sort_text=f"1_{table_name}"
-                    ))
-        return suggestions
+        return self._index.tables.lookup(current_word)
 
     def _get_column_suggestions(self, tables_in_query: List[str], current_word: str) -> List[SQLCompletionItem]:
         """クエリ内のテーブルに含まれるカラムの候補を生成する"""
         suggestions = []
-        if not tables_in_query or not self._all_metadata:
+        if not tables_in_query:
             return suggestions
 
-        target_table_names = [t.upper() for t in tables_in_query]
-        
-        # 検索対象テーブルのみを効率的に検索
-        found_tables = []
-        for schema_data in self._all_metadata:
-            for table_data in schema_data.get("tables", []):
-                table_name = table_data.get("name", "")
-                if table_name.upper() in target_table_names:
-                    found_tables.append(table_data)
-        
-        # 見つかったテーブルのカラムのみを検索
-        for table_data in found_tables:
-            table_name = table_data.get("name", "")
-            columns = table_data.get("columns", [])
-            for column_data in columns:
-                column_name = column_data.get("name", "")
-                # current_wordが空の場合（ドット直後）は全てのカラムを表示
-                if column_name and (not current_word or column_name.upper().startswith(current_word)):
-                    suggestions.append(self._create_column_suggestion(column_data, table_name))
+        # テーブルごとのカラムインデックスから前方一致するものを取得
+        # （current_wordが空の場合（ドット直後）は全てのカラムを表示）
+        for table_name in dict.fromkeys(t.upper() for t in tables_in_query):
+            suggestions.extend(self._index.columns_for(table_name).lookup(current_word))
         
-        self.logger.debug(f"カラム候補: {len(found_tables)}テーブルから{len(suggestions)}個生成")
+        self.logger.debug(f"カラム候補: {len(tables_in_query)}テーブルから{len(suggestions)}個生成")
         return suggestions
-
-    def _get_table_alias_before_dot(self, sql: str, dot_position: int) -> Optional[str]:
-        """ドット直前のテーブル名/エイリアスを取得"""
-        start = dot_position
-        while start > 0 and (sql[start - 1].isalnum() or sql[start - 1] in '_'):
-            start -= 1
-        
-        if start < dot_position:
-            return sql[start:dot_position].strip()
-        return None
-
-    def _resolve_table_alias(self, sql: str, alias: str) -> Optional[str]:
-        """エイリアスから実際のテーブル名を解決"""
-        try:
-            # 簡単な正規表現パターンでエイリアスを探す
-            import re
-            
-            # FROM table_name AS alias または FROM table_name alias パターンを探す
-            patterns = [
-                rf'FROM\s+(\w+)\s+AS\s+{re.escape(alias)}\b',
-                rf'FROM\s+(\w+)\s+{re.escape(alias)}\b',
-                rf'JOIN\s+(\w+)\s+AS\s+{re.escape(alias)}\b', 
-                rf'JOIN\s+(\w+)\s+{re.escape(alias)}\b'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, sql, re.IGNORECASE)
-                if match:
-                    table_name = match.group(1)
-                    return table_name
-            
-        except Exception as e:
-            self.logger.error(f"エイリアス解決エラー: {e}", exc_info=True)
-        
-        return None
-
-    def _create_column_suggestion(self, column_data: Dict[str, Any], table_name: str) -> SQLCompletionItem:
-        """カラム候補のアイテムを作成する"""
-        column_name = column_data.get("name", "")
-        comment = column_data.get("comment")
-        data_type = column_data.get("data_type", "")
-        
-        # コメントがある場合はコメントを優先、なければデフォルト形式
-        if comment:
-            detail = comment
-        else:
-            detail = f"{data_type} in {table_name}"
-        
-        return SQLCompletionItem(
-            label=column_name, 
-            kind="column", 
-            detail=detail,
-            documentation=comment,  # ドキュメントにもコメントを設定
-            insert_text=column_name, 
-            sort_text=f"0_{column_name}"
-        )
-
-    def _extract_table_names_from_sql(self, sql: str) -> List[str]:
-        """sqlparseを使い、SQLクエリからテーブル名を抽出する"""
-        tables = set()
-        try:
-            parsed = sqlparse.parse(sql)
-            for statement in parsed:
-                from_seen = False
-                for token in statement.tokens:
-                    if token.is_keyword and token.normalized in ('FROM', 'JOIN'):
-                        from_seen = True
-                        continue
-                    
-                    if from_seen:
-                        if isinstance(token, Identifier):
-                            tables.add(token.get_real_name())
-                            from_seen = False
-                        elif isinstance(token, IdentifierList):
-                            for identifier in token.get_identifiers():
-                                tables.add(identifier.get_real_name())
-                            from_seen = False
-        except Exception as e:
-            self.logger.error(f"SQLからのテーブル名抽出エラー: {e}", exc_info=True)
-        
-        return list(tables)
\ No newline at end of file
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+補完候補の利用状況ランキングサービス
+SQL実行履歴からテーブル・カラム・結合ペアの利用回数と最終利用日時をユーザー別・全体で集計し、
+補完候補の並べ替えに使うスコアを提供する
+"""
+import asyncio
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.logger import get_logger
+from app.metadata_cache import MetadataCache
+from app.services.sql_context_analyzer import SQL_KEYWORDS, collect_table_references, tokenize
+
+OBJECT_TABLE = "table"
+OBJECT_COLUMN = "column"
+OBJECT_JOIN = "join"
+
+# 全ユーザー合計の集計に使う user_id
+GLOBAL_USER = ""
+
+# 1クエリから数える結合ペアの対象テーブル数の上限（組み合わせ数の爆発を防ぐ）
+MAX_JOIN_TABLES = 6
+
+
+class SqlUsage(NamedTuple):
+    tables: List[str]
+    columns: List[str]  # "テーブル.カラム"
+    joins: List[str]    # "テーブルA|テーブルB"（名前順）
+
+
+def join_key(table_a: str, table_b: str) -> str:
+    """結合ペアのキー（順不同）"""
+    first, second = sorted((table_a.upper(), table_b.upper()))
+    return f"{first}|{second}"
+
+
+def extract_usage(sql: str) -> SqlUsage:
+    """SQLから参照しているテーブル・カラム・結合ペアを抽出する（名前はすべて大文字）
+
+    カラムは「別名.カラム」で修飾されたもの、またはテーブルが1つだけのクエリの非修飾の識別子を数える。
+    """
+    tokens = [token for token in tokenize(sql) if token.kind != "comment"]
+    tables, aliases = collect_table_references(tokens)
+    table_names = list(dict.fromkeys(table.upper() for table in tables))
+    names = {name.upper() for name in aliases}
+    single_table = table_names[0] if len(table_names) == 1 else None
+
+    columns: Dict[str, None] = {}
+    count = len(tokens)
+    for i, token in enumerate(tokens):
+        if token.kind not in ("word", "quoted") or (token.kind == "word" and token.value in SQL_KEYWORDS):
+            continue
+        previous = tokens[i - 1] if i > 0 else None
+        following = tokens[i + 1] if i + 1 < count else None
+        if following is not None and following.value in (".", "("):
+            continue
+        if previous is not None and previous.value == ".":
+            qualifier = tokens[i - 2] if i >= 2 else None
+            table = aliases.get(qualifier.value.upper()) if qualifier is not None else None
+            if table:
+                columns.setdefault(f"{table.upper()}.{token.value.upper()}", None)
+            continue
+        if single_table and token.value.upper() not in names and not (
+                previous is not None and previous.kind == "word" and previous.value == "AS"):
+            columns.setdefault(f"{single_table}.{token.value.upper()}", None)
+
+    joins = [join_key(a, b) for a, b in combinations(table_names[:MAX_JOIN_TABLES], 2)]
+    return SqlUsage(table_names, list(columns), joins)
+
+
+class UsageRanking:
+    """利用状況スコアの読み取り専用スナップショット（リクエスト時は辞書参照のみ）"""
+
+    # ユーザー本人の利用を全体の利用より重視する倍率
+    USER_WEIGHT = 3.0
+
+    def __init__(self, scores: Optional[Dict[Tuple[str, str, str], float]] = None):
+        self._scores = scores or {}
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._scores
+
+    def score(self, user_id: Optional[str], object_type: str, name: str) -> float:
+        """ユーザー本人と全体の利用状況を合成したスコア（未使用は0）"""
+        name = name.upper()
+        score = self._scores.get((GLOBAL_USER, object_type, name), 0.0)
+        if user_id:
+            score += self.USER_WEIGHT * self._scores.get((user_id, object_type, name), 0.0)
+        return score
+
+
+class CompletionUsageService:
+    """補完候補の利用状況ランキングサービス
+
+    集計結果は metadata_cache.db の completion_usage_stats に保存し、
+    SQL実行履歴の取り込み位置（cursor）を completion_usage_state に記録して差分だけを集計する。
+    """
+
+    SYNC_BATCH_SIZE = 1000
+    # 未更新のキーも含めて最終利用日時からの経過による減衰を再計算する間隔（秒）
+    FULL_RESCORE_INTERVAL = 3600
+
+    def __init__(self, metadata_cache: MetadataCache, half_life_days: Optional[float] = None):
+        self.metadata_cache = metadata_cache
+        self.logger = get_logger(__name__)
+        if half_life_days is None:
+            from app.config_simplified import get_settings
+            half_life_days = get_settings().completion_usage_half_life_days
+        self.half_life_days = half_life_days
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str, str], Tuple[int, str]] = {}
+        self._ranking = UsageRanking()
+        self._scored_at = datetime.min
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self._init_tables()
+        self._load()
+
+    def _get_conn(self):
+        """MetadataCacheのDB接続を再利用"""
+        return self.metadata_cache._get_conn()
+
+    def _init_tables(self):
+        """利用状況テーブルを作成"""
+        with self._get_conn() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS completion_usage_stats (
+                user_id TEXT NOT NULL,
+                object_type TEXT NOT NULL,
+                name TEXT NOT NULL,
+                use_count INTEGER NOT NULL,
+                last_used TEXT NOT NULL,
+                PRIMARY KEY (user_id, object_type, name)
+            )
+            """)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS completion_usage_state (
+                source TEXT PRIMARY KEY,
+                cursor TEXT
+            )
+            """)
+            conn.commit()
+
+    def _load(self):
+        """保存済みの集計結果を読み込み、スコアを計算する"""
+        with self._get_conn() as conn:
+            rows = conn.execute(
+                "SELECT user_id, object_type, name, use_count, last_used FROM completion_usage_stats"
+            ).fetchall()
+        with self._lock:
+            self._stats = {(row[0], row[1], row[2]): (row[3], row[4]) for row in rows}
+            self._rescore_all()
+        self.logger.info(f"補完候補の利用状況を読み込みました: {len(rows)}件")
+
+    def get_ranking(self) -> UsageRanking:
+        """現在のランキング（参照の取得のみで、ロックは不要）"""
+        return self._ranking
+
+    def _score(self, use_count: int, last_used: str, now: datetime) -> float:
+        """利用回数（対数）に最終利用日時からの経過日数による減衰をかけたスコア"""
+        try:
+            age_days = max(0.0, (now - datetime.fromisoformat(last_used)).total_seconds() / 86400)
+        except ValueError:
+            age_days = 0.0
+        return math.log1p(use_count) * 0.5 ** (age_days / self.half_life_days)
+
+    def _rescore_all(self):
+        now = datetime.now()
+        self._ranking = UsageRanking({key: self._score(count, last_used, now)
+                                      for key, (count, last_used) in self._stats.items()})
+        self._scored_at = now
+
+    def record_logs(self, logs: Iterable[Dict[str, Any]], cursor_update: Optional[Tuple[str, str]] = None) -> int:
+        """SQL実行ログ（user_id, sql, timestamp）を集計に加える。戻り値は反映したログ件数
+
+        cursor_update（ログの取り込み元, 次回の cursor）を指定した場合は集計結果と同じトランザクションで保存する。
+        """
+        deltas: Dict[Tuple[str, str, str], List[Any]] = defaultdict(lambda: [0, ""])
+        processed = 0
+        for log in logs:
+            sql = log.get("sql")
+            if not sql:
+                continue
+            processed += 1
+            used_at = log.get("timestamp") or datetime.now().isoformat()
+            usage = extract_usage(sql)
+            owners: Set[str] = {log.get("user_id") or GLOBAL_USER, GLOBAL_USER}
+            for object_type, names in ((OBJECT_TABLE, usage.tables), (OBJECT_COLUMN, usage.columns),
+                                       (OBJECT_JOIN, usage.joins)):
+                for name in names:
+                    for owner in owners:
+                        delta = deltas[(owner, object_type, name)]
+                        delta[0] += 1
+                        delta[1] = max(delta[1], used_at)
+        self._apply_deltas(deltas, cursor_update)
+        return processed
+
+    def _apply_deltas(self, deltas: Dict[Tuple[str, str, str], List[Any]], cursor_update: Optional[Tuple[str, str]] = None):
+        """差分を保存し、変更のあったキーのスコアだけを再計算して差し替える"""
+        if not deltas and cursor_update is None:
+            return
+        with self._get_conn() as conn:
+            conn.executemany("""
+            INSERT INTO completion_usage_stats (user_id, object_type, name, use_count, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, object_type, name) DO UPDATE SET
+                use_count = use_count + excluded.use_count,
+                last_used = max(last_used, excluded.last_used)
+            """, [(key[0], key[1], key[2], count, last_used) for key, (count, last_used) in deltas.items()])
+            if cursor_update is not None:
+                conn.execute("INSERT OR REPLACE INTO completion_usage_state (source, cursor) VALUES (?, ?)",
+                             cursor_update)
+            conn.commit()
+
+        with self._lock:
+            for key, (count, last_used) in deltas.items():
+                old_count, old_last_used = self._stats.get(key, (0, ""))
+                self._stats[key] = (old_count + count, max(old_last_used, last_used))
+            now = datetime.now()
+            if (now - self._scored_at).total_seconds() >= self.FULL_RESCORE_INTERVAL:
+                self._rescore_all()
+            else:
+                scores = dict(self._ranking._scores)
+                for key in deltas:
+                    scores[key] = self._score(*self._stats[key], now)
+                self._ranking = UsageRanking(scores)
+
+    def _get_cursor(self, source: str) -> Optional[str]:
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT cursor FROM completion_usage_state WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def sync_from_logs(self, sql_log_service) -> int:
+        """SQL実行履歴のうち、前回の取り込み以降に追加された分だけを集計する"""
+        source = sql_log_service.log_storage_type
+        cursor = self._get_cursor(source)
+        total = 0
+        while True:
+            logs, next_cursor = sql_log_service.get_logs_after(cursor, self.SYNC_BATCH_SIZE)
+            if not logs:
+                break
+            total += self.record_logs(logs, (source, next_cursor))
+            cursor = next_cursor
+            if len(logs) < self.SYNC_BATCH_SIZE:
+                break
+        if total:
+            self.logger.info(f"補完候補の利用状況を更新しました: {total}件のSQL")
+        return total
+
+    async def start_sync_task(self, sql_log_service_factory, interval_seconds: int) -> None:
+        """SQL実行履歴の差分集計タスクを開始"""
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._sync_loop(sql_log_service_factory, interval_seconds))
+        self.logger.info(f"補完候補の利用状況集計タスクを開始しました（間隔: {interval_seconds}秒）")
+
+    async def stop_sync_task(self) -> None:
+        """差分集計タスクを停止"""
+        if not self._running:
+            return
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.logger.info("補完候補の利用状況集計タスクを停止しました")
+
+    async def _sync_loop(self, sql_log_service_factory, interval_seconds: int) -> None:
+        sql_log_service = None
+        while self._running:
+            try:
+                if sql_log_service is None:
+                    sql_log_service = sql_log_service_factory()
+                await asyncio.to_thread(self.sync_from_logs, sql_log_service)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"補完候補の利用状況集計中にエラーが発生しました: {e}", exc_info=True)
+            try:
+                await asyncio.sleep(interval_seconds)
+            except asyncio.CancelledError:
+                break
@@ -180,6 +180,11 @@ class ConnectionManagerODBC:
             info.query_count += 1
             return oldest_conn_id, self._connections[oldest_conn_id]
     
+    def create_dedicated_connection(self) -> pyodbc.Connection:
+        """プール外の専用接続を作成（実行中クエリの中断など、使用中接続と分離したい用途向け。呼び出し側でclose）"""
+        _, connection = self._create_connection()
+        return connection
+
     def release_connection(self, connection_id: str):
         """接続をプールに返す"""
         with self._lock:
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行スケジューラー
+同時実行数の上限を超えたリクエストを拒否せずにキューイングし、公平に実行枠を割り当てる
+"""
+import asyncio
+import itertools
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from app.logger import get_logger
+from app.exceptions import RateLimitError
+
+logger = get_logger("ExecutionScheduler")
+
+LANE_INTERACTIVE = "interactive"  # 画面表示用の対話的な実行
+LANE_BULK = "bulk"                # CSV等の一括ダウンロード
+
+
+class ExecutionScheduler:
+    """公平性を考慮したキュー方式の実行枠管理
+
+    割り当て順序:
+      1. レーン優先度（interactive > bulk）。長時間待機したbulkはinteractiveと同列に昇格
+      2. 実行中件数が少ないユーザーを優先（1ユーザーによる枠の独占を防止）
+      3. 到着順
+    空き枠の数だけ上位の待機者に割り当てるため、待機者のいないチケットが先頭にあっても他の待機者は止まらない。
+    待機時間が queue_timeout_seconds を超えたチケットは、待機者がいなくても（登録後に実行が開始されなかった場合など）除去する。
+    """
+
+    _LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BULK: 1}
+    _AGING_SECONDS = 60  # bulkレーンの昇格までの待機時間
+
+    def __init__(self, global_limit: Optional[int] = None, per_user_limit: Optional[int] = None,
+                 bulk_limit: Optional[int] = None, queue_timeout_seconds: Optional[float] = None,
+                 max_queue_length: Optional[int] = None):
+        if None in (global_limit, per_user_limit, bulk_limit, queue_timeout_seconds, max_queue_length):
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            global_limit = settings.execution_global_limit if global_limit is None else global_limit
+            per_user_limit = settings.execution_per_user_limit if per_user_limit is None else per_user_limit
+            bulk_limit = settings.execution_bulk_limit if bulk_limit is None else bulk_limit
+            queue_timeout_seconds = (settings.execution_queue_timeout_seconds
+                                     if queue_timeout_seconds is None else queue_timeout_seconds)
+            max_queue_length = settings.execution_max_queue_length if max_queue_length is None else max_queue_length
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.bulk_limit = bulk_limit
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_queue_length = max_queue_length
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: Dict[str, Dict[str, Any]] = {}  # セッションID -> チケット
+        self._running: Dict[str, Dict[str, Any]] = {}  # セッションID -> チケット
+        self._async_waiters: Dict[str, Any] = {}  # セッションID -> (イベントループ, asyncio.Event)
+        self._stats = {'dispatched': 0, 'timeouts': 0, 'rejected': 0, 'total_wait_seconds': 0.0}
+
+    def enqueue(self, session_id: str, user_id: str, lane: str = LANE_INTERACTIVE) -> int:
+        """実行待ちキューに登録し、待ち順位を返す（0=即時実行可能）"""
+        if lane not in self._LANE_PRIORITY:
+            lane = LANE_INTERACTIVE
+        with self._cond:
+            self._expire_stale_locked()
+            if session_id in self._waiting or session_id in self._running:
+                return self._position_locked(session_id)
+            if len(self._waiting) >= self.max_queue_length:
+                self._stats['rejected'] += 1
+                raise RateLimitError(
+                    f"実行待ちが{self.max_queue_length}件に達しています。しばらく待ってから再度お試しください。"
+                )
+            self._waiting[session_id] = {
+                'session_id': session_id,
+                'user_id': user_id,
+                'lane': lane,
+                'seq': next(self._seq),
+                'enqueued_at': time.monotonic(),
+            }
+            self._notify_locked()
+            position = self._position_locked(session_id)
+        logger.debug(f"実行キュー登録: {session_id}, user={user_id}, lane={lane}, position={position}")
+        return position
+
+    def wait_for_slot(self, session_id: str, timeout: Optional[float] = None) -> bool:
+        """実行枠が割り当てられるまで待機（タイムアウト・キャンセル時はFalse）"""
+        timeout = self.queue_timeout_seconds if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                dispatched = self._try_dispatch_locked(session_id)
+                if dispatched is not None:
+                    return dispatched
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeout_locked(session_id)
+                    return False
+                self._cond.wait(self._wait_interval_locked(remaining))
+
+    async def wait_for_slot_async(self, session_id: str, timeout: Optional[float] = None) -> bool:
+        """実行枠が割り当てられるまでイベントループ上で待機（スレッドを占有しない。戻り値は wait_for_slot と同じ）"""
+        timeout = self.queue_timeout_seconds if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        try:
+            while True:
+                with self._cond:
+                    dispatched = self._try_dispatch_locked(session_id)
+                    if dispatched is not None:
+                        return dispatched
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeout_locked(session_id)
+                        return False
+                    wakeup.clear()
+                    self._async_waiters[session_id] = (loop, wakeup)
+                    remaining = self._wait_interval_locked(remaining)
+                try:
+                    await asyncio.wait_for(wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.pop(session_id, None)
+
+    def acquire(self, session_id: str, user_id: str, lane: str = LANE_INTERACTIVE,
+                timeout: Optional[float] = None) -> bool:
+        """キュー登録と実行枠の待機をまとめて行う"""
+        self.enqueue(session_id, user_id, lane)
+        return self.wait_for_slot(session_id, timeout)
+
+    async def acquire_async(self, session_id: str, user_id: str, lane: str = LANE_INTERACTIVE,
+                            timeout: Optional[float] = None) -> bool:
+        """キュー登録と実行枠の待機をまとめて行う（イベントループ上で待機）"""
+        self.enqueue(session_id, user_id, lane)
+        return await self.wait_for_slot_async(session_id, timeout)
+
+    def release(self, session_id: str) -> None:
+        """実行枠を解放（待機中の場合はキューから除去）"""
+        with self._cond:
+            removed = self._running.pop(session_id, None) or self._waiting.pop(session_id, None)
+            if removed:
+                self._notify_locked()
+
+    def get_queue_position(self, session_id: str) -> Optional[int]:
+        """待ち順位を取得（0=実行中、None=未登録）"""
+        with self._cond:
+            self._expire_stale_locked()
+            if session_id not in self._waiting and session_id not in self._running:
+                return None
+            return self._position_locked(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キュー状況と統計を取得"""
+        with self._cond:
+            self._expire_stale_locked()
+            dispatched = self._stats['dispatched']
+            return {
+                'running': len(self._running),
+                'waiting': len(self._waiting),
+                'running_by_lane': self._count_by_lane(self._running.values()),
+                'waiting_by_lane': self._count_by_lane(self._waiting.values()),
+                'dispatched': dispatched,
+                'timeouts': self._stats['timeouts'],
+                'rejected': self._stats['rejected'],
+                'avg_wait_seconds': round(self._stats['total_wait_seconds'] / dispatched, 3) if dispatched else 0.0,
+                'global_limit': self.global_limit,
+                'per_user_limit': self.per_user_limit,
+                'bulk_limit': self.bulk_limit,
+            }
+
+    def _try_dispatch_locked(self, session_id: str) -> Optional[bool]:
+        """順番が来ていれば実行枠を割り当てる（True=実行可、False=キューから除去済み、None=待機継続）"""
+        if session_id in self._running:
+            return True
+        self._expire_stale_locked()
+        if session_id not in self._waiting:
+            # release() またはタイムアウトによりキューから除去された（キャンセル等）
+            return False
+        if session_id not in self._dispatchable_locked():
+            return None
+        ticket = self._waiting.pop(session_id)
+        ticket['started_at'] = time.monotonic()
+        self._running[session_id] = ticket
+        self._stats['dispatched'] += 1
+        self._stats['total_wait_seconds'] += ticket['started_at'] - ticket['enqueued_at']
+        # 他の待機者も次の候補を再評価できるよう通知
+        self._notify_locked()
+        return True
+
+    def _timeout_locked(self, session_id: str) -> None:
+        if self._waiting.pop(session_id, None) is None:
+            return
+        self._stats['timeouts'] += 1
+        self._notify_locked()
+        logger.warning(f"実行待ちタイムアウト: {session_id}")
+
+    def _wait_interval_locked(self, remaining: float) -> float:
+        """次に待機を再評価するまでの秒数（期限切れで除去されるチケットがあれば、その時点で起きる）"""
+        if not self._waiting:
+            return remaining
+        oldest = min(t['enqueued_at'] for t in self._waiting.values())
+        return max(0.0, min(remaining, oldest + self.queue_timeout_seconds - time.monotonic()))
+
+    def _expire_stale_locked(self) -> None:
+        """登録から queue_timeout_seconds を超えて待機しているチケットを除去（待機者の有無によらない）"""
+        deadline = time.monotonic() - self.queue_timeout_seconds
+        for session_id in [sid for sid, t in self._waiting.items() if t['enqueued_at'] <= deadline]:
+            self._timeout_locked(session_id)
+
+    def _notify_locked(self) -> None:
+        """スレッドで待機中の呼び出し元と、イベントループで待機中の呼び出し元の両方を起こす"""
+        self._cond.notify_all()
+        for loop, wakeup in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # イベントループが既に終了している
+                pass
+
+    def _priority_key(self, ticket: Dict[str, Any], now: float, running_by_user: Dict[str, int]):
+        lane_priority = self._LANE_PRIORITY[ticket['lane']]
+        if now - ticket['enqueued_at'] >= self._AGING_SECONDS:
+            lane_priority = 0
+        return (lane_priority, running_by_user.get(ticket['user_id'], 0), ticket['seq'])
+
+    def _dispatchable_locked(self) -> List[str]:
+        """空き枠に今すぐ割り当てられるセッションIDを優先順に返す（ロック取得済みで呼び出すこと）
+
+        先頭から1件ずつ割り当てたと仮定し、ユーザー別・bulkレーンの上限を反映しながら空き枠の数だけ選ぶ。
+        """
+        free = self.global_limit - len(self._running)
+        if free <= 0:
+            return []
+        running_by_user: Dict[str, int] = {}
+        running_bulk = 0
+        for t in self._running.values():
+            running_by_user[t['user_id']] = running_by_user.get(t['user_id'], 0) + 1
+            if t['lane'] == LANE_BULK:
+                running_bulk += 1
+        now = time.monotonic()
+        selected: List[str] = []
+        remaining = list(self._waiting.values())
+        while len(selected) < free:
+            candidates = [
+                t for t in remaining
+                if running_by_user.get(t['user_id'], 0) < self.per_user_limit
+                and (t['lane'] != LANE_BULK or running_bulk < self.bulk_limit)
+            ]
+            if not candidates:
+                break
+            ticket = min(candidates, key=lambda t: self._priority_key(t, now, running_by_user))
+            selected.append(ticket['session_id'])
+            remaining.remove(ticket)
+            running_by_user[ticket['user_id']] = running_by_user.get(ticket['user_id'], 0) + 1
+            if ticket['lane'] == LANE_BULK:
+                running_bulk += 1
+        return selected
+
+    def _position_locked(self, session_id: str) -> int:
+        """待ち順位（1始まり）。実行中は0。即時割り当て可能な先頭も0とする"""
+        if session_id in self._running:
+            return 0
+        if session_id in self._dispatchable_locked():
+            return 0
+        running_by_user: Dict[str, int] = {}
+        for t in self._running.values():
+            running_by_user[t['user_id']] = running_by_user.get(t['user_id'], 0) + 1
+        now = time.monotonic()
+        ordered: List[Dict[str, Any]] = sorted(
+            self._waiting.values(), key=lambda t: self._priority_key(t, now, running_by_user)
+        )
+        for index, ticket in enumerate(ordered, start=1):
+            if ticket['session_id'] == session_id:
+                return index
+        return 0
+
+    @staticmethod
+    def _count_by_lane(tickets) -> Dict[str, int]:
+        counts = {LANE_INTERACTIVE: 0, LANE_BULK: 0}
+        for t in tickets:
+            counts[t['lane']] += 1
+        return counts
@@ -3,12 +3,19 @@
 ハイブリッドSQLサービス
 カーソル方式によるデータ取得とローカルキャッシュ機能を提供
 """
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime
 from app.services.cache_service import CacheService
 from app.services.connection_manager_odbc import ConnectionManagerODBC
 from app.services.streaming_state_service import StreamingStateService
 from app.services.session_service import SessionService
+from app.services.result_cache_service import ResultCacheService
+from app.services.execution_scheduler import ExecutionScheduler, LANE_INTERACTIVE
+from app.services.query_cancellation_service import QueryCancellationService
+from app.services.query_cost_gate import QueryCostGate, CostDecision, POLICY_CONFIRM, POLICY_REJECT
+from app.services.query_executor import QueryExecutor
+from app.services.adaptive_chunk_sizer import AdaptiveChunkSizer
 from app.logger import get_logger
 from app.exceptions import SQLExecutionError, DatabaseError
 from app.config_simplified import settings
@@ -30,6 +37,10 @@ class HybridSQLService:
         connection_manager: Optional[ConnectionManagerODBC] = kwargs.get("connection_manager")
         session_service: Optional[SessionService] = kwargs.get("session_service")
         streaming_state_service: Optional[StreamingStateService] = kwargs.get("streaming_state_service")
+        result_cache_service: Optional[ResultCacheService] = kwargs.get("result_cache_service")
+        execution_scheduler: Optional[ExecutionScheduler] = kwargs.get("execution_scheduler")
+        query_cancellation_service: Optional[QueryCancellationService] = kwargs.get("query_cancellation_service")
+        query_cost_gate: Optional[QueryCostGate] = kwargs.get("query_cost_gate")
 
         # 位置引数の自動判別（両順序に対応）
         if (cache_service is None) or (connection_manager is None):
@@ -54,11 +65,23 @@ class HybridSQLService:
         self.connection_manager = connection_manager
         self.session_service = session_service
         self.streaming_state_service = streaming_state_service
-        self.chunk_size = settings.cursor_chunk_size  # 一度に取得する行数
+        self.result_cache_service = result_cache_service  # 結果再利用キャッシュ（任意）
+        self.execution_scheduler = execution_scheduler  # 実行枠スケジューラー（任意）
+        self.query_cancellation_service = query_cancellation_service  # サーバー側キャンセル（任意）
+        self.query_cost_gate = query_cost_gate  # 実行前コストゲート（任意。未設定時は COUNT(*) で件数確認）
+        self.chunk_size = settings.cursor_chunk_size  # 一度に取得する行数（適応制御の初期値）
         self.validator = get_validator()  # SQLバリデーター
     
-    def execute_sql_with_cache(self, sql: str, user_id: str, limit: Optional[int] = None) -> Dict[str, Any]:
-        """SQLを実行し、結果をキャッシュに保存"""
+    def execute_sql_with_cache(self, sql: str, user_id: str, limit: Optional[int] = None,
+                               scope: Optional[str] = None, bypass_cache: bool = False,
+                               lane: str = LANE_INTERACTIVE, confirmed: bool = False) -> Dict[str, Any]:
+        """SQLを実行し、結果をキャッシュに保存
+
+        scope: 可視性スコープ（ロール）。結果再利用キャッシュのキーに含める
+        bypass_cache: Trueの場合は結果再利用キャッシュを使用せず必ず実行する
+        lane: 実行レーン（interactive / bulk）。同時実行数超過時はキューで待機する
+        confirmed: コストゲートの確認要求に対してユーザーが実行を承認済みかどうか
+        """
         start_time = datetime.now()
         session_id = None  # finallyブロックで参照できるよう、tryの外で初期化
         try:
@@ -69,21 +92,42 @@ class HybridSQLService:
             if not self.cache_service.register_session(session_id, user_id):
                 raise SQLExecutionError("現在、他の処理を実行中です。しばらく待ってから再度お試しください。")
 
-            # 総件数を取得（軽量チェックのため）
-            # 複雑なクエリの場合はCOUNTもスキップして高速化
-            try:
-                total_count = self._get_total_count(sql)
-            except Exception as e:
-                logger.warning(f"総件数取得エラー、推定値を使用: {e}")
-                total_count = -1  # 不明な件数として処理継続
+            # SQLバリデーション（常に実施。禁止されたSQLは結果の再利用もせず、EXPLAIN・COUNT(*) も含めてウェアハウスへ送らない）
+            invalid = self._validation_error_response(sql, session_id)
+            if invalid:
+                return invalid
+
+            # 同一SQLの完了済み結果があれば再利用（COUNT・本実行をスキップ）
+            reused = self._reuse_cached_result(sql, session_id, scope, limit, bypass_cache)
+            if reused:
+                return reused
+
+            # 実行前コストゲート（EXPLAINの見積もり）
+            cost_decision = self._evaluate_cost(sql, session_id, confirmed)
+            if cost_decision and cost_decision.policy == POLICY_CONFIRM:
+                return self._cost_confirmation_response(cost_decision, session_id)
+            total_count = -1
+            if cost_decision:
+                total_count = self._estimated_total_count(cost_decision)
+                lane = cost_decision.lane or lane
+            # ゲートが見積もりを得られなかった場合（ゲート未設定・見積もり失敗）のみ COUNT(*) で総件数を取得する。
+            # スキャン量の見積もりがあれば判定はゲートで済んでいるため、COUNT の往復は行わない
+            counted = total_count < 0 and not self._has_scan_estimate(cost_decision)
+            if counted:
+                # 総件数を取得（軽量チェックのため）
+                try:
+                    total_count = self._get_total_count(sql)
+                except Exception as e:
+                    logger.warning(f"総件数取得エラー、推定値を使用: {e}")
+                    total_count = -1  # 不明な件数として処理継続
 
             # 大容量データの条件分岐
             # 設定値をそのまま使用
             max_records_for_display = getattr(settings, 'max_records_for_display', 1000000)
             max_records_for_csv_download = getattr(settings, 'max_records_for_csv_download', 10000000)
 
-            # 総件数が不明(-1)の場合は処理を続行
-            if total_count > 0 and total_count > max_records_for_display:
+            # 総件数が不明(-1)の場合は処理を続行（コストゲートが判定済みの場合は再判定しない）
+            if counted and total_count > 0 and total_count > max_records_for_display:
                 logger.warning(f"大容量データ検出: {total_count}件, ユーザー: {user_id}")
 
                 # CSVダウンロードも不可な場合
@@ -104,25 +148,6 @@ class HybridSQLService:
                     'message': f"大容量データです（{total_count:,}件）。条件を絞れない場合はCSVでダウンロードしてください"
                 }
 
-            # SQLバリデーション（常に実施）
-            validation_result = self.validator.validate_sql(sql)
-            if not validation_result.is_valid:
-                error_message = "; ".join(validation_result.errors)
-                
-                # バリデーションエラーの場合、セッションをクリーンアップ
-                logger.warning(f"SQLバリデーションエラー: {error_message}, セッション: {session_id}")
-                self.cache_service.cleanup_session(session_id)
-                
-                return {
-                    'success': False,
-                    'error_message': error_message,
-                    'message': error_message,  # APIエンドポイントで期待されるフィールド
-                    'session_id': None,
-                    'total_count': 0,
-                    'processed_rows': 0,
-                    'execution_time': 0
-                }
-
             # セッション情報を更新
             self.cache_service.update_session_progress(session_id, 0, False)
 
@@ -130,6 +155,11 @@ class HybridSQLService:
             if self.streaming_state_service:
                 self.streaming_state_service.create_streaming_state(session_id, total_count)
 
+            # 実行枠を待機（同時実行数超過時はキューイング）
+            if self.execution_scheduler:
+                self._enqueue_execution(session_id, user_id, lane)
+                self._wait_for_execution_slot(session_id)
+
             # データ取得・キャッシュ（カーソル方式で逐次取得に統一）
             processed_rows = self._fetch_and_cache_data(sql, session_id, limit)
 
@@ -144,7 +174,10 @@ class HybridSQLService:
 
             # ストリーミング完了
             if self.streaming_state_service:
-                self.streaming_state_service.complete_streaming(session_id, processed_rows)
+                self.streaming_state_service.complete_streaming(session_id, processed_rows, execution_time)
+
+            # 結果再利用キャッシュに登録
+            self._store_cached_result(sql, session_id, scope, limit, total_count, processed_rows, execution_time)
 
             return {
                 'success': True,
@@ -154,7 +187,9 @@ class HybridSQLService:
                 'current_count': processed_rows,  # 現在取得済みレコード数
                 'progress_percentage': round((processed_rows / total_count) * 100, 1) if total_count > 0 else 100.0,  # 進捗率
                 'execution_time': execution_time,
-                'message': f"データ取得完了: {processed_rows}件"
+                'message': f"データ取得完了: {processed_rows}件" + (
+                    f" {cost_decision.message}" if cost_decision and cost_decision.message else ""),
+                'cost_estimate': cost_decision.to_dict() if cost_decision else None
             }
 
         except Exception as e:
@@ -190,6 +225,10 @@ class HybridSQLService:
             raise SQLExecutionError(f"SQL実行に失敗しました: {str(e)}")
         
         finally:
+            # 実行枠を解放
+            if session_id and self.execution_scheduler:
+                self.execution_scheduler.release(session_id)
+
             # finally句で確実なクリーンアップ保証
             if session_id:
                 # セッションがまだアクティブな場合のみクリーンアップ
@@ -198,8 +237,14 @@ class HybridSQLService:
                     logger.warning(f"finally句: 未完了セッションを強制クリーンアップ: {session_id}")
                     self.cache_service.cleanup_session(session_id)
 
-    def prepare_sql_execution(self, sql: str, user_id: str, limit: Optional[int] = None) -> Dict[str, Any]:
-        """軽量検証を行い、即座にsession_idを返却（対策案3: 軽量非同期対応）"""
+    def prepare_sql_execution(self, sql: str, user_id: str, limit: Optional[int] = None,
+                              scope: Optional[str] = None, bypass_cache: bool = False,
+                              lane: str = LANE_INTERACTIVE, confirmed: bool = False) -> Dict[str, Any]:
+        """軽量検証を行い、即座にsession_idを返却（対策案3: 軽量非同期対応）
+
+        結果再利用キャッシュにヒットした場合は 'status': 'completed', 'cache_hit': True を返し、
+        バックグラウンド実行は不要となる。
+        """
         try:
             # セッションIDを生成
             session_id = self.cache_service.generate_session_id(user_id)
@@ -208,20 +253,41 @@ class HybridSQLService:
             if not self.cache_service.register_session(session_id, user_id):
                 raise SQLExecutionError("現在、他の処理を実行中です。しばらく待ってから再度お試しください。")
 
-            # 総件数を取得（軽量チェックのため）
-            # 複雑なクエリの場合はCOUNTもスキップして高速化
-            try:
-                total_count = self._get_total_count(sql)
-            except Exception as e:
-                logger.warning(f"総件数取得エラー、推定値を使用: {e}")
-                total_count = -1  # 不明な件数として処理継続
+            # SQLバリデーション（常に実施。禁止されたSQLは結果の再利用もせず、EXPLAIN・COUNT(*) も含めてウェアハウスへ送らない）
+            invalid = self._validation_error_response(sql, session_id)
+            if invalid:
+                return invalid
+
+            # 同一SQLの完了済み結果があれば再利用
+            reused = self._reuse_cached_result(sql, session_id, scope, limit, bypass_cache)
+            if reused:
+                return reused
+
+            # 実行前コストゲート（EXPLAINの見積もり）
+            cost_decision = self._evaluate_cost(sql, session_id, confirmed)
+            if cost_decision and cost_decision.policy == POLICY_CONFIRM:
+                return self._cost_confirmation_response(cost_decision, session_id)
+            total_count = -1
+            if cost_decision:
+                total_count = self._estimated_total_count(cost_decision)
+                lane = cost_decision.lane or lane
+            # ゲートが見積もりを得られなかった場合（ゲート未設定・見積もり失敗）のみ COUNT(*) で総件数を取得する。
+            # スキャン量の見積もりがあれば判定はゲートで済んでいるため、COUNT の往復は行わない
+            counted = total_count < 0 and not self._has_scan_estimate(cost_decision)
+            if counted:
+                # 総件数を取得（軽量チェックのため）
+                try:
+                    total_count = self._get_total_count(sql)
+                except Exception as e:
+                    logger.warning(f"総件数取得エラー、推定値を使用: {e}")
+                    total_count = -1  # 不明な件数として処理継続
 
             # 大容量データの条件分岐
             max_records_for_display = getattr(settings, 'max_records_for_display', 1000000)
             max_records_for_csv_download = getattr(settings, 'max_records_for_csv_download', 10000000)
 
-            # 総件数が不明(-1)の場合は処理を続行
-            if total_count > 0 and total_count > max_records_for_display:
+            # 総件数が不明(-1)の場合は処理を続行（コストゲートが判定済みの場合は再判定しない）
+            if counted and total_count > 0 and total_count > max_records_for_display:
                 logger.warning(f"大容量データ検出: {total_count}件, ユーザー: {user_id}")
 
                 if total_count > max_records_for_csv_download:
@@ -240,25 +306,6 @@ class HybridSQLService:
                     'message': f"大容量データです（{total_count:,}件）。条件を絞れない場合はCSVでダウンロードしてください"
                 }
 
-            # SQLバリデーション（常に実施）
-            validation_result = self.validator.validate_sql(sql)
-            if not validation_result.is_valid:
-                error_message = "; ".join(validation_result.errors)
-                
-                # バリデーションエラーの場合、セッションをクリーンアップ
-                logger.warning(f"SQLバリデーションエラー: {error_message}, セッション: {session_id}")
-                self.cache_service.cleanup_session(session_id)
-                
-                return {
-                    'success': False,
-                    'error_message': error_message,
-                    'message': error_message,
-                    'session_id': None,
-                    'total_count': 0,
-                    'processed_rows': 0,
-                    'execution_time': 0
-                }
-
             # セッション情報を更新（開始状態）
             self.cache_service.update_session_progress(session_id, 0, False)
 
@@ -266,6 +313,18 @@ class HybridSQLService:
             if self.streaming_state_service:
                 self.streaming_state_service.create_streaming_state(session_id, total_count)
 
+            # 実行待ちキューに登録（実行枠の待機はバックグラウンド側で行う）
+            queue_position = 0
+            if self.execution_scheduler:
+                queue_position = self._enqueue_execution(session_id, user_id, lane)
+
+            count_text = f"総件数: {total_count:,}件" if total_count >= 0 else "総件数: 不明"
+            message = f"処理を開始しました。{count_text}"
+            if queue_position > 0:
+                message = f"実行待ちです（{queue_position}番目）。{count_text}"
+            if cost_decision and cost_decision.message:
+                message = f"{message} {cost_decision.message}"
+
             # 即座にsession_idを返却
             return {
                 'success': True,
@@ -273,26 +332,46 @@ class HybridSQLService:
                 'total_count': total_count,
                 'processed_rows': 0,
                 'execution_time': 0,
-                'message': f"処理を開始しました。総件数: {total_count:,}件",
-                'status': 'processing'
+                'message': message,
+                'status': 'processing',
+                'queue_position': queue_position,
+                'cost_estimate': cost_decision.to_dict() if cost_decision else None
             }
 
         except Exception as e:
             logger.error(f"SQL準備エラー: {e}", exc_info=True)
-            # セッションが作成されていればクリーンアップ
+            # セッションが作成されていればクリーンアップ（実行待ちキューのチケットも残さない）
             if 'session_id' in locals():
                 self.cache_service.cleanup_session(session_id)
+                if self.execution_scheduler:
+                    self.execution_scheduler.release(session_id)
             raise SQLExecutionError(f"SQL準備に失敗しました: {str(e)}")
 
-    def execute_sql_background(self, sql: str, session_id: str, user_id: str, limit: Optional[int] = None):
+    def execute_sql_background(self, sql: str, session_id: str, user_id: str, limit: Optional[int] = None,
+                               scope: Optional[str] = None):
         """バックグラウンドでSQL実行（対策案3: 軽量非同期対応）"""
-        start_time = datetime.now()
         try:
+            # 実行枠を待機（prepare_sql_execution でキュー登録済み）
+            if self.execution_scheduler:
+                if not self.execution_scheduler.wait_for_slot(session_id):
+                    if self.streaming_state_service and self.streaming_state_service.is_cancelled(session_id):
+                        logger.info(f"実行待ち中にキャンセルされました: {session_id}")
+                        return
+                    raise SQLExecutionError("実行待ちがタイムアウトしました。しばらく待ってから再度お試しください。")
+                if self.streaming_state_service:
+                    self.streaming_state_service.update_phase(session_id, 'executing')
+
+            start_time = datetime.now()
             logger.info(f"バックグラウンドSQL実行開始: {session_id}")
 
             # データ取得・キャッシュ（カーソル方式で逐次取得に統一）
             processed_rows = self._fetch_and_cache_data(sql, session_id, limit)
 
+            # キャンセル済みの場合は完了扱いにしない
+            if self._is_cancelled(session_id):
+                logger.info(f"バックグラウンドSQL実行はキャンセルされました: {session_id}")
+                return
+
             # 実行時間を計算
             execution_time = (datetime.now() - start_time).total_seconds()
 
@@ -303,12 +382,25 @@ class HybridSQLService:
             self.cache_service.complete_active_session(session_id)
 
             # ストリーミング完了
+            total_count = processed_rows
             if self.streaming_state_service:
-                self.streaming_state_service.complete_streaming(session_id, processed_rows)
+                state = self.streaming_state_service.get_state(session_id)
+                if state and state.get('total_count', -1) >= 0:
+                    total_count = state['total_count']
+                self.streaming_state_service.complete_streaming(session_id, processed_rows, execution_time)
+
+            # 結果再利用キャッシュに登録
+            self._store_cached_result(sql, session_id, scope, limit, total_count, processed_rows, execution_time)
 
             logger.info(f"バックグラウンドSQL実行完了: {session_id}, 処理件数: {processed_rows}")
 
         except Exception as e:
+            # サーバー側キャンセルにより execute / fetch が中断された場合はエラー扱いしない
+            if self._is_cancelled(session_id):
+                logger.info(f"キャンセルによりSQL実行が中断されました: {session_id}, {e}")
+                self.cache_service.cleanup_session(session_id)
+                return
+
             logger.error(f"バックグラウンドSQL実行エラー: {e}", exc_info=True)
             
             # エラーの種類に応じた処理
@@ -336,6 +428,185 @@ class HybridSQLService:
             if self.streaming_state_service:
                 self.streaming_state_service.error_streaming(session_id, error_message)
 
+        finally:
+            # 実行枠を解放
+            if self.execution_scheduler:
+                self.execution_scheduler.release(session_id)
+
+    def cancel_execution(self, session_id: str) -> Dict[str, Any]:
+        """実行中のSQLをキャンセル（ストリーミング状態の更新とサーバー側のクエリ中断）
+
+        戻り値の server_cancelled は、ウェアハウス側で実行中だったクエリを中断できたかを示す
+        """
+        result: Dict[str, Any] = {'success': False, 'server_cancelled': False, 'cancel_method': None,
+                                  'query_id': None, 'message': None}
+        if self.streaming_state_service and not self.streaming_state_service.cancel_streaming(session_id):
+            result['message'] = "キャンセルできませんでした"
+            return result
+        result['success'] = True
+
+        if self.query_cancellation_service:
+            server_result = self.query_cancellation_service.cancel(session_id)
+            result['server_cancelled'] = server_result['cancelled']
+            result['cancel_method'] = server_result['method']
+            result['query_id'] = server_result['query_id']
+            result['message'] = server_result['message']
+
+        self.cleanup_session(session_id)
+        return result
+
+    def add_completion_hook(self, session_id: str, hook: Callable[[Dict[str, Any]], None]) -> bool:
+        """バックグラウンド実行の完了・エラー・キャンセル時に一度だけ呼ばれるフックを登録
+
+        フックは最終状態（status, processed_count, execution_time, error_message）を受け取る。
+        ストリーミング状態管理がない場合は登録できないため False を返す。
+        """
+        if not self.streaming_state_service:
+            return False
+        self.streaming_state_service.add_completion_hook(session_id, hook)
+        return True
+
+    def _is_cancelled(self, session_id: str) -> bool:
+        """セッションがキャンセル済みか"""
+        return bool(self.streaming_state_service and self.streaming_state_service.is_cancelled(session_id))
+
+    def _register_active_query(self, session_id: str, conn_id: Optional[str], sql: str, cursor) -> None:
+        """実行前のカーソルをキャンセル対象として登録（SQL本文は変更しない）
+
+        別接続からの中断に備えて、SQL本文と接続のウェアハウスセッションIDを記録する。
+        セッションIDはプール接続ごとに初回のみ問い合わせる。
+        """
+        warehouse_session = self.query_cancellation_service.warehouse_session(conn_id, cursor)
+        self.query_cancellation_service.register(session_id, cursor, self.connection_manager,
+                                                 statement=sql, warehouse_session=warehouse_session)
+
+    def _enqueue_execution(self, session_id: str, user_id: str, lane: str) -> int:
+        """実行待ちキューに登録し、待ち順位を返す"""
+        queue_position = self.execution_scheduler.enqueue(session_id, user_id, lane)
+        if queue_position > 0 and self.streaming_state_service:
+            self.streaming_state_service.update_phase(session_id, 'queued')
+        return queue_position
+
+    def _wait_for_execution_slot(self, session_id: str) -> None:
+        """実行枠が割り当てられるまで待機（タイムアウト時は例外）"""
+        if not self.execution_scheduler.wait_for_slot(session_id):
+            raise SQLExecutionError("実行待ちがタイムアウトしました。しばらく待ってから再度お試しください。")
+        if self.streaming_state_service:
+            self.streaming_state_service.update_phase(session_id, 'executing')
+
+    def _reuse_cached_result(self, sql: str, session_id: str, scope: Optional[str],
+                             limit: Optional[int], bypass_cache: bool) -> Optional[Dict[str, Any]]:
+        """結果再利用キャッシュにヒットした場合、元セッションの結果を複製して完了レスポンスを返す"""
+        if not self.result_cache_service:
+            return None
+        try:
+            fingerprint = self.result_cache_service.fingerprint(sql, scope, limit)
+            entry = self.result_cache_service.lookup(fingerprint, bypass=bypass_cache)
+            if not entry:
+                return None
+            if not self.cache_service.clone_session_data(entry['session_id'], session_id):
+                self.result_cache_service.invalidate_session(entry['session_id'])
+                return None
+        except Exception as e:
+            logger.warning(f"結果再利用キャッシュ参照エラー、通常実行に切り替えます: {e}")
+            return None
+
+        total_count = entry['total_count']
+        processed_rows = entry['processed_rows']
+        execution_time = entry['execution_time']
+
+        self.cache_service.update_session_progress(session_id, processed_rows, True, execution_time)
+        self.cache_service.complete_active_session(session_id)
+        if self.streaming_state_service:
+            self.streaming_state_service.create_streaming_state(session_id, total_count)
+            self.streaming_state_service.complete_streaming(session_id, processed_rows)
+
+        logger.info(f"結果再利用キャッシュヒット: {entry['session_id']} -> {session_id}")
+        return {
+            'success': True,
+            'session_id': session_id,
+            'total_count': total_count,
+            'processed_rows': processed_rows,
+            'current_count': processed_rows,
+            'progress_percentage': 100.0,
+            'execution_time': execution_time,
+            'message': f"データ取得完了: {processed_rows}件（キャッシュ再利用）",
+            'status': 'completed',
+            'cache_hit': True
+        }
+
+    def _store_cached_result(self, sql: str, session_id: str, scope: Optional[str], limit: Optional[int],
+                             total_count: int, processed_rows: int, execution_time: float) -> None:
+        """完了したセッションを結果再利用キャッシュに登録（キャンセル時は登録しない）"""
+        if not self.result_cache_service:
+            return
+        if self.streaming_state_service and self.streaming_state_service.is_cancelled(session_id):
+            return
+        try:
+            fingerprint = self.result_cache_service.fingerprint(sql, scope, limit)
+            self.result_cache_service.store(
+                fingerprint, session_id, self.cache_service.get_session_db_path(session_id),
+                total_count, processed_rows, execution_time
+            )
+        except Exception as e:
+            logger.warning(f"結果再利用キャッシュ登録エラー: {e}")
+
+    def _evaluate_cost(self, sql: str, session_id: str, confirmed: bool) -> Optional[CostDecision]:
+        """コストゲートで判定（ゲート未設定・無効時は None。拒否の場合はセッションを片付けて例外）"""
+        if not self.query_cost_gate or not self.query_cost_gate.enabled:
+            return None
+        decision = self.query_cost_gate.evaluate(sql, QueryExecutor(self.connection_manager), confirmed)
+        if decision.policy == POLICY_REJECT:
+            logger.warning(f"コストゲートにより実行を拒否: {session_id}, {decision.message}")
+            self.cache_service.cleanup_session(session_id)
+            raise SQLExecutionError(decision.message)
+        return decision
+
+    @staticmethod
+    def _has_scan_estimate(decision: Optional[CostDecision]) -> bool:
+        """EXPLAIN によるスキャン量（パーティション数・バイト数）の見積もりがあるか"""
+        estimate = decision.estimate if decision else None
+        return bool(estimate) and (estimate.bytes_assigned is not None or estimate.partitions_assigned is not None)
+
+    def _validation_error_response(self, sql: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """SQLバリデーションに失敗した場合はセッションを片付けてエラーレスポンスを返す（問題なければ None）"""
+        validation_result = self.validator.validate_sql(sql)
+        if validation_result.is_valid:
+            return None
+        error_message = "; ".join(validation_result.errors)
+
+        # バリデーションエラーの場合、セッションをクリーンアップ
+        logger.warning(f"SQLバリデーションエラー: {error_message}, セッション: {session_id}")
+        self.cache_service.cleanup_session(session_id)
+
+        return {
+            'success': False,
+            'error_message': error_message,
+            'message': error_message,  # APIエンドポイントで期待されるフィールド
+            'session_id': None,
+            'total_count': 0,
+            'processed_rows': 0,
+            'execution_time': 0
+        }
+
+    @staticmethod
+    def _estimated_total_count(decision: CostDecision) -> int:
+        """見積もりの推定行数（不明な場合は -1）"""
+        if decision.estimate and decision.estimate.estimated_rows is not None:
+            return decision.estimate.estimated_rows
+        return -1
+
+    def _cost_confirmation_response(self, decision: CostDecision, session_id: str) -> Dict[str, Any]:
+        """コストゲートの確認要求レスポンス（ユーザーの承認後に confirmed=True で再実行される）"""
+        logger.info(f"コストゲートの確認要求のためセッションクリーンアップ: {session_id}")
+        self.cache_service.cleanup_session(session_id)
+        return {
+            'status': 'requires_confirmation',
+            'total_count': self._estimated_total_count(decision),
+            'message': decision.message,
+            'cost_estimate': decision.to_dict()
+        }
+
     def _get_total_count(self, sql: str) -> int:
         """SQLの総件数を取得（末尾セミコロンを除去してサブクエリ化）"""
         sql_for_count = sql.rstrip(';')
@@ -415,6 +686,10 @@ class HybridSQLService:
         try:
             conn_id, connection = self.connection_manager.get_connection()
             cursor = connection.cursor()
+
+            # キャンセル対象として登録（execute 中でもサーバー側で中断できるようにする）
+            if self.query_cancellation_service:
+                self._register_active_query(session_id, conn_id, sql, cursor)
             
             # SQLを実行
             cursor.execute(sql)
@@ -429,6 +704,9 @@ class HybridSQLService:
             if self.streaming_state_service:
                 self.streaming_state_service.update_phase(session_id, 'downloading')
             
+            # 取得行数は行の幅と取得・挿入レイテンシに応じて調整する
+            sizer = self._create_chunk_sizer()
+
             # チャンク単位でデータを取得・キャッシュ
             while True:
                 # キャンセルされたかチェック
@@ -436,7 +714,12 @@ class HybridSQLService:
                     logger.info(f"処理がキャンセルされたため、データ取得を中断します: {session_id}")
                     break
 
-                chunk = cursor.fetchmany(self.chunk_size)
+                fetch_size = sizer.size
+                if limit:
+                    fetch_size = min(fetch_size, limit - processed_rows)
+                fetch_started = time.perf_counter()
+                chunk = cursor.fetchmany(fetch_size)
+                fetch_seconds = time.perf_counter() - fetch_started
                 if not chunk:
                     break
                 
@@ -446,11 +729,16 @@ class HybridSQLService:
                     raise SQLExecutionError(f"データ型エラー: {error_msg}")
                 
                 # キャッシュに挿入（バッチCOMMIT対応）
+                insert_started = time.perf_counter()
                 inserted_count = self.cache_service.insert_chunk(table_name, chunk, session_id)
+                insert_seconds = time.perf_counter() - insert_started
                 processed_rows += inserted_count
+                sizer.observe(chunk, fetch_seconds, insert_seconds)
                 
-                # 進捗を更新
-                self.cache_service.update_session_progress(session_id, processed_rows, False)
+                # 進捗を更新（選択したチャンクサイズを診断情報として記録）
+                self.cache_service.update_session_progress(
+                    session_id, processed_rows, False, fetch_diagnostics=sizer.get_diagnostics()
+                )
                 
                 # ストリーミング状態を更新
                 if self.streaming_state_service:
@@ -471,6 +759,9 @@ class HybridSQLService:
                 logger.info(f"部分キャッシュを保持: {processed_rows}件")
             raise DatabaseError(f"データ取得に失敗しました: {str(e)}")
         finally:
+            if self.query_cancellation_service:
+                self.query_cancellation_service.unregister(session_id)
+
             # バッチセッションの最終COMMIT
             if session_id:
                 self.cache_service.finalize_batch_session(session_id)
@@ -480,6 +771,17 @@ class HybridSQLService:
                 self.connection_manager.release_connection(conn_id)
                 logger.info(f"ODBC接続を解放しました: {conn_id}")
     
+    def _create_chunk_sizer(self) -> AdaptiveChunkSizer:
+        """fetchmany の行数コントローラーを生成（初期値は self.chunk_size）"""
+        return AdaptiveChunkSizer(
+            initial_size=self.chunk_size,
+            min_size=settings.cursor_chunk_min_size,
+            max_size=settings.cursor_chunk_max_size,
+            target_chunk_bytes=settings.cursor_chunk_target_bytes,
+            target_chunk_seconds=settings.cursor_chunk_target_seconds,
+            enabled=settings.cursor_chunk_adaptive,
+        )
+
     def get_cached_data(self, session_id: str, page: int = 1, page_size: int = None,
                         filters: Optional[Dict] = None, extended_filters: Optional[List] = None, 
                         sort_by: Optional[str] = None, sort_order: str = 'ASC') -> Dict[str, Any]:
@@ -549,6 +851,10 @@ class HybridSQLService:
         """セッションをクリーンアップ"""
         try:
             self.cache_service.cleanup_session(session_id)
+            if self.result_cache_service:
+                self.result_cache_service.invalidate_session(session_id)
+            if self.execution_scheduler:
+                self.execution_scheduler.release(session_id)
             logger.info(f"セッションクリーンアップ完了: {session_id}")
             if self.session_service:
                 try:
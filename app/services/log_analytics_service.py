@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行ログの分析サービス
+ログの書き込み時にユーザー別・時間/日別・SQLフィンガープリント別のロールアップを差分で更新し、
+分析APIはロールアップだけを参照する（生ログは走査しない）
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.logger import get_logger
+from app.metadata_cache import MetadataCache
+from app.services.log_handlers.base import SQLLogRecord
+from app.services.sql_context_analyzer import tokenize
+from app.utils import calculate_hash
+
+GRAIN_HOUR = "hour"
+GRAIN_DAY = "day"
+GRAINS = (GRAIN_HOUR, GRAIN_DAY)
+
+# 全ユーザー合計のロールアップに使う user_id
+GLOBAL_USER = ""
+
+# 実行時間ヒストグラムの区間の上限（秒）。最後の区間は上限なし
+LATENCY_BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# フィンガープリント別ロールアップに保存する代表SQLの最大長
+MAX_SAMPLE_SQL_LENGTH = 2000
+
+_LITERAL_LIST_PATTERN = re.compile(r"\?(?: , \?)+")
+
+
+def sql_fingerprint(sql: str) -> Tuple[str, str]:
+    """リテラルを ? に置き換えて正規化したSQLと、そのハッシュを返す（IN リストは件数によらず1つの ? にまとめる）"""
+    parts = []
+    for token in tokenize(sql or ""):
+        if token.kind == "comment":
+            continue
+        if token.kind in ("string", "number"):
+            parts.append("?")
+        elif token.kind == "quoted":
+            parts.append(f'"{token.value}"')
+        else:
+            parts.append(token.value)
+    normalized = _LITERAL_LIST_PATTERN.sub("?", " ".join(parts)).rstrip(" ;")
+    return calculate_hash(normalized), normalized
+
+
+def bucket_key(moment: datetime, grain: str) -> str:
+    """ロールアップの集計単位のキー（時間: 2025-01-17T09:00、日: 2025-01-17）"""
+    return moment.strftime("%Y-%m-%dT%H:00" if grain == GRAIN_HOUR else "%Y-%m-%d")
+
+
+def latency_bin(seconds: float) -> int:
+    """実行時間が属するヒストグラムの区間番号"""
+    return bisect_left(LATENCY_BOUNDS, seconds)
+
+
+def percentile_from_histogram(bins: Dict[int, int], quantile: float, max_time: float) -> Optional[float]:
+    """ヒストグラムからパーセンタイルを求める（該当区間の上限値。最大実行時間を超える場合は最大値）"""
+    total = sum(bins.values())
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    for index in sorted(bins):
+        seen += bins[index]
+        if seen >= rank:
+            upper = LATENCY_BOUNDS[index] if index < len(LATENCY_BOUNDS) else max_time
+            return min(upper, max_time)
+    return max_time
+
+
+class _Totals:
+    """ロールアップ1行分の差分"""
+
+    __slots__ = ("query_count", "error_count", "row_count", "total_time", "max_time")
+
+    def __init__(self):
+        self.query_count = 0
+        self.error_count = 0
+        self.row_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, record: SQLLogRecord):
+        self.query_count += 1
+        self.error_count += 0 if record.success else 1
+        self.row_count += max(record.row_count or 0, 0)
+        self.total_time += record.execution_time
+        self.max_time = max(self.max_time, record.execution_time)
+
+    def values(self) -> Tuple[int, int, int, float, float]:
+        return self.query_count, self.error_count, self.row_count, self.total_time, self.max_time
+
+
+class LogAnalyticsService:
+    """SQL実行ログのロールアップ（増分集計）と分析クエリ
+
+    ロールアップは metadata_cache.db に保存する。
+    - log_rollups: 時間/日 × ユーザー（全体は user_id=''）ごとの件数・エラー件数・取得行数・実行時間
+    - log_rollup_latency: 同じ単位の実行時間ヒストグラム（p50/p95 の算出用）
+    - log_rollup_fingerprints: 日 × ユーザー × SQLフィンガープリントごとの件数・実行時間
+    時間単位のロールアップは hourly_retention_days を過ぎたら削除する（日単位は保持し続ける）。
+    """
+
+    # 時間単位ロールアップの期限切れ削除を行う間隔（秒）
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, metadata_cache: MetadataCache, hourly_retention_days: Optional[int] = None,
+                 top_n: Optional[int] = None):
+        if hourly_retention_days is None or top_n is None:
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            hourly_retention_days = settings.log_analytics_hourly_retention_days if hourly_retention_days is None else hourly_retention_days
+            top_n = settings.log_analytics_top_n if top_n is None else top_n
+        self.metadata_cache = metadata_cache
+        self.hourly_retention_days = hourly_retention_days
+        self.top_n = top_n
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._pruned_at = datetime.min
+        self._init_tables()
+
+    def _get_conn(self):
+        """MetadataCacheのDB接続を再利用"""
+        return self.metadata_cache._get_conn()
+
+    def _init_tables(self):
+        """ロールアップテーブルを作成"""
+        with self._get_conn() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS log_rollups (
+                grain TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                query_count INTEGER NOT NULL,
+                error_count INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                total_time REAL NOT NULL,
+                max_time REAL NOT NULL,
+                PRIMARY KEY (grain, user_id, bucket)
+            )
+            """)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS log_rollup_latency (
+                grain TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (grain, user_id, bucket, bin)
+            )
+            """)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS log_rollup_fingerprints (
+                bucket TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                sample_sql TEXT NOT NULL,
+                query_count INTEGER NOT NULL,
+                error_count INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                total_time REAL NOT NULL,
+                max_time REAL NOT NULL,
+                PRIMARY KEY (user_id, bucket, fingerprint)
+            )
+            """)
+            # 全ユーザーのランキング（期間内の user_id 別集計）用
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_log_rollups_bucket ON log_rollups (grain, bucket)")
+            conn.commit()
+
+    def record_logs(self, records: Iterable[SQLLogRecord]) -> int:
+        """書き込まれたSQL実行ログをロールアップに加える（1トランザクション）。戻り値は反映したログ件数"""
+        rollups: Dict[Tuple[str, str, str], _Totals] = defaultdict(_Totals)
+        latency: Dict[Tuple[str, str, str, int], int] = defaultdict(int)
+        fingerprints: Dict[Tuple[str, str, str], _Totals] = defaultdict(_Totals)
+        samples: Dict[str, str] = {}
+        processed = 0
+        for record in records:
+            processed += 1
+            owners = {record.user_id or GLOBAL_USER, GLOBAL_USER}
+            time_bin = latency_bin(record.execution_time)
+            fingerprint, normalized = sql_fingerprint(record.sql)
+            samples.setdefault(fingerprint, normalized[:MAX_SAMPLE_SQL_LENGTH])
+            day = bucket_key(record.end_time, GRAIN_DAY)
+            for owner in owners:
+                for grain in GRAINS:
+                    bucket = bucket_key(record.end_time, grain)
+                    rollups[(grain, bucket, owner)].add(record)
+                    latency[(grain, bucket, owner, time_bin)] += 1
+                fingerprints[(day, owner, fingerprint)].add(record)
+        if not processed:
+            return 0
+
+        with self._lock, self._get_conn() as conn:
+            conn.executemany("""
+            INSERT INTO log_rollups (grain, bucket, user_id, query_count, error_count, row_count, total_time, max_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (grain, user_id, bucket) DO UPDATE SET
+                query_count = query_count + excluded.query_count,
+                error_count = error_count + excluded.error_count,
+                row_count = row_count + excluded.row_count,
+                total_time = total_time + excluded.total_time,
+                max_time = max(max_time, excluded.max_time)
+            """, [(*key, *totals.values()) for key, totals in rollups.items()])
+            conn.executemany("""
+            INSERT INTO log_rollup_latency (grain, bucket, user_id, bin, count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (grain, user_id, bucket, bin) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in latency.items()])
+            conn.executemany("""
+            INSERT INTO log_rollup_fingerprints (
+                bucket, user_id, fingerprint, sample_sql, query_count, error_count, row_count, total_time, max_time
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, bucket, fingerprint) DO UPDATE SET
+                query_count = query_count + excluded.query_count,
+                error_count = error_count + excluded.error_count,
+                row_count = row_count + excluded.row_count,
+                total_time = total_time + excluded.total_time,
+                max_time = max(max_time, excluded.max_time)
+            """, [(day, owner, fingerprint, samples[fingerprint], *totals.values())
+                  for (day, owner, fingerprint), totals in fingerprints.items()])
+            self._prune_hourly(conn)
+            conn.commit()
+        return processed
+
+    def _prune_hourly(self, conn):
+        """保持期間を過ぎた時間単位のロールアップを削除（PRUNE_INTERVAL ごと）"""
+        now = datetime.now()
+        if (now - self._pruned_at).total_seconds() < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        cutoff = bucket_key(now - timedelta(days=self.hourly_retention_days), GRAIN_HOUR)
+        conn.execute("DELETE FROM log_rollups WHERE grain = ? AND bucket < ?", (GRAIN_HOUR, cutoff))
+        conn.execute("DELETE FROM log_rollup_latency WHERE grain = ? AND bucket < ?", (GRAIN_HOUR, cutoff))
+
+    def get_analytics(self, start: date, end: date, grain: str = GRAIN_DAY, user_id: Optional[str] = None,
+                      include_users: bool = False) -> Dict[str, Any]:
+        """start〜end（両端を含む日付）の分析結果をロールアップから集計する
+
+        user_id を指定するとそのユーザーだけ、省略すると全体を対象にする。
+        include_users=True の場合は件数の多いユーザーの一覧も返す（管理者向け）。
+        """
+        if grain not in GRAINS:
+            raise ValueError(f"サポートされていない集計単位です: {grain}")
+        owner = user_id or GLOBAL_USER
+        first = bucket_key(datetime.combine(start, datetime.min.time()), grain)
+        last = bucket_key(datetime.combine(end + timedelta(days=1), datetime.min.time()), grain)
+        day_first, day_last = start.isoformat(), (end + timedelta(days=1)).isoformat()
+
+        with self._get_conn() as conn:
+            rows = conn.execute("""
+            SELECT bucket, query_count, error_count, row_count, total_time, max_time FROM log_rollups
+            WHERE grain = ? AND user_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket
+            """, (grain, owner, first, last)).fetchall()
+            latency_rows = conn.execute("""
+            SELECT bucket, bin, count FROM log_rollup_latency
+            WHERE grain = ? AND user_id = ? AND bucket >= ? AND bucket < ?
+            """, (grain, owner, first, last)).fetchall()
+            query_rows = conn.execute("""
+            SELECT fingerprint, MAX(sample_sql), SUM(query_count), SUM(error_count), SUM(row_count),
+                   SUM(total_time), MAX(max_time)
+            FROM log_rollup_fingerprints
+            WHERE user_id = ? AND bucket >= ? AND bucket < ?
+            GROUP BY fingerprint ORDER BY SUM(total_time) DESC LIMIT ?
+            """, (owner, day_first, day_last, self.top_n)).fetchall()
+            users = self._top_users(conn, day_first, day_last) if include_users and not user_id else None
+
+        histograms: Dict[str, Dict[int, int]] = defaultdict(dict)
+        overall: Dict[int, int] = defaultdict(int)
+        for bucket, time_bin, count in latency_rows:
+            histograms[bucket][time_bin] = count
+            overall[time_bin] += count
+
+        series = [self._metrics(row[1:], histograms.get(row[0], {}), bucket=row[0]) for row in rows]
+        summary = [sum(row[i] for row in rows) for i in range(1, 5)] + [max((row[5] for row in rows), default=0.0)]
+        top_queries = [self._metrics(row[2:], None, fingerprint=row[0], sample_sql=row[1]) for row in query_rows]
+
+        result = {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "grain": grain,
+            "user_id": user_id,
+            **self._metrics(summary, overall),
+            "series": series,
+            "top_queries": top_queries,
+        }
+        if users is not None:
+            result["users"] = users
+        return result
+
+    def _top_users(self, conn, day_first: str, day_last: str) -> List[Dict[str, Any]]:
+        """期間内の実行件数が多いユーザー（日単位ロールアップから集計）"""
+        rows = conn.execute("""
+        SELECT user_id, SUM(query_count), SUM(error_count), SUM(row_count), SUM(total_time), MAX(max_time)
+        FROM log_rollups
+        WHERE grain = ? AND bucket >= ? AND bucket < ? AND user_id != ?
+        GROUP BY user_id ORDER BY SUM(query_count) DESC LIMIT ?
+        """, (GRAIN_DAY, day_first, day_last, GLOBAL_USER, self.top_n)).fetchall()
+        if not rows:
+            return []
+        histograms: Dict[str, Dict[int, int]] = defaultdict(dict)
+        placeholders = ", ".join("?" * len(rows))
+        for owner, time_bin, count in conn.execute(f"""
+        SELECT user_id, bin, SUM(count) FROM log_rollup_latency
+        WHERE grain = ? AND bucket >= ? AND bucket < ? AND user_id IN ({placeholders})
+        GROUP BY user_id, bin
+        """, (GRAIN_DAY, day_first, day_last, *(row[0] for row in rows))).fetchall():
+            histograms[owner][time_bin] = count
+        return [self._metrics(row[1:], histograms.get(row[0], {}), user_id=row[0]) for row in rows]
+
+    @staticmethod
+    def _metrics(values, histogram: Optional[Dict[int, int]], **extra) -> Dict[str, Any]:
+        """(件数, エラー件数, 取得行数, 合計実行時間, 最大実行時間) から応答用の指標を作る"""
+        query_count, error_count, row_count, total_time, max_time = values
+        metrics = {
+            **extra,
+            "total_queries": query_count,
+            "error_count": error_count,
+            "success_rate": round((query_count - error_count) / query_count, 4) if query_count else None,
+            "total_rows": row_count,
+            "avg_execution_time": round(total_time / query_count, 3) if query_count else None,
+            "max_execution_time": max_time,
+        }
+        if histogram is not None:
+            metrics["p50_execution_time"] = percentile_from_histogram(histogram, 0.5, max_time)
+            metrics["p95_execution_time"] = percentile_from_histogram(histogram, 0.95, max_time)
+        return metrics
@@ -1,12 +1,13 @@
 # app/services/log_handlers/__init__.py
 
-from .base import BaseLogHandler
+from .base import BaseLogHandler, SQLLogRecord
 from .oracle import OracleLogHandler
 from .sqlite import SqliteLogHandler
 from .snowflake import SnowflakeLogHandler
 
 __all__ = [
     'BaseLogHandler',
+    'SQLLogRecord',
     'OracleLogHandler', 
     'SqliteLogHandler',
     'SnowflakeLogHandler'
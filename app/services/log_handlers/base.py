@@ -1,16 +1,113 @@
+import re
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+from app import __version__
+
+
+@dataclass
+class SQLLogRecord:
+    """書き込み待ちのSQL実行ログ（終了日時は実行完了時点で確定させる）"""
+    user_id: str
+    sql: str
+    execution_time: float
+    start_time: datetime
+    row_count: int = 0
+    success: bool = True
+    error_message: Optional[str] = None
+    end_time: datetime = field(default_factory=datetime.now)
+
+
+# TOOL_LOG.MK_DATE の書式（文字列比較で日付範囲を絞り込める）
+LOG_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+
+# keyset の同日時内の並び順に使う一意キー（SQLite の rowid、Oracle の ROWID、Snowflake の行ハッシュ）
+_ROW_KEY_PATTERN = re.compile(r"-?[A-Za-z0-9+/]+")
+
+
+def encode_history_cursor(mk_date: str, row_key: Any) -> str:
+    """ページ位置（最後に返したログの MK_DATE と、同日時内の一意キー）を cursor 文字列にする"""
+    return f"{mk_date}.{row_key}"
+
+
+def decode_history_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """cursor 文字列を (MK_DATE, 同日時内の一意キー) に戻す（不正な値は先頭から扱う）"""
+    if not cursor:
+        return None
+    mk_date, _, row_key = cursor.partition('.')
+    if len(mk_date) != 14 or not mk_date.isdigit() or not _ROW_KEY_PATTERN.fullmatch(row_key):
+        return None
+    return mk_date, row_key
+
+
+def decode_logs_after_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """差分取得の cursor を (MK_DATE, 同日時内の一意キー) に戻す
+
+    以前の形式（ISO 形式の実行日時のみ）の cursor は (MK_DATE, None) とし、その日時より後から読む。
+    不正な値は (None, None)（先頭から読む）。
+    """
+    if not cursor:
+        return None, None
+    position = decode_history_cursor(cursor)
+    if position:
+        return position
+    try:
+        return datetime.fromisoformat(cursor).strftime(LOG_DATE_FORMAT), None
+    except ValueError:
+        return None, None
+
+
+def version_number() -> int:
+    """ログに記録するツールバージョン（1.4.0 → 140）"""
+    major, minor, patch = (int(part) for part in __version__.split('.')[:3])
+    return major * 100 + minor * 10 + patch
+
 
 class BaseLogHandler(ABC):
     """ログハンドラのベースクラス"""
-    
+
+    # 1つのINSERT文にまとめる最大件数（バインド変数の上限に収めるため）
+    max_rows_per_statement = 100
+
     @abstractmethod
     def add_log(self, user_id: str, sql: str, execution_time: float, start_time: datetime, row_count: int, success: bool, error_message: Optional[str] = None):
         """SQL実行ログを追加する"""
         pass
-    
+
+    def write_logs(self, records: List[SQLLogRecord]) -> None:
+        """SQL実行ログをまとめて書き込む（失敗時は例外を送出し、呼び出し側で再試行する）"""
+        for record in records:
+            self.add_log(record.user_id, record.sql, record.execution_time, record.start_time,
+                         record.row_count, record.success, record.error_message)
+
     @abstractmethod
     def get_logs(self, user_id: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
         """SQL実行ログを取得する"""
-        pass 
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def get_history(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    until: Optional[datetime] = None) -> Dict[str, Any]:
+        """新しい順のSQL実行履歴を keyset 方式で取得する
+
+        since 以降（until を指定した場合は until より前）のログだけを対象にし、
+        cursor（前ページの next_cursor）より古いログを最大 limit 件返す。
+        戻り値は {"logs": [...], "next_cursor": str | None}（次ページがなければ None）。
+        """
+        pass
+
+    @abstractmethod
+    def get_logs_after(self, cursor: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """cursor より後に追加されたログを古い順に最大 limit 件取得する（利用状況の差分集計用）
+
+        各ログの "cursor" を次回の cursor に渡すと、その続きから取得できる。
+        """
+        pass
+
+    def _chunks(self, records: List[SQLLogRecord]):
+        for start in range(0, len(records), self.max_rows_per_statement):
+            yield records[start:start + self.max_rows_per_statement]
@@ -1,7 +1,10 @@
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any
-from app.services.log_handlers.base import BaseLogHandler
+from typing import Optional, Dict, Any, List
+from app.services.log_handlers.base import (
+    BaseLogHandler, SQLLogRecord, LOG_DATE_FORMAT, decode_history_cursor, decode_logs_after_cursor, encode_history_cursor
+)
+from app.exceptions import DatabaseError
 from app.services.query_executor import QueryExecutor
 from app.logger import get_logger
 from app import __version__
@@ -16,34 +19,36 @@ class OracleLogHandler(BaseLogHandler):
     def add_log(self, user_id: str, sql: str, execution_time: float, start_time: datetime, row_count: int, success: bool, error_message: Optional[str] = None):
         """OracleにSQL実行ログを追加する"""
         try:
-            end_time = datetime.now()
-            mk_date = end_time.strftime('%Y%m%d%H%M%S')
-            from_date = start_time.strftime('%Y%m%d%H%M%S')
-            
-            # SQLが長すぎる場合は切り詰める
-            truncated_sql = sql[:3900] if len(sql) > 3900 else sql
-            
-            # バージョン番号の計算
-            version_parts = __version__.split('.')
-            version_number = int(version_parts[0]) + int(version_parts[1]) * 0.1 + int(version_parts[2]) *0.01
-
-            log_sql = """
-            INSERT INTO HF3J8M01 (
-                MK_DATE, OPE_CODE, TOOL_NAME, OPTION_NO, 
-                SYSTEM_WORK_TIME, FROM_DATE, TO_DATE, TOOL_VER, CONN_SERVER
-            ) VALUES (
-                ?, ?, 'SQLDOJOWEB', ?,
-                ?, ?, ?, ?, '98'
-            )
-            """
-            params = (mk_date, user_id, truncated_sql, int(execution_time), from_date, mk_date, version_number)
-
-            result = self.query_executor.execute_query(log_sql, params)
-            if not result.success:
-                self.logger.error(f"Oracleへのログ記録に失敗しました: {result.error_message}")
+            self.write_logs([SQLLogRecord(user_id, sql, execution_time, start_time, row_count, success, error_message)])
         except Exception as e:
             self.logger.error(f"Oracleへのログ記録中に予期せぬエラーが発生しました: {e}", exc_info=True)
 
+    def write_logs(self, records: List[SQLLogRecord]) -> None:
+        """OracleにSQL実行ログをまとめて追加する（INSERT ALL で複数行を1文に）"""
+        # バージョン番号の計算
+        version_parts = __version__.split('.')
+        version_number = int(version_parts[0]) + int(version_parts[1]) * 0.1 + int(version_parts[2]) *0.01
+
+        for chunk in self._chunks(records):
+            into_clauses = []
+            params = []
+            for record in chunk:
+                mk_date = record.end_time.strftime('%Y%m%d%H%M%S')
+                # SQLが長すぎる場合は切り詰める
+                truncated_sql = record.sql[:3900] if len(record.sql) > 3900 else record.sql
+                into_clauses.append("""
+                INTO HF3J8M01 (
+                    MK_DATE, OPE_CODE, TOOL_NAME, OPTION_NO,
+                    SYSTEM_WORK_TIME, FROM_DATE, TO_DATE, TOOL_VER, CONN_SERVER
+                ) VALUES (?, ?, 'SQLDOJOWEB', ?, ?, ?, ?, ?, '98')""")
+                params.extend([mk_date, record.user_id, truncated_sql, int(record.execution_time),
+                               record.start_time.strftime('%Y%m%d%H%M%S'), mk_date, version_number])
+            log_sql = "INSERT ALL" + "".join(into_clauses) + "\n            SELECT 1 FROM DUAL"
+
+            result = self.query_executor.execute_query(log_sql, tuple(params))
+            if not result.success:
+                raise DatabaseError(f"Oracleへのログ記録に失敗しました: {result.error_message}")
+
     def get_logs(self, user_id: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
         """OracleからSQL実行ログを取得する"""
         try:
@@ -71,19 +76,85 @@ class OracleLogHandler(BaseLogHandler):
                 return {"logs": [], "total_count": 0}
 
             # 修正点: こちらのキーもすべて小文字に修正
-            logs_data = [{
-                "log_id": str(uuid.uuid4()),
-                "user_id": row.get("ope_code"),
-                "sql": row.get("option_no"),
-                "execution_time": row.get("system_work_time"),
-                "connserver": "98",  # デフォルト値として固定で設定
-                "row_count": None,  # テーブルに存在しないためNone
-                "success": True,     # テーブルに存在しないためデフォルト値
-                "error_message": None,  # テーブルに存在しないためNone
-                "timestamp": datetime.strptime(row.get("mk_date"), '%Y%m%d%H%M%S').isoformat()
-            } for row in logs_result.data]
+            logs_data = [self._row_to_log(row) for row in logs_result.data]
 
             return {"logs": logs_data, "total_count": total_count}
         except Exception as e:
             self.logger.error(f"Oracleからのログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
-            return {"logs": [], "total_count": 0} 
+            return {"logs": [], "total_count": 0}
+
+    def get_history(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    until: Optional[datetime] = None) -> Dict[str, Any]:
+        """OracleからSQL実行履歴を新しい順に取得する（(MK_DATE, ROWID) の keyset 方式）
+
+        日付範囲とユーザーはSQLで絞り込み、同じ日時のログは ROWID で一意に並べるため読み飛ばしが要らない。
+        HF3J8M01 に (TOOL_NAME, OPE_CODE, MK_DATE) のインデックスがあれば取得位置に関係なく一定時間で返る。
+        """
+        data_sql = ("SELECT MK_DATE, ROWIDTOCHAR(ROWID) AS ROW_ID, OPE_CODE, OPTION_NO, SYSTEM_WORK_TIME "
+                    "FROM HF3J8M01 WHERE TOOL_NAME = 'SQLDOJOWEB'")
+        params: List[Any] = []
+        if user_id:
+            data_sql += " AND OPE_CODE = ?"
+            params.append(user_id)
+        if since:
+            data_sql += " AND MK_DATE >= ?"
+            params.append(since.strftime(LOG_DATE_FORMAT))
+        if until:
+            data_sql += " AND MK_DATE < ?"
+            params.append(until.strftime(LOG_DATE_FORMAT))
+        position = decode_history_cursor(cursor)
+        # ROWID は18文字（それ以外の値は CHARTOROWID でエラーになるため先頭から扱う）
+        if position and len(position[1]) == 18:
+            data_sql += " AND (MK_DATE < ? OR (MK_DATE = ? AND ROWID < CHARTOROWID(?)))"
+            params.extend([position[0], position[0], position[1]])
+        data_sql += " ORDER BY MK_DATE DESC, ROWID DESC FETCH FIRST ? ROWS ONLY"
+        params.append(limit + 1)
+
+        result = self.query_executor.execute_query(data_sql, tuple(params))
+        if not result.success:
+            raise DatabaseError(f"Oracleからの履歴取得に失敗しました: {result.error_message}")
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].get("mk_date"), rows[-1].get("row_id")) if has_more else None
+        return {"logs": [self._row_to_log(row) for row in rows], "next_cursor": next_cursor}
+
+    def get_logs_after(self, cursor: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """cursor より後に追加されたログを古い順に取得する（(MK_DATE, ROWID) の keyset 方式）
+
+        同じ日時のログも ROWID で一意に並ぶため、ページの境目で取りこぼしや重複が起きない。
+        """
+        data_sql = ("SELECT MK_DATE, ROWIDTOCHAR(ROWID) AS ROW_ID, OPE_CODE, OPTION_NO, SYSTEM_WORK_TIME "
+                    "FROM HF3J8M01 WHERE TOOL_NAME = 'SQLDOJOWEB'")
+        params: List[Any] = []
+        mk_date, row_id = decode_logs_after_cursor(cursor)
+        if mk_date and row_id and len(row_id) == 18:
+            data_sql += " AND (MK_DATE > ? OR (MK_DATE = ? AND ROWID > CHARTOROWID(?)))"
+            params.extend([mk_date, mk_date, row_id])
+        elif mk_date:
+            data_sql += " AND MK_DATE > ?"
+            params.append(mk_date)
+        data_sql += " ORDER BY MK_DATE, ROWID FETCH FIRST ? ROWS ONLY"
+        params.append(limit)
+
+        result = self.query_executor.execute_query(data_sql, tuple(params))
+        if not result.success:
+            raise DatabaseError(f"Oracleからの差分ログ取得に失敗しました: {result.error_message}")
+        return [
+            {**self._row_to_log(row), "cursor": encode_history_cursor(row.get("mk_date"), row.get("row_id"))}
+            for row in result.data or []
+        ]
+
+    def _row_to_log(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "log_id": str(uuid.uuid4()),
+            "user_id": row.get("ope_code"),
+            "sql": row.get("option_no"),
+            "execution_time": row.get("system_work_time"),
+            "connserver": "98",  # デフォルト値として固定で設定
+            "row_count": None,  # テーブルに存在しないためNone
+            "success": True,     # テーブルに存在しないためデフォルト値
+            "error_message": None,  # テーブルに存在しないためNone
+            "timestamp": datetime.strptime(row.get("mk_date"), LOG_DATE_FORMAT).isoformat()
+        }
@@ -1,13 +1,20 @@
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any
-from app.services.log_handlers.base import BaseLogHandler
+from typing import Optional, Dict, Any, List, Tuple
+from app.services.log_handlers.base import (
+    BaseLogHandler, SQLLogRecord, LOG_DATE_FORMAT, decode_history_cursor, decode_logs_after_cursor,
+    encode_history_cursor, version_number
+)
+from app.exceptions import DatabaseError
 from app.services.query_executor import QueryExecutor
 from app.logger import get_logger
-from app import __version__
 
 class SnowflakeLogHandler(BaseLogHandler):
     """Snowflakeデータベース用ログハンドラ"""
+
+    # 同じ MK_DATE のログを並べる一意キー（TOOL_LOG には一意な列がないため、残りの列のハッシュを使う）
+    _ROW_HASH = "HASH(OPE_CODE, OPTION_NO, FROM_DATE, TO_DATE, SYSTEM_WORKNUMBER, CONNSERVER)"
+    _SELECT_COLUMNS = "MK_DATE, OPE_CODE, OPTION_NO, SYSTEM_WORKNUMBER, CONNSERVER"
     
     def __init__(self, query_executor: QueryExecutor):
         self.query_executor = query_executor
@@ -20,53 +27,47 @@ class SnowflakeLogHandler(BaseLogHandler):
         """SnowflakeにSQL実行ログを追加する"""
         try:
             self.logger.info(f"Snowflakeログ記録を開始: user_id={user_id}, success={success}")
-            
-            end_time = datetime.now()
-            mk_date = end_time.strftime('%Y%m%d%H%M%S')
-            from_date = start_time.strftime('%Y%m%d%H%M%S')
-            
-            truncated_sql = sql[:3900] if len(sql) > 3900 else sql
-            self.logger.debug(f"SQL長: {len(sql)} -> {len(truncated_sql)}")
-            
-            version_parts = __version__.split('.')
-            version_number = int(version_parts[0]) * 100 + int(version_parts[1]) * 10 + int(version_parts[2])
+            self.write_logs([SQLLogRecord(user_id, sql, execution_time, start_time, row_count, success, error_message)])
+            self.logger.info("Snowflakeへのログ記録が成功しました")
+        except Exception as e:
+            self.logger.error(f"Snowflakeへのログ記録中に予期せぬエラーが発生しました: {e}", exc_info=True)
 
+    def write_logs(self, records: List[SQLLogRecord]) -> None:
+        """SnowflakeにSQL実行ログをまとめて追加する（複数行の VALUES を1文で、値はバインド変数で渡す）"""
+        tool_ver = version_number()
+        for chunk in self._chunks(records):
+            params = []
+            for record in chunk:
+                mk_date = record.end_time.strftime('%Y%m%d%H%M%S')
+                truncated_sql = record.sql[:3900] if len(record.sql) > 3900 else record.sql
+                params.extend([mk_date, record.user_id, truncated_sql, int(record.execution_time),
+                               record.start_time.strftime('%Y%m%d%H%M%S'), mk_date, tool_ver])
+            values = ",\n                ".join(["(?, ?, 'SQLDOJOWEB', ?, ?, ?, ?, ?, '98')"] * len(chunk))
             log_sql = f"""
             INSERT INTO Log.TOOL_LOG (
                 MK_DATE, OPE_CODE, TOOL_NAME, OPTION_NO, 
                 SYSTEM_WORKNUMBER, FROM_DATE, TO_DATE, TOOL_VER, CONNSERVER
-            ) VALUES (
-                '{mk_date}', '{user_id}', 'SQLDOJOWEB', '{truncated_sql}',
-                {int(execution_time)}, '{from_date}', '{mk_date}', {version_number}, '98'
-            )
+            ) VALUES
+                {values}
             """
-            params = None
-            
-            self.logger.debug(f"実行SQL: {log_sql}")
-            self.logger.debug(f"パラメータ: {params}")
+            self.logger.debug(f"Snowflakeログ一括記録: {len(chunk)}件")
 
-            self.logger.info("Snowflakeクエリ実行を開始します")
             # 直接ConnectionManagerSnowflakeLogを使用
-            result = self.connection_manager.execute_query(log_sql, params)
-            self.logger.info(f"クエリ実行結果: success={result['success']}")
-            
+            result = self.connection_manager.execute_query(log_sql, tuple(params))
             if not result['success']:
-                self.logger.error(f"Snowflakeへのログ記録に失敗しました: {result['error_message']}")
-                self.logger.error(f"失敗の詳細: {result}")
-            else:
-                self.logger.info("Snowflakeへのログ記録が成功しました")
-        except Exception as e:
-            self.logger.error(f"Snowflakeへのログ記録中に予期せぬエラーが発生しました: {e}", exc_info=True)
+                raise DatabaseError(f"Snowflakeへのログ記録に失敗しました: {result['error_message']}")
 
     def get_logs(self, user_id: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
         """SnowflakeからSQL実行ログを取得する"""
         try:
             base_sql = "FROM Log.TOOL_LOG WHERE TOOL_NAME = 'SQLDOJOWEB'"
+            params = []
             if user_id:
-                base_sql += f" AND OPE_CODE = '{user_id}'"
+                base_sql += " AND OPE_CODE = ?"
+                params.append(user_id)
 
             count_sql = f"SELECT COUNT(*) as TOTAL_COUNT {base_sql}"
-            count_result = self.connection_manager.execute_query(count_sql, None)
+            count_result = self.connection_manager.execute_query(count_sql, tuple(params) or None)
             total_count = count_result['data'][0]['TOTAL_COUNT'] if count_result['success'] and count_result['data'] else 0
 
             data_sql = f"""
@@ -74,24 +75,107 @@ class SnowflakeLogHandler(BaseLogHandler):
             {base_sql} ORDER BY MK_DATE DESC OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY
             """
             
-            logs_result = self.connection_manager.execute_query(data_sql, None)
+            logs_result = self.connection_manager.execute_query(data_sql, tuple(params) or None)
             
             if not logs_result['success']:
                 return {"logs": [], "total_count": 0}
 
-            logs_data = [{
-                "log_id": str(uuid.uuid4()),
-                "user_id": row.get("OPE_CODE"),
-                "sql": row.get("OPTION_NO"),
-                "execution_time": row.get("SYSTEM_WORKNUMBER"),
-                "connserver": row.get("CONNSERVER", "98"),  # CONNSERVERカラムを追加
-                "row_count": None,  # テーブルに存在しないためNone
-                "success": True,     # テーブルに存在しないためデフォルト値
-                "error_message": None,  # テーブルに存在しないためNone
-                "timestamp": datetime.strptime(row.get("MK_DATE"), '%Y%m%d%H%M%S').isoformat()
-            } for row in logs_result['data']]
+            logs_data = [self._row_to_log(row) for row in logs_result['data']]
 
             return {"logs": logs_data, "total_count": total_count}
         except Exception as e:
             self.logger.error(f"Snowflakeからのログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
-            return {"logs": [], "total_count": 0} 
\ No newline at end of file
+            return {"logs": [], "total_count": 0}
+
+    def get_history(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    until: Optional[datetime] = None) -> Dict[str, Any]:
+        """SnowflakeからSQL実行履歴を新しい順に取得する（(MK_DATE, 行ハッシュ) の keyset 方式）
+
+        日付範囲とユーザーはSQLで絞り込むため、MK_DATE によるマイクロパーティションの刈り込みが効く。
+        同じ日時のログは行ハッシュで並べるため、OFFSET による読み飛ばしが要らない。
+        """
+        where_sql = "TOOL_NAME = 'SQLDOJOWEB'"
+        params: List[Any] = []
+        if user_id:
+            where_sql += " AND OPE_CODE = ?"
+            params.append(user_id)
+        if since:
+            where_sql += " AND MK_DATE >= ?"
+            params.append(since.strftime(LOG_DATE_FORMAT))
+        if until:
+            where_sql += " AND MK_DATE < ?"
+            params.append(until.strftime(LOG_DATE_FORMAT))
+        position = decode_history_cursor(cursor)
+        if position and not position[1].lstrip('-').isdigit():
+            position = None
+        rows, has_more = self._fetch_keyset_page(
+            where_sql, params, (position[0], int(position[1])) if position else None, True, limit
+        )
+        next_cursor = encode_history_cursor(rows[-1].get("MK_DATE"), rows[-1].get("ROW_HASH")) if has_more else None
+        return {"logs": [self._row_to_log(row) for row in rows], "next_cursor": next_cursor}
+
+    def get_logs_after(self, cursor: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """cursor より後に追加されたログを古い順に取得する（(MK_DATE, 行ハッシュ) の keyset 方式）"""
+        mk_date, row_hash = decode_logs_after_cursor(cursor)
+        position = None
+        if mk_date:
+            position = (mk_date, int(row_hash) if row_hash and row_hash.lstrip('-').isdigit() else None)
+        rows, _ = self._fetch_keyset_page("TOOL_NAME = 'SQLDOJOWEB'", [], position, False, limit)
+        return [
+            {**self._row_to_log(row), "cursor": encode_history_cursor(row.get("MK_DATE"), row.get("ROW_HASH"))}
+            for row in rows
+        ]
+
+    def _fetch_keyset_page(self, where_sql: str, params: List[Any], position: Optional[tuple],
+                           descending: bool, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """(MK_DATE, 行ハッシュ) の keyset で position の次から1ページ分を取得し、(行, 続きがあるか) を返す
+
+        position の行ハッシュが None の場合は、その MK_DATE のログをすべて読み終えたものとして扱う。
+        全列が同じログは行ハッシュも同じになるため、ページの境目で分かれる場合はまとめて同じページに含める
+        （そのときだけページが limit 件を超える）。
+        """
+        op, order = ("<", " DESC") if descending else (">", "")
+        base_sql = (f"SELECT {self._SELECT_COLUMNS}, {self._ROW_HASH} AS ROW_HASH "
+                    f"FROM Log.TOOL_LOG WHERE {where_sql}")
+        page_sql, page_params = base_sql, list(params)
+        if position and position[1] is None:
+            page_sql += f" AND MK_DATE {op} ?"
+            page_params.append(position[0])
+        elif position:
+            page_sql += f" AND (MK_DATE {op} ? OR (MK_DATE = ? AND {self._ROW_HASH} {op} ?))"
+            page_params.extend([position[0], position[0], position[1]])
+        page_sql += f" ORDER BY MK_DATE{order}, ROW_HASH{order} LIMIT {int(limit) + 1}"
+        rows = self._query_rows(page_sql, page_params)
+        has_more = len(rows) > limit
+        if not has_more:
+            return rows, False
+
+        def row_key(row):
+            return row.get("MK_DATE"), row.get("ROW_HASH")
+
+        boundary = row_key(rows[limit])
+        if row_key(rows[limit - 1]) != boundary:
+            return rows[:limit], True
+        same_rows = self._query_rows(base_sql + f" AND MK_DATE = ? AND {self._ROW_HASH} = ?",
+                                     list(params) + list(boundary))
+        return [row for row in rows[:limit] if row_key(row) != boundary] + same_rows, True
+
+    def _query_rows(self, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        result = self.connection_manager.execute_query(sql, tuple(params) or None)
+        if not result['success']:
+            raise DatabaseError(f"Snowflakeからのログ取得に失敗しました: {result['error_message']}")
+        return result['data'] or []
+
+    def _row_to_log(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "log_id": str(uuid.uuid4()),
+            "user_id": row.get("OPE_CODE"),
+            "sql": row.get("OPTION_NO"),
+            "execution_time": row.get("SYSTEM_WORKNUMBER"),
+            "connserver": row.get("CONNSERVER", "98"),  # CONNSERVERカラムを追加
+            "row_count": None,  # テーブルに存在しないためNone
+            "success": True,     # テーブルに存在しないためデフォルト値
+            "error_message": None,  # テーブルに存在しないためNone
+            "timestamp": datetime.strptime(row.get("MK_DATE"), LOG_DATE_FORMAT).isoformat()
+        }
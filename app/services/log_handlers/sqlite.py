@@ -1,12 +1,12 @@
 import sqlite3
 import uuid
-import sqlite3
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pathlib import Path
-from app.services.log_handlers.base import BaseLogHandler
+from app.services.log_handlers.base import (
+    BaseLogHandler, SQLLogRecord, LOG_DATE_FORMAT, decode_history_cursor, encode_history_cursor, version_number
+)
 from app.logger import get_logger
-from app import __version__
 from app.config_simplified import get_settings
 
 class SqliteLogHandler(BaseLogHandler):
@@ -51,6 +51,10 @@ class SqliteLogHandler(BaseLogHandler):
                     else:
                         self.logger.warning(f"CONNSERVERカラムの追加で警告: {e}")
                 
+                # 履歴取得用インデックス（ユーザー別・全体の新しい順、rowid は末尾に暗黙で含まれる）
+                conn.execute("CREATE INDEX IF NOT EXISTS IX_TOOL_LOG_OPE_DATE ON TOOL_LOG (OPE_CODE, MK_DATE)")
+                conn.execute("CREATE INDEX IF NOT EXISTS IX_TOOL_LOG_DATE ON TOOL_LOG (MK_DATE)")
+
                 conn.commit()
                 self.logger.info(f"SQLiteログデータベースを初期化しました: {self.db_path}")
         except Exception as e:
@@ -60,37 +64,36 @@ class SqliteLogHandler(BaseLogHandler):
     def add_log(self, user_id: str, sql: str, execution_time: float, start_time: datetime, row_count: int, success: bool, error_message: Optional[str] = None):
         """SQLiteにSQL実行ログを追加する"""
         try:
-            end_time = datetime.now()
-            mk_date = end_time.strftime('%Y%m%d%H%M%S')
-            from_date = start_time.strftime('%Y%m%d%H%M%S')
-            
-            # バージョン番号の計算
-            version_parts = __version__.split('.')
-            version_number = int(version_parts[0]) * 100 + int(version_parts[1]) * 10 + int(version_parts[2])
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    """
-                    INSERT INTO TOOL_LOG (
-                        MK_DATE, OPE_CODE, TOOL_NAME, OPTION_NO,
-                        SYSTEM_WORKNUMBER, FROM_DATE, TO_DATE, TOOL_VER, CONNSERVER
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        mk_date,
-                        user_id,
-                        self.settings.sqlite_tool_name,
-                        sql,
-                        int(execution_time),
-                        from_date,
-                        mk_date,
-                        version_number,
-                        '98',
-                    ),
-                )
-                conn.commit()
+            self.write_logs([SQLLogRecord(user_id, sql, execution_time, start_time, row_count, success, error_message)])
         except Exception as e:
             self.logger.error(f"SQLiteへのログ記録中に予期せぬエラーが発生しました: {e}", exc_info=True)
 
+    def write_logs(self, records: List[SQLLogRecord]) -> None:
+        """SQLiteにSQL実行ログをまとめて追加する（1トランザクションで executemany）"""
+        tool_ver = version_number()
+        rows = [(
+            record.end_time.strftime('%Y%m%d%H%M%S'),
+            record.user_id,
+            self.settings.sqlite_tool_name,
+            record.sql,
+            int(record.execution_time),
+            record.start_time.strftime('%Y%m%d%H%M%S'),
+            record.end_time.strftime('%Y%m%d%H%M%S'),
+            tool_ver,
+            '98',
+        ) for record in records]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                """
+                INSERT INTO TOOL_LOG (
+                    MK_DATE, OPE_CODE, TOOL_NAME, OPTION_NO,
+                    SYSTEM_WORKNUMBER, FROM_DATE, TO_DATE, TOOL_VER, CONNSERVER
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            conn.commit()
+
     def get_logs(self, user_id: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
         """SQLiteからSQL実行ログを取得する"""
         try:
@@ -133,19 +136,82 @@ class SqliteLogHandler(BaseLogHandler):
                 
                 logs_result = conn.execute(data_sql, data_params).fetchall()
                 
-                logs_data = [{
-                    "log_id": str(uuid.uuid4()),
-                    "user_id": row['OPE_CODE'],
-                    "sql": row['OPTION_NO'],
-                    "execution_time": row['SYSTEM_WORKNUMBER'],
-                    "connserver": row.get('CONNSERVER', '98'),  # CONNSERVERカラムを追加
-                    "row_count": None,  # テーブルに存在しないためNone
-                    "success": True,     # テーブルに存在しないためデフォルト値
-                    "error_message": None,  # テーブルに存在しないためNone
-                    "timestamp": datetime.strptime(row['MK_DATE'], '%Y%m%d%H%M%S').isoformat()
-                } for row in logs_result]
+                logs_data = [self._row_to_log(row) for row in logs_result]
                 
                 return {"logs": logs_data, "total_count": total_count}
         except Exception as e:
             self.logger.error(f"SQLiteからのログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
-            return {"logs": [], "total_count": 0} 
\ No newline at end of file
+            return {"logs": [], "total_count": 0}
+
+    def get_history(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    until: Optional[datetime] = None) -> Dict[str, Any]:
+        """SQLiteからSQL実行履歴を新しい順に取得する（(MK_DATE, rowid) の keyset 方式）
+
+        インデックス IX_TOOL_LOG_OPE_DATE / IX_TOOL_LOG_DATE を新しい順にたどるため、
+        総件数や取得位置に関係なく limit 件の読み取りで済む。
+        """
+        data_sql = "SELECT rowid, MK_DATE, OPE_CODE, OPTION_NO, SYSTEM_WORKNUMBER, CONNSERVER FROM TOOL_LOG WHERE 1 = 1"
+        params: List[Any] = []
+        if self.settings.sqlite_tool_name:
+            data_sql += " AND TOOL_NAME = ?"
+            params.append(self.settings.sqlite_tool_name)
+        if user_id:
+            data_sql += " AND OPE_CODE = ?"
+            params.append(user_id)
+        if since:
+            data_sql += " AND MK_DATE >= ?"
+            params.append(since.strftime(LOG_DATE_FORMAT))
+        if until:
+            data_sql += " AND MK_DATE < ?"
+            params.append(until.strftime(LOG_DATE_FORMAT))
+        position = decode_history_cursor(cursor)
+        if position and position[1].isdigit():
+            data_sql += " AND (MK_DATE < ? OR (MK_DATE = ? AND rowid < ?))"
+            params.extend([position[0], position[0], int(position[1])])
+        data_sql += " ORDER BY MK_DATE DESC, rowid DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(data_sql, params).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1]['MK_DATE'], rows[-1]['rowid']) if has_more else None
+        return {"logs": [self._row_to_log(row) for row in rows], "next_cursor": next_cursor}
+
+    def _row_to_log(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "log_id": str(uuid.uuid4()),
+            "user_id": row['OPE_CODE'],
+            "sql": row['OPTION_NO'],
+            "execution_time": row['SYSTEM_WORKNUMBER'],
+            "connserver": row['CONNSERVER'] or '98',
+            "row_count": None,  # テーブルに存在しないためNone
+            "success": True,     # テーブルに存在しないためデフォルト値
+            "error_message": None,  # テーブルに存在しないためNone
+            "timestamp": datetime.strptime(row['MK_DATE'], LOG_DATE_FORMAT).isoformat()
+        }
+
+    def get_logs_after(self, cursor: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """rowid が cursor より大きいログを古い順に取得する（利用状況の差分集計用）"""
+        last_rowid = int(cursor) if cursor and cursor.isdigit() else 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                data_sql = "SELECT rowid, MK_DATE, OPE_CODE, OPTION_NO FROM TOOL_LOG WHERE rowid > ?"
+                data_params: List[Any] = [last_rowid]
+                if self.settings.sqlite_tool_name:
+                    data_sql += " AND TOOL_NAME = ?"
+                    data_params.append(self.settings.sqlite_tool_name)
+                data_sql += " ORDER BY rowid LIMIT ?"
+                data_params.append(limit)
+                return [{
+                    "cursor": str(row['rowid']),
+                    "user_id": row['OPE_CODE'],
+                    "sql": row['OPTION_NO'],
+                    "timestamp": datetime.strptime(row['MK_DATE'], '%Y%m%d%H%M%S').isoformat()
+                } for row in conn.execute(data_sql, data_params).fetchall()]
+        except Exception as e:
+            self.logger.error(f"SQLiteからの差分ログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
+            return []
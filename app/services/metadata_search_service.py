@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ検索サービス
+metadata_cache.db の検索インデックスを使い、ロールの表示設定を適用した検索結果を返す
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.logger import get_logger
+from app.metadata_cache import MetadataCache
+from app.metadata_search_index import MetadataSearchIndex
+from app.services.visibility_control_service import VisibilityControlService, VisibilityModel
+
+
+class MetadataSearchService:
+    """メタデータ検索サービス"""
+
+    OBJECT_TYPES = MetadataSearchIndex.OBJECT_TYPES
+    # 表示対象外のヒットを除いた後に件数が不足した場合、取得件数を増やして再検索する上限
+    MAX_FETCH = 2000
+
+    def __init__(self, metadata_cache: MetadataCache, visibility_service: VisibilityControlService):
+        self.cache = metadata_cache
+        self.visibility_service = visibility_service
+        self.logger = get_logger(__name__)
+
+    def search(self, query: str, role: str, object_types: Optional[Sequence[str]] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        """名前・コメントを検索し、ロールに表示可能なものを関連度順に返す"""
+        query = query.strip()
+        if not query:
+            return []
+        model = self.visibility_service.get_visibility_model()
+        fetch = limit
+        while True:
+            hits = self.cache.search_metadata(query, list(object_types) if object_types else None, fetch)
+            visible = [hit for hit in hits if self._is_visible(model, hit, role)]
+            if len(visible) >= limit or len(hits) < fetch or fetch >= self.MAX_FETCH:
+                return visible[:limit]
+            fetch = min(fetch * 4, self.MAX_FETCH)
+
+    @staticmethod
+    def _is_visible(model: VisibilityModel, hit: Dict[str, Any], role: str) -> bool:
+        # テーブル・カラムはテーブルの表示設定に従う（ツリー表示と同じ判定）
+        if hit["object_type"] == "schema":
+            return model.is_visible(hit["schema_name"], role)
+        return model.is_visible(f"{hit['schema_name']}.{hit['table_name']}", role)
@@ -3,39 +3,87 @@
 メタデータサービス
 データベースのメタデータ（スキーマ、テーブル、カラム）を管理
 """
-from typing import List, Dict, Any, Optional
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime, timedelta
 
 from app.logger import get_logger
-from app.metadata_cache import MetadataCache
+from app.metadata_cache import MetadataCache, format_sync_timestamp, parse_sync_timestamp
 from app.exceptions import MetadataError
 from .query_executor import QueryExecutor, QueryResult
+from .metadata_snapshot import MetadataSnapshot, MetadataSnapshotStore, get_metadata_snapshot_store
 
 
 class MetadataService:
     """メタデータサービス"""
+
+    _SCHEMATA_SQL = "SELECT SCHEMA_NAME, CREATED, SCHEMA_OWNER FROM INFORMATION_SCHEMA.SCHEMATA"
+    _ALL_TABLES_SQL = """
+    SELECT 
+        TABLE_SCHEMA,
+        TABLE_NAME,
+        TABLE_TYPE,
+        ROW_COUNT,
+        CREATED,
+        LAST_ALTERED,
+        COMMENT
+    FROM INFORMATION_SCHEMA.TABLES 
+    WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+    ORDER BY TABLE_SCHEMA, TABLE_NAME
+    """
+    _COLUMNS_SELECT = """
+    SELECT 
+        TABLE_SCHEMA,
+        TABLE_NAME,
+        COLUMN_NAME,
+        DATA_TYPE,
+        IS_NULLABLE,
+        COLUMN_DEFAULT,
+        ORDINAL_POSITION,
+        COMMENT
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    """
+    _ALL_COLUMNS_SQL = _COLUMNS_SELECT + """
+    WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+    ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION
+    """
+    _SCHEMA_COLUMNS_SQL = _COLUMNS_SELECT + """
+    WHERE TABLE_SCHEMA = ?
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """
     
-    def __init__(self, query_executor: QueryExecutor, metadata_cache: MetadataCache):
+    def __init__(self, query_executor: QueryExecutor, metadata_cache: MetadataCache,
+                 snapshot_store: Optional[MetadataSnapshotStore] = None,
+                 extraction_workers: Optional[int] = None, split_columns_by_schema: Optional[bool] = None):
         self.query_executor = query_executor
         self.cache = metadata_cache
+        self.snapshot_store = snapshot_store or get_metadata_snapshot_store()
+        # 全件取得時の並列度（1 の場合は従来どおり順次取得）。None の場合は設定値を使う
+        self.extraction_workers = extraction_workers
+        self.split_columns_by_schema = split_columns_by_schema
         self.logger = get_logger(__name__)
+
+    def get_metadata_snapshot(self) -> MetadataSnapshot:
+        """プロセス共通のメタデータスナップショットを取得（初回のみSQLiteから読み込む）"""
+        return self.snapshot_store.current(self.cache)
     
     def get_all_metadata(self) -> List[Dict[str, Any]]:
-        """全メタデータを取得（キャッシュ優先）"""
+        """全メタデータを取得（スナップショット優先）"""
         self.logger.info("全メタデータ取得開始")
         
         try:
-            # キャッシュから全メタデータを取得
-            cached_data = self.cache.get_all_metadata_normalized()
-            if not cached_data:
+            snapshot = self.get_metadata_snapshot()
+            if snapshot.is_empty:
                 self.logger.warning("キャッシュにデータがないため、モックデータを返します")
                 return self._get_mock_all_metadata()
             
-            self.logger.info("キャッシュから全メタデータ取得完了", 
-                           schema_count=len(cached_data),
-                           total_tables=sum(len(schema.get("tables", [])) for schema in cached_data),
-                           total_columns=sum(len(table.get("columns", [])) for schema in cached_data for table in schema.get("tables", [])))
-            return cached_data
+            self.logger.info("スナップショットから全メタデータ取得完了", 
+                           version=snapshot.version, schema_count=len(snapshot.schemas))
+            return snapshot.to_list()
             
         except Exception as e:
             self.logger.error("全メタデータ取得エラー", exception=e)
@@ -47,7 +95,7 @@ class MetadataService:
         
         try:
             # キャッシュから全メタデータを取得
-            cached_data = self.cache.get_all_metadata_normalized()
+            cached_data = self.get_metadata_snapshot().to_list()
             if not cached_data:
                 self.logger.warning("キャッシュにデータがないため、モックデータを返します")
                 return self._get_mock_schemas_and_tables()
@@ -117,28 +165,84 @@ class MetadataService:
 
     def refresh_full_metadata_cache(self) -> int:
         """バックグラウンドで全メタデータを取得してキャッシュを更新するメソッド
+        取得したスキーマから順にキャッシュへ書き込み、全件揃った時点で差し替える
         戻り値: 更新されたスキーマ数
         """
         # ▼ INFOをDEBUGに変更
         self.logger.debug("メタデータキャッシュの強制更新を開始")
         try:
             # 直接Snowflakeから全メタデータを取得（キャッシュは使用しない）
-            all_metadata = self._fetch_all_from_snowflake_direct()
-            if all_metadata:
-                self.cache.save_all_metadata_normalized(all_metadata)
-                schema_count = len(all_metadata)
-                # ▼ INFOをDEBUGに変更し、スキーマ数を戻り値として返す
-                self.logger.debug(f"メタデータキャッシュの更新が完了。スキーマ数: {schema_count}")
-                return schema_count
-            else:
+            metadata_stream = iter(self._fetch_all_from_snowflake_direct())
+            first_schema = next(metadata_stream, None)
+            if first_schema is None:
                 self.logger.warning("メタデータ取得に失敗しました")
                 return 0
+
+            fetched_tables: List[Dict[str, Any]] = []
+            schema_count = 0
+
+            def counted(schemas):
+                nonlocal schema_count
+                for schema in schemas:
+                    schema_count += 1
+                    fetched_tables.extend(schema.get("tables", []))
+                    yield schema
+
+            self.cache.save_all_metadata_normalized(
+                counted(chain([first_schema], metadata_stream)),
+                sync_watermark=lambda: self._compute_sync_watermark(fetched_tables),
+            )
+            self.snapshot_store.reload(self.cache)
+            # ▼ INFOをDEBUGに変更し、スキーマ数を戻り値として返す
+            self.logger.debug(f"メタデータキャッシュの更新が完了。スキーマ数: {schema_count}")
+            return schema_count
         except Exception as e:
             self.logger.error(f"メタデータキャッシュの更新に失敗: {str(e)}")
             raise MetadataError(f"メタデータキャッシュの更新に失敗しました: {str(e)}")
 
-    def refresh_full_metadata_and_master_cache(self, master_data_service) -> Dict[str, Any]:
+    def sync_metadata_cache(self, full_resync: bool = False) -> Dict[str, Any]:
+        """メタデータキャッシュを差分同期するメソッド
+
+        前回同期時のウォーターマーク以降に LAST_ALTERED/CREATED が更新されたテーブルのみを取得し、
+        追加・変更・削除をキャッシュに反映する。ウォーターマークがない場合や full_resync 指定時は全件更新。
+        戻り値: 同期結果の詳細
+        """
+        watermark = None if full_resync else self.cache.get_sync_watermark()
+        if watermark is None or not self.cache.is_cache_valid():
+            schema_count = self.refresh_full_metadata_cache()
+            return {'mode': 'full', 'schema_count': schema_count}
+
+        self.logger.debug("メタデータキャッシュの差分同期を開始", watermark=format_sync_timestamp(watermark))
+        try:
+            diff = self._fetch_metadata_diff(watermark)
+            if diff is None:
+                raise MetadataError("INFORMATION_SCHEMA からの差分取得に失敗しました")
+            if diff['has_changes'] or diff['watermark'] != watermark:
+                self.cache.apply_metadata_diff(
+                    diff['schemas'], diff['upsert_tables'], diff['drop_tables'], diff['watermark']
+                )
+            if diff['has_changes']:
+                self.snapshot_store.reload(self.cache)
+        except MetadataError:
+            raise
+        except Exception as e:
+            self.logger.error(f"メタデータキャッシュの差分同期に失敗: {str(e)}")
+            raise MetadataError(f"メタデータキャッシュの差分同期に失敗しました: {str(e)}")
+
+        result = {
+            'mode': 'incremental',
+            'schema_count': len(diff['schemas']),
+            'added': diff['added'],
+            'changed': diff['changed'],
+            'dropped': len(diff['drop_tables']),
+            'watermark': format_sync_timestamp(diff['watermark']),
+        }
+        self.logger.info("メタデータキャッシュの差分同期が完了", **result)
+        return result
+
+    def refresh_full_metadata_and_master_cache(self, master_data_service, full_resync: bool = False) -> Dict[str, Any]:
         """メタデータとマスター情報の両方を更新するメソッド
+        メタデータは差分同期（full_resync=True の場合は全件更新）
         戻り値: 更新結果の詳細
         """
         self.logger.info("メタデータとマスター情報の一括更新を開始")
@@ -146,9 +250,11 @@ class MetadataService:
         
         try:
             # メタデータ更新
-            schema_count = self.refresh_full_metadata_cache()
+            sync_result = self.sync_metadata_cache(full_resync=full_resync)
+            schema_count = sync_result['schema_count']
             results['metadata'] = {
                 'schema_count': schema_count,
+                'mode': sync_result['mode'],
                 'success': True
             }
             
@@ -177,79 +283,60 @@ class MetadataService:
             self.logger.error(f"メタデータとマスター情報の更新に失敗: {str(e)}")
             raise MetadataError(f"メタデータとマスター情報の更新に失敗しました: {str(e)}")
 
-    def get_schemas(self) -> List[Dict[str, Any]]:
-        """スキーマ一覧を取得（キャッシュ優先）"""
-        self.logger.info("スキーマ一覧取得開始")
-        
-        # キャッシュの有効性をチェック
-        if self.cache.is_cache_valid():
-            cached_data = self.cache.get_all_metadata_normalized()
-            if cached_data:
-                schemas = []
-                for schema_data in cached_data:
-                    schemas.append({
-                        "name": schema_data.get("name"),
-                        "created_on": schema_data.get("created_on"),
-                        "owner": schema_data.get("owner"),
-                    })
-                
-                self.logger.info("キャッシュからスキーマ一覧取得完了", count=len(schemas))
-                return schemas
-        
-        # キャッシュが無効または存在しない場合はモックデータを返す
-        self.logger.warning("キャッシュが無効なため、モックデータを返します")
-        return self._get_mock_schemas()
+    def get_level_index(self, role: Optional[str] = None, visibility_service=None) -> "MetadataLevelIndex":
+        """階層別の参照用インデックスを取得（スナップショットのバージョンごとに1回だけ構築）
 
-    def get_tables(self, schema_name: str) -> List[Dict[str, Any]]:
-        """テーブル一覧を取得（キャッシュ優先）"""
-        self.logger.info("テーブル一覧取得開始", schema=schema_name)
-        
-        # キャッシュの有効性をチェック
-        if self.cache.is_cache_valid():
-            cached_data = self.cache.get_all_metadata_normalized()
-            if cached_data:
-                for schema_data in cached_data:
-                    if schema_data.get("name") == schema_name:
-                        tables = []
-                        for table_data in schema_data.get("tables", []):
-                            tables.append({
-                                "name": table_data.get("name"),
-                                "schema_name": table_data.get("schema_name"),
-                                "table_type": table_data.get("table_type"),
-                                "row_count": table_data.get("row_count"),
-                                "created_on": table_data.get("created_on"),
-                                "last_altered": table_data.get("last_altered"),
-                            })
-                        
-                        self.logger.info("キャッシュからテーブル一覧取得完了", 
-                                       schema=schema_name, count=len(tables))
-                        return tables
-        
-        # キャッシュが無効または存在しない場合はモックデータを返す
-        self.logger.warning("キャッシュが無効なため、モックデータを返します", schema=schema_name)
-        return self._get_mock_tables(schema_name)
+        role と visibility_service を指定した場合はロールの表示設定を適用したインデックスを返し、
+        表示設定が変わるまでロールごとに再利用する。
+        """
+        snapshot = self.get_metadata_snapshot()
+        if role is None or visibility_service is None:
+            return snapshot.get_derived(
+                "metadata.level_index", lambda s: MetadataLevelIndex(s.schemas, tag=str(s.version))
+            )
 
-    def get_columns(self, schema_name: str, table_name: str) -> List[Dict[str, Any]]:
-        """カラム一覧を取得（キャッシュ優先）"""
-        self.logger.info("カラム一覧取得開始", schema=schema_name, table=table_name)
-        
-        # キャッシュの有効性をチェック
-        if self.cache.is_cache_valid():
-            cached_data = self.cache.get_all_metadata_normalized()
-            if cached_data:
-                for schema_data in cached_data:
-                    if schema_data.get("name") == schema_name:
-                        for table_data in schema_data.get("tables", []):
-                            if table_data.get("name") == table_name:
-                                columns = table_data.get("columns", [])
-                                self.logger.info("キャッシュからカラム一覧取得完了", 
-                                               schema=schema_name, table=table_name, count=len(columns))
-                                return columns
-        
-        # キャッシュが無効または存在しない場合はモックデータを返す
-        self.logger.warning("キャッシュが無効なため、モックデータを返します", 
-                        schema=schema_name, table=table_name)
-        return self._get_mock_columns(schema_name, table_name)
+        model = visibility_service.get_visibility_model()
+        tag = f"{snapshot.version}-{model.version}-{role}"
+        return snapshot.get_derived_versioned(
+            ("metadata.level_index", role), model.version,
+            lambda s: MetadataLevelIndex(visibility_service.filter_metadata(s, role), tag=tag)
+        )
+
+    def get_schemas(self, role: Optional[str] = None, visibility_service=None) -> List[Dict[str, Any]]:
+        """スキーマ一覧を取得（スナップショットの階層インデックスを参照）"""
+        if self.get_metadata_snapshot().is_empty:
+            self.logger.warning("キャッシュにデータがないため、モックデータを返します")
+            return self._get_mock_schemas()
+        return list(self.get_level_index(role, visibility_service).schemas)
+
+    def get_tables(self, schema_name: str, role: Optional[str] = None,
+                   visibility_service=None) -> List[Dict[str, Any]]:
+        """テーブル一覧を取得（スナップショットの階層インデックスを参照）
+
+        存在しない（または表示対象外の）スキーマの場合は空リストを返す。
+        """
+        if self.get_metadata_snapshot().is_empty:
+            self.logger.warning("キャッシュにデータがないため、モックデータを返します", schema=schema_name)
+            return self._get_mock_tables(schema_name)
+        return list(self.get_level_index(role, visibility_service).tables.get(schema_name, ()))
+
+    def get_columns(self, schema_name: str, table_name: str, role: Optional[str] = None,
+                    visibility_service=None) -> List[Dict[str, Any]]:
+        """カラム一覧を取得（スナップショットの階層インデックスを参照）
+
+        存在しない（または表示対象外の）テーブルの場合は空リストを返す。
+        """
+        if self.get_metadata_snapshot().is_empty:
+            self.logger.warning("キャッシュにデータがないため、モックデータを返します",
+                                schema=schema_name, table=table_name)
+            return self._get_mock_columns(schema_name, table_name)
+        index = self.get_level_index(role, visibility_service)
+        return list(index.columns.get((schema_name, table_name), ()))
+
+    def get_metadata_etag(self, role: Optional[str] = None, visibility_service=None) -> str:
+        """階層別エンドポイント用のETag（メタデータのバージョン・表示設定のバージョン・ロールから生成）"""
+        tag = self.get_level_index(role, visibility_service).tag
+        return '"' + hashlib.sha1(tag.encode("utf-8")).hexdigest()[:16] + '"'
 
     def get_table_info(self, schema_name: str, table_name: str) -> Dict[str, Any]:
         """テーブル詳細情報を取得"""
@@ -290,6 +377,7 @@ class MetadataService:
         self.logger.info("Snowflakeから全メタデータの一括更新を開始")
         all_metadata = self._fetch_all_from_snowflake()
         self.cache.save_all_metadata_normalized(all_metadata)
+        self.snapshot_store.reload(self.cache)
         self.logger.info("Snowflakeから全メタデータの一括更新が完了")
         return all_metadata
 
@@ -306,7 +394,7 @@ class MetadataService:
         self.logger.info("キャッシュからカラム情報取得", schema=schema_name, table=table_name)
         
         # キャッシュから全メタデータを取得
-        cached_data = self.cache.get_all_metadata_normalized()
+        cached_data = self.get_metadata_snapshot().to_list()
         if not cached_data:
             self.logger.warning("キャッシュにデータがないため、空のリストを返します")
             return []
@@ -441,127 +529,60 @@ class MetadataService:
             self.logger.error(f"メタデータ取得中にエラーが発生: {str(e)}")
             return []
 
-    def _fetch_all_from_snowflake_direct(self) -> List[Dict[str, Any]]:
-        """Snowflakeから全メタデータを直接取得する内部メソッド（キャッシュを使用しない）"""
+    def _fetch_all_from_snowflake_direct(self) -> Iterable[Dict[str, Any]]:
+        """Snowflakeから全メタデータを直接取得する内部メソッド（キャッシュを使用しない）
+
+        並列抽出が有効な場合は、取得できたスキーマから順に返すイテレータを返す
+        （取得途中のエラーはイテレーション中に MetadataError として送出される）。
+        """
+        workers, split_columns = self._get_extraction_options()
+        if workers > 1:
+            return self._iter_all_from_snowflake_parallel(workers, split_columns)
+        return self._fetch_all_from_snowflake_sequential()
+
+    def _get_extraction_options(self) -> Tuple[int, bool]:
+        if self.extraction_workers is None or self.split_columns_by_schema is None:
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            if self.extraction_workers is None:
+                self.extraction_workers = settings.metadata_extraction_workers
+            if self.split_columns_by_schema is None:
+                self.split_columns_by_schema = settings.metadata_extraction_split_columns
+        return max(1, int(self.extraction_workers)), bool(self.split_columns_by_schema)
+
+    def _fetch_all_from_snowflake_sequential(self) -> List[Dict[str, Any]]:
+        """SCHEMATA / TABLES / COLUMNS を1本の接続で順に取得する"""
         self.logger.info("Snowflakeからメタデータを直接取得開始")
         
         try:
             # 1. スキーマ一覧を直接取得
-            schemas_sql = "SELECT SCHEMA_NAME, CREATED, SCHEMA_OWNER FROM INFORMATION_SCHEMA.SCHEMATA"
-            schemas_result = self.query_executor.execute_query(schemas_sql)
+            schemas_result = self.query_executor.execute_query(self._SCHEMATA_SQL)
             
             if not schemas_result.success:
                 self.logger.error(f"スキーマ情報の取得に失敗: {schemas_result.error_message}")
                 return []
             
-            schemas = []
-            for row in schemas_result.data:
-                schemas.append({
-                    "name": row.get("schema_name", ""),
-                    "created_on": str(row.get("created", "")),
-                    "owner": row.get("schema_owner", ""),
-                })
+            schemas = [self._schema_from_row(row) for row in schemas_result.data]
             
             # 2. 全テーブル情報を一度に取得（コメント情報を含む）
-            all_tables_sql = """
-            SELECT 
-                TABLE_SCHEMA,
-                TABLE_NAME,
-                TABLE_TYPE,
-                ROW_COUNT,
-                CREATED,
-                LAST_ALTERED,
-                COMMENT
-            FROM INFORMATION_SCHEMA.TABLES 
-            WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
-            ORDER BY TABLE_SCHEMA, TABLE_NAME
-            """
-            
-            tables_result = self.query_executor.execute_query(all_tables_sql)
+            tables_result = self.query_executor.execute_query(self._ALL_TABLES_SQL)
             if not tables_result.success:
                 self.logger.error(f"テーブル情報の一括取得に失敗: {tables_result.error_message}")
                 return []
-            
-            # テーブル情報をスキーマ別に整理
-            tables_by_schema = {}
-            for row in tables_result.data:
-                schema_name = row.get("table_schema", "")
-                if schema_name not in tables_by_schema:
-                    tables_by_schema[schema_name] = []
-                
-                tables_by_schema[schema_name].append({
-                    "name": row.get("table_name", ""),
-                    "schema_name": schema_name,
-                    "table_type": row.get("table_type", ""),
-                    "row_count": row.get("row_count", 0),
-                    "created_on": str(row.get("created", "")),
-                    "last_altered": str(row.get("last_altered", "")),
-                    "comment": row.get("comment"),
-                })
+            tables_by_schema = self._group_tables_by_schema(tables_result.data)
             
             # 3. 全カラム情報を一度に取得（コメント情報を含む）
-            all_columns_sql = """
-            SELECT 
-                TABLE_SCHEMA,
-                TABLE_NAME,
-                COLUMN_NAME,
-                DATA_TYPE,
-                IS_NULLABLE,
-                COLUMN_DEFAULT,
-                ORDINAL_POSITION,
-                COMMENT
-            FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
-            ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION
-            """
-            
-            columns_result = self.query_executor.execute_query(all_columns_sql)
+            columns_result = self.query_executor.execute_query(self._ALL_COLUMNS_SQL)
             if not columns_result.success:
                 self.logger.error(f"カラム情報の一括取得に失敗: {columns_result.error_message}")
                 return []
-            
-            # カラム情報をテーブル別に整理
-            columns_by_table = {}
-            for row in columns_result.data:
-                schema_name = row.get("table_schema", "")
-                table_name = row.get("table_name", "")
-                key = f"{schema_name}.{table_name}"
-                
-                if key not in columns_by_table:
-                    columns_by_table[key] = []
-                
-                columns_by_table[key].append({
-                    "name": row.get("column_name", ""),
-                    "data_type": row.get("data_type", ""),
-                    "is_nullable": row.get("is_nullable", "YES") == "YES",
-                    "default_value": row.get("column_default"),
-                    "ordinal_position": row.get("ordinal_position", 0),
-                    "comment": row.get("comment"),
-                })
+            columns_by_table = self._group_columns_by_table(columns_result.data)
             
             # 4. スキーマ、テーブル、カラム情報を統合
-            all_schemas_data = []
-            for schema_info in schemas:
-                schema_name = schema_info.get("name")
-                if not schema_name or schema_name.upper() == 'INFORMATION_SCHEMA':
-                    continue
-                
-                # スキーマのテーブル情報を取得
-                tables = tables_by_schema.get(schema_name, [])
-                
-                # 各テーブルにカラム情報を追加
-                for table_info in tables:
-                    table_name = table_info.get("name")
-                    if not table_name:
-                        continue
-                    
-                    # カラム情報を取得
-                    key = f"{schema_name}.{table_name}"
-                    columns = columns_by_table.get(key, [])
-                    table_info["columns"] = columns
-                
-                schema_info["tables"] = tables
-                all_schemas_data.append(schema_info)
+            all_schemas_data = [
+                self._assemble_schema(schema_info, tables_by_schema, columns_by_table)
+                for schema_info in schemas if self._is_target_schema(schema_info)
+            ]
             
             total_tables = sum(len(schema.get("tables", [])) for schema in all_schemas_data)
             total_columns = sum(len(table.get("columns", [])) for schema in all_schemas_data for table in schema.get("tables", []))
@@ -577,9 +598,251 @@ class MetadataService:
             self.logger.error(f"メタデータ取得中にエラーが発生: {str(e)}")
             return []
 
+    def _iter_all_from_snowflake_parallel(self, workers: int, split_columns: bool) -> Iterator[Dict[str, Any]]:
+        """SCHEMATA / TABLES / COLUMNS をワーカーごとの専用接続で同時に取得する
+
+        split_columns=True の場合、COLUMNS はスキーマ単位に分割して最大 workers 本まで同時に実行し、
+        カラムが揃ったスキーマから順に返す。
+        """
+        self.logger.info("Snowflakeからメタデータを並列取得開始", workers=workers, split_columns=split_columns)
+        started = time.perf_counter()
+        connections = _DedicatedConnections(self.query_executor)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata-extract")
+        schema_count = 0
+        try:
+            schemas_future = pool.submit(connections.fetch, self._SCHEMATA_SQL, "スキーマ情報")
+            tables_future = pool.submit(connections.fetch, self._ALL_TABLES_SQL, "テーブル情報")
+            columns_future = None
+            if not split_columns:
+                columns_future = pool.submit(connections.fetch, self._ALL_COLUMNS_SQL, "カラム情報")
+
+            schemas = [
+                schema for schema in (self._schema_from_row(row) for row in schemas_future.result())
+                if self._is_target_schema(schema)
+            ]
+            tables_by_schema = self._group_tables_by_schema(tables_future.result())
+
+            if columns_future is not None:
+                columns_by_table = self._group_columns_by_table(columns_future.result())
+                for schema_info in schemas:
+                    schema_count += 1
+                    yield self._assemble_schema(schema_info, tables_by_schema, columns_by_table)
+                return
+
+            pending = {}
+            for schema_info in schemas:
+                if tables_by_schema.get(schema_info["name"]):
+                    future = pool.submit(connections.fetch, self._SCHEMA_COLUMNS_SQL,
+                                         f"カラム情報({schema_info['name']})", (schema_info["name"],))
+                    pending[future] = schema_info
+                else:
+                    schema_count += 1
+                    yield self._assemble_schema(schema_info, tables_by_schema, {})
+            for future in as_completed(pending):
+                schema_count += 1
+                yield self._assemble_schema(
+                    pending[future], tables_by_schema, self._group_columns_by_table(future.result())
+                )
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            connections.close_all()
+            self.logger.info("Snowflakeからのメタデータ並列取得を終了",
+                             schema_count=schema_count, elapsed=f"{time.perf_counter() - started:.3f}s")
+
+    @staticmethod
+    def _is_target_schema(schema_info: Dict[str, Any]) -> bool:
+        schema_name = schema_info.get("name")
+        return bool(schema_name) and schema_name.upper() != 'INFORMATION_SCHEMA'
+
+    @classmethod
+    def _group_tables_by_schema(cls, rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """テーブル情報をスキーマ別に整理"""
+        tables_by_schema: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            tables_by_schema.setdefault(row.get("table_schema", ""), []).append(cls._table_from_row(row))
+        return tables_by_schema
+
+    @classmethod
+    def _group_columns_by_table(cls, rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """カラム情報をテーブル別（"スキーマ.テーブル"）に整理"""
+        columns_by_table: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            key = f"{row.get('table_schema', '')}.{row.get('table_name', '')}"
+            columns_by_table.setdefault(key, []).append(cls._column_from_row(row))
+        return columns_by_table
+
+    @staticmethod
+    def _assemble_schema(schema_info: Dict[str, Any], tables_by_schema: Dict[str, List[Dict[str, Any]]],
+                         columns_by_table: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """スキーマ情報にテーブル・カラム情報を統合"""
+        schema_name = schema_info.get("name")
+        tables = tables_by_schema.get(schema_name, [])
+        for table_info in tables:
+            table_name = table_info.get("name")
+            if not table_name:
+                continue
+            table_info["columns"] = columns_by_table.get(f"{schema_name}.{table_name}", [])
+        schema_info["tables"] = tables
+        return schema_info
+
+    def _fetch_metadata_diff(self, watermark: datetime) -> Optional[Dict[str, Any]]:
+        """ウォーターマーク以降に更新されたテーブルを取得し、キャッシュとの差分を計算する内部メソッド"""
+        schemas_result = self.query_executor.execute_query(self._SCHEMATA_SQL)
+        if not schemas_result.success:
+            self.logger.error(f"スキーマ情報の取得に失敗: {schemas_result.error_message}")
+            return None
+        schemas = [
+            schema for schema in (self._schema_from_row(row) for row in schemas_result.data)
+            if self._is_target_schema(schema)
+        ]
+        schema_names = {schema["name"] for schema in schemas}
+
+        # 削除検出用のテーブル一覧（名前のみ）
+        inventory_sql = """
+        SELECT TABLE_SCHEMA, TABLE_NAME
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+        """
+        inventory_result = self.query_executor.execute_query(inventory_sql)
+        if not inventory_result.success:
+            self.logger.error(f"テーブル一覧の取得に失敗: {inventory_result.error_message}")
+            return None
+
+        # ウォーターマーク以降に作成・変更されたテーブル（境界の取りこぼしを防ぐため >= で比較）
+        # ウォーターマークは UTC オフセット付きの ISO-8601 でバインドし、文字列ではなく日時として比較させる
+        bound = format_sync_timestamp(watermark)
+        changed_tables_sql = """
+        SELECT 
+            TABLE_SCHEMA,
+            TABLE_NAME,
+            TABLE_TYPE,
+            ROW_COUNT,
+            CREATED,
+            LAST_ALTERED,
+            COMMENT
+        FROM INFORMATION_SCHEMA.TABLES 
+        WHERE TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+          AND (LAST_ALTERED >= TO_TIMESTAMP_TZ(?) OR CREATED >= TO_TIMESTAMP_TZ(?))
+        ORDER BY TABLE_SCHEMA, TABLE_NAME
+        """
+        tables_result = self.query_executor.execute_query(changed_tables_sql, (bound, bound))
+        if not tables_result.success:
+            self.logger.error(f"変更テーブル情報の取得に失敗: {tables_result.error_message}")
+            return None
+
+        changed_columns_sql = """
+        SELECT 
+            c.TABLE_SCHEMA,
+            c.TABLE_NAME,
+            c.COLUMN_NAME,
+            c.DATA_TYPE,
+            c.IS_NULLABLE,
+            c.COLUMN_DEFAULT,
+            c.ORDINAL_POSITION,
+            c.COMMENT
+        FROM INFORMATION_SCHEMA.COLUMNS c
+        JOIN INFORMATION_SCHEMA.TABLES t
+          ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+        WHERE c.TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+          AND (t.LAST_ALTERED >= TO_TIMESTAMP_TZ(?) OR t.CREATED >= TO_TIMESTAMP_TZ(?))
+        ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION
+        """
+        columns_result = self.query_executor.execute_query(changed_columns_sql, (bound, bound))
+        if not columns_result.success:
+            self.logger.error(f"変更カラム情報の取得に失敗: {columns_result.error_message}")
+            return None
+
+        columns_by_table: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in columns_result.data:
+            key = (row.get("table_schema", ""), row.get("table_name", ""))
+            columns_by_table.setdefault(key, []).append(self._column_from_row(row))
+
+        cached_tables = self.cache.load_table_sync_index()
+        changed_tables = [self._table_from_row(row) for row in tables_result.data]
+        present = {(row.get("table_schema", ""), row.get("table_name", "")) for row in inventory_result.data}
+        upsert_tables = []
+        added = changed = 0
+        for table in changed_tables:
+            key = (table["schema_name"], table["name"])
+            present.add(key)
+            if table["schema_name"] not in schema_names:
+                continue
+            if key in cached_tables:
+                # 境界（ウォーターマークと同時刻）で再取得されただけのテーブルは対象外
+                if cached_tables[key] == table["last_altered"]:
+                    continue
+                changed += 1
+            else:
+                added += 1
+            table["columns"] = columns_by_table.get(key, [])
+            upsert_tables.append(table)
+        drop_tables = [key for key in cached_tables if key not in present or key[0] not in schema_names]
+
+        cached_schemas = {(s.get("name"), s.get("owner"), s.get("created_on")) for s in self.cache.load_schemas()}
+        schemas_changed = cached_schemas != {(s["name"], s["owner"], s["created_on"]) for s in schemas}
+
+        return {
+            'schemas': schemas,
+            'upsert_tables': upsert_tables,
+            'drop_tables': drop_tables,
+            'added': added,
+            'changed': changed,
+            'has_changes': bool(upsert_tables or drop_tables or schemas_changed),
+            'watermark': self._compute_sync_watermark(changed_tables, current=watermark),
+        }
+
+    @staticmethod
+    def _schema_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """INFORMATION_SCHEMA.SCHEMATA の行をスキーマ情報に変換"""
+        return {
+            "name": row.get("schema_name", ""),
+            "created_on": str(row.get("created", "")),
+            "owner": row.get("schema_owner", ""),
+        }
+
+    @staticmethod
+    def _table_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """INFORMATION_SCHEMA.TABLES の行をテーブル情報に変換"""
+        return {
+            "name": row.get("table_name", ""),
+            "schema_name": row.get("table_schema", ""),
+            "table_type": row.get("table_type", ""),
+            "row_count": row.get("row_count", 0),
+            "created_on": str(row.get("created", "")),
+            "last_altered": str(row.get("last_altered", "")),
+            "comment": row.get("comment"),
+        }
+
+    @staticmethod
+    def _column_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """INFORMATION_SCHEMA.COLUMNS の行をカラム情報に変換"""
+        return {
+            "name": row.get("column_name", ""),
+            "data_type": row.get("data_type", ""),
+            "is_nullable": row.get("is_nullable", "YES") == "YES",
+            "default_value": row.get("column_default"),
+            "ordinal_position": row.get("ordinal_position", 0),
+            "comment": row.get("comment"),
+        }
+
+    @staticmethod
+    def _compute_sync_watermark(tables, current: Optional[datetime] = None) -> Optional[datetime]:
+        """テーブルの LAST_ALTERED/CREATED の最大値を次回の差分同期の起点とする
+
+        値の形式やタイムゾーンが混在しても正しく比較できるよう、UTC の日時に揃えてから最大値を取る
+        """
+        values = [current] if current else []
+        for table in tables:
+            for key in ("last_altered", "created_on"):
+                value = parse_sync_timestamp(table.get(key))
+                if value:
+                    values.append(value)
+        return max(values) if values else None
+
     def clear_cache(self):
         """キャッシュをクリア"""
         self.cache.clear_cache()
+        self.snapshot_store.invalidate()
 
     def _fetch_schemas_from_snowflake(self) -> List[Dict[str, Any]]:
         """Snowflakeからスキーマ情報を取得"""
@@ -800,4 +1063,74 @@ class MetadataService:
         """カラム情報をDBから直接取得（DatabaseServiceから移行）"""
         sql = f"DESCRIBE TABLE {schema}.{table}"
         self.logger.info("カラム情報取得", query=sql, schema=schema, table=table)
-        return self.query_executor.execute_metadata_query(sql) 
\ No newline at end of file
+        return self.query_executor.execute_metadata_query(sql) 
+
+class _DedicatedConnections:
+    """並列取得用の専用接続（ワーカースレッドごとに1本ずつ作成し、取得完了後にまとめて閉じる）
+
+    接続プールの get_connection は同じ接続を共有するため、同時実行には専用接続を使う。
+    """
+
+    def __init__(self, query_executor: QueryExecutor):
+        self.query_executor = query_executor
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def fetch(self, sql: str, label: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.query_executor.connection_manager.create_dedicated_connection()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        result = self.query_executor.execute_query_with_connection(connection, sql, params)
+        if not result.success:
+            raise MetadataError(f"{label}の取得に失敗しました: {result.error_message}")
+        return result.data
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+class MetadataLevelIndex:
+    """スナップショットから構築する階層別の参照用インデックス
+
+    スキーマ一覧・スキーマ別テーブル一覧・テーブル別カラム一覧を保持し、
+    ツリー展開時の取得コストを子要素の件数に比例させる。
+    """
+
+    def __init__(self, schemas: List[Dict[str, Any]], tag: str):
+        self.tag = tag
+        self.schemas: List[Dict[str, Any]] = []
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.columns: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for schema_data in schemas:
+            schema_name = schema_data.get("name")
+            schema_info = {
+                "name": schema_name,
+                "created_on": schema_data.get("created_on"),
+                "owner": schema_data.get("owner"),
+            }
+            if schema_data.get("schema_hidden"):
+                schema_info["schema_hidden"] = True
+            self.schemas.append(schema_info)
+
+            tables = []
+            for table_data in schema_data.get("tables", []):
+                tables.append({
+                    "name": table_data.get("name"),
+                    "schema_name": table_data.get("schema_name", schema_name),
+                    "table_type": table_data.get("table_type"),
+                    "row_count": table_data.get("row_count"),
+                    "created_on": table_data.get("created_on"),
+                    "last_altered": table_data.get("last_altered"),
+                })
+                self.columns[(schema_name, table_data.get("name"))] = table_data.get("columns", [])
+            self.tables[schema_name] = tables
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータスナップショット
+プロセス全体で共有する読み取り専用のメタデータと、そのバージョン番号を管理
+"""
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.logger import get_logger
+
+
+@dataclass(frozen=True)
+class MetadataSnapshot:
+    """ある時点の全メタデータ（階層形式）
+
+    schemas 以下の辞書は複数のサービス・リクエストで共有されるため、変更してはならない。
+    補完用インデックスなどの派生データは get_derived で生成し、スナップショットと同じ寿命で保持する。
+    """
+    version: int
+    schemas: Tuple[Dict[str, Any], ...]
+    source: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    _derived: Dict[Any, Any] = field(default_factory=dict, repr=False, compare=False)
+    # 派生データのビルダーが別の派生データを参照できるよう再入可能なロックにする
+    _derived_lock: threading.RLock = field(default_factory=threading.RLock, repr=False, compare=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.schemas
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """スキーマ一覧のリストを返す（リスト自体はコピー、要素は共有）"""
+        return list(self.schemas)
+
+    def get_derived(self, key: Any, builder: Callable[["MetadataSnapshot"], Any]) -> Any:
+        """派生データを取得（このバージョンで未生成の場合のみ builder を実行）"""
+        with self._derived_lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+            return self._derived[key]
+
+    def get_derived_versioned(self, key: Any, version: Any, builder: Callable[["MetadataSnapshot"], Any]) -> Any:
+        """スナップショット以外の入力（表示設定など）にも依存する派生データを取得
+
+        version が前回の生成時と異なる場合のみ builder を実行し、古い版は置き換える。
+        """
+        with self._derived_lock:
+            cached = self._derived.get(key)
+            if cached is None or cached[0] != version:
+                cached = (version, builder(self))
+                self._derived[key] = cached
+            return cached[1]
+
+
+class MetadataSnapshotStore:
+    """現在のスナップショットを保持し、更新時にバージョンを進めて差し替える"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[MetadataSnapshot] = None
+        self._version = 0
+        self.logger = get_logger(__name__)
+
+    def current(self, metadata_cache) -> MetadataSnapshot:
+        """現在のスナップショットを取得（未読み込み、または別のキャッシュDBの場合はSQLiteから読み込む）"""
+        snapshot = self._current
+        if snapshot is not None and snapshot.source == metadata_cache.db_path:
+            return snapshot
+        with self._lock:
+            snapshot = self._current
+            if snapshot is None or snapshot.source != metadata_cache.db_path:
+                schemas = metadata_cache.get_all_metadata_normalized() or []
+                snapshot = self._swap(schemas, metadata_cache.db_path)
+            return snapshot
+
+    def reload(self, metadata_cache) -> MetadataSnapshot:
+        """キャッシュ更新後にSQLiteから読み直し、新しいバージョンとして差し替える"""
+        with self._lock:
+            schemas = metadata_cache.get_all_metadata_normalized() or []
+            return self._swap(schemas, metadata_cache.db_path)
+
+    def invalidate(self) -> None:
+        """スナップショットを破棄（次回参照時にSQLiteから再読み込み）"""
+        with self._lock:
+            self._current = None
+
+    @property
+    def version(self) -> int:
+        snapshot = self._current
+        return snapshot.version if snapshot is not None else 0
+
+    def _swap(self, all_metadata: List[Dict[str, Any]], source: Optional[str]) -> MetadataSnapshot:
+        self._version += 1
+        snapshot = MetadataSnapshot(version=self._version, schemas=tuple(all_metadata), source=source)
+        self._current = snapshot
+        self.logger.info("メタデータスナップショットを更新", version=snapshot.version, schema_count=len(snapshot.schemas))
+        return snapshot
+
+
+_snapshot_store: Optional[MetadataSnapshotStore] = None
+_snapshot_store_lock = threading.Lock()
+
+
+def get_metadata_snapshot_store() -> MetadataSnapshotStore:
+    """プロセス共通のスナップショットストアを取得"""
+    global _snapshot_store
+    if _snapshot_store is None:
+        with _snapshot_store_lock:
+            if _snapshot_store is None:
+                _snapshot_store = MetadataSnapshotStore()
+    return _snapshot_store
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+クエリキャンセルサービス
+実行中のカーソルとウェアハウス側のクエリ情報をセッション単位で追跡し、サーバー側でクエリを中断する
+"""
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from app.logger import get_logger
+
+logger = get_logger("QueryCancellationService")
+
+_QUERY_ID_PATTERN = re.compile(r"^[0-9A-Za-z\-]+$")
+
+CANCEL_METHOD_CURSOR = "cursor_cancel"        # ODBC の SQLCancel（cursor.cancel()）
+CANCEL_METHOD_ABORT = "abort_statement"       # 別接続からの SYSTEM$CANCEL_QUERY
+
+# アプリケーションサーバーとウェアハウスの時計のずれを見込んだ、開始時刻の許容幅（秒）
+_START_TIME_TOLERANCE_SECONDS = 5
+
+_LEADING_COMMENTS = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)+", re.DOTALL)
+
+
+def _query_text_candidates(statement: str) -> List[str]:
+    """クエリ履歴の QUERY_TEXT として記録されうるSQL本文（先頭のコメントは除去されて記録される場合がある）"""
+    stripped = _LEADING_COMMENTS.sub("", statement)
+    return [statement, stripped or statement]
+
+
+class QueryCancellationService:
+    """実行中クエリのサーバー側キャンセル
+
+    1. 実行中カーソルの cursor.cancel() を別スレッドから呼び出す（ブロック中の execute も中断される）
+    2. 失敗した場合は別接続を開き、クエリ履歴からこの実行のクエリIDを特定して SYSTEM$CANCEL_QUERY を発行する。
+       プールの接続は複数の実行で共有されるため、ウェアハウスのセッションIDに加えて
+       SQL本文と開始時刻で絞り込み、開始時刻が最も近いクエリを対象とする
+       （SQL本文は変更しないため、ウェアハウスの結果キャッシュはそのまま効く）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[str, Dict[str, Any]] = {}  # セッションID -> 実行中クエリ情報
+        self._warehouse_sessions: Dict[str, str] = {}  # プール接続ID -> ウェアハウスのセッションID
+        self._metrics = {'requested': 0, 'cursor_cancelled': 0, 'abort_cancelled': 0, 'failed': 0}
+
+    def register(self, session_id: str, cursor: Any, connection_manager: Any = None,
+                 statement: Optional[str] = None, warehouse_session: Optional[str] = None) -> None:
+        """実行直前のカーソルを登録（statement は実行するSQL本文、warehouse_session は接続のセッションID）"""
+        with self._lock:
+            self._active[session_id] = {
+                'cursor': cursor,
+                'connection_manager': connection_manager,
+                'statement': statement,
+                'warehouse_session': warehouse_session,
+                'query_id': None,
+                'started_at': time.monotonic(),
+                'started_at_utc': datetime.now(timezone.utc),
+                'cancel_requested': False,
+            }
+
+    def warehouse_session(self, connection_id: Optional[str], cursor: Any) -> Optional[str]:
+        """プール接続のウェアハウスのセッションIDを取得（接続ごとに初回のみ CURRENT_SESSION() を問い合わせる）"""
+        if not connection_id:
+            return None
+        with self._lock:
+            cached = self._warehouse_sessions.get(connection_id)
+        if cached:
+            return cached
+        try:
+            cursor.execute("SELECT CURRENT_SESSION()")
+            row = cursor.fetchone()
+        except Exception as e:
+            logger.debug(f"ウェアハウスのセッションIDを取得できませんでした: {connection_id}, {e}")
+            return None
+        value = str(row[0]) if row and row[0] is not None else None
+        if not value or not value.isdigit():
+            return None
+        with self._lock:
+            self._warehouse_sessions[connection_id] = value
+        return value
+
+    def set_query_id(self, session_id: str, query_id: Optional[str]) -> None:
+        """ウェアハウス側のクエリIDを記録"""
+        with self._lock:
+            entry = self._active.get(session_id)
+            if entry is not None and query_id:
+                entry['query_id'] = query_id
+
+    def unregister(self, session_id: str) -> None:
+        """実行完了したカーソルの登録を解除"""
+        with self._lock:
+            self._active.pop(session_id, None)
+
+    def is_active(self, session_id: str) -> bool:
+        """指定セッションのクエリが実行中か"""
+        with self._lock:
+            return session_id in self._active
+
+    def was_cancel_requested(self, session_id: str) -> bool:
+        """指定セッションにキャンセル要求が出されたか"""
+        with self._lock:
+            entry = self._active.get(session_id)
+            return bool(entry and entry['cancel_requested'])
+
+    def cancel(self, session_id: str) -> Dict[str, Any]:
+        """実行中クエリをサーバー側でキャンセルし、結果を返す"""
+        with self._lock:
+            entry = self._active.get(session_id)
+            if entry is None:
+                return {'cancelled': False, 'method': None, 'query_id': None,
+                        'message': "実行中のクエリはありません"}
+            entry['cancel_requested'] = True
+            self._metrics['requested'] += 1
+            entry = entry.copy()
+
+        cursor_error = None
+        try:
+            entry['cursor'].cancel()
+            with self._lock:
+                self._metrics['cursor_cancelled'] += 1
+            logger.info(f"cursor.cancel() によりクエリをキャンセルしました: {session_id}")
+            return {'cancelled': True, 'method': CANCEL_METHOD_CURSOR, 'query_id': entry['query_id'],
+                    'message': "実行中のクエリをキャンセルしました"}
+        except Exception as e:
+            cursor_error = e
+            logger.warning(f"cursor.cancel() に失敗したため中断ステートメントで再試行します: {session_id}, {e}")
+
+        try:
+            query_id = self._abort_with_statement(entry)
+            if query_id:
+                self.set_query_id(session_id, query_id)
+                with self._lock:
+                    self._metrics['abort_cancelled'] += 1
+                logger.info(f"SYSTEM$CANCEL_QUERY によりクエリをキャンセルしました: {session_id}, query_id={query_id}")
+                return {'cancelled': True, 'method': CANCEL_METHOD_ABORT, 'query_id': query_id,
+                        'message': "実行中のクエリをキャンセルしました"}
+            message = "キャンセル対象のクエリを特定できませんでした"
+        except Exception as e:
+            logger.error(f"中断ステートメントの発行に失敗しました: {session_id}, {e}")
+            message = f"クエリのキャンセルに失敗しました: {e}"
+
+        with self._lock:
+            self._metrics['failed'] += 1
+        if cursor_error is not None:
+            message = f"{message}（cursor.cancel: {cursor_error}）"
+        return {'cancelled': False, 'method': None, 'query_id': entry['query_id'], 'message': message}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """キャンセル統計を取得"""
+        with self._lock:
+            return {**self._metrics, 'active': len(self._active)}
+
+    def _abort_with_statement(self, entry: Dict[str, Any]) -> Optional[str]:
+        """別接続から SYSTEM$CANCEL_QUERY を発行（キャンセルしたクエリIDを返す）"""
+        connection_manager = entry['connection_manager']
+        if connection_manager is None or not hasattr(connection_manager, 'create_dedicated_connection'):
+            return None
+
+        connection = connection_manager.create_dedicated_connection()
+        try:
+            cursor = connection.cursor()
+            query_id = entry['query_id']
+            if not query_id and entry['statement']:
+                query_id = self._find_query_id(cursor, entry)
+            if not query_id or not _QUERY_ID_PATTERN.match(str(query_id)):
+                return None
+            cursor.execute(f"SELECT SYSTEM$CANCEL_QUERY('{query_id}')")
+            cursor.fetchone()
+            return str(query_id)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                logger.debug("中断用接続のクローズで例外を無視")
+
+    @staticmethod
+    def _find_query_id(cursor: Any, entry: Dict[str, Any]) -> Optional[str]:
+        """クエリ履歴から、この実行と同じSQL本文で開始時刻が最も近い実行中のクエリIDを取得
+
+        セッションIDが分かる場合はそのセッションに絞り込み、見つからなければ全体の履歴から探す。
+        """
+        started_at = entry['started_at_utc'].isoformat()
+        conditions: List[Any] = _query_text_candidates(entry['statement'])
+        conditions.extend([_START_TIME_TOLERANCE_SECONDS, started_at, started_at])
+        sources = []
+        if entry['warehouse_session']:
+            sources.append(("QUERY_HISTORY_BY_SESSION(SESSION_ID => ?, RESULT_LIMIT => 1000)",
+                            [entry['warehouse_session']]))
+        sources.append(("QUERY_HISTORY(RESULT_LIMIT => 1000)", []))
+        for source, source_params in sources:
+            cursor.execute(
+                f"SELECT QUERY_ID FROM TABLE(INFORMATION_SCHEMA.{source}) "
+                "WHERE QUERY_TEXT IN (?, ?) "
+                "AND EXECUTION_STATUS IN ('RUNNING', 'QUEUED', 'RESUMING_WAREHOUSE', 'BLOCKED') "
+                "AND START_TIME >= DATEADD('second', -?, TO_TIMESTAMP_TZ(?)) "
+                "ORDER BY ABS(DATEDIFF('millisecond', START_TIME, TO_TIMESTAMP_TZ(?))) LIMIT 1",
+                tuple(source_params + conditions)
+            )
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+        return None
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+実行前コストゲート
+本実行の前に EXPLAIN でスキャン対象のパーティション数・バイト数・推定行数を見積もり、
+設定した閾値に応じて 警告 / 確認要求 / 一括レーンへの振り分け / 拒否 を判定する。
+見積もりは正規化SQLのフィンガープリントごとにキャッシュする（同じSQLの再実行で EXPLAIN を繰り返さない）。
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.logger import get_logger
+from app.services.execution_scheduler import LANE_BULK
+from app.services.result_cache_service import normalize_sql
+from app.utils import calculate_hash
+
+logger = get_logger("QueryCostGate")
+
+POLICY_ALLOW = "allow"
+POLICY_WARN = "warn"
+POLICY_BULK = "bulk"
+POLICY_CONFIRM = "confirm"
+POLICY_REJECT = "reject"
+
+# 複数の閾値を超えた場合は重いほうを採用する
+_POLICY_SEVERITY = {POLICY_ALLOW: 0, POLICY_WARN: 1, POLICY_BULK: 2, POLICY_CONFIRM: 3, POLICY_REJECT: 4}
+
+# EXPLAIN の結果で推定行数を表す列（Snowflake の表形式の EXPLAIN には無いため、ドライバが返す場合のみ使用）
+_ROW_ESTIMATE_COLUMNS = ("estimatedrows", "estimated_rows", "rows", "cardinality")
+
+
+@dataclass
+class QueryCostEstimate:
+    """EXPLAIN による実行コストの見積もり"""
+    partitions_total: Optional[int] = None
+    partitions_assigned: Optional[int] = None
+    bytes_assigned: Optional[int] = None
+    estimated_rows: Optional[int] = None
+    explain_time: float = 0.0
+    cached: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class CostDecision:
+    """コストゲートの判定結果"""
+    policy: str = POLICY_ALLOW
+    estimate: Optional[QueryCostEstimate] = None
+    messages: List[str] = field(default_factory=list)
+
+    @property
+    def lane(self) -> Optional[str]:
+        """振り分け先の実行レーン（振り分けない場合は None）"""
+        return LANE_BULK if self.policy == POLICY_BULK else None
+
+    @property
+    def message(self) -> Optional[str]:
+        return " ".join(self.messages) if self.messages else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'policy': self.policy,
+            'message': self.message,
+            **(self.estimate.to_dict() if self.estimate else {}),
+        }
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_explain_rows(rows: List[Dict[str, Any]]) -> QueryCostEstimate:
+    """EXPLAIN USING TABULAR の結果（列名は小文字）から見積もりを取り出す
+
+    パーティション数・バイト数は operation = 'GlobalStats' の行、推定行数は推定行数の列を持つ最初の行から取得する。
+    """
+    estimate = QueryCostEstimate()
+    for row in rows:
+        if str(row.get('operation') or '').lower() == 'globalstats':
+            estimate.partitions_total = _to_int(row.get('partitionstotal'))
+            estimate.partitions_assigned = _to_int(row.get('partitionsassigned'))
+            estimate.bytes_assigned = _to_int(row.get('bytesassigned'))
+            break
+    for row in rows:
+        for column in _ROW_ESTIMATE_COLUMNS:
+            value = _to_int(row.get(column))
+            if value is not None:
+                estimate.estimated_rows = value
+                return estimate
+    return estimate
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+class QueryCostGate:
+    """EXPLAIN の見積もりによる実行前ゲート
+
+    閾値は 0 で無効。判定は EXPLAIN が返すスキャン量（バイト数）で行い、見積もりが得られた場合は COUNT(*) を省略する。
+    行数の閾値は既存の表示上限（MAX_RECORDS_FOR_DISPLAY → 確認要求）と CSV上限（MAX_RECORDS_FOR_CSV_DOWNLOAD → 拒否）を使い、
+    推定行数を返すドライバの場合のみ適用される。
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, warn_bytes: Optional[int] = None,
+                 confirm_bytes: Optional[int] = None, bulk_bytes: Optional[int] = None,
+                 reject_bytes: Optional[int] = None, confirm_rows: Optional[int] = None,
+                 reject_rows: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None, explain_timeout_seconds: Optional[int] = None):
+        from app.config_simplified import get_settings
+        settings = get_settings()
+        self.enabled = settings.query_cost_gate_enabled if enabled is None else enabled
+        self.warn_bytes = settings.query_cost_warn_bytes if warn_bytes is None else warn_bytes
+        self.confirm_bytes = settings.query_cost_confirm_bytes if confirm_bytes is None else confirm_bytes
+        self.bulk_bytes = settings.query_cost_bulk_bytes if bulk_bytes is None else bulk_bytes
+        self.reject_bytes = settings.query_cost_reject_bytes if reject_bytes is None else reject_bytes
+        self.confirm_rows = settings.max_records_for_display if confirm_rows is None else confirm_rows
+        self.reject_rows = settings.max_records_for_csv_download if reject_rows is None else reject_rows
+        self.ttl_seconds = settings.query_cost_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.query_cost_cache_max_entries if max_entries is None else max_entries
+        self.explain_timeout_seconds = (settings.query_cost_explain_timeout_seconds
+                                        if explain_timeout_seconds is None else explain_timeout_seconds)
+        self._lock = threading.Lock()
+        # フィンガープリント -> (見積もり, 登録時刻)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._metrics = {'explains': 0, 'hits': 0, 'errors': 0, 'warned': 0, 'confirmations': 0,
+                         'routed_bulk': 0, 'rejected': 0}
+
+    @staticmethod
+    def fingerprint(sql: str) -> str:
+        return calculate_hash(normalize_sql(sql))
+
+    def estimate(self, sql: str, query_executor) -> Optional[QueryCostEstimate]:
+        """見積もりを取得（キャッシュになければ EXPLAIN を実行。失敗・タイムアウト時は None）"""
+        fingerprint = self.fingerprint(sql)
+        with self._lock:
+            cached = self._entries.get(fingerprint)
+            if cached and time.time() - cached[1] < self.ttl_seconds:
+                self._entries.move_to_end(fingerprint)
+                self._metrics['hits'] += 1
+                return QueryCostEstimate(**{**cached[0].to_dict(), 'cached': True})
+
+        started = time.time()
+        result = query_executor.execute_explain_plan(sql, self.explain_timeout_seconds)
+        if not result.success:
+            with self._lock:
+                self._metrics['errors'] += 1
+            logger.warning(f"EXPLAINによるコスト見積もりに失敗したため、ゲートを通過させます: {result.error_message}")
+            return None
+        estimate = parse_explain_rows(result.data or [])
+        estimate.explain_time = time.time() - started
+
+        with self._lock:
+            self._metrics['explains'] += 1
+            self._entries[fingerprint] = (estimate, time.time())
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return estimate
+
+    def evaluate(self, sql: str, query_executor, confirmed: bool = False) -> CostDecision:
+        """見積もりを取得してポリシーを判定（confirmed=True の場合は確認要求を省略）"""
+        if not self.enabled:
+            return CostDecision()
+        estimate = self.estimate(sql, query_executor)
+        decision = self.decide(estimate, confirmed)
+        if decision.policy != POLICY_ALLOW:
+            counter = {POLICY_WARN: 'warned', POLICY_CONFIRM: 'confirmations',
+                       POLICY_BULK: 'routed_bulk', POLICY_REJECT: 'rejected'}[decision.policy]
+            with self._lock:
+                self._metrics[counter] += 1
+            logger.info(f"コストゲート判定: {decision.policy}, {decision.message}")
+        return decision
+
+    def decide(self, estimate: Optional[QueryCostEstimate], confirmed: bool = False) -> CostDecision:
+        """見積もりに閾値を当てはめてポリシーを決める"""
+        decision = CostDecision(estimate=estimate)
+        if estimate is None:
+            return decision
+
+        def exceeds(value: Optional[int], threshold: int) -> bool:
+            return bool(threshold) and value is not None and value > threshold
+
+        triggered = []
+        size = estimate.bytes_assigned
+        rows = estimate.estimated_rows
+        if exceeds(size, self.reject_bytes):
+            triggered.append((POLICY_REJECT, f"スキャン量が大きすぎます（推定{_format_bytes(size)}）。条件を絞ってから再実行してください。"))
+        if exceeds(rows, self.reject_rows):
+            triggered.append((POLICY_REJECT, f"データが大きすぎます（推定{rows:,}件）。クエリを制限してから再実行してください。"))
+        if not confirmed:
+            if exceeds(size, self.confirm_bytes):
+                triggered.append((POLICY_CONFIRM, f"スキャン量が大きいクエリです（推定{_format_bytes(size)}）。実行してよいか確認してください。"))
+            if exceeds(rows, self.confirm_rows):
+                triggered.append((POLICY_CONFIRM, f"大容量データです（推定{rows:,}件）。条件を絞れない場合はCSVでダウンロードしてください"))
+        if exceeds(size, self.bulk_bytes):
+            triggered.append((POLICY_BULK, f"スキャン量が大きいため一括処理の実行枠で実行します（推定{_format_bytes(size)}）。"))
+        if exceeds(size, self.warn_bytes):
+            triggered.append((POLICY_WARN, f"スキャン量が大きいクエリです（推定{_format_bytes(size)}）。"))
+
+        if triggered:
+            decision.policy = max((policy for policy, _ in triggered), key=_POLICY_SEVERITY.__getitem__)
+            decision.messages = [message for policy, message in triggered if policy == decision.policy]
+        return decision
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, 'entries': len(self._entries), 'enabled': self.enabled}
@@ -78,6 +78,24 @@ class QueryExecutor:
             if conn_id:
                 self.connection_manager.release_connection(conn_id)
     
+    def execute_query_with_connection(self, connection: pyodbc.Connection, sql: str,
+                                      params: Optional[Any] = None) -> QueryResult:
+        """指定した接続でSQLクエリを実行（並列処理用の専用接続など、プール外の接続向け。接続のクローズは呼び出し側で行う）"""
+        start_time = time.time()
+        try:
+            result = self._execute_query_internal(connection, sql, params)
+            result.execution_time = time.time() - start_time
+            return result
+        except Exception as e:
+            execution_time = time.time() - start_time
+            self.logger.error(f"Snowflakeクエリ実行失敗（専用接続）: {str(e)}", sql=sql)
+            return QueryResult(
+                success=False,
+                error_message=f"クエリ実行エラー: {str(e)}",
+                execution_time=execution_time,
+                sql=sql
+            )
+
     def _execute_query_internal(self, connection: pyodbc.Connection, 
                                sql: str, params: Optional[Dict[str, Any]] = None, 
                                limit: Optional[int] = None) -> QueryResult:
@@ -149,11 +167,30 @@ class QueryExecutor:
             if cursor:
                 cursor.close()
     
-    def execute_explain_plan(self, sql: str) -> QueryResult:
-        """EXPLAIN PLANを実行"""
-        explain_sql = f"EXPLAIN PLAN FOR {sql}"
-        return self.execute_query(explain_sql)
-    
+    def execute_explain_plan(self, sql: str, timeout_seconds: Optional[int] = None) -> QueryResult:
+        """EXPLAIN PLANを実行（Snowflakeの表形式。GlobalStats行にスキャン対象のパーティション数・バイト数が入る）
+
+        プール接続で実行し、timeout_seconds を指定した場合は EXPLAIN の間だけ接続のタイムアウトを差し替えて元に戻す。
+        """
+        explain_sql = f"EXPLAIN USING TABULAR {sql.strip().rstrip(';')}"
+        if not timeout_seconds:
+            return self.execute_query(explain_sql)
+        conn_id = None
+        try:
+            conn_id, connection = self.connection_manager.get_connection()
+            previous_timeout = getattr(connection, 'timeout', 0)
+            connection.timeout = timeout_seconds
+            try:
+                return self.execute_query_with_connection(connection, explain_sql)
+            finally:
+                connection.timeout = previous_timeout
+        except Exception as e:
+            self.logger.error(f"EXPLAIN実行エラー: {str(e)}")
+            return QueryResult(success=False, error_message=f"クエリ実行エラー: {str(e)}", sql=explain_sql)
+        finally:
+            if conn_id:
+                self.connection_manager.release_connection(conn_id)
+
     def execute_metadata_query(self, sql: str) -> QueryResult:
         """メタデータクエリを実行"""
         return self.execute_query(sql)
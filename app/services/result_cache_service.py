@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+結果再利用キャッシュサービス
+正規化したSQLのフィンガープリントをキーに、完了済みセッションの結果を再利用する
+"""
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+import sqlparse
+
+from app.logger import get_logger
+from app.utils import calculate_hash
+
+logger = get_logger("ResultCacheService")
+
+
+def normalize_sql(sql: str) -> str:
+    """SQLを正規化（コメント除去・キーワード大文字化・空白圧縮・末尾セミコロン除去）
+
+    空白の圧縮はトークン単位で行い、文字列リテラルや引用符付き識別子の中の空白はそのまま残す。
+    """
+    if not sql:
+        return ""
+    formatted = sqlparse.format(sql, strip_comments=True, keyword_case='upper')
+    parts = []
+    for statement in sqlparse.parse(formatted):
+        for token in statement.flatten():
+            if token.is_whitespace:
+                if parts and parts[-1] != " ":
+                    parts.append(" ")
+            else:
+                parts.append(token.value)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class ResultCacheService:
+    """正規化SQLフィンガープリントによる結果再利用キャッシュ
+
+    完了済みセッションのセッション専用DBをコピーして新セッションへ払い出す（copy-on-read）。
+    元セッションが削除されていれば自動的にミス扱いとなる。
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, enabled: Optional[bool] = None,
+                 max_entries: Optional[int] = None):
+        if ttl_seconds is None or enabled is None or max_entries is None:
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            ttl_seconds = settings.result_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+            enabled = settings.result_cache_enabled if enabled is None else enabled
+            max_entries = settings.result_cache_max_entries if max_entries is None else max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # フィンガープリント -> エントリ
+        self._metrics = {'hits': 0, 'misses': 0, 'bypasses': 0, 'stores': 0, 'evictions': 0}
+
+    def fingerprint(self, sql: str, scope: Optional[str] = None, limit: Optional[int] = None) -> str:
+        """正規化SQL・可視性スコープ（ロール）・取得上限からフィンガープリントを生成"""
+        key = f"{scope or 'DEFAULT'}|{limit or 0}|{normalize_sql(sql)}"
+        return calculate_hash(key)
+
+    def lookup(self, fingerprint: str, bypass: bool = False) -> Optional[Dict[str, Any]]:
+        """再利用可能なエントリを取得（TTL切れ・元DB消失時はNone）"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if bypass:
+                self._metrics['bypasses'] += 1
+                return None
+            entry = self._entries.get(fingerprint)
+            if entry and not self._is_entry_alive(entry):
+                self._entries.pop(fingerprint, None)
+                entry = None
+            if entry is None:
+                self._metrics['misses'] += 1
+                return None
+            self._metrics['hits'] += 1
+            entry['hit_count'] += 1
+            return entry.copy()
+
+    def store(self, fingerprint: str, session_id: str, db_path: str, total_count: int,
+              processed_rows: int, execution_time: float) -> None:
+        """完了済みセッションを再利用元として登録"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if fingerprint not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict_oldest()
+            self._entries[fingerprint] = {
+                'fingerprint': fingerprint,
+                'session_id': session_id,
+                'db_path': db_path,
+                'total_count': total_count,
+                'processed_rows': processed_rows,
+                'execution_time': execution_time,
+                'stored_at': time.time(),
+                'hit_count': 0,
+            }
+            self._metrics['stores'] += 1
+
+    def invalidate_session(self, session_id: str) -> None:
+        """指定セッションを再利用元とするエントリを削除"""
+        with self._lock:
+            for fp in [fp for fp, e in self._entries.items() if e['session_id'] == session_id]:
+                self._entries.pop(fp, None)
+
+    def clear(self) -> None:
+        """全エントリを削除"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """ヒット/ミス等のメトリクスを取得"""
+        with self._lock:
+            lookups = self._metrics['hits'] + self._metrics['misses']
+            return {
+                **self._metrics,
+                'entries': len(self._entries),
+                'hit_ratio': round(self._metrics['hits'] / lookups, 4) if lookups else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+                'enabled': self.enabled,
+            }
+
+    def _is_entry_alive(self, entry: Dict[str, Any]) -> bool:
+        """TTL内かつ元セッションDBが存在するか"""
+        if time.time() - entry['stored_at'] > self.ttl_seconds:
+            return False
+        return os.path.exists(entry['db_path'])
+
+    def _evict_oldest(self) -> None:
+        """最も古いエントリを追い出す（ロック取得済みで呼び出すこと）"""
+        oldest = min(self._entries.values(), key=lambda e: e['stored_at'])
+        self._entries.pop(oldest['fingerprint'], None)
+        self._metrics['evictions'] += 1
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完用の文脈解析
+エディタセッションごとにトークン列と FROM/JOIN のエイリアス表をキャッシュし、
+編集された範囲だけを再字句解析してカーソル位置の文脈（テーブル候補か、カラム候補か）を判断する
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+# 空白以外を1トークンずつ切り出す軽量レキサー（閉じていないコメント・文字列は末尾までを1トークンとする）
+_TOKEN_RE = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^']|'')*(?:'|\Z))
+  | (?P<quoted>"(?:[^"]|"")*(?:"|\Z))
+  | (?P<word>[^\W\d][\w$]*)
+  | (?P<number>\d+(?:\.\d*)?)
+  | (?P<punct>\S)
+""", re.DOTALL | re.VERBOSE)
+
+# 直前にあればテーブル候補を出すキーワード
+TABLE_CONTEXT_KEYWORDS = frozenset({"FROM", "JOIN"})
+
+# 文脈判定に使う予約語（これ以外の単語は識別子として扱う）
+SQL_KEYWORDS = frozenset({
+    "SELECT", "FROM", "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL",
+    "ON", "USING", "GROUP", "ORDER", "BY", "HAVING", "QUALIFY", "LIMIT", "OFFSET", "FETCH", "TOP",
+    "UNION", "ALL", "EXCEPT", "INTERSECT", "MINUS", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL",
+    "LIKE", "ILIKE", "BETWEEN", "EXISTS", "CASE", "WHEN", "THEN", "ELSE", "END", "DISTINCT", "WITH",
+    "INSERT", "INTO", "VALUES", "UPDATE", "SET", "DELETE", "MERGE", "OVER", "PARTITION", "WINDOW",
+    "ASC", "DESC", "LATERAL", "PIVOT", "UNPIVOT", "SAMPLE",
+})
+
+
+class Token(NamedTuple):
+    start: int
+    end: int
+    kind: str
+    # 単語は大文字、引用符付き識別子は引用符を外した値
+    value: str
+
+
+class SqlDocument:
+    """ある版の SQL テキストと、その字句解析結果・エイリアス表"""
+
+    __slots__ = ("version", "text", "tokens", "starts", "ends", "tables", "aliases")
+
+    def __init__(self, version: Optional[Hashable], text: str, tokens: List[Token]):
+        self.version = version
+        self.text = text
+        self.tokens = tokens
+        self.starts = [token.start for token in tokens]
+        self.ends = [token.end for token in tokens]
+        self.tables, self.aliases = collect_table_references(tokens)
+
+
+def tokenize(text: str, start: int = 0) -> List[Token]:
+    """text を start 位置から最後まで字句解析する"""
+    return list(_iter_tokens(text, start))
+
+
+def _iter_tokens(text: str, start: int):
+    for match in _TOKEN_RE.finditer(text, start):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "word":
+            value = value.upper()
+        elif kind == "quoted":
+            value = value[1:-1] if len(value) > 1 and value.endswith('"') else value[1:]
+            value = value.replace('""', '"')
+        yield Token(match.start(), match.end(), kind, value)
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """二分探索で共通接頭辞の長さを求める（スライス比較はC実装のため文字単位のループより速い）"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def relex(previous: SqlDocument, text: str) -> List[Token]:
+    """前の版のトークン列を再利用し、編集範囲だけを字句解析し直す
+
+    編集位置にかかるトークンの先頭から解析を再開し、編集範囲より後ろで
+    前の版と同じトークン境界に戻った時点で残りを前の版からずらして流用する。
+    """
+    old_text = previous.text
+    prefix = _common_prefix_length(old_text, text)
+    suffix = _common_suffix_length(old_text, text, min(len(old_text), len(text)) - prefix)
+    delta = len(text) - len(old_text)
+    edit_end = len(text) - suffix
+
+    # 編集開始位置で終わるトークンも、挿入文字と連結する可能性があるため解析し直す
+    first = bisect_left(previous.ends, prefix)
+    restart = min(previous.starts[first], prefix) if first < len(previous.tokens) else prefix
+    tokens = previous.tokens[:first]
+    old_tokens = previous.tokens
+    old_starts = previous.starts
+    for token in _iter_tokens(text, restart):
+        if token.start >= edit_end:
+            j = bisect_left(old_starts, token.start - delta)
+            if j < len(old_tokens):
+                old = old_tokens[j]
+                if old.start + delta == token.start and old.end + delta == token.end and old.kind == token.kind:
+                    if delta:
+                        tokens.extend(Token(t.start + delta, t.end + delta, t.kind, t.value) for t in old_tokens[j:])
+                    else:
+                        tokens.extend(old_tokens[j:])
+                    return tokens
+        tokens.append(token)
+    return tokens
+
+
+def _is_name(token: Token) -> bool:
+    return token.kind == "quoted" or (token.kind == "word" and token.value not in SQL_KEYWORDS)
+
+
+def collect_table_references(tokens: List[Token]) -> Tuple[List[str], Dict[str, str]]:
+    """FROM / JOIN 句のテーブル参照を集め、(出現順のテーブル名, 大文字エイリアス → テーブル名) を返す
+
+    スキーマ修飾（SCHEMA.TABLE）はテーブル名部分を使う。サブクエリ内の FROM / JOIN も対象にする。
+    """
+    tables: Dict[str, None] = {}
+    aliases: Dict[str, str] = {}
+    count = len(tokens)
+    i = 0
+    while i < count:
+        token = tokens[i]
+        i += 1
+        if token.kind != "word" or token.value not in TABLE_CONTEXT_KEYWORDS:
+            continue
+        in_from_list = token.value == "FROM"
+        while i < count and _is_name(tokens[i]):
+            # SCHEMA.TABLE / DB.SCHEMA.TABLE
+            name_token = tokens[i]
+            i += 1
+            while i + 1 < count and tokens[i].value == "." and _is_name(tokens[i + 1]):
+                name_token = tokens[i + 1]
+                i += 2
+            table_name = name_token.value
+            tables.setdefault(table_name, None)
+            aliases[table_name.upper()] = table_name
+            if i < count and tokens[i].kind == "word" and tokens[i].value == "AS":
+                i += 1
+            if i < count and _is_name(tokens[i]):
+                aliases[tokens[i].value.upper()] = table_name
+                i += 1
+            # FROM a x, b y のようなカンマ区切りのテーブル列挙
+            if in_from_list and i < count and tokens[i].value == ",":
+                i += 1
+                continue
+            break
+    return list(tables), aliases
+
+
+class SqlContextAnalyzer:
+    """エディタセッションごとの文脈解析（最近使われたセッションから max_sessions 件を保持）"""
+
+    def __init__(self, max_sessions: int = 256):
+        self.max_sessions = max_sessions
+        self._documents: "OrderedDict[Hashable, SqlDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def document(self, sql: str, session_id: Optional[Hashable] = None,
+                 version: Optional[Hashable] = None) -> SqlDocument:
+        """SQL の解析結果を返す（同じセッションの前の版があれば差分だけを解析する）"""
+        if session_id is None:
+            return SqlDocument(version, sql, tokenize(sql))
+        with self._lock:
+            previous = self._documents.get(session_id)
+            if previous is not None:
+                self._documents.move_to_end(session_id)
+        if previous is not None and previous.text == sql:
+            return previous
+        tokens = relex(previous, sql) if previous is not None else tokenize(sql)
+        document = SqlDocument(version, sql, tokens)
+        with self._lock:
+            self._documents[session_id] = document
+            self._documents.move_to_end(session_id)
+            while len(self._documents) > self.max_sessions:
+                self._documents.popitem(last=False)
+        return document
+
+    def analyze(self, sql: str, position: int, session_id: Optional[Hashable] = None,
+                version: Optional[Hashable] = None) -> Tuple[str, List[str]]:
+        """カーソル位置の文脈を (文脈種別, 候補テーブル名) で返す
+
+        文脈種別: 'TABLE'（FROM/JOIN の後）、'COLUMN_SPECIFIC'（"別名." の直後）、'COLUMN'（それ以外）
+        """
+        document = self.document(sql, session_id, version)
+        position = max(0, min(position, len(sql)))
+        tokens = document.tokens
+        # カーソル位置より前で終わるトークン（入力中の単語はカーソル位置で終わる）
+        index = bisect_right(document.ends, position)
+
+        if position > 0 and sql[position - 1] == '.':
+            # ドット直前の単語（テーブル名/エイリアス）を取得し、実際のテーブル名を解決
+            dot = index - 1
+            if dot >= 1 and tokens[dot].value == "." and tokens[dot - 1].end == tokens[dot].start \
+                    and tokens[dot - 1].kind in ("word", "quoted"):
+                name = tokens[dot - 1]
+                alias = name.value if name.kind == "quoted" else sql[name.start:name.end]
+                return 'COLUMN_SPECIFIC', [document.aliases.get(alias.upper(), alias)]
+
+        # 入力中の単語を除き、カーソルより前の直近のキーワードで判断
+        if index > 0 and tokens[index - 1].end == position and tokens[index - 1].kind == "word":
+            index -= 1
+        for k in range(index - 1, -1, -1):
+            token = tokens[k]
+            if token.kind == "word" and token.value in SQL_KEYWORDS:
+                if token.value in TABLE_CONTEXT_KEYWORDS:
+                    return 'TABLE', list(document.tables)
+                break
+        return 'COLUMN', list(document.tables)
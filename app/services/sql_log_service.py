@@ -1,55 +1,68 @@
 # app/services/sql_log_service.py
 
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from app.logger import get_logger
 from app.services.query_executor import QueryExecutor
-from app.services.log_handlers import OracleLogHandler, SqliteLogHandler, SnowflakeLogHandler
+from app.services.log_handlers import BaseLogHandler, OracleLogHandler, SqliteLogHandler, SnowflakeLogHandler, SQLLogRecord
+from app.services.sql_log_writer import SQLLogWriter
+from app.services.log_analytics_service import LogAnalyticsService
 from app.config_simplified import get_settings
 from app import __version__
 
 logger = get_logger("SQLLogService")
 
+def create_log_handler(query_executor: QueryExecutor, log_storage_type: str) -> BaseLogHandler:
+    """ログストレージの種類に応じたログハンドラを作成"""
+    settings = get_settings()
+    if log_storage_type == "oracle":
+        logger.info("Oracleログハンドラを初期化します")
+        return OracleLogHandler(query_executor)
+    if log_storage_type == "sqlite":
+        logger.info("SQLiteログハンドラを初期化します")
+        logger.info(f"SQLite ログDBパス: {settings.sqlite_db_path}")
+        return SqliteLogHandler(settings.sqlite_db_path)
+    if log_storage_type == "snowflake":
+        logger.info("Snowflakeログハンドラを初期化します")
+        # Snowflake用のQueryExecutorを作成
+        from app.services.connection_manager_snowflake_log import ConnectionManagerSnowflakeLog
+        snowflake_log_connection_manager = ConnectionManagerSnowflakeLog()
+        snowflake_log_query_executor = QueryExecutor(snowflake_log_connection_manager)
+        return SnowflakeLogHandler(snowflake_log_query_executor)
+    raise ValueError(f"サポートされていないログストレージタイプ: {log_storage_type}")
+
+
 class SQLLogService:
-    def __init__(self, query_executor: QueryExecutor, log_storage_type: str = "oracle"):
+    def __init__(self, query_executor: QueryExecutor, log_storage_type: str = "oracle",
+                 log_writer: Optional[SQLLogWriter] = None, log_analytics: Optional[LogAnalyticsService] = None):
         self.query_executor = query_executor
         self.log_storage_type = log_storage_type
         self.settings = get_settings()
         self.logger = get_logger(__name__)
+        # 非同期一括書き込み（任意。未設定時はリクエスト処理中に直接書き込む）
+        self.log_writer = log_writer
+        # ログ分析のロールアップ（任意。書き込みワーカーがある場合はワーカーが書き込み後に更新する）
+        self.log_analytics = log_analytics
         
         self.logger.info(f"SQLLogService初期化: log_storage_type={log_storage_type}")
         
         # ログハンドラの初期化
-        if log_storage_type == "oracle":
-            self.logger.info("Oracleログハンドラを初期化します")
-            self.log_handler = OracleLogHandler(query_executor)
-        elif log_storage_type == "sqlite":
-            self.logger.info("SQLiteログハンドラを初期化します")
-            # SQLite用のQueryExecutorを作成
-            from app.services.connection_manager_sqlite import ConnectionManagerSQLite
-            sqlite_connection_manager = ConnectionManagerSQLite()
-            sqlite_query_executor = QueryExecutor(sqlite_connection_manager)
-            self.logger.info(f"SQLite ログDBパス: {self.settings.sqlite_db_path}")
-            self.log_handler = SqliteLogHandler(self.settings.sqlite_db_path)
-        elif log_storage_type == "snowflake":
-            self.logger.info("Snowflakeログハンドラを初期化します")
-            # Snowflake用のQueryExecutorを作成
-            from app.services.connection_manager_snowflake_log import ConnectionManagerSnowflakeLog
-            snowflake_log_connection_manager = ConnectionManagerSnowflakeLog()
-            snowflake_log_query_executor = QueryExecutor(snowflake_log_connection_manager)
-            self.log_handler = SnowflakeLogHandler(snowflake_log_query_executor)
-        else:
-            raise ValueError(f"サポートされていないログストレージタイプ: {log_storage_type}")
+        self.log_handler = create_log_handler(query_executor, log_storage_type)
         
         self.logger.info(f"ログハンドラ初期化完了: {type(self.log_handler).__name__}")
 
     def add_log_to_db(self, user_id: str, sql: str, execution_time: float, start_time: datetime, row_count: int, success: bool, error_message: Optional[str]):
-        """ログハンドラを使用してログを追加"""
+        """ログを追加（書き込みワーカーがあればキューに積むだけで、ログストアへの書き込みは待たない）"""
         try:
+            if self.log_writer:
+                self.log_writer.submit(SQLLogRecord(user_id, sql, execution_time, start_time, row_count, success, error_message))
+                return
             self.logger.info(f"ログ記録を開始: storage_type={self.log_storage_type}, user_id={user_id}")
             self.log_handler.add_log(user_id, sql, execution_time, start_time, row_count, success, error_message)
             self.logger.info(f"ログ記録が完了しました: storage_type={self.log_storage_type}")
+            if self.log_analytics:
+                self.log_analytics.record_logs([SQLLogRecord(user_id, sql, execution_time, start_time, row_count, success, error_message)])
         except Exception as e:
             self.logger.error(f"{self.log_storage_type}へのログ記録中に予期せぬエラーが発生しました: {e}", exc_info=True)
 
@@ -59,4 +72,52 @@ class SQLLogService:
             return self.log_handler.get_logs(user_id, limit, offset)
         except Exception as e:
             self.logger.error(f"{self.log_storage_type}からのログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
-            return {"logs": [], "total_count": 0}
\ No newline at end of file
+            return {"logs": [], "total_count": 0}
+
+    def get_history(self, user_id: Optional[str] = None, limit: Optional[int] = None,
+                    cursor: Optional[str] = None, days: Optional[int] = None) -> Dict[str, Any]:
+        """直近 days 日（既定は history_retention_days）のSQL実行履歴を新しい順に取得
+
+        期間とユーザーの絞り込みはログストア側で行い、続きは戻り値の next_cursor を渡して取得する。
+        """
+        limit = min(limit or self.settings.max_history_logs, self.settings.max_history_logs)
+        days = self.settings.history_retention_days if days is None else days
+        since = datetime.now() - timedelta(days=days)
+        try:
+            return self.log_handler.get_history(user_id, since, limit, cursor)
+        except Exception as e:
+            self.logger.error(f"{self.log_storage_type}からの履歴取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
+            return {"logs": [], "next_cursor": None}
+
+    def iter_logs(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """期間内のログを新しい順に1件ずつ返す（ログストアから page_size 件ずつ keyset で読み進める）
+
+        エクスポートのストリーミング用。途中で取得に失敗した場合はエラーを記録して例外をそのまま送出する
+        （途中までの出力が完全なエクスポートに見えないよう、呼び出し側のストリームごと中断させる）。
+        """
+        page_size = page_size or self.settings.max_history_logs
+        cursor = None
+        while True:
+            try:
+                page = self.log_handler.get_history(user_id, since, page_size, cursor, until=until)
+            except Exception as e:
+                self.logger.error(f"{self.log_storage_type}からのログ読み出し中にエラーが発生したため中断します: {e}", exc_info=True)
+                raise
+            yield from page.get("logs", [])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    def get_logs_after(self, cursor: Optional[str] = None,
+                       limit: int = 1000) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """cursor 以降に追加されたログを古い順に取得し、(ログ, 次回の cursor) を返す
+
+        cursor はログストアごとの keyset（SQLiteは rowid、その他は実行日時と同日時内の一意キー）。
+        """
+        try:
+            logs = self.log_handler.get_logs_after(cursor, limit)
+            return logs, (logs[-1]["cursor"] if logs else cursor)
+        except Exception as e:
+            self.logger.error(f"{self.log_storage_type}からの差分ログ取得中に予期せぬエラーが発生しました: {e}", exc_info=True)
+            return [], cursor
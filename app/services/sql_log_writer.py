@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行ログの非同期一括書き込み
+リクエスト処理ではログを上限付きキューに積むだけにし、バックグラウンドのワーカースレッドが
+件数または経過時間でまとめてログストアへ書き込む（失敗時は間隔を延ばしながら再試行）。
+終了時（lifespan）にはキューに残ったログを書き切ってから停止する。
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logger import get_logger
+from app.services.log_handlers.base import BaseLogHandler, SQLLogRecord
+
+logger = get_logger("SQLLogWriter")
+
+_STOP = object()
+
+
+class SQLLogWriter:
+    """上限付きキューとワーカースレッドによるSQL実行ログの一括書き込み
+
+    キューが満杯の場合はログを捨てずに呼び出し元のスレッドで直接書き込む（過負荷時のみ遅延が戻る）。
+    """
+
+    def __init__(self, handler: BaseLogHandler, max_queue_size: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 max_retries: Optional[int] = None, retry_backoff: Optional[float] = None):
+        from app.config_simplified import get_settings
+        settings = get_settings()
+        self.handler = handler
+        self.batch_size = settings.sql_log_batch_size if batch_size is None else batch_size
+        self.flush_interval = settings.sql_log_flush_interval_seconds if flush_interval is None else flush_interval
+        self.max_retries = settings.sql_log_max_retries if max_retries is None else max_retries
+        self.retry_backoff = settings.sql_log_retry_backoff_seconds if retry_backoff is None else retry_backoff
+        max_queue_size = settings.sql_log_queue_size if max_queue_size is None else max_queue_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._listeners: List[Callable[[List[SQLLogRecord]], Any]] = []
+        self._metrics = {'enqueued': 0, 'written': 0, 'batches': 0, 'retries': 0, 'dropped': 0,
+                         'written_inline': 0}
+
+    def add_listener(self, listener: Callable[[List[SQLLogRecord]], Any]) -> None:
+        """書き込みに成功したバッチを受け取るリスナーを登録（ログ分析のロールアップ更新など）"""
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """ワーカースレッドを開始（起動済みなら何もしない）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="sql-log-writer", daemon=True)
+            self._thread.start()
+        logger.info(f"SQL実行ログの書き込みワーカーを開始しました（{self.batch_size}件 / {self.flush_interval}秒ごと）")
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """キューに残ったログを書き込んでからワーカーを停止（timeout 内に書き切れたら True）"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._closed = True
+        if not thread:
+            return True
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"SQL実行ログの書き込みが終了時間内に完了しませんでした（残り約{self._queue.qsize()}件）")
+            return False
+        logger.info("SQL実行ログの書き込みワーカーを停止しました")
+        return True
+
+    def submit(self, record: SQLLogRecord) -> None:
+        """ログをキューに積む（ワーカー未起動なら起動し、停止後は呼び出し元で直接書き込む）"""
+        if self._closed:
+            self._write_inline(record)
+            return
+        if not self._thread:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logger.warning("SQL実行ログのキューが満杯のため、呼び出し元で直接書き込みます")
+            self._write_inline(record)
+            return
+        with self._lock:
+            self._metrics['enqueued'] += 1
+
+    def _write_inline(self, record: SQLLogRecord) -> None:
+        if self._write_batch([record]):
+            with self._lock:
+                self._metrics['written_inline'] += 1
+
+    def flush(self) -> None:
+        """キューに積まれたログがすべて書き込まれる（または破棄される）まで待つ"""
+        self._queue.join()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, 'queued': self._queue.qsize(), 'running': bool(self._thread)}
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                self._drain()
+                return
+            batch = [item]
+            stop_requested = self._collect(batch)
+            self._finish(batch)
+            if stop_requested:
+                self._drain()
+                return
+
+    def _collect(self, batch: List[SQLLogRecord]) -> bool:
+        """件数上限か最初のログから flush_interval 経過までログを集める（停止要求を受けたら True）"""
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+                return True
+            batch.append(item)
+        return False
+
+    def _drain(self) -> None:
+        """停止時にキューに残ったログを書き込む"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._finish(batch)
+                batch = []
+        if batch:
+            self._finish(batch)
+
+    def _finish(self, batch: List[SQLLogRecord]) -> None:
+        try:
+            self._write_batch(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[SQLLogRecord]) -> bool:
+        """再試行付きで一括書き込み（再試行しても失敗したら破棄して False）"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.handler.write_logs(batch)
+                with self._lock:
+                    self._metrics['written'] += len(batch)
+                    self._metrics['batches'] += 1
+                self._notify(batch)
+                return True
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"SQL実行ログの書き込みに失敗したため{len(batch)}件を破棄します: {e}", exc_info=True)
+                    with self._lock:
+                        self._metrics['dropped'] += len(batch)
+                    return False
+                wait = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"SQL実行ログの書き込みに失敗しました。{wait:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）: {e}")
+                with self._lock:
+                    self._metrics['retries'] += 1
+                time.sleep(wait)
+        return False
+
+    def _notify(self, batch: List[SQLLogRecord]) -> None:
+        """リスナーに書き込み済みのバッチを渡す（リスナーの失敗は書き込み結果に影響させない）"""
+        for listener in self._listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.error(f"SQL実行ログのリスナーでエラーが発生しました: {e}", exc_info=True)
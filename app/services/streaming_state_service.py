@@ -13,10 +13,13 @@ logger = get_logger("StreamingStateService")
 
 class StreamingStateService:
     """ストリーミング状態管理サービス"""
+
+    FINISHED_STATUSES = ('completed', 'error', 'cancelled')
     
     def __init__(self):
         self._states = {}  # session_id -> state_info
         self._callbacks = {}  # session_id -> callback_functions
+        self._completion_hooks = {}  # session_id -> [hook]（完了・エラー・キャンセル時に一度だけ呼ぶ）
         self._lock = Lock()
     
     def create_streaming_state(self, session_id: str, total_count: int = 0) -> Dict[str, Any]:
@@ -66,14 +69,17 @@ class StreamingStateService:
                 state['last_update'] = datetime.now()
                 logger.info(f"処理段階更新: {session_id}, phase: {phase}")
     
-    def complete_streaming(self, session_id: str, final_count: int):
+    def complete_streaming(self, session_id: str, final_count: int, execution_time: Optional[float] = None):
         """ストリーミング完了"""
+        hooks, snapshot = [], None
         with self._lock:
             if session_id in self._states:
                 state = self._states[session_id]
                 state['status'] = 'completed'
                 state['processed_count'] = final_count
                 state['last_update'] = datetime.now()
+                self._mark_finished(state, execution_time)
+                hooks, snapshot = self._completion_hooks.pop(session_id, []), state.copy()
                 
                 # コールバックを実行
                 if session_id in self._callbacks:
@@ -84,15 +90,19 @@ class StreamingStateService:
                         logger.error(f"コールバック実行エラー: {e}")
                 
                 logger.info(f"ストリーミング完了: {session_id}, 最終件数: {final_count}")
+        self._run_completion_hooks(session_id, hooks, snapshot)
     
     def error_streaming(self, session_id: str, error_message: str):
         """ストリーミングエラー"""
+        hooks, snapshot = [], None
         with self._lock:
             if session_id in self._states:
                 state = self._states[session_id]
                 state['status'] = 'error'
                 state['error_message'] = error_message
                 state['last_update'] = datetime.now()
+                self._mark_finished(state)
+                hooks, snapshot = self._completion_hooks.pop(session_id, []), state.copy()
                 
                 # コールバックを実行
                 if session_id in self._callbacks:
@@ -103,33 +113,36 @@ class StreamingStateService:
                         logger.error(f"コールバック実行エラー: {e}")
                 
                 logger.error(f"ストリーミングエラー: {session_id}, エラー: {error_message}")
+        self._run_completion_hooks(session_id, hooks, snapshot)
     
     def cancel_streaming(self, session_id: str) -> bool:
         """ストリーミングをキャンセル"""
+        hooks, snapshot = [], None
         with self._lock:
-            if session_id in self._states:
-                state = self._states[session_id]
-                if state['status'] == 'running':
-                    state['status'] = 'cancelled'
-                    state['is_cancelled'] = True
-                    state['last_update'] = datetime.now()
-                    
-                    # コールバックを実行
-                    if session_id in self._callbacks:
-                        try:
-                            callback = self._callbacks[session_id]
-                            asyncio.create_task(callback(state.copy()))
-                        except Exception as e:
-                            logger.error(f"コールバック実行エラー: {e}")
-                    
-                    logger.info(f"ストリーミングキャンセル: {session_id}")
-                    return True
-                else:
-                    logger.warning(f"ストリーミングは既に完了済み: {session_id}")
-                    return False
-            else:
+            if session_id not in self._states:
                 logger.warning(f"セッションが見つかりません: {session_id}")
                 return False
+            state = self._states[session_id]
+            if state['status'] != 'running':
+                logger.warning(f"ストリーミングは既に完了済み: {session_id}")
+                return False
+            state['status'] = 'cancelled'
+            state['is_cancelled'] = True
+            state['last_update'] = datetime.now()
+            self._mark_finished(state)
+
+            # コールバックを実行
+            if session_id in self._callbacks:
+                try:
+                    callback = self._callbacks[session_id]
+                    asyncio.create_task(callback(state.copy()))
+                except Exception as e:
+                    logger.error(f"コールバック実行エラー: {e}")
+
+            logger.info(f"ストリーミングキャンセル: {session_id}")
+            hooks, snapshot = self._completion_hooks.pop(session_id, []), state.copy()
+        self._run_completion_hooks(session_id, hooks, snapshot)
+        return True
     
     def get_state(self, session_id: str) -> Optional[Dict[str, Any]]:
         """状態を取得"""
@@ -151,6 +164,36 @@ class StreamingStateService:
             self._callbacks[session_id] = callback
             logger.debug(f"コールバック登録: {session_id}")
     
+    def add_completion_hook(self, session_id: str, hook: Callable[[Dict[str, Any]], None]):
+        """完了・エラー・キャンセル時に一度だけ呼ばれるフックを登録
+
+        フックは状態を確定させたスレッド（バックグラウンド実行やキャンセル要求）から同期的に呼ばれ、
+        最終状態（status, processed_count, execution_time, error_message など）のコピーを受け取る。
+        登録時点で既に終了していれば、その場で呼び出す。
+        """
+        with self._lock:
+            state = self._states.get(session_id)
+            if not state or state['status'] not in self.FINISHED_STATUSES:
+                self._completion_hooks.setdefault(session_id, []).append(hook)
+                return
+            snapshot = state.copy()
+        self._run_completion_hooks(session_id, [hook], snapshot)
+
+    def _mark_finished(self, state: Dict[str, Any], execution_time: Optional[float] = None):
+        """終了時刻と実行時間を記録（ロック内で呼ぶ）"""
+        state['end_time'] = state['last_update']
+        if execution_time is None:
+            execution_time = (state['end_time'] - state['start_time']).total_seconds()
+        state['execution_time'] = execution_time
+
+    def _run_completion_hooks(self, session_id: str, hooks, snapshot: Optional[Dict[str, Any]]):
+        """完了フックを実行（ロック外で呼ぶ。フックの例外は他のフックに影響させない）"""
+        for hook in hooks:
+            try:
+                hook(snapshot.copy())
+            except Exception as e:
+                logger.error(f"完了フック実行エラー: {session_id}, {e}", exc_info=True)
+
     def unregister_callback(self, session_id: str):
         """コールバック関数を削除"""
         with self._lock:
@@ -165,6 +208,7 @@ class StreamingStateService:
                 del self._states[session_id]
             if session_id in self._callbacks:
                 del self._callbacks[session_id]
+            self._completion_hooks.pop(session_id, None)
             logger.info(f"ストリーミング状態クリーンアップ: {session_id}")
     
     def get_all_states(self) -> Dict[str, Dict[str, Any]]:
@@ -209,5 +253,6 @@ class StreamingStateService:
                     del self._states[session_id]
                 if session_id in self._callbacks:
                     del self._callbacks[session_id]
+                self._completion_hooks.pop(session_id, None)
         
         logger.info(f"ユーザー状態クリーンアップ完了: {user_id}, {len(sessions_to_cleanup)}件")
\ No newline at end of file
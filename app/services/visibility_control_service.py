@@ -1,11 +1,20 @@
 import sqlite3
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Set, Union
 from app.metadata_cache import MetadataCache
 from app.logger import get_logger
+from app.services.metadata_snapshot import MetadataSnapshot
 
 class VisibilityControlService:
-    def __init__(self, metadata_cache: MetadataCache):
+    # コンパイル済み表示制御モデル（キャッシュDBごとにプロセス内で共有）
+    _models: Dict[str, "VisibilityModel"] = {}
+    _models_lock = threading.Lock()
+    _model_generation = 0
+
+    def __init__(self, metadata_cache: MetadataCache, result_cache_service: Optional[Any] = None):
         self.cache = metadata_cache
+        # 結果再利用キャッシュ（任意）。キャッシュキーのスコープはロール名のみのため、表示設定の変更時に破棄する
+        self.result_cache_service = result_cache_service
         self.logger = get_logger(__name__)
 
     def _get_conn(self):
@@ -13,21 +22,24 @@ class VisibilityControlService:
 
     def get_all_settings(self) -> Dict[str, Dict[str, bool]]:
         """管理者UI用に全ての表示設定を取得します。"""
-        settings = {}
         try:
-            with self._get_conn() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("SELECT object_name, role_name, is_visible FROM visibility_settings")
-                for row in cursor.fetchall():
-                    if row['object_name'] not in settings:
-                        settings[row['object_name']] = {}
-                    settings[row['object_name']][row['role_name']] = bool(row['is_visible'])
-            return settings
+            return self._load_settings()
         except Exception as e:
             self.logger.error("表示設定の取得エラー", exception=e)
             return {}
 
+    def _load_settings(self) -> Dict[str, Dict[str, bool]]:
+        settings = {}
+        with self._get_conn() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT object_name, role_name, is_visible FROM visibility_settings")
+            for row in cursor.fetchall():
+                if row['object_name'] not in settings:
+                    settings[row['object_name']] = {}
+                settings[row['object_name']][row['role_name']] = bool(row['is_visible'])
+        return settings
+
     def save_settings(self, settings_list: List[Any]):
         """管理者UIからの設定を保存します。"""
         try:
@@ -47,49 +59,106 @@ class VisibilityControlService:
                     data_to_save.append((object_type, object_name, role_name, is_visible))
                 cursor.executemany(sql, data_to_save)
                 conn.commit()
+            self.invalidate_model()
+            if self.result_cache_service:
+                self.result_cache_service.clear()
             self.logger.info(f"表示設定を {len(data_to_save)} 件保存しました。")
         except Exception as e:
             self.logger.error("表示設定の保存エラー", exception=e)
             raise
 
-    def filter_metadata(self, metadata: List[Dict[str, Any]], role: str) -> List[Dict[str, Any]]:
-        """ユーザーのロールに基づいてメタデータをフィルタリングします。"""
-        settings = self.get_all_settings()
-        self.logger.info(f"[DEBUG] filter_metadata: role={role}")
-        self.logger.info(f"[DEBUG] settings.keys={list(settings.keys())}")
-        if not settings:
-            self.logger.info("[DEBUG] settings is empty, returning all metadata")
-            return metadata
+    def get_visibility_model(self) -> "VisibilityModel":
+        """コンパイル済みの表示制御モデルを取得（表示設定の保存時のみ再構築）"""
+        key = str(self.cache.db_path)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                try:
+                    settings = self._load_settings()
+                except Exception as e:
+                    # 読み込みに失敗した場合はキャッシュせず、次回のリクエストで再試行する
+                    self.logger.error("表示設定の取得エラー", exception=e)
+                    return VisibilityModel({}, 0)
+                VisibilityControlService._model_generation += 1
+                model = VisibilityModel(settings, VisibilityControlService._model_generation)
+                self._models[key] = model
+                self.logger.info("表示制御モデルをコンパイルしました",
+                                 version=model.version, object_count=model.object_count)
+            return model
+
+    def invalidate_model(self) -> None:
+        """表示制御モデルを破棄（次回参照時に再構築）"""
+        with self._models_lock:
+            self._models.pop(str(self.cache.db_path), None)
+
+    def filter_metadata(self, metadata: Union[MetadataSnapshot, List[Dict[str, Any]]], role: str) -> List[Dict[str, Any]]:
+        """ユーザーのロールに基づいてメタデータをフィルタリングします。
+
+        スナップショットを渡した場合、フィルタ結果をロールごとにスナップショットへ保持し、
+        メタデータのバージョンと表示設定が変わらない限り再計算しません。
+        """
+        model = self.get_visibility_model()
+        if not isinstance(metadata, MetadataSnapshot):
+            return model.apply(metadata, role)
+
+        def build(snapshot: MetadataSnapshot) -> List[Dict[str, Any]]:
+            filtered = model.apply(snapshot.schemas, role)
+            self.logger.debug("ロール別の表示対象メタデータを構築しました",
+                              role=role, metadata_version=snapshot.version,
+                              settings_version=model.version, schema_count=len(filtered))
+            return filtered
+
+        filtered = metadata.get_derived_versioned(("visibility.filtered", role), model.version, build)
+        return list(filtered)
+
+
+class VisibilityModel:
+    """表示設定をロール別の参照用集合にコンパイルしたもの
+
+    表示判定の優先順位は「ロール個別の設定」>「DEFAULT の設定」>「表示（設定なし）」。
+    """
+
+    def __init__(self, settings: Dict[str, Dict[str, bool]], version: int):
+        self.version = version
+        self.object_count = len(settings)
+        self._default_hidden: Set[str] = set()
+        self._role_visible: Dict[str, Set[str]] = {}
+        self._role_hidden: Dict[str, Set[str]] = {}
+        for object_name, roles in settings.items():
+            for role_name, is_visible in roles.items():
+                if role_name == 'DEFAULT':
+                    if not is_visible:
+                        self._default_hidden.add(object_name)
+                    continue
+                target = self._role_visible if is_visible else self._role_hidden
+                target.setdefault(role_name, set()).add(object_name)
+
+    def is_visible(self, object_name: str, role: str) -> bool:
+        if object_name in self._role_visible.get(role, ()):
+            return True
+        if object_name in self._role_hidden.get(role, ()):
+            return False
+        return object_name not in self._default_hidden
+
+    def apply(self, metadata, role: str) -> List[Dict[str, Any]]:
+        """表示設定をメタデータに適用します。"""
+        if not self.object_count:
+            return list(metadata)
 
         filtered_metadata = []
         for schema_data in metadata:
             schema_name = schema_data.get("name")
-            schema_settings = settings.get(schema_name, {})
-            self.logger.info(f"[DEBUG] schema: {schema_name}, schema_settings={schema_settings}")
-            
-            # スキーマの表示設定を取得
-            if role in schema_settings:
-                is_schema_visible = schema_settings[role]
-                self.logger.info(f"[DEBUG] schema {schema_name}: role({role}) found, is_schema_visible={is_schema_visible}")
-            else:
-                is_schema_visible = schema_settings.get('DEFAULT', True)
-                self.logger.info(f"[DEBUG] schema {schema_name}: role({role}) not found, DEFAULT used, is_schema_visible={is_schema_visible}")
+            is_schema_visible = self.is_visible(schema_name, role)
 
             # テーブルのフィルタリング（スキーマの表示設定に関係なく実行）
-            filtered_tables = []
-            for table_data in schema_data.get("tables", []):
-                table_full_name = f"{schema_name}.{table_data.get('name')}"
-                table_settings = settings.get(table_full_name, {})
-                self.logger.info(f"[DEBUG] table: {table_full_name}, table_settings={table_settings}")
-                if role in table_settings:
-                    is_table_visible = table_settings[role]
-                    self.logger.info(f"[DEBUG] table {table_full_name}: role({role}) found, is_table_visible={is_table_visible}")
-                else:
-                    is_table_visible = table_settings.get('DEFAULT', True)
-                    self.logger.info(f"[DEBUG] table {table_full_name}: role({role}) not found, DEFAULT used, is_table_visible={is_table_visible}")
-                if is_table_visible:
-                    filtered_tables.append(table_data)
-            
+            filtered_tables = [
+                table_data for table_data in schema_data.get("tables", [])
+                if self.is_visible(f"{schema_name}.{table_data.get('name')}", role)
+            ]
+
             # スキーマが表示対象、またはテーブルが1つでも表示対象の場合にスキーマを含める
             if is_schema_visible or filtered_tables:
                 filtered_schema = schema_data.copy()
@@ -97,8 +166,5 @@ class VisibilityControlService:
                 # スキーマが非表示でテーブルのみ表示の場合、スキーマ情報にマークを付ける
                 if not is_schema_visible and filtered_tables:
                     filtered_schema["schema_hidden"] = True
-                    self.logger.info(f"[DEBUG] schema {schema_name}: schema hidden but tables visible")
                 filtered_metadata.append(filtered_schema)
-                
-        self.logger.info(f"[DEBUG] filtered_metadata schema count: {len(filtered_metadata)}")
-        return filtered_metadata 
\ No newline at end of file
+        return filtered_metadata
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+ワークロード別スレッドプール
+処理の種類ごとに専用のスレッドプールを割り当て、重い更新処理が対話的な処理を枯渇させないようにする
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Iterator, AsyncIterator
+
+from app.logger import get_logger
+
+logger = get_logger("WorkloadExecutor")
+
+WORKLOAD_INTERACTIVE = "interactive"  # 補完・整形・メタデータ参照など、ユーザーが応答を待つ処理
+WORKLOAD_INGEST = "ingest"            # SQL実行結果の取り込み（キャッシュ書き込み）
+WORKLOAD_EXPORT = "export"            # CSV/Excel等のエクスポート
+WORKLOAD_METADATA = "metadata"        # メタデータ・マスター情報の更新
+
+_STOP = object()
+
+
+class WorkloadExecutor(Executor):
+    """メトリクス付きのスレッドプール（キュー滞留数・稼働スレッド数を計測）"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0,
+                       'total_wait_seconds': 0.0, 'total_run_seconds': 0.0, 'max_queue_depth': 0}
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._queued += 1
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queued)
+
+        def run():
+            started_at = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._stats['total_wait_seconds'] += started_at - submitted_at
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._stats['completed'] += 1
+                    self._stats['total_run_seconds'] += time.monotonic() - started_at
+                    if failed:
+                        self._stats['failed'] += 1
+
+        try:
+            return self._pool.submit(run)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """キュー滞留数・稼働スレッド数などを取得"""
+        with self._lock:
+            completed = self._stats['completed']
+            return {
+                'max_workers': self.max_workers,
+                'busy_threads': self._active,
+                'queue_depth': self._queued,
+                'max_queue_depth': self._stats['max_queue_depth'],
+                'submitted': self._stats['submitted'],
+                'completed': completed,
+                'failed': self._stats['failed'],
+                'avg_wait_seconds': round(self._stats['total_wait_seconds'] / completed, 4) if completed else 0.0,
+                'avg_run_seconds': round(self._stats['total_run_seconds'] / completed, 4) if completed else 0.0,
+            }
+
+
+class WorkloadExecutorRegistry:
+    """ワークロード種別ごとの WorkloadExecutor を管理"""
+
+    def __init__(self, worker_counts: Optional[Dict[str, int]] = None):
+        if worker_counts is None:
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            worker_counts = {
+                WORKLOAD_INTERACTIVE: settings.executor_interactive_workers,
+                # 実行枠待ちのセッションもスレッド上で待機するため、キュー長分を上乗せする
+                # （待機スレッドが枯渇すると、スケジューラーが選んだセッションがスレッドを得られず停滞する）
+                WORKLOAD_INGEST: settings.executor_ingest_workers + settings.execution_max_queue_length,
+                WORKLOAD_EXPORT: settings.executor_export_workers,
+                WORKLOAD_METADATA: settings.executor_metadata_workers,
+            }
+        self._executors: Dict[str, WorkloadExecutor] = {
+            name: WorkloadExecutor(name, max(1, int(count))) for name, count in worker_counts.items()
+        }
+
+    def get(self, workload: str) -> WorkloadExecutor:
+        """ワークロード種別のスレッドプールを取得（未定義の種別は interactive）"""
+        executor = self._executors.get(workload)
+        if executor is None:
+            logger.warning(f"未定義のワークロード種別のため interactive を使用します: {workload}")
+            executor = self._executors[WORKLOAD_INTERACTIVE]
+        return executor
+
+    async def run(self, workload: str, func: Callable, *args, **kwargs) -> Any:
+        """同期関数を指定ワークロードのスレッドプールで実行して結果を待つ"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get(workload), lambda: func(*args, **kwargs))
+
+    async def iterate(self, workload: str, iterator: Iterator) -> AsyncIterator:
+        """同期イテレーターを指定ワークロードのスレッドプールで1要素ずつ進める（StreamingResponse用）"""
+        loop = asyncio.get_running_loop()
+        executor = self.get(workload)
+        try:
+            while True:
+                item = await loop.run_in_executor(executor, next, iterator, _STOP)
+                if item is _STOP:
+                    break
+                yield item
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                await loop.run_in_executor(executor, close)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """全ワークロードのメトリクスを取得"""
+        return {name: executor.get_metrics() for name, executor in self._executors.items()}
+
+    def shutdown(self, wait: bool = False) -> None:
+        """全スレッドプールを停止"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
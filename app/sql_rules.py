@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+SQL検証ルールエンジン
+禁止キーワード・セキュリティ・WHERE句必須・パフォーマンスの各ルールを1つの正規表現に結合して起動時にコンパイルし、
+SQL全体を1回走査するだけで全ルールの一致を集める。コメント・文字列リテラル・引用符付き識別子の中は対象外。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+RULE_SET_FORBIDDEN = "forbidden"
+RULE_SET_SECURITY = "security"
+RULE_SET_WHERE_REQUIRED = "where_required"
+RULE_SET_PERFORMANCE = "performance"
+
+ALL_RULE_SETS = (RULE_SET_FORBIDDEN, RULE_SET_SECURITY, RULE_SET_WHERE_REQUIRED, RULE_SET_PERFORMANCE)
+
+# ルールの対象外とする範囲（コメント・文字列リテラル・引用符付き識別子）。閉じていないものは末尾まで
+_SKIP_PATTERN = r"""--[^\n]*|/\*.*?(?:\*/|\Z)|'(?:[^']|'')*(?:'|\Z)|"(?:[^"]|"")*(?:"|\Z)"""
+
+
+@dataclass(frozen=True)
+class SQLRule:
+    """検証ルール
+
+    name はルールエンジン内で一意な名前、pattern は大文字に変換したSQLに対して照合する正規表現
+    （名前付きグループは使わない）。
+    """
+    rule_set: str
+    name: str
+    pattern: str
+    message: str = ""
+
+
+def keyword_rule(rule_set: str, keyword: str, message: str = "") -> SQLRule:
+    """単語境界で一致するキーワードのルール（大文字・小文字は区別せず、"BULK INSERT" のような複数語は任意の空白で区切る）"""
+    pattern = r"\b" + r"\s+".join(re.escape(word) for word in keyword.upper().split()) + r"\b"
+    return SQLRule(rule_set, f"{rule_set}:{keyword}", pattern, message)
+
+
+def literal_rule(rule_set: str, text: str, message: str = "") -> SQLRule:
+    """文字列として含まれていれば一致するルール（英数字で始まる場合は単語の先頭でのみ一致、大文字・小文字は区別しない）"""
+    pattern = (r"\b" if re.match(r"\w", text) else "") + re.escape(text.upper())
+    return SQLRule(rule_set, f"{rule_set}:{text}", pattern, message)
+
+
+class RuleScan:
+    """1つのSQLに対する全ルールの走査結果"""
+
+    __slots__ = ("counts", "positions", "_rules")
+
+    def __init__(self, rules: Dict[str, SQLRule]):
+        self._rules = rules
+        # ルール名 → 一致した回数 / 最初に一致した位置
+        self.counts: Dict[str, int] = {}
+        self.positions: Dict[str, int] = {}
+
+    def found(self, name: str) -> bool:
+        return name in self.counts
+
+    def count(self, name: str) -> int:
+        return self.counts.get(name, 0)
+
+    def position(self, name: str) -> Optional[int]:
+        return self.positions.get(name)
+
+    def first_violation(self, rule_set: str) -> Optional[SQLRule]:
+        """rule_set のルールのうち、SQL内で最も前に一致したもの"""
+        candidates = [name for name in self.positions if self._rules[name].rule_set == rule_set]
+        if not candidates:
+            return None
+        return self._rules[min(candidates, key=self.positions.__getitem__)]
+
+
+class SQLRuleEngine:
+    """コンパイル済みの結合ルールで SQL を1回だけ走査するルールエンジン
+
+    全ルールを先読み（幅0の一致）の選択に結合し、コメント・文字列を読み飛ばしながら1回の走査で
+    いずれかのルールに一致する位置を見つける。単語境界（\\b）で始まるルールはまとめて単語の先頭でだけ試す。
+    結合パターンにはキャプチャグループを含めず（含めると走査が数倍遅くなる）、一致した位置でだけ
+    各ルールを定義順に照合してどのルールかを判定する（同じ位置で複数に一致する場合は先に定義されたルール）。
+    """
+
+    def __init__(self, rules: Iterable[SQLRule]):
+        self.rules: List[SQLRule] = []
+        self._by_name: Dict[str, SQLRule] = {}
+        for rule in rules:
+            if rule.name not in self._by_name:
+                self.rules.append(rule)
+                self._by_name[rule.name] = rule
+        self._compiled = [(re.compile(rule.pattern, re.DOTALL), rule.name) for rule in self.rules]
+        self._compiled_ignorecase = [(re.compile(rule.pattern, re.DOTALL | re.IGNORECASE), rule.name)
+                                     for rule in self.rules]
+
+        # 単語境界で始まるルールは共通の \b の後ろにまとめ、単語の途中の位置ではすぐに失敗させる
+        word_alternatives = [f"(?:{rule.pattern[2:]})" for rule in self.rules if rule.pattern.startswith(r"\b")]
+        other_alternatives = [f"(?:{rule.pattern})" for rule in self.rules if not rule.pattern.startswith(r"\b")]
+        # コメント・文字列は1つの一致として読み飛ばし、それ以外の位置でルールを先読みで試す
+        pattern = _SKIP_PATTERN
+        if word_alternatives:
+            pattern += r"|\b(?=" + "|".join(word_alternatives) + ")"
+        if other_alternatives:
+            pattern += "|(?=" + "|".join(other_alternatives) + ")"
+        self._pattern = re.compile(pattern, re.DOTALL)
+        # 大文字への変換で長さが変わる文字を含むSQL用（一致位置を元のSQLの位置と揃えるため）
+        self._pattern_ignorecase = re.compile(pattern, re.DOTALL | re.IGNORECASE)
+
+    @property
+    def rule_sets(self) -> List[str]:
+        return list(dict.fromkeys(rule.rule_set for rule in self.rules))
+
+    def get_rule(self, name: str) -> Optional[SQLRule]:
+        return self._by_name.get(name)
+
+    def scan(self, sql: str) -> RuleScan:
+        """SQL 全体を1回走査し、ルールごとの一致回数と最初の位置を返す"""
+        result = RuleScan(self._by_name)
+        counts = result.counts
+        positions = result.positions
+        # 大文字に変換して照合する（IGNORECASE より速い）
+        text = sql.upper()
+        pattern, compiled = self._pattern, self._compiled
+        if len(text) != len(sql):
+            text, pattern, compiled = sql, self._pattern_ignorecase, self._compiled_ignorecase
+        for match in pattern.finditer(text):
+            position = match.start()
+            if match.end() != position:
+                # コメント・文字列
+                continue
+            for rule_pattern, name in compiled:
+                if rule_pattern.match(text, position):
+                    if name in counts:
+                        counts[name] += 1
+                    else:
+                        counts[name] = 1
+                        positions[name] = position
+                    break
+        return result
@@ -5,14 +5,46 @@ SQLの構文チェック、セキュリティチェック、ビジネスルー
 """
 import sqlparse
 import re
+import threading
+from collections import OrderedDict
+from sqlparse import formatter
+from sqlparse.engine import FilterStack
+from sqlparse.filters import SerializerUnicode
 from sqlparse.sql import Statement, Token, TokenList
 from sqlparse.tokens import Keyword, DML, Punctuation
 from typing import List, Dict, Tuple, Optional, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 from app.logger import get_logger
 from app.exceptions import SQLValidationError
-from app.utils import retry_on_exception
+from app.sql_rules import (
+    RULE_SET_FORBIDDEN, RULE_SET_PERFORMANCE, RULE_SET_SECURITY, RULE_SET_WHERE_REQUIRED,
+    RuleScan, SQLRule, SQLRuleEngine, keyword_rule, literal_rule,
+)
+from app.utils import calculate_hash, retry_on_exception
+
+# SQL整形のオプション（sqlparse.format と同じ指定）
+FORMAT_OPTIONS = dict(
+    reindent=True,
+    keyword_case='upper',
+    indent_width=4,
+    use_space_around_operators=True,
+    comma_first=True
+)
+
+# WHERE句必須・パフォーマンスのチェックで有無・位置・回数を使うルール
+_RULE_SELECT = keyword_rule(RULE_SET_WHERE_REQUIRED, 'SELECT')
+_RULE_WHERE = keyword_rule(RULE_SET_WHERE_REQUIRED, 'WHERE')
+# "SELECT" 自体のルールと同じ位置で競合しないよう、"*" の位置で一致させる（後読みは "*" の位置でだけ評価される）
+_RULE_SELECT_STAR = SQLRule(RULE_SET_PERFORMANCE, f"{RULE_SET_PERFORMANCE}:SELECT *", r'\*(?<=\bSELECT\s\*)')
+_RULE_LIMIT = keyword_rule(RULE_SET_PERFORMANCE, 'LIMIT')
+_RULE_TOP = keyword_rule(RULE_SET_PERFORMANCE, 'TOP')
+_RULE_JOIN = keyword_rule(RULE_SET_PERFORMANCE, 'JOIN')
+
+_WHERE_CONTENT_RE = re.compile(r'WHERE\s+(.*)', re.IGNORECASE | re.DOTALL)
+_AND_SPLIT_RE = re.compile(r'\s+AND\s+', re.IGNORECASE)
+_CLEAN_CONDITION_RE = re.compile(r'[()"\']')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 
 @dataclass
@@ -34,13 +66,91 @@ class ValidationResult:
         if self.columns is None:
             self.columns = []
 
+    def copy(self) -> "ValidationResult":
+        """リストを複製した結果（キャッシュした結果を呼び出し側の変更から守る）"""
+        return replace(
+            self,
+            errors=list(self.errors),
+            warnings=list(self.warnings),
+            suggestions=list(self.suggestions),
+            tables=list(self.tables),
+            columns=list(self.columns)
+        )
+
+
+class ParsedSQL:
+    """1つのSQLの解析結果
+
+    sqlparse による字句解析・構文解析はここで1回だけ行い、各チェック・テーブル抽出・整形で共有する。
+    整形は解析木を書き換えるため、他の処理がすべて終わった後に1回だけ行う。
+    """
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.statements: List[Statement] = list(sqlparse.parse(sql))
+        self._formatted: Optional[str] = None
+
+    def format(self) -> str:
+        """sqlparse.format(sql, **FORMAT_OPTIONS) と同じ整形を、解析済みの木に対して行う"""
+        if self._formatted is None:
+            options = formatter.validate_options(dict(FORMAT_OPTIONS))
+            stack = formatter.build_filter_stack(FilterStack(), options)
+            stack.postprocess.append(SerializerUnicode())
+            parts = []
+            for statement in self.statements:
+                # 字句単位のフィルタ（キーワードの大文字化など）は葉トークンに直接適用する
+                for filter_ in stack.preprocess:
+                    for token in statement.flatten():
+                        for _, value in filter_.process([(token.ttype, token.value)]):
+                            token.value = value
+                for filter_ in stack.stmtprocess:
+                    filter_.process(statement)
+                for filter_ in stack.postprocess:
+                    statement = filter_.process(statement)
+                parts.append(statement)
+            self._formatted = ''.join(parts)
+        return self._formatted
+
+
+class _CachedValidation:
+    """バリデーション結果のキャッシュエントリ"""
+
+    __slots__ = ("result", "formatted_sql", "completed")
+
+    def __init__(self, result: ValidationResult, formatted_sql: Optional[str], completed: bool = False):
+        self.result = result
+        # 整形結果（バリデーションエラーでも構文解析できたSQLは整形しておく）
+        self.formatted_sql = formatted_sql
+        # すべてのチェックを最後まで実行したか（途中のチェックで打ち切った場合は False）
+        self.completed = completed
+
 
 class SQLValidator:
-    """SQLバリデーションクラス"""
+    """SQLバリデーションクラス
+
+    バリデーション結果はSQLのハッシュをキーにしたLRUキャッシュに保持し、
+    整形・実行・ダウンロードで同じSQLを繰り返し検証しても解析は1回で済むようにする。
+    禁止キーワード・セキュリティ・WHERE句必須・パフォーマンスのチェックは、
+    起動時にコンパイルしたルールエンジン（有効なルールセットのみ）で1回走査した結果を使う。
+    """
     
-    def __init__(self):
+    def __init__(self, cache_size: Optional[int] = None, rule_sets: Optional[List[str]] = None,
+                 extra_forbidden_keywords: Optional[List[str]] = None):
         self.logger = get_logger("sql_validator")
         self._setup_keywords()
+        if cache_size is None or rule_sets is None or extra_forbidden_keywords is None:
+            from app.config_simplified import get_settings
+            settings = get_settings()
+            cache_size = settings.sql_validation_cache_size if cache_size is None else cache_size
+            rule_sets = settings.sql_validation_rule_sets if rule_sets is None else rule_sets
+            if extra_forbidden_keywords is None:
+                extra_forbidden_keywords = settings.sql_validation_extra_forbidden_keywords
+        self.forbidden_keywords |= set(extra_forbidden_keywords)
+        self.rule_sets: Set[str] = set(rule_sets)
+        self.rule_engine = self._build_rule_engine()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, _CachedValidation]" = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def _setup_keywords(self) -> None:
         """キーワードを設定"""
@@ -56,118 +166,178 @@ class SQLValidator:
             'UPPER', 'LOWER', 'TRIM', 'LENGTH', 'ROUND', 'FLOOR', 'CEILING'
         }
         
+        # 'xp_' / 'sp_' は従来の照合（単語境界付き・小文字のまま大文字化したSQLと比較）では一致したことがないため、
+        # SP_SALES のような識別子を拒否しないよう対象に含めない（プロシージャ呼び出しは EXEC / EXECUTE で拒否される）
         self.forbidden_keywords: Set[str] = {
             'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE',
             'GRANT', 'REVOKE', 'COMMIT', 'ROLLBACK', 'MERGE', 'COPY', 'EXEC',
-            'EXECUTE', 'xp_', 'sp_', 'BACKUP', 'RESTORE', 'BULK INSERT'
+            'EXECUTE', 'BACKUP', 'RESTORE', 'BULK INSERT'
         }
         
         self.dangerous_patterns: List[str] = [
-            ';--', ';/*', ';*/', 'EXEC', 'EXECUTE', 'xp_', 'sp_', 'WAITFOR', 'DELAY'
+            ';--', ';/*', ';*/', 'EXEC', 'EXECUTE', 'WAITFOR', 'DELAY'
         ]
     
+    def _build_rule_engine(self) -> SQLRuleEngine:
+        """有効なルールセットのルールを1つのルールエンジンにコンパイル"""
+        rules: List[SQLRule] = []
+        if RULE_SET_FORBIDDEN in self.rule_sets:
+            rules.extend(
+                keyword_rule(RULE_SET_FORBIDDEN, keyword, f"'{keyword}' は使用できません。データの変更は許可されていません")
+                for keyword in sorted(self.forbidden_keywords)
+            )
+        if RULE_SET_SECURITY in self.rule_sets:
+            rules.extend(
+                literal_rule(RULE_SET_SECURITY, pattern, f"セキュリティ上の理由で '{pattern}' は使用できません")
+                for pattern in self.dangerous_patterns
+            )
+        if RULE_SET_WHERE_REQUIRED in self.rule_sets:
+            rules.extend([_RULE_SELECT, _RULE_WHERE])
+        if RULE_SET_PERFORMANCE in self.rule_sets:
+            rules.extend([_RULE_SELECT_STAR, _RULE_LIMIT, _RULE_TOP, _RULE_JOIN])
+        return SQLRuleEngine(rules)
+    
     @retry_on_exception(max_retries=2, delay=0.1)
     def validate_sql(self, sql: str) -> ValidationResult:
         """
         SQLをバリデーション
         戻り値: ValidationResult
         """
+        entry = self._get_cached(sql)
+        result = entry.result.copy()
+        
+        # ログ出力
+        if entry.completed:
+            self.logger.log_sql_validation(
+                sql, result.is_valid,
+                '; '.join(result.errors) if result.errors else None
+            )
+        
+        return result
+    
+    def _get_cached(self, sql: str) -> _CachedValidation:
+        """キャッシュ済みのバリデーション結果を返す（なければ解析してキャッシュする）"""
+        key = calculate_hash(sql or '')
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry
+        
+        entry, cacheable = self._validate_uncached(sql)
+        if cacheable and self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[key] = entry
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return entry
+    
+    def clear_cache(self) -> None:
+        """バリデーション結果のキャッシュをクリア"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    def _validate_uncached(self, sql: str) -> Tuple[_CachedValidation, bool]:
+        """SQLを1回だけ解析してバリデーションと整形を行う。戻り値は (結果, キャッシュしてよいか)"""
         errors: List[str] = []
         warnings: List[str] = []
         suggestions: List[str] = []
+        parsed: Optional[ParsedSQL] = None
+        
+        def finish(result: ValidationResult) -> Tuple[_CachedValidation, bool]:
+            # 整形は解析木を書き換えるため、すべてのチェックが終わった後に行う
+            return _CachedValidation(result, self._format_parsed(parsed)), True
         
         try:
             # 基本的な構文チェック
-            if not self._check_basic_syntax(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            parsed = self._check_basic_syntax(sql, errors)
+            if parsed is None:
+                return finish(ValidationResult(False, errors, warnings, suggestions))
             
             # SELECT文のみ許可
-            if not self._check_select_only(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            if not self._check_select_only(parsed, errors):
+                return finish(ValidationResult(False, errors, warnings, suggestions))
+            
+            # ルールエンジンで全ルールの一致を1回の走査で集める（コメント・文字列の中は対象外）
+            scan = self.rule_engine.scan(sql)
             
             # 禁止キーワードチェック
-            if not self._check_forbidden_keywords(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            if not self._check_forbidden_keywords(scan, errors):
+                return finish(ValidationResult(False, errors, warnings, suggestions))
             
             # セキュリティチェック
-            if not self._check_security(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            if not self._check_security(scan, errors):
+                return finish(ValidationResult(False, errors, warnings, suggestions))
             
             # WHERE句必須チェック
-            sql_upper = sql.upper()
-            if 'SELECT' in sql_upper and 'WHERE' not in sql_upper:
+            if scan.found(_RULE_SELECT.name) and not scan.found(_RULE_WHERE.name):
                 suggestions.append("WHERE句を追加するとパフォーマンスが向上します")
-            if not self._check_where_clause_required(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            if not self._check_where_clause_required(sql, scan, errors):
+                return finish(ValidationResult(False, errors, warnings, suggestions))
             
             # 構文の詳細チェック
-            if not self._check_detailed_syntax(sql, errors):
-                return ValidationResult(False, errors, warnings, suggestions)
+            if not self._check_detailed_syntax(parsed, errors):
+                return finish(ValidationResult(False, errors, warnings, suggestions))
             
             # パフォーマンス警告
-            self._check_performance_warnings(sql, warnings)
-            if 'SELECT *' in sql_upper:
-                suggestions.append("SELECT * の代わりに必要なカラムのみを指定してください")
-            if 'LIMIT' not in sql_upper and 'TOP' not in sql_upper:
-                suggestions.append("LIMIT句の追加を検討してください")
-            join_count = sql_upper.count('JOIN')
-            if join_count > 3:
-                suggestions.append(f"JOINが多いSQLです（{join_count}個）。パフォーマンスに注意してください")
-            
-            # 整形されたSQLを取得
-            formatted_sql = self.format_sql(sql) if not errors else None
+            if RULE_SET_PERFORMANCE in self.rule_sets:
+                self._check_performance_warnings(scan, warnings)
+                if scan.found(_RULE_SELECT_STAR.name):
+                    suggestions.append("SELECT * の代わりに必要なカラムのみを指定してください")
+                if not scan.found(_RULE_LIMIT.name) and not scan.found(_RULE_TOP.name):
+                    suggestions.append("LIMIT句の追加を検討してください")
+                join_count = scan.count(_RULE_JOIN.name)
+                if join_count > 3:
+                    suggestions.append(f"JOINが多いSQLです（{join_count}個）。パフォーマンスに注意してください")
             
             # テーブルとカラムを抽出
-            tables = self.extract_tables(sql)
+            tables = self._extract_tables_from_statements(parsed.statements)
             columns = self.extract_columns(sql)
             
+            # 整形されたSQLを取得
+            formatted_sql = self._format_parsed(parsed)
+            
             is_valid = len(errors) == 0
             result = ValidationResult(
                 is_valid=is_valid,
                 errors=errors,
                 warnings=warnings,
                 suggestions=suggestions,
-                formatted_sql=formatted_sql,
+                formatted_sql=formatted_sql if is_valid else None,
                 tables=tables,
                 columns=columns
             )
-            
-            # ログ出力
-            self.logger.log_sql_validation(
-                sql, is_valid, 
-                '; '.join(errors) if errors else None
-            )
-            
-            return result
+            return _CachedValidation(result, formatted_sql, completed=True), True
             
         except Exception as e:
             error_msg = f"SQLバリデーション中にエラーが発生しました: {str(e)}"
             self.logger.error(error_msg, exception=e)
-            return ValidationResult(False, [error_msg], warnings, suggestions)
+            # 想定外のエラーは一時的な可能性があるためキャッシュしない
+            return _CachedValidation(ValidationResult(False, [error_msg], warnings, suggestions), None), False
     
-    def _check_basic_syntax(self, sql: str, errors: List[str]) -> bool:
-        """基本的な構文チェック"""
+    def _check_basic_syntax(self, sql: str, errors: List[str]) -> Optional[ParsedSQL]:
+        """基本的な構文チェック（構文解析に成功した場合は解析結果を返す）"""
         if not sql or not sql.strip():
             errors.append("SQLを入力してください")
-            return False
+            return None
         
         # SQLParseで構文解析
         try:
-            parsed = sqlparse.parse(sql)
-            if not parsed:
+            parsed = ParsedSQL(sql)
+            if not parsed.statements:
                 errors.append("SQLの構文に問題があります。正しいSQLを入力してください")
-                return False
+                return None
         except Exception as e:
             errors.append(f"SQLの構文解析エラー: {str(e)}")
-            return False
+            return None
         
-        return True
+        return parsed
     
-    def _check_select_only(self, sql: str, errors: List[str]) -> bool:
+    def _check_select_only(self, parsed: ParsedSQL, errors: List[str]) -> bool:
         """SELECT文のみ許可"""
         try:
-            parsed = sqlparse.parse(sql)
-            for statement in parsed:
+            for statement in parsed.statements:
                 if statement.get_type() != 'SELECT':
                     errors.append("SELECT文のみ実行可能です。INSERT、UPDATE、DELETE文は許可されていません")
                     return False
@@ -176,55 +346,52 @@ class SQLValidator:
             errors.append(f"SELECT文チェックエラー: {str(e)}")
             return False
     
-    def _check_forbidden_keywords(self, sql: str, errors: List[str]) -> bool:
-        """禁止キーワードチェック"""
+    def _check_forbidden_keywords(self, scan: RuleScan, errors: List[str]) -> bool:
+        """禁止キーワードチェック（SQL内で最初に現れた禁止キーワードを報告）"""
         try:
-            # 単語境界を考慮したキーワードチェック
-            for keyword in self.forbidden_keywords:
-                pattern = r'\b' + re.escape(keyword) + r'\b'
-                if re.search(pattern, sql, re.IGNORECASE):
-                    errors.append(f"'{keyword}' は使用できません。データの変更は許可されていません")
-                    return False
+            rule = scan.first_violation(RULE_SET_FORBIDDEN)
+            if rule is not None:
+                errors.append(rule.message)
+                return False
             return True
         except Exception as e:
             errors.append(f"禁止キーワードチェックエラー: {str(e)}")
             return False
     
-    def _check_security(self, sql: str, errors: List[str]) -> bool:
+    def _check_security(self, scan: RuleScan, errors: List[str]) -> bool:
         """セキュリティチェック"""
         try:
-            sql_upper = sql.upper()
-            for pattern in self.dangerous_patterns:
-                if pattern in sql_upper:
-                    errors.append(f"セキュリティ上の理由で '{pattern}' は使用できません")
-                    return False
+            rule = scan.first_violation(RULE_SET_SECURITY)
+            if rule is not None:
+                errors.append(rule.message)
+                return False
             return True
         except Exception as e:
             errors.append(f"セキュリティチェックエラー: {str(e)}")
             return False
     
-    def _check_where_clause_required(self, sql: str, errors: List[str]) -> bool:
+    def _check_where_clause_required(self, sql: str, scan: RuleScan, errors: List[str]) -> bool:
         """WHERE句必須チェック"""
+        if RULE_SET_WHERE_REQUIRED not in self.rule_sets:
+            return True
         try:
-            sql_upper = sql.upper()
-            
             # SELECT文でWHERE句がない場合
-            if 'SELECT' in sql_upper and 'WHERE' not in sql_upper:
+            if scan.found(_RULE_SELECT.name) and not scan.found(_RULE_WHERE.name):
                 errors.append("WHERE句が必要です。大量データの取得を防ぐため、条件を指定してください。例: WHERE column_name = 'value'")
                 return False
             
             # WHERE句の内容が20文字以下の場合のチェック
-            if 'WHERE' in sql_upper:
-                # WHERE句全体を抽出（より簡単な方法）
-                where_pattern = r'WHERE\s+(.*)'
-                where_match = re.search(where_pattern, sql, re.IGNORECASE | re.DOTALL)
+            where_position = scan.position(_RULE_WHERE.name)
+            if where_position is not None:
+                # 最初のWHERE句から末尾までを抽出
+                where_match = _WHERE_CONTENT_RE.match(sql, where_position)
                 
                 if where_match:
                     where_content = where_match.group(1).strip()
                     self.logger.debug(f"WHERE句抽出: {where_content}")
                     
                     # ANDで分割して個別の条件をチェック
-                    conditions = re.split(r'\s+AND\s+', where_content, flags=re.IGNORECASE)
+                    conditions = _AND_SPLIT_RE.split(where_content)
                     self.logger.debug(f"AND分割結果: {conditions}")
                     
                     all_conditions_valid = False
@@ -233,9 +400,9 @@ class SQLValidator:
                     for condition in conditions:
                         condition = condition.strip()
                         # 括弧やクォートを除いた実際の内容の長さをチェック
-                        clean_content = re.sub(r'[()"\']', '', condition)
+                        clean_content = _CLEAN_CONDITION_RE.sub('', condition)
                         # スペースも除去して実際の文字数だけをカウント
-                        clean_content = re.sub(r'\s+', '', clean_content)
+                        clean_content = _WHITESPACE_RE.sub('', clean_content)
                         
                         # デバッグログ
                         self.logger.debug(f"WHERE句条件チェック: 元の内容='{condition}', クリーン内容='{clean_content}', 文字数={len(clean_content)}")
@@ -263,11 +430,10 @@ class SQLValidator:
             errors.append(f"WHERE句チェックエラー: {str(e)}")
             return False
     
-    def _check_detailed_syntax(self, sql: str, errors: List[str]) -> bool:
+    def _check_detailed_syntax(self, parsed: ParsedSQL, errors: List[str]) -> bool:
         """詳細な構文チェック"""
         try:
-            parsed = sqlparse.parse(sql)
-            for statement in parsed:
+            for statement in parsed.statements:
                 if not self._validate_statement(statement, errors):
                     return False
             return True
@@ -303,21 +469,19 @@ class SQLValidator:
             errors.append(f"ステートメントバリデーションエラー: {str(e)}")
             return False
     
-    def _check_performance_warnings(self, sql: str, warnings: List[str]) -> None:
+    def _check_performance_warnings(self, scan: RuleScan, warnings: List[str]) -> None:
         """パフォーマンス警告をチェック"""
         try:
-            sql_upper = sql.upper()
-            
             # SELECT * の警告
-            if 'SELECT *' in sql_upper:
+            if scan.found(_RULE_SELECT_STAR.name):
                 warnings.append("SELECT * の使用は推奨されません。必要なカラムのみを指定してください")
             
             # 大量データ取得の警告
-            if 'LIMIT' not in sql_upper and 'TOP' not in sql_upper:
+            if not scan.found(_RULE_LIMIT.name) and not scan.found(_RULE_TOP.name):
                 warnings.append("大量データ取得の可能性があります。LIMIT句の使用を検討してください")
             
             # 複雑なJOINの警告
-            join_count = sql_upper.count('JOIN')
+            join_count = scan.count(_RULE_JOIN.name)
             if join_count > 3:
                 warnings.append(f"複雑なJOIN（{join_count}個）が使用されています。パフォーマンスに注意してください")
             
@@ -327,27 +491,35 @@ class SQLValidator:
     
     @retry_on_exception(max_retries=2, delay=0.1)
     def format_sql(self, sql: str) -> str:
-        """SQLを整形"""
+        """SQLを整形（バリデーションと解析結果・キャッシュを共有する）"""
+        if not sql or not sql.strip():
+            return sql
+        formatted = self._get_cached(sql).formatted_sql
+        return formatted if formatted is not None else sql
+    
+    def _format_parsed(self, parsed: Optional[ParsedSQL]) -> Optional[str]:
+        """解析済みのSQLを整形（解析できなかった場合は None）"""
+        if parsed is None:
+            return None
         try:
-            formatted = sqlparse.format(
-                sql,
-                reindent=True,
-                keyword_case='upper',
-                indent_width=4,
-                use_space_around_operators=True,
-                comma_first=True
-            )
-            return formatted
+            return parsed.format()
         except Exception as e:
             self.logger.error("SQL整形エラー", exception=e)
-            return sql
+            return None
     
     def extract_tables(self, sql: str) -> List[str]:
         """SQLからテーブル名を抽出"""
+        try:
+            return self._extract_tables_from_statements(sqlparse.parse(sql))
+        except Exception as e:
+            self.logger.error("テーブル名抽出エラー", exception=e)
+            return []
+    
+    def _extract_tables_from_statements(self, statements: List[Statement]) -> List[str]:
+        """解析済みのステートメントからテーブル名を抽出"""
         tables = []
         try:
-            parsed = sqlparse.parse(sql)
-            for statement in parsed:
+            for statement in statements:
                 for token in statement.tokens:
                     if hasattr(token, 'tokens'):
                         tables.extend(self._extract_tables_from_token(token))
@@ -14,6 +14,7 @@ from datetime import datetime
 
 from app.tests.test_main import app
 from app.api.models import UserInfo
+from app.metadata_cache import MetadataCache
 from app.dependencies import (
     get_metadata_service_di, get_performance_service_di,
     get_export_service_di, get_sql_validator_di, get_connection_manager_di,
@@ -129,6 +130,35 @@ def temp_db() -> Generator[str, None, None]:
         os.unlink(path)
 
 
+@pytest.fixture
+def metadata_catalog() -> list:
+    """メタデータキャッシュに保存するカタログ（テストモジュールで同名のフィクスチャを定義して差し替える）"""
+    return [
+        {
+            "name": "SALES",
+            "owner": "SYSADMIN",
+            "created_on": "2024-01-01",
+            "tables": [
+                {"name": "ORDERS", "table_type": "BASE TABLE", "row_count": 10, "comment": "受注",
+                 "columns": [{"name": "ID", "data_type": "NUMBER", "is_nullable": False},
+                             {"name": "AMOUNT", "data_type": "NUMBER", "is_nullable": True, "comment": "金額"}]},
+                {"name": "CUSTOMERS", "table_type": "BASE TABLE", "row_count": 5,
+                 "columns": [{"name": "NAME", "data_type": "VARCHAR", "is_nullable": True}]},
+                {"name": "EMPTY_VIEW", "table_type": "VIEW", "columns": []},
+            ],
+        },
+        {"name": "ANALYTICS", "owner": "SYSADMIN", "created_on": "2024-01-02", "tables": []},
+    ]
+
+
+@pytest.fixture
+def cache(tmp_path, metadata_catalog) -> MetadataCache:
+    """metadata_catalog を保存した一時データベースのメタデータキャッシュ"""
+    cache = MetadataCache(db_path=str(tmp_path / "metadata_cache.db"))
+    cache.save_all_metadata_normalized(metadata_catalog)
+    return cache
+
+
 @pytest.fixture
 def mock_sql_service():
     """SQLサービスのモック"""
@@ -170,6 +200,7 @@ def mock_sql_service():
 def mock_metadata_service():
     """メタデータサービスのモック"""
     service = Mock()
+    service.get_metadata_etag.return_value = '"v1"'
     # 実際のサービスはリストを直接返す（辞書でラップしない）
     service.get_schemas.return_value = [
         {"name": "PUBLIC", "created_on": "2024-01-01", "owner": "ROOT", "is_default": True},
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+適応的チャンクサイズ制御のテスト
+"""
+from unittest.mock import Mock
+
+from app.services.adaptive_chunk_sizer import AdaptiveChunkSizer
+from app.services.hybrid_sql_service import HybridSQLService
+
+NARROW_ROW = (12345, 67.89)
+WIDE_ROW = tuple("x" * 400 for _ in range(40))
+
+
+def _make_sizer(**kwargs):
+    params = dict(initial_size=1000, min_size=100, max_size=20000,
+                  target_chunk_bytes=8 * 1024 * 1024, target_chunk_seconds=1.0)
+    params.update(kwargs)
+    return AdaptiveChunkSizer(**params)
+
+
+def _feed(sizer, row, rounds, row_seconds):
+    for _ in range(rounds):
+        rows = [row] * sizer.size
+        sizer.observe(rows, fetch_seconds=row_seconds * len(rows), insert_seconds=0.0)
+    return sizer.size
+
+
+class TestAdaptiveChunkSizer:
+    """AdaptiveChunkSizerのテスト"""
+
+    def test_first_fetch_is_a_small_probe(self):
+        assert _make_sizer().size == 100
+        assert _make_sizer(enabled=False).size == 1000
+
+    def test_narrow_rows_grow_towards_max(self):
+        sizer = _make_sizer()
+        assert _feed(sizer, NARROW_ROW, 1, row_seconds=1e-6) == 2000  # probe後は初期値の2倍まで
+        assert _feed(sizer, NARROW_ROW, 10, row_seconds=1e-6) == 20000
+        diagnostics = sizer.get_diagnostics()
+        assert diagnostics["chunk_size_history"][:3] == [100, 2000, 4000]
+        assert diagnostics["adjustments"] >= 5
+
+    def test_wide_rows_are_bounded_by_target_bytes(self):
+        sizer = _make_sizer()
+        size = _feed(sizer, WIDE_ROW, 5, row_seconds=1e-6)
+        row_bytes = AdaptiveChunkSizer.estimate_row_bytes([WIDE_ROW])
+        assert size < 1000
+        assert size * row_bytes <= 8 * 1024 * 1024
+
+    def test_slow_inserts_shrink_chunks(self):
+        sizer = _make_sizer()
+        # 1行あたり5ms → 目標1秒に収まる200行程度まで縮小
+        assert _feed(sizer, NARROW_ROW, 5, row_seconds=0.005) == 200
+
+    def test_disabled_keeps_fixed_size(self):
+        sizer = _make_sizer(enabled=False)
+        assert _feed(sizer, NARROW_ROW, 5, row_seconds=1e-6) == 1000
+        assert sizer.get_diagnostics()["avg_row_bytes"] > 0
+
+
+class TestHybridSQLServiceChunkSizing:
+    """HybridSQLService._fetch_and_cache_data のチャンクサイズ記録のテスト"""
+
+    def test_fetch_records_chunk_sizes_and_respects_limit(self):
+        cursor = Mock()
+        cursor.description = [("A",), ("B",)]
+        requested = []
+
+        def fetchmany(size):
+            requested.append(size)
+            return [NARROW_ROW] * size
+
+        cursor.fetchmany.side_effect = fetchmany
+        connection = Mock()
+        connection.cursor.return_value = cursor
+        connection_manager = Mock()
+        connection_manager.get_connection.return_value = ("conn_1", connection)
+        cache_service = Mock()
+        cache_service.validate_data_types.return_value = (True, None)
+        cache_service.insert_chunk.side_effect = lambda table, chunk, session_id: len(chunk)
+        service = HybridSQLService(cache_service=cache_service, connection_manager=connection_manager)
+
+        processed = service._fetch_and_cache_data("SELECT A, B FROM T", "s1", limit=2500)
+
+        assert processed == 2500
+        assert sum(requested) == 2500
+        diagnostics = cache_service.update_session_progress.call_args.kwargs["fetch_diagnostics"]
+        assert diagnostics["chunks"] == len(requested)
+        assert diagnostics["chunk_size_history"][0] == requested[0]
@@ -6,13 +6,17 @@
 /sql/cache/read
 /sql/cache/download/csv
 /sql/cache/unique-values
+/sql/cache/queue/stats
+/sql/cache/result-cache/metrics
+/sql/cache/cost-gate/metrics
 """
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch, AsyncMock
 from app.dependencies import (
-    get_hybrid_sql_service_di, get_current_user, get_sql_log_service_di,
-    get_streaming_state_service_di, get_session_service_di
+    get_hybrid_sql_service_di, get_current_user, get_current_admin, get_sql_log_service_di,
+    get_streaming_state_service_di, get_session_service_di, get_execution_scheduler_di,
+    get_result_cache_service_di, get_query_cost_gate_di
 )
 
 
@@ -89,9 +93,45 @@ class TestCacheSQLExecuteAPI:
             
             # バックグラウンドタスクが呼び出されたことを確認
             mock_service.prepare_sql_execution.assert_called_once_with(
-                "SELECT * FROM large_table", mock_user.user_id, 100000
+                "SELECT * FROM large_table", mock_user.user_id, 100000,
+                scope="DEFAULT", bypass_cache=False, lane="interactive", confirmed=False
             )
+            # 実行ログは完了フックで記録する（ポーリングしない）
+            assert mock_service.add_completion_hook.call_args[0][0] == "async_session_123"
+            # レスポンス送信後にバックグラウンド実行が実際に行われる
+            mock_service.execute_sql_background.assert_called_once_with(
+                "SELECT * FROM large_table", "async_session_123", mock_user.user_id, 100000, "DEFAULT"
+            )
+
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_cache_execute_sql_async_releases_queue_ticket_when_hook_fails(self, client: TestClient, mock_user):
+        """完了フックの登録に失敗した場合は、登録済みの実行待ちチケットを残さないテスト"""
+        mock_service = AsyncMock()
+        mock_service.prepare_sql_execution.return_value = {
+            "success": True,
+            "session_id": "async_session_123",
+            "total_count": 10,
+            "processed_rows": 0,
+            "execution_time": 0,
+            "message": "処理を開始しました。総件数: 10件",
+            "status": "processing"
+        }
+        mock_service.add_completion_hook.side_effect = RuntimeError("hook failed")
+        mock_service.execute_sql_background = Mock()
+        
+        app = client.app
+        app.dependency_overrides[get_hybrid_sql_service_di] = lambda: mock_service
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        app.dependency_overrides[get_sql_log_service_di] = lambda: Mock()
+        
+        try:
+            response = client.post("/api/v1/sql/cache/execute-async", json={"sql": "SELECT * FROM large_table"})
             
+            assert response.status_code == 400
+            mock_service.cleanup_session.assert_called_once_with("async_session_123")
+            mock_service.execute_sql_background.assert_not_called()
         finally:
             app.dependency_overrides.clear()
 
@@ -456,6 +496,39 @@ class TestSessionStatusAPI:
         finally:
             app.dependency_overrides.clear()
 
+    def test_get_session_status_queued(self, client: TestClient):
+        """実行待ちセッションの待ち順位取得のテスト"""
+        from app.services.execution_scheduler import ExecutionScheduler
+
+        mock_service = Mock()
+        mock_service.get_state.return_value = {
+            "session_id": "queued_session",
+            "status": "running",
+            "phase": "queued",
+            "total_count": 100,
+            "processed_count": 0,
+            "error_message": None
+        }
+        scheduler = ExecutionScheduler(global_limit=1, per_user_limit=1, bulk_limit=1,
+                                       queue_timeout_seconds=1, max_queue_length=10)
+        scheduler.acquire("running_session", "other_user")
+        scheduler.enqueue("queued_session", "test_user")
+
+        app = client.app
+        app.dependency_overrides[get_streaming_state_service_di] = lambda: mock_service
+        app.dependency_overrides[get_execution_scheduler_di] = lambda: scheduler
+
+        try:
+            response = client.get("/api/v1/sql/cache/status/queued_session")
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["phase"] == "queued"
+            assert data["queue_position"] == 1
+            assert data["is_complete"] is False
+        finally:
+            app.dependency_overrides.clear()
+
 
 class TestCancelStreamingAPI:
     """ストリーミングキャンセルAPIのテスト"""
@@ -467,6 +540,10 @@ class TestCancelStreamingAPI:
         
         mock_hybrid_service = AsyncMock()
         mock_hybrid_service.cleanup_session.return_value = True
+        mock_hybrid_service.cancel_execution.return_value = {
+            "success": True, "server_cancelled": True, "cancel_method": "cursor_cancel",
+            "query_id": None, "message": "実行中のクエリをキャンセルしました"
+        }
         
         app = client.app
         app.dependency_overrides[get_streaming_state_service_di] = lambda: mock_streaming_service
@@ -482,5 +559,63 @@ class TestCancelStreamingAPI:
             data = response.json()
             assert data["success"] is True
             assert "キャンセルしました" in data["message"]
+            assert data["server_cancelled"] is True
+            assert data["cancel_method"] == "cursor_cancel"
+            mock_hybrid_service.cancel_execution.assert_called_once_with("test_session_123")
+        finally:
+            app.dependency_overrides.clear()
+
+
+class TestCacheMetricsAPI:
+    """実行基盤のメトリクスAPI（管理者のみ）のテスト"""
+
+    def test_result_cache_metrics_require_admin(self, client: TestClient):
+        mock_result_cache = Mock()
+        mock_result_cache.get_metrics.return_value = {"hits": 3, "misses": 1}
+        app = client.app
+        app.dependency_overrides[get_result_cache_service_di] = lambda: mock_result_cache
+
+        try:
+            assert client.get("/api/v1/sql/cache/result-cache/metrics").status_code == 401
+            mock_result_cache.get_metrics.assert_not_called()
+
+            app.dependency_overrides[get_current_admin] = lambda: True
+            response = client.get("/api/v1/sql/cache/result-cache/metrics")
+            assert response.status_code == 200
+            assert response.json() == {"hits": 3, "misses": 1}
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_queue_stats_require_admin(self, client: TestClient):
+        mock_scheduler = Mock()
+        mock_scheduler.get_stats.return_value = {"running": 1, "waiting": 2}
+        app = client.app
+        app.dependency_overrides[get_execution_scheduler_di] = lambda: mock_scheduler
+
+        try:
+            assert client.get("/api/v1/sql/cache/queue/stats").status_code == 401
+            mock_scheduler.get_stats.assert_not_called()
+
+            app.dependency_overrides[get_current_admin] = lambda: True
+            response = client.get("/api/v1/sql/cache/queue/stats")
+            assert response.status_code == 200
+            assert response.json() == {"running": 1, "waiting": 2}
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_cost_gate_metrics_require_admin(self, client: TestClient):
+        mock_cost_gate = Mock()
+        mock_cost_gate.get_metrics.return_value = {"explains": 4, "estimate_cache_hits": 2}
+        app = client.app
+        app.dependency_overrides[get_query_cost_gate_di] = lambda: mock_cost_gate
+
+        try:
+            assert client.get("/api/v1/sql/cache/cost-gate/metrics").status_code == 401
+            mock_cost_gate.get_metrics.assert_not_called()
+
+            app.dependency_overrides[get_current_admin] = lambda: True
+            response = client.get("/api/v1/sql/cache/cost-gate/metrics")
+            assert response.status_code == 200
+            assert response.json() == {"explains": 4, "estimate_cache_hits": 2}
         finally:
             app.dependency_overrides.clear()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 補完チャネル（CompletionChannel と /sql/suggest/ws）のテスト
+"""
+import asyncio
+import time
+from unittest.mock import Mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.models import SQLCompletionItem, SQLCompletionResponse
+from app.dependencies import get_completion_service_di
+from app.services.completion_channel import CompletionChannel
+from app.services.completion_service import CompletionService
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.tests.test_main import app
+
+
+class RecordingCompletionService:
+    """呼び出しを記録し、指定時間だけ待ってから SQL をそのまま候補として返す"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    def get_completions(self, sql, position, context=None, user_id=None):
+        self.calls.append((sql, position, context, user_id))
+        time.sleep(self.delay)
+        return SQLCompletionResponse(
+            suggestions=[SQLCompletionItem(label=sql[:position], kind="keyword")], is_incomplete=False
+        )
+
+
+def _run_channel(service, messages, debounce=0.02, interval=0.0, settle=0.2, **kwargs):
+    """messages を interval 秒おきに送り、settle 秒待ってから (応答, チャネル) を返す"""
+    replies = []
+
+    async def send(payload):
+        replies.append(payload)
+
+    async def run(func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    async def scenario():
+        channel = CompletionChannel(service, send=send, run=run, debounce_seconds=debounce, **kwargs)
+        queue: asyncio.Queue = asyncio.Queue()
+        serving = asyncio.create_task(channel.serve(queue.get))
+        for message in messages:
+            await queue.put(message)
+            await asyncio.sleep(interval)
+        await asyncio.sleep(settle)
+        serving.cancel()
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        return channel
+
+    channel = asyncio.run(scenario())
+    return replies, channel
+
+
+class TestCompletionChannel:
+    """デバウンスと取り消しのテスト"""
+
+    def test_burst_is_debounced_to_latest_request(self):
+        service = RecordingCompletionService()
+        sql = "SELECT * FROM ORDERS"
+        messages = [{"id": i, "sql": sql[:i], "position": i, "version": i} for i in range(15, len(sql) + 1)]
+
+        replies, channel = _run_channel(service, messages)
+
+        assert len(service.calls) == 1
+        assert service.calls[0][:2] == (sql, len(sql))
+        assert [r["id"] for r in replies if r.get("cancelled")] == [m["id"] for m in messages[:-1]]
+        assert replies[-1]["id"] == len(sql)
+        assert replies[-1]["suggestions"][0]["label"] == sql
+        assert channel.stats == {"received": len(messages), "completed": 1, "cancelled": len(messages) - 1, "errors": 0}
+
+    def test_request_superseded_while_computing_is_cancelled(self):
+        service = RecordingCompletionService(delay=0.1)
+        messages = [{"id": 1, "sql": "SELECT A", "position": 8}, {"id": 2, "sql": "SELECT AB", "position": 9}]
+
+        replies, _ = _run_channel(service, messages, debounce=0.0, interval=0.05, settle=0.4)
+
+        assert [call[0] for call in service.calls] == ["SELECT A", "SELECT AB"]
+        assert replies[0] == {"id": 1, "cancelled": True}
+        assert replies[1]["id"] == 2 and replies[1]["suggestions"][0]["label"] == "SELECT AB"
+
+    def test_reuses_document_and_session_across_requests(self):
+        service = RecordingCompletionService()
+        messages = [{"id": 1, "sql": "SELECT * FROM ORDERS", "position": 14, "version": 7},
+                    {"id": 2, "position": 20}]
+
+        replies, channel = _run_channel(service, messages, debounce=0.0, interval=0.05, user_id="alice")
+
+        assert [r["id"] for r in replies] == [1, 2]
+        (sql1, _, context1, user1), (sql2, position2, context2, _) = service.calls
+        assert sql2 == sql1 and position2 == 20
+        assert context1 == context2 == {"session_id": channel.session_id, "version": 7}
+        assert user1 == "alice"
+
+    def test_invalid_messages_get_error_replies(self):
+        replies, _ = _run_channel(RecordingCompletionService(), ["x", {"id": 1, "sql": "SELECT"}])
+        assert replies[0]["error"] and replies[0]["id"] is None
+        assert replies[1]["id"] == 1 and replies[1]["error"]
+
+
+class TestCompletionWebSocketEndpoint:
+    """/api/v1/sql/suggest/ws のテスト"""
+
+    @pytest.fixture
+    def metadata_catalog(self):
+        columns = [{"name": "ID", "data_type": "NUMBER"}, {"name": "STATUS", "data_type": "VARCHAR"}]
+        return [{"name": "SALES", "tables": [
+            {"name": name, "table_type": "TABLE", "columns": columns} for name in ("ORDERS", "CUSTOMERS")
+        ]}]
+
+    @pytest.fixture
+    def completion(self, cache):
+        service = CompletionService(MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore()))
+        app.dependency_overrides[get_completion_service_di] = lambda: service
+        yield service
+        app.dependency_overrides.pop(get_completion_service_di, None)
+
+    def test_completions_over_websocket(self, completion):
+        client = TestClient(app)
+        with client.websocket_connect("/api/v1/sql/suggest/ws") as websocket:
+            websocket.send_json({"id": 1, "sql": "SELECT * FROM ORD", "position": 17, "version": 1})
+            reply = websocket.receive_json()
+            assert reply["id"] == 1
+            assert "ORDERS" in [s["label"] for s in reply["suggestions"]]
+
+            websocket.send_json({"id": 2, "sql": "SELECT o. FROM ORDERS o", "position": 9, "version": 2})
+            reply = websocket.receive_json()
+            assert reply["id"] == 2
+            assert {s["label"] for s in reply["suggestions"]} == {"ID", "STATUS"}
+
+    def test_malformed_json_gets_error_reply_and_keeps_channel_open(self, completion):
+        client = TestClient(app)
+        with client.websocket_connect("/api/v1/sql/suggest/ws") as websocket:
+            websocket.send_text("{not json")
+            reply = websocket.receive_json()
+            assert reply["id"] is None and reply["error"]
+
+            websocket.send_json({"id": 1, "sql": "SELECT * FROM ORD", "position": 17, "version": 1})
+            assert websocket.receive_json()["id"] == 1
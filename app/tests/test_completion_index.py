@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完用インデックスのテスト
+"""
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.completion_index import CompletionIndex, PrefixIndex
+from app.services.completion_service import CompletionService
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+
+
+@pytest.fixture
+def metadata_catalog():
+    return [
+        {"name": "SALES", "tables": [
+            {"name": "ORDERS", "table_type": "BASE TABLE", "comment": "受注",
+             "columns": [{"name": "ORDER_ID", "data_type": "NUMBER"}, {"name": "CUSTOMER_ID", "data_type": "NUMBER"}]},
+            {"name": "ORDER_ITEMS", "table_type": "BASE TABLE",
+             "columns": [{"name": "ITEM_ID", "data_type": "NUMBER"}]},
+            {"name": "CUSTOMERS", "table_type": "TABLE",
+             "columns": [{"name": "CUSTOMER_ID", "data_type": "NUMBER"},
+                         {"name": "CUSTOMER_NAME", "data_type": "VARCHAR", "comment": "氏名"}]},
+        ]},
+        {"name": "ARCHIVE", "tables": [
+            {"name": "ORDERS", "table_type": "BASE TABLE",
+             "columns": [{"name": "ARCHIVED_AT", "data_type": "TIMESTAMP"}]},
+        ]},
+    ]
+
+
+@pytest.fixture
+def service(cache):
+    return MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore())
+
+
+class TestPrefixIndex:
+    """PrefixIndex のテスト"""
+
+    def test_lookup_returns_prefix_range_in_key_order(self):
+        index = PrefixIndex([("ORDERS", 1), ("CUSTOMERS", 2), ("ORDER_ITEMS", 3), ("ORD", 4), ("PRE_ORDERS", 5)])
+
+        assert index.lookup("ORDER") == [1, 3]
+        assert index.lookup("ORD") == [4, 1, 3]
+        assert index.lookup("ORD", limit=2) == [4, 1]
+        assert index.lookup("Z") == []
+        assert index.lookup("") == [2, 4, 1, 3, 5]
+
+
+class TestCompletionIndex:
+    """CompletionIndex と CompletionService の連携テスト"""
+
+    def test_index_covers_schemas_tables_columns_and_keywords(self, metadata_catalog):
+        index = CompletionIndex(metadata_catalog, {"SELECT": "", "SET": ""}, {"SUM": ""})
+
+        assert [s["name"] for s in index.schemas.lookup("S")] == ["SALES"]
+        assert [t.label for t in index.tables.lookup("ORD")] == ["ORDERS", "ORDERS", "ORDER_ITEMS"]
+        assert [c.label for c in index.columns_for("orders").lookup("")] == ["ARCHIVED_AT", "CUSTOMER_ID", "ORDER_ID"]
+        assert index.columns_for("ORDERS") is index.columns_for("Orders")
+        assert [k.label for k in index.keywords.lookup("SE")] == ["SELECT", "SET"]
+        assert [f.insert_text for f in index.functions.lookup("S")] == ["SUM($1)"]
+
+    def test_index_is_built_once_per_snapshot_version(self, service, monkeypatch):
+        builds = []
+        original_init = CompletionIndex.__init__
+
+        def counting_init(self, *args, **kwargs):
+            builds.append(1)
+            original_init(self, *args, **kwargs)
+
+        monkeypatch.setattr(CompletionIndex, "__init__", counting_init)
+        first = CompletionService(service)
+        second = CompletionService(service)
+
+        first.get_completions("SELECT * FROM ORD", len("SELECT * FROM ORD"))
+        second.get_completions("SELECT * FROM CUS", len("SELECT * FROM CUS"))
+        assert len(builds) == 1
+
+        service.snapshot_store.reload(service.cache)
+        first.get_completions("SELECT * FROM ORD", len("SELECT * FROM ORD"))
+        assert len(builds) == 2
+
+    def test_completions_use_index(self, service):
+        completion = CompletionService(service)
+
+        sql = "SELECT * FROM ORD"
+        tables = [s.label for s in completion.get_completions(sql, len(sql)).suggestions
+                  if s.kind in ("table", "view")]
+        assert tables == ["ORDERS", "ORDER_ITEMS"]
+
+        sql = "SELECT c. FROM CUSTOMERS c"
+        items = completion.get_completions(sql, len("SELECT c.")).suggestions
+        assert [s.label for s in items] == ["CUSTOMER_ID", "CUSTOMER_NAME"]
+        assert items[1].detail == "氏名"
+
+        sql = "SELECT CUS FROM ORDERS"
+        labels = [s.label for s in completion.get_completions(sql, len("SELECT CUS")).suggestions]
+        assert labels == ["CUSTOMER_ID"]
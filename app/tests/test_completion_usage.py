@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+補完候補の利用状況ランキングのテスト
+"""
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+from app.logger import get_logger
+from app.services.completion_service import CompletionService
+from app.services.completion_usage_service import (
+    OBJECT_COLUMN, OBJECT_JOIN, OBJECT_TABLE, CompletionUsageService, extract_usage, join_key,
+)
+from app.services.log_handlers.sqlite import SqliteLogHandler
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.services.sql_log_service import SQLLogService
+
+
+@pytest.fixture
+def metadata_catalog():
+    columns = [{"name": name, "data_type": "NUMBER"} for name in ("ID", "CUSTOMER_ID", "AMOUNT", "STATUS")]
+    return [{"name": "SALES", "tables": [
+        {"name": name, "table_type": "TABLE", "columns": columns}
+        for name in ("ORDERS", "ORDER_ITEMS", "ORDER_HISTORY", "CUSTOMERS")
+    ]}]
+
+
+@pytest.fixture
+def usage(cache):
+    return CompletionUsageService(cache, half_life_days=30)
+
+
+def _log(user_id, sql, days_ago=0):
+    return {"user_id": user_id, "sql": sql, "timestamp": (datetime.now() - timedelta(days=days_ago)).isoformat()}
+
+
+class TestExtractUsage:
+    """SQLからの利用状況抽出のテスト"""
+
+    def test_tables_columns_and_joins(self):
+        usage = extract_usage(
+            "SELECT o.ID, c.NAME, COUNT(*) AS cnt FROM SALES.ORDERS o "
+            "JOIN CUSTOMERS c ON c.ID = o.CUSTOMER_ID -- x.IGNORED"
+        )
+        assert usage.tables == ["ORDERS", "CUSTOMERS"]
+        assert set(usage.columns) == {"ORDERS.ID", "ORDERS.CUSTOMER_ID", "CUSTOMERS.NAME", "CUSTOMERS.ID"}
+        assert usage.joins == ["CUSTOMERS|ORDERS"]
+
+    def test_unqualified_columns_for_single_table(self):
+        usage = extract_usage("SELECT ID, SUM(AMOUNT) AS total FROM ORDERS WHERE STATUS = 'X' GROUP BY ID")
+        assert set(usage.columns) == {"ORDERS.ID", "ORDERS.AMOUNT", "ORDERS.STATUS"}
+
+
+class TestCompletionUsageService:
+    """利用状況の集計とスコアのテスト"""
+
+    def test_user_usage_outweighs_global_and_recency_decays(self, usage):
+        usage.record_logs([
+            _log("alice", "SELECT * FROM ORDERS"),
+            _log("bob", "SELECT * FROM ORDER_ITEMS"),
+            _log("bob", "SELECT * FROM ORDER_ITEMS"),
+            _log("bob", "SELECT * FROM ORDER_HISTORY", days_ago=120),
+            _log("bob", "SELECT * FROM ORDER_HISTORY", days_ago=120),
+        ])
+        ranking = usage.get_ranking()
+
+        assert ranking.score("alice", OBJECT_TABLE, "orders") > ranking.score("alice", OBJECT_TABLE, "ORDER_ITEMS")
+        assert ranking.score("bob", OBJECT_TABLE, "ORDER_ITEMS") > ranking.score("bob", OBJECT_TABLE, "ORDERS")
+        assert ranking.score("bob", OBJECT_TABLE, "ORDER_ITEMS") > ranking.score("bob", OBJECT_TABLE, "ORDER_HISTORY")
+        assert ranking.score(None, OBJECT_TABLE, "CUSTOMERS") == 0.0
+
+    def test_stats_are_persisted(self, usage, cache):
+        usage.record_logs([_log("alice", "SELECT o.ID FROM ORDERS o JOIN CUSTOMERS c ON c.ID = o.CUSTOMER_ID")])
+
+        reloaded = CompletionUsageService(cache, half_life_days=30).get_ranking()
+        assert reloaded.score("alice", OBJECT_COLUMN, "ORDERS.ID") > 0
+        assert reloaded.score("alice", OBJECT_JOIN, join_key("ORDERS", "CUSTOMERS")) > 0
+
+    def test_sync_reads_only_new_sqlite_logs(self, usage, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        log_service = SQLLogService.__new__(SQLLogService)
+        log_service.log_handler = handler
+        log_service.log_storage_type = "sqlite"
+        log_service.logger = get_logger(__name__)
+        usage.SYNC_BATCH_SIZE = 2
+        for _ in range(3):
+            handler.add_log("alice", "SELECT * FROM ORDERS", 0.1, datetime.now(), 1, True)
+
+        assert usage.sync_from_logs(log_service) == 3
+        assert usage.sync_from_logs(log_service) == 0
+
+        handler.add_log("alice", "SELECT * FROM CUSTOMERS", 0.1, datetime.now(), 1, True)
+        assert usage.sync_from_logs(log_service) == 1
+        with usage._get_conn() as conn:
+            counts = dict(conn.execute(
+                "SELECT name, use_count FROM completion_usage_stats WHERE user_id = 'alice' AND object_type = 'table'"
+            ).fetchall())
+        assert counts == {"ORDERS": 3, "CUSTOMERS": 1}
+
+
+class TestUsageAwareCompletion:
+    """CompletionService への反映のテスト"""
+
+    @pytest.fixture
+    def completion(self, cache, usage):
+        service = MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore())
+        return CompletionService(service, usage)
+
+    def _tables(self, completion, sql, user_id):
+        return [s.label for s in completion.get_completions(sql, len(sql), user_id=user_id).suggestions
+                if s.kind in ("table", "view")]
+
+    def test_frequently_used_tables_come_first(self, completion, usage):
+        assert self._tables(completion, "SELECT * FROM ORD", "alice") == ["ORDERS", "ORDER_HISTORY", "ORDER_ITEMS"]
+
+        usage.record_logs([_log("alice", "SELECT * FROM ORDER_ITEMS")] * 3 + [_log("alice", "SELECT * FROM ORDER_HISTORY")])
+        assert self._tables(completion, "SELECT * FROM ORD", "alice") == ["ORDER_ITEMS", "ORDER_HISTORY", "ORDERS"]
+
+    def test_join_partners_are_boosted(self, completion, usage):
+        usage.record_logs([_log("bob", "SELECT * FROM CUSTOMERS c JOIN ORDER_HISTORY h ON h.CUSTOMER_ID = c.ID")])
+        usage.record_logs([_log("bob", "SELECT * FROM ORDER_ITEMS")])
+
+        sql = "SELECT * FROM CUSTOMERS c JOIN ORD"
+        assert self._tables(completion, sql, "bob")[0] == "ORDER_HISTORY"
+
+    def test_frequently_used_columns_come_first(self, completion, usage):
+        usage.record_logs([_log("alice", "SELECT STATUS FROM ORDERS")])
+        sql = "SELECT o. FROM ORDERS o"
+        labels = [s.label for s in completion.get_completions(sql, len("SELECT o."), user_id="alice").suggestions]
+        assert labels[0] == "STATUS"
+        assert sorted(labels[1:]) == labels[1:]
@@ -1,27 +1,28 @@
 # -*- coding: utf-8 -*-
 """
 エラーレスポンス統一の最小テスト
-- HTTPException 経路: /api/v1/logs/analytics (501)
+- HTTPException 経路: /api/v1/logs/analytics （ログ分析無効時 503）
 - バリデーションエラー経路: /api/v1/admin/login （password欠如 422）
 """
 from fastapi.testclient import TestClient
 from app.tests.test_main import app
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_log_analytics_service_di
 
 
 def test_http_exception_has_standard_fields():
     client = TestClient(app)
 
-    # 認証を上書きして 501 のスタブまで到達させる
+    # 認証を上書きし、ログ分析を無効化して 503 を発生させる
     def override_current_user():
         return {"user_id": "test_user", "user_name": "Test User", "role": "USER"}
     app.dependency_overrides[get_current_user] = override_current_user
+    app.dependency_overrides[get_log_analytics_service_di] = lambda: None
 
     res = client.get("/api/v1/logs/analytics")
-    assert res.status_code == 501
+    assert res.status_code == 503
     body = res.json()
     assert body["error"] is True
-    assert body["status_code"] == 501
+    assert body["status_code"] == 503
     assert isinstance(body.get("timestamp"), float)
     assert "message" in body
     assert "detail" in body
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+バックグラウンド実行の完了フックと、完了フックによるSQL実行ログ記録のテスト
+"""
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+from fastapi.testclient import TestClient
+
+from app.api.routers.cache import log_sql_execution_on_finish
+from app.dependencies import get_current_user, get_hybrid_sql_service_di, get_sql_log_service_di
+from app.logger import get_logger
+from app.services.hybrid_sql_service import HybridSQLService
+from app.services.log_handlers import SqliteLogHandler
+from app.services.sql_log_service import SQLLogService
+from app.services.streaming_state_service import StreamingStateService
+
+
+class TestStreamingStateCompletionHook:
+    """StreamingStateService の完了フックのテスト"""
+
+    def test_fires_once_on_completion_with_final_state(self):
+        service = StreamingStateService()
+        service.create_streaming_state("s1", 100)
+        hook = Mock()
+        service.add_completion_hook("s1", hook)
+
+        service.update_progress("s1", 50)
+        hook.assert_not_called()
+        service.complete_streaming("s1", 100, execution_time=12.5)
+        service.error_streaming("s1", "後から届いたエラー")
+
+        hook.assert_called_once()
+        state = hook.call_args[0][0]
+        assert (state["status"], state["processed_count"], state["execution_time"]) == ("completed", 100, 12.5)
+
+    def test_fires_on_error_and_cancel(self):
+        service = StreamingStateService()
+        service.create_streaming_state("err")
+        service.create_streaming_state("cancel")
+        on_error, on_cancel = Mock(), Mock()
+        service.add_completion_hook("err", on_error)
+        service.add_completion_hook("cancel", on_cancel)
+
+        service.error_streaming("err", "接続が切断されました")
+        assert service.cancel_streaming("cancel") is True
+
+        assert on_error.call_args[0][0]["error_message"] == "接続が切断されました"
+        assert on_error.call_args[0][0]["execution_time"] >= 0
+        assert on_cancel.call_args[0][0]["status"] == "cancelled"
+
+    def test_late_registration_fires_immediately(self):
+        service = StreamingStateService()
+        service.create_streaming_state("s1")
+        service.complete_streaming("s1", 3)
+
+        hook = Mock()
+        service.add_completion_hook("s1", hook)
+        assert hook.call_args[0][0]["processed_count"] == 3
+
+    def test_long_running_execution_is_not_limited_by_wait_time(self):
+        service = StreamingStateService()
+        service.create_streaming_state("s1")
+        # 開始から10分経過した実行でも、終了時に一度だけ通知される
+        service._states["s1"]["start_time"] = datetime.now() - timedelta(minutes=10)
+        hook = Mock()
+        service.add_completion_hook("s1", hook)
+
+        service.complete_streaming("s1", 5_000_000)
+        assert hook.call_args[0][0]["execution_time"] >= 600
+
+    def test_failing_hook_does_not_block_others(self):
+        service = StreamingStateService()
+        service.create_streaming_state("s1")
+        broken, hook = Mock(side_effect=RuntimeError("boom")), Mock()
+        service.add_completion_hook("s1", broken)
+        service.add_completion_hook("s1", hook)
+
+        service.complete_streaming("s1", 1)
+        hook.assert_called_once()
+
+    def test_cleanup_discards_pending_hooks(self):
+        service = StreamingStateService()
+        service.create_streaming_state("s1")
+        hook = Mock()
+        service.add_completion_hook("s1", hook)
+
+        service.cleanup_state("s1")
+        service.create_streaming_state("s1")
+        service.complete_streaming("s1", 1)
+        hook.assert_not_called()
+
+
+class TestBackgroundExecutionLogging:
+    """HybridSQLService のバックグラウンド実行終了時のログ記録のテスト"""
+
+    def _service(self):
+        streaming_state_service = StreamingStateService()
+        service = HybridSQLService(cache_service=Mock(), connection_manager=Mock(),
+                                   streaming_state_service=streaming_state_service)
+        streaming_state_service.create_streaming_state("s1", 10)
+        sql_log_service = Mock()
+        assert service.add_completion_hook(
+            "s1", lambda state: log_sql_execution_on_finish(sql_log_service, "alice", "SELECT 1", datetime.now(), state))
+        return service, sql_log_service
+
+    def test_success_is_logged_from_worker_thread(self):
+        service, sql_log_service = self._service()
+        service._fetch_and_cache_data = Mock(return_value=10)
+
+        thread = threading.Thread(target=service.execute_sql_background, args=("SELECT 1", "s1", "alice"))
+        thread.start()
+        thread.join(timeout=5)
+
+        args = sql_log_service.add_log_to_db.call_args[0]
+        assert args[0:2] == ("alice", "SELECT 1")
+        assert (args[4], args[5], args[6]) == (10, True, None)
+
+    def test_failure_is_logged(self):
+        service, sql_log_service = self._service()
+        service._fetch_and_cache_data = Mock(side_effect=RuntimeError("SQL compilation error"))
+
+        service.execute_sql_background("SELECT 1", "s1", "alice")
+
+        args = sql_log_service.add_log_to_db.call_args[0]
+        assert (args[5], args[6]) == (False, "SQL compilation error")
+
+    def test_cancel_is_logged(self):
+        service, sql_log_service = self._service()
+
+        service.cancel_execution("s1")
+
+        sql_log_service.add_log_to_db.assert_called_once()
+        assert sql_log_service.add_log_to_db.call_args[0][5] is False
+
+    def test_without_streaming_state_hook_cannot_be_registered(self):
+        service = HybridSQLService(cache_service=Mock(), connection_manager=Mock())
+        assert service.add_completion_hook("s1", Mock()) is False
+
+
+class TestExecuteAsyncLogging:
+    """/execute-async の投入から実行ログの書き込みまでのテスト"""
+
+    def _log_service(self, tmp_path):
+        sql_log_service = SQLLogService.__new__(SQLLogService)
+        sql_log_service.log_storage_type = "sqlite"
+        sql_log_service.log_handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        sql_log_service.log_writer = None
+        sql_log_service.log_analytics = None
+        sql_log_service.logger = get_logger(__name__)
+        return sql_log_service
+
+    def test_background_execution_is_logged_end_to_end(self, client: TestClient, mock_user, tmp_path):
+        cache_service = Mock()
+        cache_service.generate_session_id.return_value = "async_s1"
+        cache_service.register_session.return_value = True
+        streaming_state_service = StreamingStateService()
+        service = HybridSQLService(cache_service=cache_service, connection_manager=Mock(),
+                                   streaming_state_service=streaming_state_service)
+        service._get_total_count = Mock(return_value=3)
+        service._fetch_and_cache_data = Mock(return_value=3)
+        sql_log_service = self._log_service(tmp_path)
+
+        app = client.app
+        app.dependency_overrides[get_hybrid_sql_service_di] = lambda: service
+        app.dependency_overrides[get_sql_log_service_di] = lambda: sql_log_service
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        try:
+            sql = "SELECT * FROM ORDERS WHERE ORDER_DATE = '2025-01-01'"
+            response = client.post("/api/v1/sql/cache/execute-async", json={"sql": sql})
+            assert response.json()["status"] == "processing"
+
+            # TestClient はバックグラウンドタスクの終了まで待つため、この時点で実行と記録が済んでいる
+            service._fetch_and_cache_data.assert_called_once()
+            logs = sql_log_service.log_handler.get_logs(mock_user.user_id, 10, 0)["logs"]
+            assert [log["sql"] for log in logs] == [sql]
+            assert streaming_state_service._completion_hooks == {}
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_cache_hit_is_logged_directly(self, client: TestClient, mock_user, tmp_path):
+        service = Mock()
+        service.prepare_sql_execution.return_value = {
+            "success": True, "session_id": "reused_s1", "total_count": 3, "processed_rows": 3,
+            "execution_time": 0.01, "message": "キャッシュから取得しました", "status": "completed", "cache_hit": True,
+        }
+        sql_log_service = self._log_service(tmp_path)
+
+        app = client.app
+        app.dependency_overrides[get_hybrid_sql_service_di] = lambda: service
+        app.dependency_overrides[get_sql_log_service_di] = lambda: sql_log_service
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        try:
+            response = client.post("/api/v1/sql/cache/execute-async", json={"sql": "SELECT 1"})
+
+            assert response.json()["cache_hit"] is True
+            # 実行しないため完了フックは登録せず、その場で記録する
+            service.add_completion_hook.assert_not_called()
+            service.execute_sql_background.assert_not_called()
+            logs = sql_log_service.log_handler.get_logs(mock_user.user_id, 10, 0)["logs"]
+            assert [log["sql"] for log in logs] == ["SELECT 1"]
+        finally:
+            app.dependency_overrides.clear()
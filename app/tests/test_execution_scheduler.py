@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行スケジューラーのテスト
+
+スリープするフェイクカーソルで競合状態を再現し、公平性とスループットを検証する
+HybridSQLService の実行経路（キュー登録 → 実行枠待機）でも、2ユーザー間の公平性を検証する
+"""
+import asyncio
+import itertools
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from app.exceptions import RateLimitError
+from app.services.execution_scheduler import ExecutionScheduler, LANE_BULK, LANE_INTERACTIVE
+from app.services.hybrid_sql_service import HybridSQLService
+from app.services.streaming_state_service import StreamingStateService
+
+
+class SleepingCursor:
+    """fetchmany のたびに一定時間スリープするフェイクカーソル"""
+
+    def __init__(self, rows: int = 2, delay: float = 0.05):
+        self._remaining = rows
+        self._delay = delay
+
+    def execute(self, sql):
+        time.sleep(self._delay)
+
+    def fetchmany(self, size):
+        time.sleep(self._delay)
+        if self._remaining <= 0:
+            return []
+        self._remaining -= 1
+        return [("v",)]
+
+
+def _make_scheduler(**kwargs):
+    params = dict(global_limit=2, per_user_limit=2, bulk_limit=1, queue_timeout_seconds=5, max_queue_length=50)
+    params.update(kwargs)
+    return ExecutionScheduler(**params)
+
+
+def _run_job(scheduler, session_id, user_id, lane, started, finished):
+    assert scheduler.acquire(session_id, user_id, lane)
+    started[session_id] = time.monotonic()
+    try:
+        cursor = SleepingCursor()
+        cursor.execute("SELECT 1")
+        while cursor.fetchmany(1000):
+            pass
+    finally:
+        finished[session_id] = time.monotonic()
+        scheduler.release(session_id)
+
+
+def _start(scheduler, jobs, started, finished, stagger: float = 0.01):
+    threads = []
+    for session_id, user_id, lane in jobs:
+        t = threading.Thread(target=_run_job, args=(scheduler, session_id, user_id, lane, started, finished))
+        t.start()
+        threads.append(t)
+        time.sleep(stagger)
+    return threads
+
+
+class TestExecutionScheduler:
+    """ExecutionSchedulerのテスト"""
+
+    def test_one_user_cannot_monopolize_slots(self):
+        scheduler = _make_scheduler(global_limit=3, per_user_limit=2)
+        started, finished = {}, {}
+        jobs = [(f"a{i}", "user_a", LANE_INTERACTIVE) for i in range(5)] + [("b0", "user_b", LANE_INTERACTIVE)]
+        for t in _start(scheduler, jobs, started, finished):
+            t.join(timeout=10)
+
+        assert len(finished) == 6
+        # user_b は user_a の3件目より先に開始される
+        assert started["b0"] < started["a2"]
+        assert scheduler.get_stats()["running"] == 0
+
+    def test_concurrent_execution_improves_throughput(self):
+        scheduler = _make_scheduler(global_limit=3, per_user_limit=3)
+        started, finished = {}, {}
+        jobs = [(f"s{i}", f"user_{i}", LANE_INTERACTIVE) for i in range(6)]
+        begin = time.monotonic()
+        for t in _start(scheduler, jobs, started, finished, stagger=0):
+            t.join(timeout=10)
+        elapsed = time.monotonic() - begin
+
+        serial_time = 6 * 4 * 0.05  # execute + fetchmany x3 を直列実行した場合
+        assert len(finished) == 6
+        assert elapsed < serial_time * 0.75
+
+    def test_interactive_lane_is_dispatched_before_bulk(self):
+        scheduler = _make_scheduler(global_limit=1)
+        assert scheduler.acquire("running", "user_x", LANE_INTERACTIVE)
+        scheduler.enqueue("bulk", "user_y", LANE_BULK)
+        scheduler.enqueue("interactive", "user_z", LANE_INTERACTIVE)
+
+        assert scheduler.get_queue_position("interactive") == 1
+        assert scheduler.get_queue_position("bulk") == 2
+
+        scheduler.release("running")
+        assert scheduler.wait_for_slot("bulk", timeout=0.05) is False  # interactive が先
+        assert scheduler.wait_for_slot("interactive", timeout=0.05) is True
+        assert scheduler.get_queue_position("interactive") == 0
+
+    def test_bulk_lane_limit(self):
+        scheduler = _make_scheduler(global_limit=3, per_user_limit=3, bulk_limit=1)
+        assert scheduler.acquire("bulk1", "user_a", LANE_BULK)
+        assert scheduler.acquire("bulk2", "user_b", LANE_BULK, timeout=0.05) is False
+        assert scheduler.acquire("int1", "user_b", LANE_INTERACTIVE, timeout=0.05) is True
+
+    def test_queue_timeout_and_cancel(self):
+        scheduler = _make_scheduler(global_limit=1)
+        assert scheduler.acquire("s1", "user_a")
+        scheduler.enqueue("s2", "user_b")
+        assert scheduler.wait_for_slot("s2", timeout=0.05) is False
+        assert scheduler.get_queue_position("s2") is None
+        assert scheduler.get_stats()["timeouts"] == 1
+
+        # 待機中にreleaseされた場合（キャンセル）は即座にFalse
+        scheduler.enqueue("s3", "user_b")
+        threading.Timer(0.05, scheduler.release, args=("s3",)).start()
+        assert scheduler.wait_for_slot("s3", timeout=5) is False
+
+    def test_ticket_without_waiter_does_not_block_free_slots(self):
+        scheduler = _make_scheduler(global_limit=2)
+        # 登録したまま実行枠を待たない（バックグラウンド実行が始まらなかった）チケット
+        scheduler.enqueue("orphan", "user_a")
+
+        assert scheduler.acquire("s2", "user_b", timeout=0.05) is True
+
+    def test_stale_ticket_expires_without_its_waiter(self):
+        scheduler = _make_scheduler(global_limit=1, queue_timeout_seconds=0.1)
+        scheduler.enqueue("orphan", "user_a")
+        time.sleep(0.05)
+        scheduler.enqueue("s2", "user_b")
+
+        # 先頭のチケットは待機者がいなくても期限切れで除去され、後続が実行枠を得る
+        assert scheduler.wait_for_slot("s2", timeout=1) is True
+        assert scheduler.get_queue_position("orphan") is None
+        assert scheduler.get_stats()["timeouts"] == 1
+
+    def test_queue_length_limit(self):
+        scheduler = _make_scheduler(global_limit=1, max_queue_length=1)
+        assert scheduler.acquire("s1", "user_a")
+        scheduler.enqueue("s2", "user_b")
+        with pytest.raises(RateLimitError):
+            scheduler.enqueue("s3", "user_c")
+        assert scheduler.get_stats()["rejected"] == 1
+
+    def test_async_wait_does_not_block_event_loop(self):
+        scheduler = _make_scheduler(global_limit=1)
+        assert scheduler.acquire("s1", "user_a")
+
+        async def scenario():
+            ticks = []
+
+            async def ticker():
+                # 実行枠の待機中もイベントループが他の処理を進められること
+                for _ in range(5):
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+
+            threading.Timer(0.1, scheduler.release, args=("s1",)).start()
+            acquired, _ = await asyncio.gather(scheduler.acquire_async("s2", "user_b", timeout=5), ticker())
+            return acquired, ticks
+
+        acquired, ticks = asyncio.run(scenario())
+        assert acquired is True
+        assert len(ticks) == 5
+        assert scheduler.get_queue_position("s2") == 0
+
+    def test_async_wait_timeout_and_cancel(self):
+        scheduler = _make_scheduler(global_limit=1)
+        assert scheduler.acquire("s1", "user_a")
+
+        async def scenario():
+            timed_out = await scheduler.acquire_async("s2", "user_b", timeout=0.05)
+            scheduler.enqueue("s3", "user_b")
+            threading.Timer(0.05, scheduler.release, args=("s3",)).start()
+            cancelled = await scheduler.wait_for_slot_async("s3", timeout=5)
+            return timed_out, cancelled
+
+        assert asyncio.run(scenario()) == (False, False)
+        assert scheduler.get_stats()["timeouts"] == 1
+        assert scheduler._async_waiters == {}
+
+
+SQL = "SELECT * FROM ORDERS WHERE ORDER_DATE = '2025-01-01'"
+
+
+class TestSchedulerFairnessThroughService:
+    """HybridSQLService の実行経路（キュー登録 → 実行枠待機 → データ取得）での公平性のテスト"""
+
+    def _service(self, scheduler, started):
+        ids = itertools.count()
+        cache_service = Mock()
+        cache_service.generate_session_id.side_effect = lambda user_id: f"{user_id}_{next(ids)}"
+        cache_service.register_session.return_value = True
+        service = HybridSQLService(cache_service=cache_service, connection_manager=Mock(),
+                                   streaming_state_service=StreamingStateService(),
+                                   execution_scheduler=scheduler)
+        service._get_total_count = Mock(return_value=1)
+
+        def fetch(sql, session_id, limit=None):
+            started.append(session_id)
+            time.sleep(0.1)
+            return 1
+
+        service._fetch_and_cache_data = fetch
+        return service
+
+    def test_failed_prepare_releases_queue_ticket(self):
+        scheduler = _make_scheduler(global_limit=1)
+        assert scheduler.acquire("running", "user_x")
+        service = self._service(scheduler, [])
+        service.streaming_state_service = Mock()
+        service.streaming_state_service.update_phase.side_effect = RuntimeError("state store unavailable")
+
+        with pytest.raises(Exception, match="SQL準備に失敗しました"):
+            service.prepare_sql_execution(SQL, "user_a")
+
+        assert scheduler.get_stats()["waiting"] == 0
+
+    def test_second_user_is_not_starved_by_first_users_queue(self):
+        scheduler = _make_scheduler(global_limit=2, per_user_limit=2)
+        started = []
+        service = self._service(scheduler, started)
+
+        # user_a が先に4件投入し、その後 user_b が1件投入する
+        sessions = []
+        for user_id in ["user_a"] * 4 + ["user_b"]:
+            prepared = service.prepare_sql_execution(SQL, user_id)
+            sessions.append((prepared["session_id"], user_id))
+        threads = [threading.Thread(target=service.execute_sql_background, args=(SQL, session_id, user_id))
+                   for session_id, user_id in sessions]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+
+        assert len(started) == 5
+        # user_b は user_a の3件より後に到着したが、実行中件数の少ないユーザーとして2番目の枠を得る
+        assert started[:2] == ["user_a_0", "user_b_4"]
+        # 2件が同時に終わると空いた2枠へ同時に割り当てるため、その2件の開始順は問わない
+        assert set(started[2:4]) == {"user_a_1", "user_a_2"} and started[4] == "user_a_3"
+        assert scheduler.get_stats()["running"] == 0
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行ログの分析（書き込み時に更新するロールアップ）と、期間指定のログ読み出しのテスト
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.logger import get_logger
+from app.metadata_cache import MetadataCache
+from app.services.log_analytics_service import (
+    LogAnalyticsService, percentile_from_histogram, sql_fingerprint, latency_bin,
+)
+from app.services.log_handlers import SqliteLogHandler, SQLLogRecord
+from app.services.sql_log_service import SQLLogService
+from app.services.sql_log_writer import SQLLogWriter
+
+DAY = datetime(2025, 1, 17, 9, 30, 0)
+
+
+def _record(user_id: str, sql: str, execution_time: float, end_time: datetime,
+            row_count: int = 10, success: bool = True) -> SQLLogRecord:
+    return SQLLogRecord(user_id, sql, execution_time, end_time - timedelta(seconds=execution_time),
+                        row_count, success, None if success else "error", end_time=end_time)
+
+
+@pytest.fixture
+def analytics(tmp_path):
+    cache = MetadataCache(db_path=str(tmp_path / "metadata_cache.db"))
+    return LogAnalyticsService(cache, hourly_retention_days=90, top_n=5)
+
+
+class TestSQLFingerprint:
+    """SQLフィンガープリントのテスト"""
+
+    def test_literals_and_in_lists_are_collapsed(self):
+        first, normalized = sql_fingerprint("SELECT * FROM ORDERS WHERE ID IN (1, 2, 3) AND NAME = 'a' -- memo")
+        second, _ = sql_fingerprint("select * from orders where id in (42) and name = 'bb';")
+        assert normalized == "SELECT * FROM ORDERS WHERE ID IN ( ? ) AND NAME = ?"
+        assert first == second
+
+    def test_different_tables_have_different_fingerprints(self):
+        assert sql_fingerprint("SELECT 1 FROM A")[0] != sql_fingerprint("SELECT 1 FROM B")[0]
+
+    def test_percentile_from_histogram(self):
+        bins = {latency_bin(0.05): 90, latency_bin(4.0): 10}
+        assert percentile_from_histogram(bins, 0.5, 4.0) == 0.1
+        assert percentile_from_histogram(bins, 0.95, 4.0) == 4.0
+        assert percentile_from_histogram({}, 0.5, 0.0) is None
+
+
+class TestLogAnalyticsService:
+    """ロールアップの更新と集計のテスト"""
+
+    def test_rollups_summarize_per_user_and_overall(self, analytics):
+        analytics.record_logs([
+            _record("alice", "SELECT * FROM T WHERE ID = 1", 0.05, DAY, row_count=5),
+            _record("alice", "SELECT * FROM T WHERE ID = 2", 0.2, DAY + timedelta(hours=1), row_count=7),
+            _record("bob", "SELECT * FROM U", 3.0, DAY, row_count=0, success=False),
+        ])
+        # 別バッチの追記は既存のロールアップに加算される
+        analytics.record_logs([_record("alice", "SELECT * FROM T WHERE ID = 3", 0.05, DAY + timedelta(days=1))])
+
+        alice = analytics.get_analytics(date(2025, 1, 17), date(2025, 1, 18), user_id="alice")
+        assert alice["total_queries"] == 3 and alice["error_count"] == 0 and alice["total_rows"] == 22
+        assert [point["bucket"] for point in alice["series"]] == ["2025-01-17", "2025-01-18"]
+        assert alice["series"][0]["total_queries"] == 2
+        assert alice["top_queries"][0]["total_queries"] == 3
+        assert alice["top_queries"][0]["sample_sql"] == "SELECT * FROM T WHERE ID = ?"
+
+        overall = analytics.get_analytics(date(2025, 1, 17), date(2025, 1, 17), include_users=True)
+        assert overall["total_queries"] == 3 and overall["error_count"] == 1
+        assert overall["success_rate"] == pytest.approx(2 / 3, abs=1e-4)
+        assert overall["max_execution_time"] == 3.0 and overall["p95_execution_time"] == 3.0
+        assert [user["user_id"] for user in overall["users"]] == ["alice", "bob"]
+
+    def test_hourly_grain_and_date_range(self, analytics):
+        # 時間単位は保持期間内のみ残るため、直近の日時で記録する
+        base = datetime.combine(date.today() - timedelta(days=3), DAY.time())
+        analytics.record_logs([
+            _record("alice", "SELECT 1", 0.1, base),
+            _record("alice", "SELECT 1", 0.1, base + timedelta(minutes=20)),
+            _record("alice", "SELECT 1", 0.1, base + timedelta(hours=2)),
+            _record("alice", "SELECT 1", 0.1, base + timedelta(days=1)),
+        ])
+
+        result = analytics.get_analytics(base.date(), base.date(), grain="hour", user_id="alice")
+
+        day = base.date().isoformat()
+        assert [(point["bucket"], point["total_queries"]) for point in result["series"]] == [
+            (f"{day}T09:00", 2), (f"{day}T11:00", 1)
+        ]
+        assert result["total_queries"] == 3
+        with pytest.raises(ValueError):
+            analytics.get_analytics(date(2025, 1, 17), date(2025, 1, 17), grain="month")
+
+    def test_hourly_rollups_are_pruned_after_retention(self, analytics):
+        old = datetime.now() - timedelta(days=120)
+        analytics.record_logs([_record("alice", "SELECT 1", 0.1, old)])
+        analytics._pruned_at = datetime.min
+        analytics.record_logs([_record("alice", "SELECT 1", 0.1, datetime.now())])
+
+        hourly = analytics.get_analytics(old.date(), old.date(), grain="hour", user_id="alice")
+        daily = analytics.get_analytics(old.date(), old.date(), user_id="alice")
+        assert hourly["total_queries"] == 0 and hourly["series"] == []
+        assert daily["total_queries"] == 1
+
+    def test_writer_updates_rollups_after_batch_write(self, analytics, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        writer = SQLLogWriter(handler, batch_size=10, flush_interval=0.01)
+        writer.add_listener(analytics.record_logs)
+        writer.start()
+        try:
+            for n in range(5):
+                writer.submit(_record("alice", f"SELECT {n}", 0.1, DAY))
+            writer.flush()
+        finally:
+            writer.stop()
+
+        assert analytics.get_analytics(date(2025, 1, 17), date(2025, 1, 17), user_id="alice")["total_queries"] == 5
+
+
+class TestIterLogs:
+    """エクスポート用の期間指定ログ読み出しのテスト"""
+
+    @staticmethod
+    def _service(handler) -> SQLLogService:
+        service = SQLLogService.__new__(SQLLogService)
+        service.settings = None
+        service.log_storage_type = "sqlite"
+        service.log_handler = handler
+        service.logger = get_logger(__name__)
+        return service
+
+    def test_iter_logs_pages_through_window(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs([_record("alice", f"SELECT {n}", 0.1, DAY + timedelta(hours=n)) for n in range(30)])
+        handler.write_logs([_record("bob", "SELECT 0", 0.1, DAY)])
+        service = self._service(handler)
+
+        logs = list(service.iter_logs("alice", DAY + timedelta(hours=5), DAY + timedelta(hours=25), page_size=4))
+
+        assert [log["sql"] for log in logs] == [f"SELECT {n}" for n in range(24, 4, -1)]
+
+    def test_iter_logs_raises_when_a_later_page_fails(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs([_record("alice", f"SELECT {n}", 0.1, DAY + timedelta(hours=n)) for n in range(10)])
+        read_page = handler.get_history
+        calls = []
+
+        def flaky_get_history(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > 1:
+                raise RuntimeError("log store unavailable")
+            return read_page(*args, **kwargs)
+
+        handler.get_history = flaky_get_history
+        logs = []
+
+        # 途中で打ち切った結果を完全な読み出しと区別できるよう、例外は呼び出し側へ送出される
+        with pytest.raises(RuntimeError, match="log store unavailable"):
+            for log in self._service(handler).iter_logs("alice", DAY, DAY + timedelta(days=1), page_size=4):
+                logs.append(log)
+        assert len(logs) == 4
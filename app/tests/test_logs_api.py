@@ -6,12 +6,16 @@
 /admin/logs/sql
 DELETE /logs/sql
 DELETE /admin/logs/sql
+/logs/analytics
+/logs/admin/analytics
+/logs/export
+/logs/admin/export
 """
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import Mock
-from datetime import datetime
-from app.dependencies import get_sql_log_service_di, get_current_user, get_current_admin
+from datetime import date, datetime
+from app.dependencies import get_sql_log_service_di, get_log_analytics_service_di, get_current_user, get_current_admin
 
 
 class TestSQLLogsAPI:
@@ -190,36 +194,86 @@ class TestAdminSQLLogsAPI:
 class TestLogAnalyticsAPI:
     """ログ分析APIのテスト"""
     
-    @pytest.mark.skip(reason="ログ分析APIは未実装のためスキップ")
     def test_get_log_analytics_success(self, client: TestClient, mock_user):
-        """正常なログ分析データ取得のテスト"""
-        mock_service = Mock()
-        mock_service.get_user_analytics.return_value = {
+        """自分のログだけを対象に、ロールアップから分析結果を取得するテスト"""
+        mock_analytics = Mock()
+        mock_analytics.get_analytics.return_value = {
+            "start_date": "2025-01-01",
+            "end_date": "2025-01-31",
+            "grain": "hour",
+            "user_id": mock_user.user_id,
             "total_queries": 150,
             "success_rate": 0.95,
-            "avg_execution_time": 0.8,
-            "most_used_tables": ["table1", "table2", "table3"],
-            "query_distribution_by_hour": {
-                "9": 20, "10": 35, "11": 25, "14": 30, "15": 40
-            },
-            "recent_errors": [
-                {"sql": "SELECT * FROM non_existent", "error": "テーブルが見つかりません", "timestamp": "2025-01-17T09:00:00"}
-            ]
+            "p95_execution_time": 2.5,
+            "series": [],
+            "top_queries": [{"fingerprint": "abc", "sample_sql": "SELECT * FROM table1 WHERE id = ?", "total_queries": 40}],
         }
         
         app = client.app
-        app.dependency_overrides[get_sql_log_service_di] = lambda: mock_service
+        app.dependency_overrides[get_log_analytics_service_di] = lambda: mock_analytics
         app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
         
         try:
-            response = client.get("/api/v1/logs/analytics")
+            response = client.get("/api/v1/logs/analytics?start_date=2025-01-01&end_date=2025-01-31&grain=hour")
             
             assert response.status_code == 200
             data = response.json()
             assert data["total_queries"] == 150
-            assert data["success_rate"] == 0.95
-            assert "table1" in data["most_used_tables"]
-            assert "9" in data["query_distribution_by_hour"]
+            assert data["top_queries"][0]["fingerprint"] == "abc"
+            mock_analytics.get_analytics.assert_called_once_with(
+                date(2025, 1, 1), date(2025, 1, 31), "hour", mock_user.user_id, False
+            )
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_get_log_analytics_defaults_to_last_30_days(self, client: TestClient, mock_user):
+        """期間省略時は今日までの30日間を日単位で集計するテスト"""
+        mock_analytics = Mock()
+        mock_analytics.get_analytics.return_value = {"total_queries": 0}
+        
+        app = client.app
+        app.dependency_overrides[get_log_analytics_service_di] = lambda: mock_analytics
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        
+        try:
+            response = client.get("/api/v1/logs/analytics")
+            
+            assert response.status_code == 200
+            start, end, grain = mock_analytics.get_analytics.call_args[0][:3]
+            assert end == date.today() and (end - start).days == 29 and grain == "day"
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_get_log_analytics_rejects_invalid_params(self, client: TestClient, mock_user):
+        """不正な集計単位・期間と、分析無効時のテスト"""
+        app = client.app
+        app.dependency_overrides[get_log_analytics_service_di] = lambda: Mock()
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        
+        try:
+            assert client.get("/api/v1/logs/analytics?grain=month").status_code == 400
+            assert client.get("/api/v1/logs/analytics?start_date=2025-02-01&end_date=2025-01-01").status_code == 400
+            
+            app.dependency_overrides[get_log_analytics_service_di] = lambda: None
+            assert client.get("/api/v1/logs/analytics").status_code == 503
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_get_admin_log_analytics(self, client: TestClient, mock_admin):
+        """管理者は全体の分析とユーザー一覧を取得できるテスト"""
+        mock_analytics = Mock()
+        mock_analytics.get_analytics.return_value = {"total_queries": 300, "users": [{"user_id": "u1", "total_queries": 200}]}
+        
+        app = client.app
+        app.dependency_overrides[get_log_analytics_service_di] = lambda: mock_analytics
+        app.dependency_overrides[get_current_admin] = lambda: {"user_id": mock_admin.user_id, "user_name": mock_admin.user_name}
+        
+        try:
+            response = client.get("/api/v1/logs/admin/analytics?start_date=2025-01-01&end_date=2025-01-31")
+            
+            assert response.status_code == 200
+            assert response.json()["users"][0]["user_id"] == "u1"
+            mock_analytics.get_analytics.assert_called_once_with(date(2025, 1, 1), date(2025, 1, 31), "day", None, True)
         finally:
             app.dependency_overrides.clear()
 
@@ -227,11 +281,13 @@ class TestLogAnalyticsAPI:
 class TestLogExportAPI:
     """ログエクスポートAPIのテスト"""
     
-    @pytest.mark.skip(reason="ログエクスポートAPIは未実装のためスキップ")
     def test_export_logs_csv_success(self, client: TestClient, mock_user):
-        """正常なログCSVエクスポートのテスト"""
+        """自分のログを期間指定でCSVエクスポートするテスト"""
         mock_service = Mock()
-        mock_service.export_logs_to_csv.return_value = "log_id,user_id,sql,execution_time,timestamp\n1,test_user,SELECT * FROM table1,0.5,2025-01-17T09:00:00\n"
+        mock_service.iter_logs.return_value = iter([
+            {"user_id": mock_user.user_id, "sql": "SELECT * FROM table1", "execution_time": 0.5, "timestamp": "2025-01-17T09:00:00"},
+            {"user_id": mock_user.user_id, "sql": "SELECT 'a,b'", "execution_time": 0.1, "timestamp": "2025-01-16T09:00:00"},
+        ])
         
         app = client.app
         app.dependency_overrides[get_sql_log_service_di] = lambda: mock_service
@@ -247,8 +303,62 @@ class TestLogExportAPI:
             assert response.headers["content-type"] == "text/csv; charset=utf-8"
             assert "attachment" in response.headers["content-disposition"]
             
-            content = response.content.decode('utf-8')
-            assert "log_id,user_id,sql" in content
-            assert "SELECT * FROM table1" in content
+            lines = response.content.decode('utf-8').splitlines()
+            assert lines[0] == "timestamp,user_id,sql,execution_time"
+            assert lines[1] == f"2025-01-17T09:00:00,{mock_user.user_id},SELECT * FROM table1,0.5"
+            assert lines[2] == f"2025-01-16T09:00:00,{mock_user.user_id},\"SELECT 'a,b'\",0.1"
+            # 終了日を含むよう、翌日0時の手前までを読み出す
+            mock_service.iter_logs.assert_called_once_with(
+                mock_user.user_id, datetime(2025, 1, 1), datetime(2025, 2, 1)
+            )
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_export_logs_aborts_stream_when_read_fails(self, client: TestClient, mock_user):
+        """途中でログの読み出しに失敗した場合は、途中までのCSVを正常終了として返さずストリームを中断するテスト"""
+        def failing_logs(*args):
+            yield {"user_id": mock_user.user_id, "sql": "SELECT 1", "execution_time": 0.1, "timestamp": "2025-01-17T09:00:00"}
+            raise RuntimeError("log store unavailable")
+
+        mock_service = Mock()
+        mock_service.iter_logs.side_effect = failing_logs
+        
+        app = client.app
+        app.dependency_overrides[get_sql_log_service_di] = lambda: mock_service
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        
+        try:
+            with pytest.raises(RuntimeError, match="log store unavailable"):
+                client.post("/api/v1/logs/export", json={"start_date": "2025-01-01", "end_date": "2025-01-31"})
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_export_logs_rejects_unsupported_format(self, client: TestClient, mock_user):
+        """csv 以外の形式はエラーになるテスト"""
+        app = client.app
+        app.dependency_overrides[get_sql_log_service_di] = lambda: Mock()
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        
+        try:
+            response = client.post("/api/v1/logs/export", json={"format": "xlsx"})
+            assert response.status_code == 400
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_admin_export_logs_for_all_users(self, client: TestClient, mock_admin):
+        """管理者は user_id 省略時に全ユーザーのログをエクスポートできるテスト"""
+        mock_service = Mock()
+        mock_service.iter_logs.return_value = iter([])
+        
+        app = client.app
+        app.dependency_overrides[get_sql_log_service_di] = lambda: mock_service
+        app.dependency_overrides[get_current_admin] = lambda: {"user_id": mock_admin.user_id, "user_name": mock_admin.user_name}
+        
+        try:
+            response = client.post("/api/v1/logs/admin/export", json={"start_date": "2025-01-01", "end_date": "2025-01-01"})
+            
+            assert response.status_code == 200
+            assert response.content.decode('utf-8').splitlines() == ["timestamp,user_id,sql,execution_time"]
+            assert mock_service.iter_logs.call_args[0][0] is None
         finally:
             app.dependency_overrides.clear()
@@ -44,6 +44,7 @@ class TestMetadataSchemaAPI:
         """スキーマ取得エラーのテスト"""
         mock_service = Mock()
         mock_service.get_schemas.side_effect = Exception("メタデータ接続エラー")
+        mock_service.get_metadata_etag.return_value = '"v1"'
         
         app = client.app
         app.dependency_overrides[get_metadata_service_di] = lambda: mock_service
@@ -92,6 +93,7 @@ class TestMetadataTableAPI:
         """存在しないスキーマでのテーブル取得のテスト"""
         mock_service = Mock()
         mock_service.get_tables.return_value = []  # 空リストを返す
+        mock_service.get_metadata_etag.return_value = '"v1"'
         
         app = client.app
         app.dependency_overrides[get_metadata_service_di] = lambda: mock_service
@@ -114,6 +116,7 @@ class TestMetadataTableAPI:
             {"name": f"table_{i}", "schema_name": "PUBLIC", "table_type": "BASE TABLE"}
             for i in range(1, 11)
         ]
+        mock_service.get_metadata_etag.return_value = '"v1"'
         
         app = client.app
         app.dependency_overrides[get_metadata_service_di] = lambda: mock_service
@@ -161,6 +164,7 @@ class TestMetadataColumnAPI:
         """存在しないテーブルでのカラム取得のテスト"""
         mock_service = Mock()
         mock_service.get_columns.return_value = []  # 空リストを返す
+        mock_service.get_metadata_etag.return_value = '"v1"'
         
         app = client.app
         app.dependency_overrides[get_metadata_service_di] = lambda: mock_service
@@ -180,6 +184,7 @@ class TestMetadataColumnAPI:
         """カラム取得エラーのテスト"""
         mock_service = Mock()
         mock_service.get_columns.side_effect = Exception("テーブルが見つかりません")
+        mock_service.get_metadata_etag.return_value = '"v1"'
         
         app = client.app
         app.dependency_overrides[get_metadata_service_di] = lambda: mock_service
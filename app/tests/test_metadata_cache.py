@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータSQLiteキャッシュのテスト
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.bulk_persistence import ShadowTableLoader, TableLoad
+from app.metadata_cache import MetadataCache
+
+
+class TestLoadAllMetadataHierarchical:
+    """一括読み込みによる階層構造メタデータ取得のテスト"""
+
+    def test_matches_per_level_loaders(self, cache):
+        expected = []
+        for schema in cache.load_schemas():
+            tables = cache.load_tables(schema["name"])
+            for table in tables:
+                table["columns"] = cache.load_columns(schema["name"], table["name"])
+            schema["tables"] = tables
+            expected.append(schema)
+
+        assert cache.load_all_metadata_hierarchical() == expected
+
+    def test_structure_and_ordering(self, cache):
+        result = cache.get_all_metadata_normalized()
+
+        assert [s["name"] for s in result] == ["ANALYTICS", "SALES"]
+        assert result[0]["tables"] == []
+        sales_tables = result[1]["tables"]
+        assert [t["name"] for t in sales_tables] == ["CUSTOMERS", "EMPTY_VIEW", "ORDERS"]
+        assert sales_tables[1]["columns"] == []
+        assert [c["name"] for c in sales_tables[2]["columns"]] == ["AMOUNT", "ID"]
+        assert sales_tables[2]["columns"][0]["comment"] == "金額"
+
+    def test_uses_single_connection_and_three_queries(self, cache, monkeypatch):
+        statements = []
+        original = cache._get_conn
+
+        def tracing_conn():
+            conn = original()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(cache, "_get_conn", tracing_conn)
+        cache.load_all_metadata_hierarchical()
+
+        assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 3
+
+    def test_orphan_rows_are_ignored(self, cache):
+        with sqlite3.connect(cache.db_path) as conn:
+            conn.execute("INSERT INTO tables (name, schema_name) VALUES ('GHOST', 'MISSING')")
+            conn.execute("INSERT INTO columns (name, table_name, schema_name) VALUES ('X', 'NOPE', 'SALES')")
+            conn.commit()
+
+        result = cache.load_all_metadata_hierarchical()
+        all_tables = [t["name"] for s in result for t in s["tables"]]
+        assert "GHOST" not in all_tables
+        assert sum(len(t["columns"]) for s in result for t in s["tables"]) == 3
+
+
+def _count(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _shadow_tables(db_path):
+    with sqlite3.connect(db_path) as conn:
+        names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return [name for name in names if name.endswith(ShadowTableLoader.SHADOW_SUFFIX)]
+
+
+class TestShadowTablePersistence:
+    """シャドウテーブル経由の一括保存のテスト"""
+
+    def test_readers_see_previous_data_until_swap(self, cache):
+        observed = []
+
+        def rows():
+            for i in range(2000):
+                if i == 1000:
+                    observed.append(_count(cache.db_path, "columns"))
+                yield (f"C{i}", "T", "SALES", "NUMBER", True, None)
+
+        with sqlite3.connect(cache.db_path) as conn:
+            ShadowTableLoader(conn, batch_size=300).replace_tables(
+                [TableLoad("columns", MetadataCache._COLUMN_COLUMNS, rows())]
+            )
+
+        assert observed == [3]
+        assert _count(cache.db_path, "columns") == 2000
+        assert _shadow_tables(cache.db_path) == []
+
+    def test_overlapping_refreshes_do_not_share_shadow_tables(self, cache, metadata_catalog):
+        first_started = threading.Event()
+        errors = []
+
+        def slow_catalog():
+            yield metadata_catalog[0]
+            first_started.set()
+            # 1件目のロード中に、2件目の更新が始まる
+            time.sleep(0.2)
+            yield from metadata_catalog[1:]
+
+        def refresh(catalog):
+            try:
+                cache.save_all_metadata_normalized(catalog)
+            except Exception as e:
+                errors.append(e)
+
+        first = threading.Thread(target=refresh, args=(slow_catalog(),))
+        first.start()
+        first_started.wait(timeout=5)
+        second = threading.Thread(target=refresh, args=([{"name": "HR", "tables": []}],))
+        second.start()
+        first.join(timeout=10)
+        second.join(timeout=10)
+
+        # 2件目は1件目の差し替えを待ってから実行され、互いのシャドウテーブルを作り直さない
+        assert errors == []
+        assert [s["name"] for s in cache.load_all_metadata_hierarchical()] == ["HR"]
+        assert _shadow_tables(cache.db_path) == []
+
+    def test_concurrent_write_is_not_blocked_while_streaming(self, cache, metadata_catalog):
+        errors = []
+
+        def slow_catalog():
+            for schema in metadata_catalog:
+                yield schema
+                # 次のスキーマを取得している間に、別接続から書き込めること
+                try:
+                    with sqlite3.connect(cache.db_path, timeout=0.1) as conn:
+                        conn.execute("INSERT OR REPLACE INTO metadata_sync_state (key, value) VALUES ('probe', ?)",
+                                     (schema["name"],))
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+
+        cache.save_all_metadata_normalized(slow_catalog())
+
+        assert errors == []
+        assert [s["name"] for s in cache.load_all_metadata_hierarchical()] == ["ANALYTICS", "SALES"]
+        assert _shadow_tables(cache.db_path) == []
+
+    def test_save_preserves_indexes_across_refreshes(self, cache, metadata_catalog):
+        with sqlite3.connect(cache.db_path) as conn:
+            conn.execute("CREATE INDEX idx_columns_table ON columns (schema_name, table_name)")
+
+        for _ in range(3):
+            cache.save_all_metadata_normalized(metadata_catalog, sync_watermark="2024-01-01")
+            with sqlite3.connect(cache.db_path) as conn:
+                indexes = [r[0] for r in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'columns' AND sql IS NOT NULL"
+                )]
+            assert len(indexes) == 1 and indexes[0].startswith("idx_columns_table")
+
+        assert _shadow_tables(cache.db_path) == []
+        assert cache.get_sync_watermark() == datetime(2024, 1, 1, tzinfo=timezone.utc)
+        assert [s["name"] for s in cache.load_all_metadata_hierarchical()] == ["ANALYTICS", "SALES"]
+
+    def test_failed_master_save_keeps_live_rows(self, cache):
+        row = {"sta_no1": "1", "sta_no2": "2", "sta_no3": "3", "code_no": 10, "trouble_ng_info": "NG"}
+        assert cache.save_trouble_master([row]) == 1
+
+        with pytest.raises(sqlite3.IntegrityError):
+            cache.save_trouble_master([{**row, "trouble_ng_info": "A"}, {**row, "trouble_ng_info": "B"}])
+
+        assert cache.get_trouble_master()[0]["trouble_ng_info"] == "NG"
+        assert _shadow_tables(cache.db_path) == []
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ差分同期のテスト
+
+SQLite上に再現した INFORMATION_SCHEMA を接続先として、実際の QueryExecutor 経由で同期する
+"""
+import sqlite3
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from app.metadata_cache import MetadataCache, parse_sync_timestamp
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.services.query_executor import QueryExecutor
+
+
+class FakeInformationSchema:
+    """INFORMATION_SCHEMA（SCHEMATA / TABLES / COLUMNS）を持つフェイク接続マネージャー"""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        # Snowflake の TO_TIMESTAMP_TZ の代わりに、UTC の "YYYY-MM-DD HH:MM:SS" に揃えて比較させる
+        self.conn.create_function(
+            "TO_TIMESTAMP_TZ", 1, lambda value: parse_sync_timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+        )
+        self.conn.execute("ATTACH DATABASE ':memory:' AS INFORMATION_SCHEMA")
+        self.conn.execute("CREATE TABLE INFORMATION_SCHEMA.SCHEMATA (SCHEMA_NAME TEXT, CREATED TEXT, SCHEMA_OWNER TEXT)")
+        self.conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.TABLES (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, TABLE_TYPE TEXT, "
+            "ROW_COUNT INTEGER, CREATED TEXT, LAST_ALTERED TEXT, COMMENT TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.COLUMNS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, "
+            "DATA_TYPE TEXT, IS_NULLABLE TEXT, COLUMN_DEFAULT TEXT, ORDINAL_POSITION INTEGER, COMMENT TEXT)"
+        )
+
+    def get_connection(self):
+        return "fake_conn", self.conn
+
+    def release_connection(self, conn_id):
+        pass
+
+    def add_schema(self, name, created="2024-01-01 00:00:00"):
+        self.conn.execute("INSERT INTO INFORMATION_SCHEMA.SCHEMATA VALUES (?, ?, 'SYSADMIN')", (name, created))
+
+    def drop_schema(self, name):
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = ?", (name,))
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = ?", (name,))
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ?", (name,))
+
+    def add_table(self, schema, name, at, columns=("ID",)):
+        self.conn.execute(
+            "INSERT INTO INFORMATION_SCHEMA.TABLES VALUES (?, ?, 'BASE TABLE', 0, ?, ?, NULL)", (schema, name, at, at)
+        )
+        self._set_columns(schema, name, columns)
+
+    def alter_table(self, schema, name, at, columns):
+        self.conn.execute(
+            "UPDATE INFORMATION_SCHEMA.TABLES SET LAST_ALTERED = ? WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?",
+            (at, schema, name)
+        )
+        self._set_columns(schema, name, columns)
+
+    def drop_table(self, schema, name):
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?", (schema, name))
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?", (schema, name))
+
+    def _set_columns(self, schema, table, columns):
+        self.conn.execute("DELETE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?", (schema, table))
+        self.conn.executemany(
+            "INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?, 'NUMBER', 'YES', NULL, ?, NULL)",
+            [(schema, table, column, i + 1) for i, column in enumerate(columns)]
+        )
+
+
+@pytest.fixture
+def warehouse():
+    warehouse = FakeInformationSchema()
+    warehouse.add_schema("SALES")
+    warehouse.add_schema("HR")
+    warehouse.add_table("SALES", "ORDERS", "2024-01-01 10:00:00", ("ID", "AMOUNT"))
+    warehouse.add_table("SALES", "CUSTOMERS", "2024-01-02 10:00:00")
+    warehouse.add_table("HR", "EMPLOYEES", "2024-01-03 10:00:00")
+    return warehouse
+
+
+@pytest.fixture
+def service(warehouse, tmp_path):
+    cache = MetadataCache(db_path=str(tmp_path / "metadata_cache.db"))
+    # フェイクは単一の SQLite 接続のため、全件取得は順次実行にする
+    return MetadataService(QueryExecutor(warehouse), cache, snapshot_store=MetadataSnapshotStore(),
+                           extraction_workers=1)
+
+
+def _tables(service):
+    return {
+        (schema["name"], table["name"]): [c["name"] for c in table["columns"]]
+        for schema in service.cache.get_all_metadata_normalized()
+        for table in schema["tables"]
+    }
+
+
+class TestIncrementalMetadataSync:
+    """MetadataService.sync_metadata_cache のテスト"""
+
+    def test_first_sync_is_full_and_records_watermark(self, service):
+        result = service.sync_metadata_cache()
+
+        assert result == {'mode': 'full', 'schema_count': 2}
+        assert service.cache.get_sync_watermark() == datetime(2024, 1, 3, 10, tzinfo=timezone.utc)
+        assert _tables(service) == {
+            ("SALES", "ORDERS"): ["AMOUNT", "ID"],
+            ("SALES", "CUSTOMERS"): ["ID"],
+            ("HR", "EMPLOYEES"): ["ID"],
+        }
+
+    def test_applies_adds_changes_and_drops(self, service, warehouse):
+        service.sync_metadata_cache()
+        version = service.get_metadata_snapshot().version
+        warehouse.alter_table("SALES", "ORDERS", "2024-02-01 09:00:00", ("ID", "AMOUNT", "STATUS"))
+        warehouse.add_table("SALES", "INVOICES", "2024-02-02 09:00:00")
+        warehouse.drop_table("SALES", "CUSTOMERS")
+        service.cache.apply_metadata_diff = Mock(wraps=service.cache.apply_metadata_diff)
+
+        result = service.sync_metadata_cache()
+
+        assert result['mode'] == 'incremental'
+        assert (result['added'], result['changed'], result['dropped']) == (1, 1, 1)
+        assert result['watermark'] == "2024-02-02T09:00:00+00:00"
+        upserted = [t["name"] for t in service.cache.apply_metadata_diff.call_args.args[1]]
+        assert upserted == ["INVOICES", "ORDERS"]  # 未変更のテーブルは取得・書き込みしない
+        assert _tables(service) == {
+            ("SALES", "ORDERS"): ["AMOUNT", "ID", "STATUS"],
+            ("SALES", "INVOICES"): ["ID"],
+            ("HR", "EMPLOYEES"): ["ID"],
+        }
+        assert service.cache.get_sync_watermark() == datetime(2024, 2, 2, 9, tzinfo=timezone.utc)
+        assert service.get_metadata_snapshot().version == version + 1
+
+    def test_no_changes_keeps_cache_and_snapshot(self, service):
+        service.sync_metadata_cache()
+        version = service.get_metadata_snapshot().version
+        service.cache.apply_metadata_diff = Mock(wraps=service.cache.apply_metadata_diff)
+
+        result = service.sync_metadata_cache()
+
+        assert (result['added'], result['changed'], result['dropped']) == (0, 0, 0)
+        service.cache.apply_metadata_diff.assert_not_called()
+        assert service.get_metadata_snapshot().version == version
+
+    def test_watermark_compares_mixed_formats_as_utc(self, service, warehouse):
+        service.sync_metadata_cache()
+        # 文字列としては ORDERS の方が大きいが、UTC では INVOICES の方が新しい
+        warehouse.alter_table("SALES", "ORDERS", "2024-02-01 18:00:00.000 +0900", ("ID", "AMOUNT", "STATUS"))
+        warehouse.add_table("SALES", "INVOICES", "2024-02-01 12:00:00.123456789Z")
+
+        result = service.sync_metadata_cache()
+
+        assert (result['added'], result['changed']) == (1, 1)
+        assert result['watermark'] == "2024-02-01T12:00:00.123456+00:00"
+        with sqlite3.connect(service.cache.db_path) as conn:
+            stored = conn.execute("SELECT value FROM metadata_sync_state").fetchone()[0]
+        assert stored == "2024-02-01T12:00:00.123456+00:00"
+
+    def test_legacy_watermark_is_parsed(self, service):
+        service.sync_metadata_cache()
+        with sqlite3.connect(service.cache.db_path) as conn:
+            conn.execute("UPDATE metadata_sync_state SET value = '2024-01-03 10:00:00'")
+
+        assert service.cache.get_sync_watermark() == datetime(2024, 1, 3, 10, tzinfo=timezone.utc)
+        assert service.sync_metadata_cache()['mode'] == 'incremental'
+
+    def test_dropped_schema_removes_its_tables(self, service, warehouse):
+        service.sync_metadata_cache()
+        warehouse.drop_schema("HR")
+
+        result = service.sync_metadata_cache()
+
+        assert result['schema_count'] == 1
+        assert result['dropped'] == 1
+        assert [s["name"] for s in service.cache.get_all_metadata_normalized()] == ["SALES"]
+
+    def test_full_resync_on_demand(self, service, warehouse):
+        service.sync_metadata_cache()
+        # ウォーターマークより古い時刻のまま変更された（差分同期では検出できない）テーブルも全件更新で反映される
+        warehouse.alter_table("HR", "EMPLOYEES", "2024-01-03 10:00:00", ("ID", "NAME"))
+        assert service.sync_metadata_cache()['mode'] == 'incremental'
+        assert _tables(service)[("HR", "EMPLOYEES")] == ["ID"]
+
+        master_data_service = Mock()
+        master_data_service.update_all_master_data.return_value = {}
+        results = service.refresh_full_metadata_and_master_cache(master_data_service, full_resync=True)
+
+        assert results['metadata']['mode'] == 'full'
+        assert _tables(service)[("HR", "EMPLOYEES")] == ["ID", "NAME"]
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+階層別メタデータAPIのテスト
+
+/metadata/schemas
+/metadata/schemas/{schema}/tables
+/metadata/schemas/{schema}/tables/{table}/columns
+
+ページング、ロール別の表示制御、ETag による条件付きGET（304）を確認する
+"""
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_current_user_optional, get_metadata_service_di, get_visibility_control_service_di
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.services.visibility_control_service import VisibilityControlService
+
+
+@pytest.fixture
+def metadata_catalog():
+    return [
+        {"name": "HR", "owner": "SYSADMIN", "tables": [
+            {"name": "EMPLOYEES", "table_type": "BASE TABLE",
+             "columns": [{"name": "ID", "data_type": "NUMBER", "is_nullable": False}]},
+        ]},
+        {"name": "SALES", "owner": "SYSADMIN", "tables": [
+            {"name": f"T{i:02d}", "table_type": "BASE TABLE",
+             "columns": [{"name": f"C{j}", "data_type": "VARCHAR", "is_nullable": True} for j in range(3)]}
+            for i in range(10)
+        ]},
+    ]
+
+
+@pytest.fixture
+def service(cache):
+    return MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore())
+
+
+@pytest.fixture
+def visibility(cache):
+    visibility = VisibilityControlService(cache)
+    visibility.save_settings([
+        Mock(object_name="HR", role_name="GUEST", is_visible=False),
+        Mock(object_name="HR.EMPLOYEES", role_name="GUEST", is_visible=False),
+        Mock(object_name="SALES.T00", role_name="GUEST", is_visible=False),
+    ])
+    return visibility
+
+
+@pytest.fixture
+def api(client: TestClient, service, visibility):
+    user = {"user_id": "guest_user", "user_name": "Guest", "role": "GUEST"}
+    app = client.app
+    app.dependency_overrides[get_metadata_service_di] = lambda: service
+    app.dependency_overrides[get_visibility_control_service_di] = lambda: visibility
+    app.dependency_overrides[get_current_user_optional] = lambda: user
+    try:
+        yield client, user
+    finally:
+        app.dependency_overrides.clear()
+
+
+class TestMetadataLevelIndex:
+    """MetadataService の階層インデックスのテスト"""
+
+    def test_index_is_built_once_per_snapshot_version(self, cache, service):
+        cache.get_all_metadata_normalized = Mock(wraps=cache.get_all_metadata_normalized)
+
+        assert [s["name"] for s in service.get_schemas()] == ["HR", "SALES"]
+        assert len(service.get_tables("SALES")) == 10
+        assert [c["name"] for c in service.get_columns("SALES", "T03")] == ["C0", "C1", "C2"]
+        assert service.get_level_index() is service.get_level_index()
+        assert cache.get_all_metadata_normalized.call_count == 1
+
+    def test_unknown_objects_return_empty_lists(self, service):
+        assert service.get_tables("NONEXISTENT") == []
+        assert service.get_columns("SALES", "NONEXISTENT") == []
+
+    def test_role_index_applies_visibility(self, service, visibility):
+        assert [s["name"] for s in service.get_schemas("GUEST", visibility)] == ["SALES"]
+        assert service.get_tables("HR", "GUEST", visibility) == []
+        assert "T00" not in [t["name"] for t in service.get_tables("SALES", "GUEST", visibility)]
+        assert len(service.get_tables("SALES", "ADMIN", visibility)) == 10
+
+    def test_concurrent_role_index_is_built_once(self, service, visibility):
+        filter_metadata = visibility.filter_metadata
+        calls = []
+        results = []
+
+        def slow_filter(snapshot, role):
+            calls.append(role)
+            time.sleep(0.05)
+            return filter_metadata(snapshot, role)
+
+        visibility.filter_metadata = slow_filter
+        threads = [threading.Thread(target=lambda: results.append(service.get_level_index("GUEST", visibility)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert calls == ["GUEST"]
+        assert len(results) == 8 and all(index is results[0] for index in results)
+
+
+class TestMetadataLevelAPI:
+    """階層別エンドポイントのテスト"""
+
+    def test_pagination(self, api):
+        client, _ = api
+        response = client.get("/api/v1/metadata/schemas/SALES/tables?limit=4&offset=4")
+
+        assert response.status_code == 200
+        assert [t["name"] for t in response.json()] == ["T05", "T06", "T07", "T08"]
+        assert response.headers["X-Total-Count"] == "9"
+        assert response.headers["X-Next-Offset"] == "8"
+
+        last_page = client.get("/api/v1/metadata/schemas/SALES/tables?limit=4&offset=8")
+        assert [t["name"] for t in last_page.json()] == ["T09"]
+        assert "X-Next-Offset" not in last_page.headers
+
+    def test_visibility_is_applied_per_role(self, api):
+        client, user = api
+        assert [s["name"] for s in client.get("/api/v1/metadata/schemas").json()] == ["SALES"]
+        assert client.get("/api/v1/metadata/schemas/HR/tables/EMPLOYEES/columns").json() == []
+
+        user["role"] = "ADMIN"
+        assert [s["name"] for s in client.get("/api/v1/metadata/schemas").json()] == ["HR", "SALES"]
+        columns = client.get("/api/v1/metadata/schemas/HR/tables/EMPLOYEES/columns").json()
+        assert [c["name"] for c in columns] == ["ID"]
+
+    def test_conditional_get_returns_304(self, api):
+        client, _ = api
+        response = client.get("/api/v1/metadata/schemas/SALES/tables")
+        etag = response.headers["ETag"]
+
+        not_modified = client.get("/api/v1/metadata/schemas/SALES/tables", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["ETag"] == etag
+        assert not_modified.content == b""
+
+    def test_etag_changes_with_metadata_settings_and_role(self, api, service, visibility):
+        client, user = api
+        etag = client.get("/api/v1/metadata/schemas").headers["ETag"]
+
+        user["role"] = "ADMIN"
+        admin_etag = client.get("/api/v1/metadata/schemas").headers["ETag"]
+        assert admin_etag != etag
+
+        visibility.save_settings([Mock(object_name="SALES.T01", role_name="ADMIN", is_visible=False)])
+        settings_etag = client.get("/api/v1/metadata/schemas").headers["ETag"]
+        assert settings_etag != admin_etag
+
+        service.snapshot_store.reload(service.cache)
+        response = client.get("/api/v1/metadata/schemas", headers={"If-None-Match": settings_etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != settings_etag
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ全件取得の並列化のテスト
+
+クエリごとに遅延を入れたフェイク接続（SQLite 上の INFORMATION_SCHEMA）を使い、
+順次取得と並列取得で結果が一致すること、並列取得で更新時間が短くなることを確認する
+"""
+import sqlite3
+from datetime import datetime, timezone
+import threading
+import time
+
+import pytest
+
+from app.exceptions import MetadataError
+from app.metadata_cache import MetadataCache
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.services.query_executor import QueryExecutor
+
+LATENCY = 0.05
+
+
+class _LatencyCursor:
+    def __init__(self, warehouse, cursor):
+        self.warehouse = warehouse
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        self.warehouse.begin_query(sql)
+        try:
+            time.sleep(self.warehouse.latency)
+            return self.cursor.execute(sql, params)
+        finally:
+            self.warehouse.end_query()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class _LatencyConnection:
+    def __init__(self, warehouse, conn):
+        self.warehouse = warehouse
+        self.conn = conn
+        self.closed = False
+
+    def cursor(self):
+        return _LatencyCursor(self.warehouse, self.conn.cursor())
+
+    def close(self):
+        self.closed = True
+        self.conn.close()
+
+
+class LatencyWarehouse:
+    """1クエリごとに latency 秒かかる INFORMATION_SCHEMA を持つフェイク接続マネージャー"""
+
+    def __init__(self, tmp_path, latency=LATENCY, schemas=3, tables=2):
+        self.db_path = str(tmp_path / "warehouse.db")
+        self.info_path = str(tmp_path / "information_schema.db")
+        self.latency = latency
+        self.fail_on = None
+        self.queries = []
+        self.active = 0
+        self.max_active = 0
+        self.dedicated = []
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("CREATE TABLE INFORMATION_SCHEMA.SCHEMATA (SCHEMA_NAME TEXT, CREATED TEXT, SCHEMA_OWNER TEXT)")
+        conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.TABLES (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, TABLE_TYPE TEXT, "
+            "ROW_COUNT INTEGER, CREATED TEXT, LAST_ALTERED TEXT, COMMENT TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.COLUMNS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, "
+            "DATA_TYPE TEXT, IS_NULLABLE TEXT, COLUMN_DEFAULT TEXT, ORDINAL_POSITION INTEGER, COMMENT TEXT)"
+        )
+        for s in range(schemas):
+            schema = f"S{s}"
+            conn.execute("INSERT INTO INFORMATION_SCHEMA.SCHEMATA VALUES (?, '2024-01-01', 'SYSADMIN')", (schema,))
+            for t in range(tables):
+                conn.execute("INSERT INTO INFORMATION_SCHEMA.TABLES VALUES (?, ?, 'BASE TABLE', 0, "
+                             "'2024-01-01', ?, NULL)", (schema, f"T{t}", f"2024-01-0{t + 1} 00:00:00"))
+                for c in range(3):
+                    conn.execute("INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?, 'NUMBER', 'YES', NULL, ?, NULL)",
+                                 (schema, f"T{t}", f"C{c}", c + 1))
+        # テーブルを持たないスキーマ
+        conn.execute("INSERT INTO INFORMATION_SCHEMA.SCHEMATA VALUES ('EMPTY', '2024-01-01', 'SYSADMIN')")
+        conn.commit()
+        self.shared = _LatencyConnection(self, conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS INFORMATION_SCHEMA", (self.info_path,))
+        return conn
+
+    def begin_query(self, sql):
+        with self._lock:
+            if self.fail_on and self.fail_on in sql:
+                raise RuntimeError("simulated failure")
+            self.queries.append(sql)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def end_query(self):
+        with self._lock:
+            self.active -= 1
+
+    def get_connection(self):
+        return "shared", self.shared
+
+    def release_connection(self, conn_id):
+        pass
+
+    def create_dedicated_connection(self):
+        connection = _LatencyConnection(self, self._connect())
+        with self._lock:
+            self.dedicated.append(connection)
+        return connection
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    return LatencyWarehouse(tmp_path)
+
+
+def _service(warehouse, tmp_path, name, **options):
+    cache = MetadataCache(db_path=str(tmp_path / f"{name}.db"))
+    return MetadataService(QueryExecutor(warehouse), cache, snapshot_store=MetadataSnapshotStore(), **options)
+
+
+def _catalog(service):
+    """キャッシュ内容を比較用に整形（更新日時を除き、スキーマ名順に並べる）"""
+    def strip(item):
+        return {key: [strip(child) for child in value] if isinstance(value, list) else value
+                for key, value in item.items() if key != "updated_at"}
+    return sorted((strip(schema) for schema in service.cache.get_all_metadata_normalized()),
+                  key=lambda schema: schema["name"])
+
+
+def _refresh(service):
+    started = time.perf_counter()
+    count = service.refresh_full_metadata_cache()
+    return count, time.perf_counter() - started
+
+
+class TestParallelExtraction:
+    """並列抽出のテスト"""
+
+    def test_parallel_matches_sequential_and_is_faster(self, warehouse, tmp_path):
+        sequential = _service(warehouse, tmp_path, "sequential", extraction_workers=1)
+        parallel = _service(warehouse, tmp_path, "parallel", extraction_workers=3)
+
+        seq_count, seq_elapsed = _refresh(sequential)
+        warehouse.max_active = 0
+        par_count, par_elapsed = _refresh(parallel)
+
+        assert seq_count == par_count == 4
+        assert _catalog(parallel) == _catalog(sequential)
+        assert parallel.cache.get_sync_watermark() == sequential.cache.get_sync_watermark() == datetime(2024, 1, 2, tzinfo=timezone.utc)
+        assert warehouse.max_active == 3
+        assert par_elapsed < seq_elapsed
+        assert warehouse.dedicated and all(conn.closed for conn in warehouse.dedicated)
+
+    def test_split_columns_fans_out_per_schema(self, warehouse, tmp_path):
+        baseline = _service(warehouse, tmp_path, "baseline", extraction_workers=1)
+        split = _service(warehouse, tmp_path, "split", extraction_workers=2, split_columns_by_schema=True)
+        _refresh(baseline)
+        warehouse.queries.clear()
+        warehouse.max_active = 0
+
+        assert split.refresh_full_metadata_cache() == 4
+
+        # テーブルを持つスキーマ（S0〜S2）ごとに COLUMNS を1回ずつ、同時実行は workers 本まで
+        column_queries = [sql for sql in warehouse.queries if "INFORMATION_SCHEMA.COLUMNS" in sql]
+        assert len(column_queries) == 3
+        assert all("TABLE_SCHEMA = ?" in sql for sql in column_queries)
+        assert warehouse.max_active == 2
+        assert _catalog(split) == _catalog(baseline)
+
+    def test_failure_keeps_existing_cache(self, warehouse, tmp_path):
+        service = _service(warehouse, tmp_path, "failure", extraction_workers=3, split_columns_by_schema=True)
+        service.refresh_full_metadata_cache()
+        before = service.cache.get_all_metadata_normalized()
+
+        warehouse.fail_on = "TABLE_SCHEMA = ?"
+        with pytest.raises(MetadataError):
+            service.refresh_full_metadata_cache()
+
+        assert service.cache.get_all_metadata_normalized() == before
+        assert all(conn.closed for conn in warehouse.dedicated)
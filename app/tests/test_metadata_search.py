@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ検索（FTS5 インデックス）のテスト
+"""
+import sqlite3
+from unittest.mock import Mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_current_user_optional, get_metadata_search_service_di
+from app.metadata_cache import MetadataCache
+from app.services.metadata_search_service import MetadataSearchService
+from app.services.visibility_control_service import VisibilityControlService
+
+
+def _table(name, columns, comment=None, schema_name=None):
+    table = {"name": name, "table_type": "BASE TABLE", "comment": comment,
+             "columns": [{"name": c, "data_type": "VARCHAR", "is_nullable": True,
+                          "comment": "顧客の氏名" if c == "CUSTOMER_NAME" else None} for c in columns]}
+    if schema_name:
+        table["schema_name"] = schema_name
+    return table
+
+
+@pytest.fixture
+def metadata_catalog():
+    return [
+        {"name": "SALES", "owner": "SYSADMIN", "tables": [
+            _table("ORDERS", ["ORDER_ID", "CUSTOMER_ID", "AMOUNT"], comment="受注ヘッダ"),
+            _table("ORDER_ITEMS", ["ORDER_ID", "ITEM_ID"]),
+            _table("CUSTOMERS", ["CUSTOMER_ID", "CUSTOMER_NAME"]),
+            _table("PRE_ORDERS", ["ID"]),
+        ]},
+        {"name": "HR", "owner": "SYSADMIN", "tables": [
+            _table("EMPLOYEES", ["ID", "NAME"], comment="社員マスタ"),
+        ]},
+    ]
+
+
+def _names(hits):
+    return [(hit["object_type"], hit["name"]) for hit in hits]
+
+
+class TestMetadataSearchIndex:
+    """MetadataCache.search_metadata のテスト"""
+
+    def test_ranks_exact_then_prefix_then_substring(self, cache):
+        hits = cache.search_metadata("orders", object_types=["table"])
+        assert _names(hits) == [("table", "ORDERS"), ("table", "PRE_ORDERS")]
+
+        hits = cache.search_metadata("order", object_types=["table", "column"])
+        names = [hit["name"] for hit in hits]
+        assert names[:2] == ["ORDER_ID", "ORDER_ID"]
+        assert set(names[2:4]) == {"ORDER_ITEMS", "ORDERS"}
+        assert names[4:] == ["PRE_ORDERS"]
+
+    def test_searches_comments_and_short_prefixes(self, cache):
+        assert _names(cache.search_metadata("顧客の氏名")) == [("column", "CUSTOMER_NAME")]
+        hits = cache.search_metadata("社員マスタ")
+        assert [(h["schema_name"], h["name"]) for h in hits] == [("HR", "EMPLOYEES")]
+        assert _names(cache.search_metadata("HR")) == [("schema", "HR")]
+        assert _names(cache.search_metadata("cust name")) == [("column", "CUSTOMER_NAME")]
+
+    def test_limit_and_empty_query(self, cache):
+        assert len(cache.search_metadata("_ID", limit=2)) == 2
+        assert cache.search_metadata("   ") == []
+
+    def test_incremental_diff_updates_index(self, cache):
+        cache.apply_metadata_diff(
+            schemas=[{"name": "SALES", "owner": "SYSADMIN"}],
+            upsert_tables=[_table("ORDERS", ["ORDER_ID", "STATUS"], schema_name="SALES"),
+                           _table("INVOICES", ["INVOICE_ID"], schema_name="SALES")],
+            drop_tables=[("SALES", "PRE_ORDERS")],
+            sync_watermark="2024-02-01 00:00:00",
+        )
+
+        assert _names(cache.search_metadata("STATUS")) == [("column", "STATUS")]
+        assert cache.search_metadata("AMOUNT") == []
+        assert cache.search_metadata("INVOICE", object_types=["table"])[0]["name"] == "INVOICES"
+        assert cache.search_metadata("PRE_ORDERS") == []
+        assert cache.search_metadata("EMPLOYEES") == []  # 削除されたスキーマ配下
+        assert cache.search_metadata("HR") == []
+
+    def test_full_save_replaces_index(self, cache):
+        cache.save_all_metadata_normalized([{"name": "HR", "tables": [_table("EMPLOYEES", ["ID"])]}])
+        assert cache.search_metadata("ORDERS") == []
+        assert _names(cache.search_metadata("EMPLOYEES")) == [("table", "EMPLOYEES")]
+
+        cache.clear_cache()
+        assert cache.search_metadata("EMPLOYEES") == []
+
+    def test_strong_match_beyond_candidate_window_is_found(self, tmp_path):
+        cache = MetadataCache(db_path=str(tmp_path / "metadata_cache.db"))
+        # コメントだけに一致するカラムを候補件数より多く先に登録し、名前に一致するテーブルを最後に置く
+        filler = [{"name": f"COL_{n}", "data_type": "VARCHAR", "is_nullable": True,
+                   "comment": "customer related attribute"} for n in range(600)]
+        cache.save_all_metadata_normalized([{"name": "SALES", "tables": [
+            {"name": "WIDE", "table_type": "BASE TABLE", "columns": filler},
+            _table("XCUSTOMERX", ["ID"]),
+        ]}])
+
+        assert _names(cache.search_metadata("customer", limit=1)) == [("table", "XCUSTOMERX")]
+        assert _names(cache.search_metadata("customer", object_types=["table"])) == [("table", "XCUSTOMERX")]
+
+    def test_backfills_index_for_existing_cache(self, cache):
+        with sqlite3.connect(cache.db_path) as conn:
+            conn.execute("DELETE FROM metadata_search_items")
+            conn.execute("INSERT INTO metadata_search_fts (metadata_search_fts) VALUES ('delete-all')")
+        assert cache.search_metadata("ORDERS") == []
+
+        reopened = MetadataCache(db_path=str(cache.db_path))
+        assert reopened.search_metadata("ORDERS", object_types=["table"])[0]["name"] == "ORDERS"
+
+
+class TestMetadataSearchService:
+    """MetadataSearchService のテスト"""
+
+    def test_applies_visibility_per_role(self, cache):
+        visibility = VisibilityControlService(cache)
+        visibility.save_settings([
+            Mock(object_name="SALES.CUSTOMERS", role_name="GUEST", is_visible=False),
+            Mock(object_name="HR", role_name="GUEST", is_visible=False),
+        ])
+        service = MetadataSearchService(cache, visibility)
+
+        assert "CUSTOMERS" not in [h["table_name"] for h in service.search("customer", "GUEST")]
+        assert {h["table_name"] for h in service.search("customer", "ADMIN")} == {"ORDERS", "CUSTOMERS"}
+        assert service.search("HR", "GUEST") == []
+        assert len(service.search("HR", "ADMIN")) == 1
+
+    def test_refetches_when_hidden_hits_fill_the_page(self, cache):
+        visibility = VisibilityControlService(cache)
+        visibility.save_settings([Mock(object_name="SALES.ORDERS", role_name="GUEST", is_visible=False)])
+        service = MetadataSearchService(cache, visibility)
+        cache.search_metadata = Mock(wraps=cache.search_metadata)
+
+        hits = service.search("ORDER", "GUEST", object_types=["column"], limit=1)
+
+        assert [(h["table_name"], h["name"]) for h in hits] == [("ORDER_ITEMS", "ORDER_ID")]
+        assert cache.search_metadata.call_count == 2
+
+
+class TestMetadataSearchAPI:
+    """/metadata/search のテスト"""
+
+    def test_search_endpoint(self, client: TestClient, cache):
+        app = client.app
+        app.dependency_overrides[get_metadata_search_service_di] = \
+            lambda: MetadataSearchService(cache, VisibilityControlService(cache))
+        app.dependency_overrides[get_current_user_optional] = lambda: {"user_id": "u", "role": "ADMIN"}
+        try:
+            response = client.get("/api/v1/metadata/search", params={"q": "orders", "types": "table", "limit": 1})
+            assert response.status_code == 200
+            assert [h["name"] for h in response.json()] == ["ORDERS"]
+
+            assert client.get("/api/v1/metadata/search", params={"q": "x", "types": "view"}).status_code == 400
+            assert client.get("/api/v1/metadata/search").status_code == 422
+        finally:
+            app.dependency_overrides.clear()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータスナップショットのテスト
+"""
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.services.completion_service import CompletionService
+from app.services.metadata_service import MetadataService
+from app.services.metadata_snapshot import MetadataSnapshotStore
+from app.services.visibility_control_service import VisibilityControlService, VisibilityModel
+
+
+def _sales_catalog(*table_names):
+    return [{
+        "name": "SALES",
+        "owner": "SYSADMIN",
+        "tables": [
+            {"name": name, "table_type": "BASE TABLE",
+             "columns": [{"name": f"{name}_ID", "data_type": "NUMBER", "is_nullable": False}]}
+            for name in table_names
+        ],
+    }]
+
+
+@pytest.fixture
+def metadata_catalog():
+    return _sales_catalog("ORDERS")
+
+
+@pytest.fixture
+def service(cache):
+    return MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore())
+
+
+def _refresh(service, catalog):
+    service._fetch_all_from_snowflake_direct = Mock(return_value=catalog)
+    master_data_service = Mock()
+    master_data_service.update_all_master_data.return_value = {}
+    return service.refresh_full_metadata_and_master_cache(master_data_service, full_resync=True)
+
+
+class TestMetadataSnapshotStore:
+    """MetadataSnapshotStoreのテスト"""
+
+    def test_snapshot_is_shared_until_refresh(self, cache, service):
+        cache.get_all_metadata_normalized = Mock(wraps=cache.get_all_metadata_normalized)
+
+        first = service.get_metadata_snapshot()
+        other = MetadataService(Mock(), cache, snapshot_store=service.snapshot_store)
+        assert other.get_metadata_snapshot() is first
+        assert [t["name"] for t in service.get_all_metadata()[0]["tables"]] == ["ORDERS"]
+        assert cache.get_all_metadata_normalized.call_count == 1
+
+        _refresh(service, _sales_catalog("ORDERS", "CUSTOMERS"))
+        second = service.get_metadata_snapshot()
+        assert second.version == first.version + 1
+        assert other.get_metadata_snapshot() is second
+        assert [t["name"] for t in second.schemas[0]["tables"]] == ["CUSTOMERS", "ORDERS"]
+
+    def test_get_all_metadata_returns_independent_list(self, service):
+        metadata = service.get_all_metadata()
+        metadata.clear()
+        assert len(service.get_all_metadata()) == 1
+
+    def test_clear_cache_invalidates_snapshot(self, service):
+        assert not service.get_metadata_snapshot().is_empty
+        service.clear_cache()
+        assert service.get_metadata_snapshot().is_empty
+        assert service.get_all_metadata()[0]["name"] == "PUBLIC"  # モックデータへのフォールバック
+
+    def test_derived_data_is_built_once_per_version(self, service):
+        builder = Mock(return_value={"index": True})
+        snapshot = service.get_metadata_snapshot()
+        assert snapshot.get_derived("key", builder) == {"index": True}
+        snapshot.get_derived("key", builder)
+        assert builder.call_count == 1
+
+        _refresh(service, _sales_catalog("ORDERS"))
+        service.get_metadata_snapshot().get_derived("key", builder)
+        assert builder.call_count == 2
+
+
+class TestSnapshotConsumers:
+    """スナップショットを参照するサービスのテスト"""
+
+    def test_completion_picks_up_refreshed_metadata(self, service):
+        completion = CompletionService(service)
+        sql = "SELECT * FROM CUS"
+        labels = [s.label for s in completion.get_completions(sql, len(sql)).suggestions]
+        assert "CUSTOMERS" not in labels
+
+        _refresh(service, _sales_catalog("ORDERS", "CUSTOMERS"))
+        labels = [s.label for s in completion.get_completions(sql, len(sql)).suggestions]
+        assert "CUSTOMERS" in labels
+        assert completion._metadata_version == service.get_metadata_snapshot().version
+
+        sql = "SELECT CUSTOMERS. FROM CUSTOMERS"
+        labels = [s.label for s in completion.get_completions(sql, len("SELECT CUSTOMERS.")).suggestions]
+        assert labels == ["CUSTOMERS_ID"]
+
+    def test_visibility_filter_is_reused_per_role_and_settings(self, cache, service):
+        visibility = VisibilityControlService(cache)
+        visibility.save_settings([Mock(object_name="SALES.ORDERS", role_name="GUEST", is_visible=False)])
+        _refresh(service, _sales_catalog("ORDERS", "CUSTOMERS"))
+        snapshot = service.get_metadata_snapshot()
+
+        with patch.object(VisibilityModel, "apply", autospec=True, side_effect=VisibilityModel.apply) as apply:
+            guest = visibility.filter_metadata(snapshot, "GUEST")
+            assert [t["name"] for t in guest[0]["tables"]] == ["CUSTOMERS"]
+            assert visibility.filter_metadata(snapshot, "GUEST") == guest
+            assert apply.call_count == 1
+
+            admin = visibility.filter_metadata(snapshot, "ADMIN")
+            assert [t["name"] for t in admin[0]["tables"]] == ["CUSTOMERS", "ORDERS"]
+            assert apply.call_count == 2
+
+            visibility.save_settings([Mock(object_name="SALES.ORDERS", role_name="GUEST", is_visible=True)])
+            guest = visibility.filter_metadata(snapshot, "GUEST")
+            assert [t["name"] for t in guest[0]["tables"]] == ["CUSTOMERS", "ORDERS"]
+            assert apply.call_count == 3
+
+    def test_concurrent_visibility_filter_is_built_once_per_role(self, cache, service):
+        visibility = VisibilityControlService(cache)
+        snapshot = service.get_metadata_snapshot()
+        results = []
+        original_apply = VisibilityModel.apply
+
+        def slow_apply(model, schemas, role):
+            time.sleep(0.05)
+            return original_apply(model, schemas, role)
+
+        with patch.object(VisibilityModel, "apply", autospec=True, side_effect=slow_apply) as apply:
+            threads = [threading.Thread(target=lambda: results.append(visibility.filter_metadata(snapshot, "GUEST")))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        assert apply.call_count == 1
+        assert len(results) == 8 and all(result == results[0] for result in results)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+クエリキャンセルサービスのテスト
+
+execute でブロックするフェイクODBCドライバーを使い、実行中クエリをサーバー側で中断できることを検証する
+（プールの1接続を複数の実行で共有していても、中断するのは自分のクエリだけであることも検証する）
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+from app.services.hybrid_sql_service import HybridSQLService
+from app.services.query_cancellation_service import (
+    QueryCancellationService, CANCEL_METHOD_CURSOR, CANCEL_METHOD_ABORT
+)
+from app.services.streaming_state_service import StreamingStateService
+
+
+class FakeOdbcCancelled(Exception):
+    """ODBCの HY008 (Operation canceled) 相当"""
+
+
+class BlockingCursor:
+    """execute で中断されるまでブロックするフェイクカーソル"""
+
+    def __init__(self, cancel_supported: bool = True, warehouse: "FakeWarehouse" = None):
+        self.cancel_supported = cancel_supported
+        self.warehouse = warehouse
+        self.aborted = threading.Event()
+        self.executing = threading.Event()
+        self.description = [("COL1",)]
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        if sql == "SELECT CURRENT_SESSION()":
+            return
+        if self.warehouse:
+            self.warehouse.start(sql, self)
+        self.executing.set()
+        if not self.aborted.wait(timeout=10):
+            raise AssertionError("キャンセルされずにタイムアウトしました")
+        raise FakeOdbcCancelled("[HY008] Operation canceled")
+
+    def cancel(self):
+        if not self.cancel_supported:
+            raise FakeOdbcCancelled("[IM001] Driver does not support this function")
+        self.aborted.set()
+
+    def fetchone(self):
+        return (FakeWarehouse.SESSION_ID,)
+
+
+class FakeWarehouse:
+    """1つのウェアハウスセッション上で実行中のクエリ（QUERY_HISTORY の代わり）"""
+
+    SESSION_ID = "1234567890"
+
+    def __init__(self):
+        self.running = {}  # クエリID -> (SQL本文, カーソル, 開始時刻)
+        self.started = 0
+
+    def start(self, sql, cursor):
+        self.started += 1
+        query_id = f"01b2c3d4-0000-1111-0000-{self.started:012d}"
+        self.running[query_id] = (sql, cursor, datetime.now(timezone.utc))
+
+
+class AbortCursor:
+    """中断用の別接続のフェイクカーソル（SYSTEM$CANCEL_QUERY で対象カーソルを中断）"""
+
+    def __init__(self, warehouse: FakeWarehouse, executed: list):
+        self._warehouse = warehouse
+        self._executed = executed
+        self._row = None
+
+    def execute(self, sql, params=None):
+        self._executed.append((sql, params))
+        if "QUERY_HISTORY" in sql:
+            if "QUERY_HISTORY_BY_SESSION" in sql:
+                assert params[0] == FakeWarehouse.SESSION_ID
+                params = params[1:]
+            texts, started_at = params[:2], datetime.fromisoformat(params[-1])
+            matches = sorted(
+                (abs(started - started_at), query_id)
+                for query_id, (text, _, started) in self._warehouse.running.items() if text in texts
+            )
+            self._row = (matches[0][1],) if matches else None
+        elif "SYSTEM$CANCEL_QUERY" in sql:
+            query_id = sql.split("'")[1]
+            self._warehouse.running.pop(query_id)[1].aborted.set()
+            self._row = ("Identified SQL statement is being canceled.",)
+
+    def fetchone(self):
+        return self._row
+
+
+class FakeConnectionManager:
+    """フェイクODBCドライバーの接続マネージャー（プールの1接続を全実行で共有する）"""
+
+    def __init__(self, cursor_factory):
+        self.cursor_factory = cursor_factory
+        self.warehouse = FakeWarehouse()
+        self.abort_sql = []
+        self.dedicated_closed = 0
+
+    def get_connection(self):
+        connection = Mock()
+        connection.cursor.side_effect = lambda: self.cursor_factory(self.warehouse)
+        return "conn_1", connection
+
+    def release_connection(self, conn_id):
+        pass
+
+    def create_dedicated_connection(self):
+        connection = Mock()
+        connection.cursor.return_value = AbortCursor(self.warehouse, self.abort_sql)
+
+        def _close():
+            self.dedicated_closed += 1
+        connection.close.side_effect = _close
+        return connection
+
+
+def _run_blocking(cursor, sql="SELECT * FROM BIG_TABLE"):
+    errors = []
+
+    def target():
+        try:
+            cursor.execute(sql)
+        except FakeOdbcCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    assert cursor.executing.wait(timeout=5)
+    return thread, errors
+
+
+def _recording_cursor_factory(cursors: list, cancel_supported: bool):
+    """作成したカーソルを cursors に記録するカーソルファクトリ"""
+    def factory(warehouse):
+        cursor = BlockingCursor(cancel_supported, warehouse)
+        cursors.append(cursor)
+        return cursor
+    return factory
+
+
+def _wait_until(predicate, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "条件が満たされませんでした"
+        time.sleep(0.01)
+
+
+class TestQueryCancellationService:
+    """QueryCancellationServiceのテスト"""
+
+    def test_cancel_interrupts_blocked_execute(self):
+        service = QueryCancellationService()
+        cursor = BlockingCursor()
+        service.register("s1", cursor)
+        thread, errors = _run_blocking(cursor)
+
+        result = service.cancel("s1")
+        thread.join(timeout=5)
+
+        assert result["cancelled"] is True
+        assert result["method"] == CANCEL_METHOD_CURSOR
+        assert not thread.is_alive()
+        assert len(errors) == 1
+        assert service.was_cancel_requested("s1")
+
+    def test_falls_back_to_abort_statement(self):
+        service = QueryCancellationService()
+        manager = FakeConnectionManager(lambda warehouse: BlockingCursor(False, warehouse))
+        cursor = BlockingCursor(cancel_supported=False, warehouse=manager.warehouse)
+        service.register("s1", cursor, manager, statement="-- 集計\nSELECT * FROM BIG_TABLE;",
+                         warehouse_session=FakeWarehouse.SESSION_ID)
+        # ウェアハウスの履歴には先頭のコメントを除いたSQLが記録される
+        thread, errors = _run_blocking(cursor, "SELECT * FROM BIG_TABLE;")
+
+        result = service.cancel("s1")
+        thread.join(timeout=5)
+
+        assert result["cancelled"] is True
+        assert result["method"] == CANCEL_METHOD_ABORT
+        assert result["query_id"] == "01b2c3d4-0000-1111-0000-000000000001"
+        sql, params = manager.abort_sql[0]
+        assert "QUERY_HISTORY_BY_SESSION" in sql
+        assert params[:3] == (FakeWarehouse.SESSION_ID, "-- 集計\nSELECT * FROM BIG_TABLE;", "SELECT * FROM BIG_TABLE;")
+        assert manager.abort_sql[1][0] == "SELECT SYSTEM$CANCEL_QUERY('01b2c3d4-0000-1111-0000-000000000001')"
+        assert manager.dedicated_closed == 1
+        assert not thread.is_alive()
+        assert service.get_metrics()["abort_cancelled"] == 1
+
+    def test_warehouse_session_is_queried_once_per_connection(self):
+        service = QueryCancellationService()
+        cursor = BlockingCursor()
+
+        assert service.warehouse_session("conn_1", cursor) == FakeWarehouse.SESSION_ID
+        assert service.warehouse_session("conn_1", BlockingCursor()) == FakeWarehouse.SESSION_ID
+        assert cursor.executed == ["SELECT CURRENT_SESSION()"]
+        assert service.warehouse_session(None, cursor) is None
+
+    def test_cancel_without_active_query(self):
+        service = QueryCancellationService()
+        result = service.cancel("unknown")
+        assert result["cancelled"] is False
+        assert service.get_metrics()["requested"] == 0
+
+    def test_cancel_fails_when_query_cannot_be_identified(self):
+        service = QueryCancellationService()
+        cursor = BlockingCursor(cancel_supported=False)
+        service.register("s1", cursor)  # 接続マネージャー・セッションIDなし
+
+        result = service.cancel("s1")
+        assert result["cancelled"] is False
+        assert service.get_metrics()["failed"] == 1
+        service.unregister("s1")
+        assert service.is_active("s1") is False
+
+
+class TestHybridSQLServiceCancellation:
+    """HybridSQLService経由のサーバー側キャンセルのテスト"""
+
+    def test_cancel_execution_stops_blocked_query(self):
+        cursors = []
+        manager = FakeConnectionManager(_recording_cursor_factory(cursors, cancel_supported=True))
+        cache_service = Mock()
+        streaming_state_service = StreamingStateService()
+        streaming_state_service.create_streaming_state("s1")
+        cancellation_service = QueryCancellationService()
+        service = HybridSQLService(
+            cache_service=cache_service,
+            connection_manager=manager,
+            streaming_state_service=streaming_state_service,
+            query_cancellation_service=cancellation_service,
+        )
+
+        thread = threading.Thread(target=service.execute_sql_background, args=("SELECT * FROM BIG_TABLE", "s1", "user"))
+        thread.start()
+        _wait_until(lambda: cursors and cursors[0].executing.is_set())
+        cursor = cursors[0]
+        # SQL本文は変更せずに実行する（セッションIDの問い合わせは接続ごとに初回のみ）
+        assert cursor.executed == ["SELECT CURRENT_SESSION()", "SELECT * FROM BIG_TABLE"]
+
+        started = time.monotonic()
+        result = service.cancel_execution("s1")
+        thread.join(timeout=5)
+
+        assert result["success"] is True
+        assert result["server_cancelled"] is True
+        assert result["cancel_method"] == CANCEL_METHOD_CURSOR
+        assert not thread.is_alive()
+        assert time.monotonic() - started < 2
+        # キャンセルによる中断はエラー扱いにならない
+        assert streaming_state_service.get_state("s1")["status"] == "cancelled"
+        assert cancellation_service.is_active("s1") is False
+        cache_service.update_session_progress.assert_not_called()
+
+    def test_abort_cancels_only_own_query_on_shared_connection(self):
+        """同じ接続（ウェアハウスセッション）で2つの実行が走っていても、キャンセル対象は自分のクエリだけ"""
+        cursors = []
+        manager = FakeConnectionManager(_recording_cursor_factory(cursors, cancel_supported=False))
+        cancellation_service = QueryCancellationService()
+        streaming_state_service = StreamingStateService()
+        service = HybridSQLService(
+            cache_service=Mock(),
+            connection_manager=manager,
+            streaming_state_service=streaming_state_service,
+            query_cancellation_service=cancellation_service,
+        )
+        threads = {}
+        for session_id, sql in [("s1", "SELECT * FROM A_TABLE"), ("s2", "SELECT * FROM B_TABLE")]:
+            streaming_state_service.create_streaming_state(session_id)
+            threads[session_id] = threading.Thread(target=service.execute_sql_background, args=(sql, session_id, session_id))
+            threads[session_id].start()
+            _wait_until(lambda: len(manager.warehouse.running) == len(threads))
+
+        # s2 の方が後から実行されたが、s1 をキャンセルすると s1 のクエリだけが中断される
+        result = service.cancel_execution("s1")
+        threads["s1"].join(timeout=5)
+
+        assert result["server_cancelled"] is True and result["cancel_method"] == CANCEL_METHOD_ABORT
+        assert not threads["s1"].is_alive()
+        assert threads["s2"].is_alive()
+        assert [text for text, _, _ in manager.warehouse.running.values()] == ["SELECT * FROM B_TABLE"]
+        # 2回目の実行では同じ接続のセッションIDを問い合わせ直さない
+        assert [c.executed for c in cursors] == [["SELECT CURRENT_SESSION()", "SELECT * FROM A_TABLE"],
+                                                 ["SELECT * FROM B_TABLE"]]
+
+        service.cancel_execution("s2")
+        threads["s2"].join(timeout=5)
+        assert not threads["s2"].is_alive()
+
+    def test_abort_picks_query_by_start_time_when_sql_is_identical(self):
+        """同じ接続で同じSQLが2つ走っていても、開始時刻が最も近い自分のクエリだけを中断する"""
+        cursors = []
+        manager = FakeConnectionManager(_recording_cursor_factory(cursors, cancel_supported=False))
+        streaming_state_service = StreamingStateService()
+        service = HybridSQLService(
+            cache_service=Mock(),
+            connection_manager=manager,
+            streaming_state_service=streaming_state_service,
+            query_cancellation_service=QueryCancellationService(),
+        )
+        threads = {}
+        for session_id in ["s1", "s2"]:
+            streaming_state_service.create_streaming_state(session_id)
+            threads[session_id] = threading.Thread(
+                target=service.execute_sql_background, args=("SELECT * FROM BIG_TABLE", session_id, session_id)
+            )
+            threads[session_id].start()
+            _wait_until(lambda: len(manager.warehouse.running) == len(threads))
+            time.sleep(0.2)
+
+        result = service.cancel_execution("s2")
+        threads["s2"].join(timeout=5)
+
+        assert result["server_cancelled"] is True and result["cancel_method"] == CANCEL_METHOD_ABORT
+        assert not threads["s2"].is_alive()
+        assert threads["s1"].is_alive()
+        assert list(manager.warehouse.running) == ["01b2c3d4-0000-1111-0000-000000000001"]
+
+        service.cancel_execution("s1")
+        threads["s1"].join(timeout=5)
+        assert not threads["s1"].is_alive()
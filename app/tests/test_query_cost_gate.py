@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+実行前コストゲート（QueryCostGate）と HybridSQLService への組み込みのテスト
+EXPLAIN USING TABULAR の出力は偽のカーソルで返す
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.exceptions import SQLExecutionError
+from app.services.execution_scheduler import LANE_BULK, LANE_INTERACTIVE
+from app.services.hybrid_sql_service import HybridSQLService
+from app.services.query_cost_gate import (
+    POLICY_ALLOW, POLICY_BULK, POLICY_CONFIRM, POLICY_REJECT, POLICY_WARN, QueryCostEstimate, QueryCostGate,
+    parse_explain_rows,
+)
+from app.services.query_executor import QueryExecutor
+
+GB = 1024 ** 3
+SQL = "SELECT id, amount FROM SALES.ORDERS WHERE customer_status = 'active' LIMIT 10"
+EXPLAIN_COLUMNS = ["step", "id", "parent", "operation", "objects", "alias", "expressions",
+                   "partitionsTotal", "partitionsAssigned", "bytesAssigned"]
+
+
+def explain_rows(bytes_assigned, partitions_total=1200, partitions_assigned=300):
+    """Snowflake の EXPLAIN USING TABULAR と同じ形の出力"""
+    return [
+        (None, None, None, "GlobalStats", None, None, None, partitions_total, partitions_assigned, bytes_assigned),
+        (1, 0, None, "Result", None, None, "ORDERS.ID, ORDERS.AMOUNT", None, None, None),
+        (1, 1, 0, "Limit", None, None, "rowCount: 10", None, None, None),
+        (1, 2, 1, "Filter", None, None, "ORDERS.CUSTOMER_STATUS = 'active'", None, None, None),
+        (1, 3, 2, "TableScan", "SALES.ORDERS", None, "ID, AMOUNT, CUSTOMER_STATUS",
+         partitions_total, partitions_assigned, bytes_assigned),
+    ]
+
+
+class FakeCursor:
+    def __init__(self, manager, connection):
+        self.manager = manager
+        self.connection = connection
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, *params):
+        self.manager.executed.append(sql)
+        self.manager.timeouts.append(self.connection.timeout)
+        if self.manager.fail_explain and sql.startswith("EXPLAIN"):
+            raise RuntimeError("SQL compilation error")
+        if sql.startswith("EXPLAIN USING TABULAR"):
+            self.description = [(name,) for name in EXPLAIN_COLUMNS]
+            self._rows = explain_rows(self.manager.bytes_assigned)
+        else:
+            self.description = [("COUNT(*)",)]
+            self._rows = [(self.manager.count,)]
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnectionManager:
+    def __init__(self, bytes_assigned=GB, fail_explain=False, count=123):
+        self.bytes_assigned = bytes_assigned
+        self.fail_explain = fail_explain
+        self.count = count
+        self.executed = []
+        self.timeouts = []
+        self.connection = Mock(timeout=0)
+        self.connection.cursor.side_effect = lambda: FakeCursor(self, self.connection)
+        self.released = 0
+
+    def get_connection(self):
+        return "conn_1", self.connection
+
+    def create_dedicated_connection(self):
+        raise AssertionError("EXPLAIN はプール接続で実行する")
+
+    def release_connection(self, conn_id):
+        self.released += 1
+
+
+def make_gate(**overrides):
+    options = dict(enabled=True, warn_bytes=10 * GB, bulk_bytes=50 * GB, confirm_bytes=200 * GB,
+                   reject_bytes=1024 * GB, confirm_rows=1_000_000, reject_rows=10_000_000,
+                   ttl_seconds=600, max_entries=10, explain_timeout_seconds=5)
+    options.update(overrides)
+    return QueryCostGate(**options)
+
+
+class TestQueryCostGate:
+    """見積もりの取得・キャッシュ・ポリシー判定のテスト"""
+
+    def test_parses_global_stats_from_explain_output(self):
+        manager = FakeConnectionManager(bytes_assigned=12 * GB)
+        estimate = make_gate().estimate(SQL, QueryExecutor(manager))
+
+        assert manager.executed == [f"EXPLAIN USING TABULAR {SQL}"]
+        assert (estimate.partitions_total, estimate.partitions_assigned) == (1200, 300)
+        assert estimate.bytes_assigned == 12 * GB
+        assert estimate.estimated_rows is None
+        assert parse_explain_rows([{"operation": "Result", "estimatedrows": "42"}]).estimated_rows == 42
+
+    def test_explain_sets_and_restores_timeout_on_pooled_connection(self):
+        manager = FakeConnectionManager()
+        make_gate(explain_timeout_seconds=7).estimate(SQL, QueryExecutor(manager))
+
+        # 新しい接続（ログイン）は作らず、EXPLAIN の間だけタイムアウトを差し替えて元に戻す
+        assert manager.timeouts == [7]
+        assert manager.connection.timeout == 0
+        assert manager.released == 1
+
+    def test_estimate_is_cached_per_sql_fingerprint(self):
+        manager = FakeConnectionManager()
+        gate = make_gate()
+        executor = QueryExecutor(manager)
+
+        first = gate.estimate(SQL, executor)
+        again = gate.estimate("  select id, amount\nfrom SALES.ORDERS where customer_status = 'active' limit 10;", executor)
+
+        assert len(manager.executed) == 1
+        assert not first.cached and again.cached
+        assert again.bytes_assigned == first.bytes_assigned
+        assert gate.get_metrics()["explains"] == 1 and gate.get_metrics()["hits"] == 1
+
+    @pytest.mark.parametrize("size, confirmed, policy", [
+        (1 * GB, False, POLICY_ALLOW),
+        (20 * GB, False, POLICY_WARN),
+        (80 * GB, False, POLICY_BULK),
+        (300 * GB, False, POLICY_CONFIRM),
+        (300 * GB, True, POLICY_BULK),
+        (2048 * GB, True, POLICY_REJECT),
+    ])
+    def test_policies_by_bytes_to_scan(self, size, confirmed, policy):
+        decision = make_gate().decide(QueryCostEstimate(bytes_assigned=size), confirmed)
+        assert decision.policy == policy
+        assert (decision.lane == LANE_BULK) == (policy == POLICY_BULK)
+        assert (decision.message is None) == (policy == POLICY_ALLOW)
+
+    def test_row_estimate_uses_display_and_csv_limits(self):
+        gate = make_gate()
+        assert gate.decide(QueryCostEstimate(estimated_rows=2_000_000)).policy == POLICY_CONFIRM
+        assert gate.decide(QueryCostEstimate(estimated_rows=20_000_000), confirmed=True).policy == POLICY_REJECT
+        assert make_gate(warn_bytes=0).decide(QueryCostEstimate(bytes_assigned=20 * GB)).policy == POLICY_ALLOW
+
+    def test_explain_failure_lets_the_query_through(self):
+        decision = make_gate().evaluate(SQL, QueryExecutor(FakeConnectionManager(fail_explain=True)))
+        assert decision.policy == POLICY_ALLOW
+        assert decision.estimate is None
+
+
+class TestHybridSQLServiceCostGate:
+    """HybridSQLService の実行前判定のテスト"""
+
+    def _service(self, manager, gate):
+        cache_service = Mock()
+        cache_service.generate_session_id.return_value = "session_1"
+        cache_service.register_session.return_value = True
+        scheduler = Mock()
+        scheduler.enqueue.return_value = 0
+        service = HybridSQLService(cache_service=cache_service, connection_manager=manager,
+                                   execution_scheduler=scheduler, query_cost_gate=gate)
+        return service, cache_service, scheduler
+
+    def test_scan_estimate_replaces_count_and_estimate_is_returned(self):
+        manager = FakeConnectionManager(bytes_assigned=20 * GB)
+        service, _, scheduler = self._service(manager, make_gate())
+
+        result = service.prepare_sql_execution(SQL, "user")
+
+        assert result["status"] == "processing"
+        # スキャン量の見積もりで判定済みのため、推定行数がなくても COUNT(*) は実行しない
+        assert not any("COUNT(*)" in sql for sql in manager.executed)
+        assert result["total_count"] == -1
+        assert result["cost_estimate"]["policy"] == POLICY_WARN
+        assert result["cost_estimate"]["bytes_assigned"] == 20 * GB
+        assert "スキャン量" in result["message"]
+        scheduler.enqueue.assert_called_once_with("session_1", "user", LANE_INTERACTIVE)
+
+    def test_confirmation_then_bulk_lane_after_approval(self):
+        manager = FakeConnectionManager(bytes_assigned=300 * GB)
+        service, cache_service, scheduler = self._service(manager, make_gate())
+
+        result = service.prepare_sql_execution(SQL, "user")
+        assert result["status"] == "requires_confirmation"
+        assert result["cost_estimate"]["policy"] == POLICY_CONFIRM
+        cache_service.cleanup_session.assert_called_once_with("session_1")
+        scheduler.enqueue.assert_not_called()
+
+        result = service.prepare_sql_execution(SQL, "user", confirmed=True)
+        assert result["status"] == "processing"
+        assert result["cost_estimate"]["cached"] is True
+        scheduler.enqueue.assert_called_once_with("session_1", "user", LANE_BULK)
+        assert len([sql for sql in manager.executed if sql.startswith("EXPLAIN")]) == 1
+
+    def test_rejected_query_is_not_executed(self):
+        manager = FakeConnectionManager(bytes_assigned=2048 * GB)
+        service, _, scheduler = self._service(manager, make_gate())
+
+        with pytest.raises(SQLExecutionError, match="スキャン量が大きすぎます"):
+            service.prepare_sql_execution(SQL, "user")
+        scheduler.enqueue.assert_not_called()
+
+    def test_row_estimate_uses_explain_rows_without_count(self, monkeypatch):
+        manager = FakeConnectionManager()
+        gate = make_gate()
+        monkeypatch.setattr(gate, "estimate", lambda sql, executor: QueryCostEstimate(estimated_rows=500))
+        service, _, _ = self._service(manager, gate)
+
+        result = service.prepare_sql_execution(SQL, "user")
+
+        assert result["total_count"] == 500
+        assert not any("COUNT(*)" in sql for sql in manager.executed)
+
+    @pytest.mark.parametrize("method", ["prepare_sql_execution", "execute_sql_with_cache"])
+    def test_record_limits_apply_when_explain_fails(self, method):
+        settings = Mock(max_records_for_display=1_000, max_records_for_csv_download=10_000)
+        gate = make_gate(confirm_rows=1_000, reject_rows=10_000)
+
+        service, cache_service, scheduler = self._service(FakeConnectionManager(count=5_000, fail_explain=True), gate)
+        with patch("app.services.hybrid_sql_service.settings", settings):
+            result = getattr(service, method)(SQL, "user")
+        assert result["status"] == "requires_confirmation"
+        assert result["total_count"] == 5_000
+        cache_service.cleanup_session.assert_called_once_with("session_1")
+
+        service, _, scheduler = self._service(FakeConnectionManager(count=50_000, fail_explain=True), gate)
+        with patch("app.services.hybrid_sql_service.settings", settings):
+            with pytest.raises(SQLExecutionError, match="データが大きすぎます"):
+                getattr(service, method)(SQL, "user")
+        scheduler.enqueue.assert_not_called()
+
+    @pytest.mark.parametrize("method", ["prepare_sql_execution", "execute_sql_with_cache"])
+    def test_invalid_sql_is_not_sent_as_explain(self, method):
+        manager = FakeConnectionManager()
+        service, cache_service, scheduler = self._service(manager, make_gate())
+
+        result = getattr(service, method)("DELETE FROM SALES.ORDERS", "user")
+
+        assert result["success"] is False
+        assert manager.executed == []
+        cache_service.cleanup_session.assert_called_with("session_1")
+        scheduler.enqueue.assert_not_called()
+
+    def test_disabled_gate_falls_back_to_count(self):
+        manager = FakeConnectionManager()
+        service, _, _ = self._service(manager, make_gate(enabled=False))
+
+        result = service.prepare_sql_execution(SQL, "user")
+
+        assert result["total_count"] == 123
+        assert result["cost_estimate"] is None
+        assert not any(sql.startswith("EXPLAIN") for sql in manager.executed)
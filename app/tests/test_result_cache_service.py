@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+結果再利用キャッシュサービスのテスト
+"""
+import sqlite3
+import time
+
+import pytest
+
+from app.services.result_cache_service import ResultCacheService, normalize_sql
+
+
+class TestNormalizeSql:
+    """SQL正規化のテスト"""
+
+    def test_whitespace_case_and_comments_are_ignored(self):
+        a = "select *  from T1\n where  A = 'x'; -- コメント"
+        b = "SELECT * FROM T1 WHERE A = 'x'"
+        assert normalize_sql(a) == normalize_sql(b)
+
+    def test_literal_case_is_preserved(self):
+        assert normalize_sql("SELECT * FROM T1 WHERE A = 'x'") != normalize_sql("SELECT * FROM T1 WHERE A = 'X'")
+
+    def test_whitespace_inside_literals_is_preserved(self):
+        # 文字列リテラル・引用符付き識別子の中の空白は結果が変わるため圧縮しない
+        assert normalize_sql("SELECT * FROM T1 WHERE A = 'x  y'") != normalize_sql("SELECT * FROM T1 WHERE A = 'x y'")
+        assert normalize_sql('SELECT "a  b" FROM T1') != normalize_sql('SELECT "a b" FROM T1')
+        assert normalize_sql("SELECT *\n  FROM T1 WHERE A = 'x  y'") == "SELECT * FROM T1 WHERE A = 'x  y'"
+
+
+class TestResultCacheService:
+    """ResultCacheServiceのテスト"""
+
+    @pytest.fixture
+    def service(self):
+        return ResultCacheService(ttl_seconds=60, enabled=True, max_entries=2)
+
+    @pytest.fixture
+    def source_db(self, tmp_path):
+        path = tmp_path / "cache_src.db"
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE cache_data (A TEXT)")
+        return str(path)
+
+    def test_fingerprint_includes_scope_and_limit(self, service):
+        sql = "SELECT * FROM T1 WHERE A = 1"
+        assert service.fingerprint(sql, "ROLE_A") == service.fingerprint("select *\n  from T1 where A = 1;", "ROLE_A")
+        assert service.fingerprint(sql, "ROLE_A") != service.fingerprint(sql, "ROLE_B")
+        assert service.fingerprint(sql, "ROLE_A") != service.fingerprint(sql, "ROLE_A", limit=10)
+
+    def test_hit_and_miss_metrics(self, service, source_db):
+        fp = service.fingerprint("SELECT 1 FROM T1 WHERE A = 1", "DEFAULT")
+        assert service.lookup(fp) is None
+        service.store(fp, "cache_src", source_db, 3, 3, 1.5)
+
+        entry = service.lookup(fp)
+        assert entry["session_id"] == "cache_src"
+        assert entry["processed_rows"] == 3
+
+        metrics = service.get_metrics()
+        assert metrics["hits"] == 1
+        assert metrics["misses"] == 1
+        assert metrics["stores"] == 1
+        assert metrics["hit_ratio"] == 0.5
+
+    def test_bypass_flag_skips_lookup(self, service, source_db):
+        fp = service.fingerprint("SELECT 1 FROM T1 WHERE A = 1")
+        service.store(fp, "cache_src", source_db, 1, 1, 0.1)
+        assert service.lookup(fp, bypass=True) is None
+        assert service.get_metrics()["bypasses"] == 1
+
+    def test_expired_or_deleted_entry_is_miss(self, service, source_db, tmp_path):
+        fp = service.fingerprint("SELECT 1 FROM T1 WHERE A = 1")
+        service.store(fp, "cache_src", source_db, 1, 1, 0.1)
+        service._entries[fp]["stored_at"] = time.time() - 120
+        assert service.lookup(fp) is None
+
+        service.store(fp, "cache_gone", str(tmp_path / "missing.db"), 1, 1, 0.1)
+        assert service.lookup(fp) is None
+        assert service.get_metrics()["entries"] == 0
+
+    def test_oldest_entry_is_evicted(self, service, source_db):
+        for i in range(3):
+            service.store(f"fp{i}", f"cache_{i}", source_db, 1, 1, 0.1)
+        assert service.lookup("fp0") is None
+        assert service.lookup("fp2") is not None
+        assert service.get_metrics()["evictions"] == 1
+
+    def test_disabled_service_never_hits(self, source_db):
+        service = ResultCacheService(ttl_seconds=60, enabled=False, max_entries=10)
+        service.store("fp", "cache_src", source_db, 1, 1, 0.1)
+        assert service.lookup("fp") is None
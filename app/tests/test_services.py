@@ -323,3 +323,71 @@ class TestHybridSQLService:
         assert result is True
         mock_cache_service.cleanup_session.assert_called_once_with("test_session_123")
         mock_session_service.delete_session.assert_called_once_with("test_session_123")
+
+    def test_execute_sql_with_cache_reuses_cached_result(self):
+        """結果再利用キャッシュにヒットした場合は実行せずに複製結果を返すテスト"""
+        from app.services.result_cache_service import ResultCacheService
+
+        mock_cache_service = Mock()
+        mock_cache_service.generate_session_id.return_value = "cache_user_new"
+        mock_cache_service.register_session.return_value = True
+        mock_cache_service.clone_session_data.return_value = True
+        mock_connection_manager = Mock()
+
+        result_cache = ResultCacheService(ttl_seconds=60, enabled=True, max_entries=10)
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+            source_path = f.name
+        try:
+            fp = result_cache.fingerprint("SELECT * FROM T1 WHERE CUSTOMER_ID = 1001", "DEFAULT")
+            result_cache.store(fp, "cache_user_old", source_path, 10, 10, 2.0)
+
+            service = HybridSQLService(
+                mock_cache_service,
+                mock_connection_manager,
+                result_cache_service=result_cache,
+            )
+            result = service.execute_sql_with_cache("select *  from T1 where CUSTOMER_ID = 1001;", "user", scope="DEFAULT")
+
+            assert result["success"] is True
+            assert result["cache_hit"] is True
+            assert result["session_id"] == "cache_user_new"
+            assert result["processed_rows"] == 10
+            mock_cache_service.clone_session_data.assert_called_once_with("cache_user_old", "cache_user_new")
+            mock_connection_manager.get_connection.assert_not_called()
+
+            # バイパス指定時は再利用しない
+            service._get_total_count = Mock(return_value=0)
+            service._fetch_and_cache_data = Mock(return_value=0)
+            service.validator = Mock()
+            service.validator.validate_sql.return_value = Mock(is_valid=True)
+            result = service.execute_sql_with_cache("SELECT * FROM T1 WHERE CUSTOMER_ID = 1001", "user", scope="DEFAULT", bypass_cache=True)
+            assert result.get("cache_hit") is None
+            service._fetch_and_cache_data.assert_called_once()
+        finally:
+            os.remove(source_path)
+
+    def test_cached_result_is_not_reused_for_sql_that_now_fails_validation(self):
+        """検証ルールの変更後は、キャッシュ済みでも検証に失敗するSQLの結果を返さないテスト"""
+        from app.services.result_cache_service import ResultCacheService
+
+        mock_cache_service = Mock()
+        mock_cache_service.generate_session_id.return_value = "cache_user_new"
+        mock_cache_service.register_session.return_value = True
+        mock_cache_service.clone_session_data.return_value = True
+        result_cache = ResultCacheService(ttl_seconds=60, enabled=True, max_entries=10)
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+            source_path = f.name
+        try:
+            result_cache.store(result_cache.fingerprint("SELECT * FROM T1", "DEFAULT"), "cache_user_old", source_path, 10, 10, 2.0)
+
+            service = HybridSQLService(mock_cache_service, Mock(), result_cache_service=result_cache)
+            service.validator = Mock()
+            service.validator.validate_sql.return_value = Mock(is_valid=False, errors=["T1 は参照できません"])
+            result = service.execute_sql_with_cache("SELECT * FROM T1", "user", scope="DEFAULT")
+
+            assert result["success"] is False
+            assert result.get("cache_hit") is None
+            mock_cache_service.clone_session_data.assert_not_called()
+            mock_cache_service.cleanup_session.assert_called_with("cache_user_new")
+        finally:
+            os.remove(source_path)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完用の文脈解析（SqlContextAnalyzer）のテスト
+"""
+import random
+
+import pytest
+
+from app.services.sql_context_analyzer import SqlContextAnalyzer, SqlDocument, relex, tokenize
+
+QUERY = """WITH recent AS (
+    SELECT o.ORDER_ID FROM SALES.ORDERS o WHERE o.CREATED_AT > '2024-01-01'
+)
+SELECT c.CUSTOMER_NAME, "Line Items".QTY -- コメント FROM DUMMY
+FROM CUSTOMERS AS c, recent r
+LEFT JOIN "Line Items" ON "Line Items".ORDER_ID = r.ORDER_ID
+/* FROM IGNORED x */
+WHERE c.STATUS = 'it''s FROM x'
+"""
+
+
+def _analyze(sql, marker="|", **kwargs):
+    analyzer = kwargs.pop("analyzer", None) or SqlContextAnalyzer()
+    position = sql.index(marker)
+    return analyzer.analyze(sql.replace(marker, ""), position, **kwargs)
+
+
+class TestLexerAndAliases:
+    """字句解析とエイリアス表のテスト"""
+
+    def test_collects_tables_and_aliases(self):
+        document = SqlDocument(None, QUERY, tokenize(QUERY))
+
+        assert document.tables == ["ORDERS", "CUSTOMERS", "RECENT", "Line Items"]
+        assert document.aliases["O"] == "ORDERS"
+        assert document.aliases["C"] == "CUSTOMERS"
+        assert document.aliases["R"] == "RECENT"
+        assert document.aliases["LINE ITEMS"] == "Line Items"
+        assert "DUMMY" not in document.aliases and "IGNORED" not in document.aliases
+
+    def test_relex_matches_full_tokenize_for_random_edits(self):
+        rng = random.Random(0)
+        snippets = ["a", " ", "'", '"', "--", "\n", "/*", "*/", ".", "FROM x ", "JOIN", ",", "''"]
+        text = QUERY
+        document = SqlDocument(None, text, tokenize(text))
+        for _ in range(2000):
+            start = rng.randrange(len(text) + 1)
+            end = min(len(text), start + rng.choice([0, 0, 1, 3]))
+            text = text[:start] + rng.choice(snippets + [""]) + text[end:]
+            tokens = relex(document, text)
+            assert tokens == tokenize(text)
+            document = SqlDocument(None, text, tokens)
+
+
+class TestCursorContext:
+    """カーソル位置の文脈判定のテスト"""
+
+    @pytest.mark.parametrize("sql, expected", [
+        ("SELECT * FROM |", "TABLE"),
+        ("SELECT * FROM ORD|", "TABLE"),
+        ("SELECT * FROM OR|", "TABLE"),
+        ("SELECT * FROM A LEFT JOIN |", "TABLE"),
+        ("SELECT * FROM A a, |", "TABLE"),
+        ("SELECT * FROM A WHERE |", "COLUMN"),
+        ("SELECT | FROM A", "COLUMN"),
+    ])
+    def test_table_or_column_context(self, sql, expected):
+        context_type, _ = _analyze(sql)
+        assert context_type == expected
+
+    def test_dot_resolves_alias(self):
+        assert _analyze("SELECT c.| FROM SALES.CUSTOMERS c") == ('COLUMN_SPECIFIC', ["CUSTOMERS"])
+        assert _analyze('SELECT "Line Items".| FROM "Line Items"') == ('COLUMN_SPECIFIC', ["Line Items"])
+        assert _analyze("SELECT x.| FROM A") == ('COLUMN_SPECIFIC', ["x"])
+        assert _analyze("SELECT * FROM A a JOIN B b ON a.ID = b.|")[1] == ["B"]
+
+
+class TestSessionCache:
+    """エディタセッション単位のキャッシュのテスト"""
+
+    def test_reuses_tokens_before_the_edit(self):
+        analyzer = SqlContextAnalyzer()
+        first = analyzer.document(QUERY, session_id="tab-1", version=1)
+        edited = QUERY.replace("WHERE c.STATUS", "WHERE c.STATUSX")
+        second = analyzer.document(edited, session_id="tab-1", version=2)
+
+        assert second.tokens == tokenize(edited)
+        assert second.tokens[0] is first.tokens[0]
+        assert analyzer.document(edited, session_id="tab-1", version=2) is second
+        assert analyzer.document(edited, session_id="tab-2") is not second
+
+    def test_evicts_least_recently_used_sessions(self):
+        analyzer = SqlContextAnalyzer(max_sessions=2)
+        first = analyzer.document("SELECT 1", session_id="a")
+        analyzer.document("SELECT 2", session_id="b")
+        assert analyzer.document("SELECT 1", session_id="a") is first
+        analyzer.document("SELECT 3", session_id="c")
+
+        assert set(analyzer._documents) == {"a", "c"}
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行履歴の keyset ページング（期間・ユーザーの絞り込みをログストア側で行う）のテスト
+"""
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_current_user, get_sql_log_service_di
+from app.services.log_handlers import OracleLogHandler, SnowflakeLogHandler, SqliteLogHandler, SQLLogRecord
+from app.services.query_executor import QueryResult
+from app.services.sql_log_service import SQLLogService
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+def _records(user_id: str, count: int, start: datetime, step: timedelta, same_second: int = 1):
+    """start から step ずつ新しくなるログ（same_second 件ずつ同じ日時）"""
+    records = []
+    for n in range(count):
+        when = start + step * (n // same_second)
+        records.append(SQLLogRecord(user_id, f"SELECT {n}", 1, when, 1, True, end_time=when))
+    return records
+
+
+def _page_all(handler, user_id=None, since=None, limit=3):
+    pages, cursor = [], None
+    while True:
+        page = handler.get_history(user_id, since, limit, cursor)
+        pages.append(page["logs"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return pages
+
+
+def _snowflake_hash(*values):
+    """Snowflake の HASH() の代わり（符号付き64ビット整数）"""
+    return int.from_bytes(hashlib.sha256(repr(values).encode()).digest()[:8], "big", signed=True)
+
+
+class SqliteBackedSnowflake:
+    """Log.TOOL_LOG を SQLite に置いた Snowflake 接続の代わり（LIMIT / OFFSET は SQLite と同じ構文）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.executed = []
+
+    def execute_query(self, sql, params=None):
+        self.executed.append((sql, params))
+        with sqlite3.connect(":memory:") as conn:
+            conn.execute("ATTACH DATABASE ? AS Log", (self.db_path,))
+            conn.create_function("HASH", -1, _snowflake_hash)
+            cursor = conn.execute(sql, params or ())
+            columns = [column[0] for column in cursor.description]
+            return {"success": True, "data": [dict(zip(columns, row)) for row in cursor.fetchall()]}
+
+
+class TestSqliteHistory:
+    """SQLiteログストアの履歴取得のテスト"""
+
+    def test_indexes_are_created_and_used(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        with sqlite3.connect(handler.db_path) as conn:
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list('TOOL_LOG')")}
+            plan = " ".join(str(row[-1]) for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT rowid FROM TOOL_LOG WHERE TOOL_NAME = ? AND OPE_CODE = ? AND MK_DATE >= ?"
+                " AND (MK_DATE < ? OR (MK_DATE = ? AND rowid < ?)) ORDER BY MK_DATE DESC, rowid DESC LIMIT 10",
+                ("SQLDOJOWEB", "alice", "20250101000000", "20250601000000", "20250601000000", 5)))
+        assert {"IX_TOOL_LOG_OPE_DATE", "IX_TOOL_LOG_DATE"} <= indexes
+        assert "IX_TOOL_LOG_OPE_DATE" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_keyset_pages_cover_window_without_gaps(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs(_records("alice", 10, NOW - timedelta(days=200), timedelta(days=1)))
+        handler.write_logs(_records("alice", 7, NOW - timedelta(hours=1), timedelta(seconds=1), same_second=3))
+        handler.write_logs(_records("bob", 5, NOW - timedelta(hours=1), timedelta(minutes=1)))
+
+        pages = _page_all(handler, "alice", NOW - timedelta(days=180))
+
+        sqls = [log["sql"] for page in pages for log in page]
+        # 200日前からの10件は期間外、直近の7件（同じ秒に3件ずつ）だけが新しい順に重複なく返る
+        assert sorted(sqls) == sorted(f"SELECT {n}" for n in range(7))
+        timestamps = [log["timestamp"] for page in pages for log in page]
+        assert timestamps == sorted(timestamps, reverse=True)
+        assert [len(page) for page in pages] == [3, 3, 1]
+
+    def test_get_logs_maps_sqlite_rows(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs(_records("alice", 2, NOW, timedelta(seconds=1)))
+
+        result = handler.get_logs("alice", 10, 0)
+        assert result["total_count"] == 2
+        assert [log["sql"] for log in result["logs"]] == ["SELECT 1", "SELECT 0"]
+        assert result["logs"][0]["connserver"] == "98"
+
+
+class TestRemoteStoreHistory:
+    """Oracle / Snowflake の履歴取得のテスト"""
+
+    def test_snowflake_keyset_pages_same_second_logs_without_offset(self, tmp_path):
+        store = SqliteLogHandler(str(tmp_path / "log.db"))
+        store.write_logs(_records("alice", 8, NOW - timedelta(minutes=5), timedelta(seconds=1), same_second=4))
+        handler = SnowflakeLogHandler(Mock())
+        handler.connection_manager = SqliteBackedSnowflake(store.db_path)
+
+        pages = _page_all(handler, "alice", NOW - timedelta(days=180))
+
+        assert [len(page) for page in pages] == [3, 3, 2]
+        assert sorted(log["sql"] for page in pages for log in page) == sorted(f"SELECT {n}" for n in range(8))
+        sql, params = handler.connection_manager.executed[-1]
+        assert "alice" not in sql and params[0] == "alice"
+        assert "MK_DATE >= ?" in sql and "(MK_DATE < ? OR (MK_DATE = ? AND HASH(" in sql
+        assert "OFFSET" not in sql
+
+    def test_oracle_pushes_filters_into_sql(self):
+        executor = Mock()
+        executor.execute_query.return_value = QueryResult(success=True, data=[
+            {"mk_date": "20250601120000", "row_id": "AAAR3sAAEAAAACXAAB", "ope_code": "alice",
+             "option_no": "SELECT 1", "system_work_time": 1},
+            {"mk_date": "20250601115959", "row_id": "AAAR3sAAEAAAACXAAA", "ope_code": "alice",
+             "option_no": "SELECT 2", "system_work_time": 1},
+        ])
+        handler = OracleLogHandler(executor)
+
+        page = handler.get_history("alice", NOW - timedelta(days=180), 1, "20250601120000.AAAR3sAAEAAAACXAAC")
+
+        sql, params = executor.execute_query.call_args[0]
+        assert "OPE_CODE = ?" in sql and "MK_DATE >= ?" in sql
+        assert "ROWID < CHARTOROWID(?)" in sql and "ORDER BY MK_DATE DESC, ROWID DESC" in sql
+        assert params == ("alice", "20241203120000", "20250601120000", "20250601120000", "AAAR3sAAEAAAACXAAC", 2)
+        # 続きは最後に返したログの (MK_DATE, ROWID) から
+        assert page["next_cursor"] == "20250601120000.AAAR3sAAEAAAACXAAB"
+        assert [log["sql"] for log in page["logs"]] == ["SELECT 1"]
+
+
+class TestHistoryAPI:
+    """履歴APIのテスト"""
+
+    def test_user_history_uses_cursor(self, client: TestClient, mock_user):
+        mock_service = Mock()
+        mock_service.get_history.return_value = {
+            "logs": [{"sql": "SELECT 1", "execution_time": 1, "row_count": None, "timestamp": "2025-06-01T12:00:00"}],
+            "next_cursor": "20250601120000.7",
+        }
+        app = client.app
+        app.dependency_overrides[get_sql_log_service_di] = lambda: mock_service
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": mock_user.user_id, "user_name": mock_user.user_name}
+        try:
+            response = client.get("/api/v1/users/history?limit=50&cursor=20250601130000.1")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["history"] == data["logs"] and data["total_count"] == 1
+            assert data["next_cursor"] == "20250601120000.7"
+            mock_service.get_history.assert_called_once_with(mock_user.user_id, 50, "20250601130000.1")
+
+            response = client.get("/api/v1/logs/user-history")
+            assert response.json()["next_cursor"] == "20250601120000.7"
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_service_caps_limit_and_applies_retention_window(self):
+        service = SQLLogService.__new__(SQLLogService)
+        service.settings = Mock(max_history_logs=1000, history_retention_days=30)
+        service.log_storage_type = "sqlite"
+        service.log_handler = Mock()
+
+        service.get_history("alice", limit=5000)
+
+        user_id, since, limit, cursor = service.log_handler.get_history.call_args[0]
+        assert (user_id, limit, cursor) == ("alice", 1000, None)
+        assert timedelta(days=29) < datetime.now() - since < timedelta(days=31)
+
+
+class TestLogsAfter:
+    """利用状況の差分集計用の get_logs_after のテスト"""
+
+    def _service(self, handler):
+        service = SQLLogService.__new__(SQLLogService)
+        service.log_storage_type = "snowflake"
+        service.log_handler = handler
+        service.logger = Mock()
+        return service
+
+    def test_snowflake_pages_same_second_and_duplicate_logs_without_gaps(self, tmp_path):
+        store = SqliteLogHandler(str(tmp_path / "log.db"))
+        store.write_logs(_records("alice", 7, NOW - timedelta(minutes=5), timedelta(seconds=1), same_second=3))
+        # 全列が同じログ（同じ秒に同じSQLを2回実行）
+        store.write_logs([SQLLogRecord("bob", "SELECT 1", 1, NOW, 1, True, end_time=NOW)] * 2)
+        handler = SnowflakeLogHandler(Mock())
+        handler.connection_manager = SqliteBackedSnowflake(store.db_path)
+        service = self._service(handler)
+
+        seen, cursor = [], None
+        while True:
+            logs, cursor = service.get_logs_after(cursor, 2)
+            if not logs:
+                break
+            seen.extend((log["user_id"], log["sql"], log["timestamp"]) for log in logs)
+
+        assert sorted(entry[1] for entry in seen[:7]) == sorted(f"SELECT {n}" for n in range(7))
+        assert [entry[2] for entry in seen] == sorted(entry[2] for entry in seen)
+        assert seen[7:] == [("bob", "SELECT 1", NOW.isoformat())] * 2
+        assert service.get_logs_after(cursor, 2) == ([], cursor)
+
+    def test_oracle_uses_rowid_keyset_and_accepts_legacy_cursor(self):
+        executor = Mock()
+        executor.execute_query.return_value = QueryResult(success=True, data=[
+            {"mk_date": "20250601120000", "row_id": "AAAR3sAAEAAAACXAAB", "ope_code": "alice",
+             "option_no": "SELECT 1", "system_work_time": 1},
+        ])
+        service = self._service(OracleLogHandler(executor))
+
+        logs, cursor = service.get_logs_after("20250601120000.AAAR3sAAEAAAACXAAA", 100)
+
+        sql, params = executor.execute_query.call_args[0]
+        assert "ROWID > CHARTOROWID(?)" in sql and "ORDER BY MK_DATE, ROWID" in sql
+        assert params == ("20250601120000", "20250601120000", "AAAR3sAAEAAAACXAAA", 100)
+        assert cursor == "20250601120000.AAAR3sAAEAAAACXAAB" and logs[0]["sql"] == "SELECT 1"
+
+        # 以前の形式（実行日時のみ）の cursor は、その日時より後から読む
+        service.get_logs_after("2025-06-01T12:00:00", 100)
+        sql, params = executor.execute_query.call_args[0]
+        assert "MK_DATE > ?" in sql and params == ("20250601120000", 100)
+
+    def test_sqlite_uses_rowid_cursor(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs(_records("alice", 3, NOW, timedelta(seconds=1)))
+        service = self._service(handler)
+
+        logs, cursor = service.get_logs_after(None, 2)
+        rest, last = service.get_logs_after(cursor, 2)
+
+        assert [log["sql"] for log in logs + rest] == ["SELECT 0", "SELECT 1", "SELECT 2"]
+        assert (cursor, last) == ("2", "3")
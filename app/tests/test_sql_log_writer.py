@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行ログの非同期一括書き込み（SQLLogWriter）とログハンドラの一括INSERTのテスト
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from app.exceptions import DatabaseError
+
+from app.logger import get_logger
+from app.services.log_handlers import OracleLogHandler, SnowflakeLogHandler, SqliteLogHandler, SQLLogRecord
+from app.services.query_executor import QueryResult
+from app.services.sql_log_service import SQLLogService
+from app.services.sql_log_writer import SQLLogWriter
+
+
+def _record(n: int = 0, sql: str = "SELECT 1") -> SQLLogRecord:
+    return SQLLogRecord(f"user{n}", sql, 0.5, datetime(2024, 1, 1, 9, 0, 0), 1, True)
+
+
+class RecordingHandler:
+    """書き込まれたバッチを記録する（fail_times 回までは失敗する）"""
+
+    def __init__(self, fail_times: int = 0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def write_logs(self, records):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise RuntimeError("log store unavailable")
+        self.batches.append(list(records))
+
+
+def _writer(handler, **options):
+    defaults = dict(max_queue_size=1000, batch_size=100, flush_interval=0.05, max_retries=3, retry_backoff=0.001)
+    defaults.update(options)
+    return SQLLogWriter(handler, **defaults)
+
+
+class TestSQLLogWriter:
+    """キュー・一括書き込み・再試行・停止時の書き切りのテスト"""
+
+    def test_batches_by_size_and_time(self):
+        handler = RecordingHandler()
+        writer = _writer(handler)
+        try:
+            for n in range(250):
+                writer.submit(_record(n))
+            writer.flush()
+        finally:
+            writer.stop(timeout=2)
+
+        sizes = [len(batch) for batch in handler.batches]
+        assert sum(sizes) == 250
+        assert max(sizes) == 100
+        assert [r.user_id for batch in handler.batches for r in batch] == [f"user{n}" for n in range(250)]
+        assert writer.get_metrics()["written"] == 250
+
+    def test_retries_with_backoff_then_succeeds(self):
+        handler = RecordingHandler(fail_times=2)
+        writer = _writer(handler)
+        writer.submit(_record())
+        writer.flush()
+        writer.stop(timeout=2)
+
+        assert len(handler.batches) == 1
+        metrics = writer.get_metrics()
+        assert metrics["retries"] == 2 and metrics["dropped"] == 0
+
+    def test_drops_batch_after_max_retries(self):
+        handler = RecordingHandler(fail_times=100)
+        writer = _writer(handler, max_retries=2)
+        writer.submit(_record())
+        writer.flush()
+        writer.stop(timeout=2)
+
+        assert handler.calls == 3
+        assert writer.get_metrics()["dropped"] == 1
+
+    def test_stop_drains_queue_without_waiting_for_flush_interval(self):
+        handler = RecordingHandler()
+        writer = _writer(handler, flush_interval=30)
+        for n in range(5):
+            writer.submit(_record(n))
+
+        started = time.monotonic()
+        assert writer.stop(timeout=5) is True
+        assert time.monotonic() - started < 5
+        assert sum(len(batch) for batch in handler.batches) == 5
+
+        # 停止後のログは呼び出し元で直接書き込む
+        writer.submit(_record(99))
+        assert handler.batches[-1][0].user_id == "user99"
+
+    def test_full_queue_writes_inline_instead_of_dropping(self):
+        release = threading.Event()
+        handler = RecordingHandler()
+        original = handler.write_logs
+
+        def slow_write(records):
+            if threading.current_thread().name == "sql-log-writer":
+                release.wait(5)
+            original(records)
+
+        handler.write_logs = slow_write
+        writer = _writer(handler, max_queue_size=1, batch_size=1)
+        try:
+            for n in range(4):
+                writer.submit(_record(n))
+            assert writer.get_metrics()["written_inline"] >= 1
+        finally:
+            release.set()
+            writer.flush()
+            writer.stop(timeout=2)
+        assert sorted(r.user_id for batch in handler.batches for r in batch) == [f"user{n}" for n in range(4)]
+
+    def test_service_enqueues_instead_of_writing_on_request_path(self):
+        service = SQLLogService.__new__(SQLLogService)
+        service.log_handler = Mock()
+        service.log_storage_type = "sqlite"
+        service.logger = get_logger(__name__)
+        service.log_writer = Mock()
+
+        service.add_log_to_db("alice", "SELECT 1", 0.1, datetime.now(), 1, True, None)
+
+        service.log_handler.add_log.assert_not_called()
+        record = service.log_writer.submit.call_args[0][0]
+        assert (record.user_id, record.sql) == ("alice", "SELECT 1")
+
+
+class TestBatchInsert:
+    """ログハンドラの一括INSERTのテスト"""
+
+    def test_sqlite_executemany(self, tmp_path):
+        handler = SqliteLogHandler(str(tmp_path / "log.db"))
+        handler.write_logs([_record(n, f"SELECT {n}") for n in range(3)])
+
+        with sqlite3.connect(handler.db_path) as conn:
+            rows = conn.execute("SELECT OPE_CODE, OPTION_NO, FROM_DATE FROM TOOL_LOG ORDER BY rowid").fetchall()
+        assert rows == [(f"user{n}", f"SELECT {n}", "20240101090000") for n in range(3)]
+
+    def test_snowflake_multi_row_values_with_bind_parameters(self):
+        handler = SnowflakeLogHandler(Mock())
+        handler.connection_manager = Mock()
+        handler.connection_manager.execute_query.return_value = {"success": True, "data": None}
+        handler.max_rows_per_statement = 2
+
+        handler.write_logs([_record(n, "SELECT 'it''s'") for n in range(3)])
+
+        calls = handler.connection_manager.execute_query.call_args_list
+        assert len(calls) == 2
+        sql, params = calls[0][0]
+        assert sql.count("(?, ?, 'SQLDOJOWEB', ?, ?, ?, ?, ?, '98')") == 2
+        assert "it''s" not in sql
+        assert len(params) == 14 and params[2] == "SELECT 'it''s'"
+
+    def test_oracle_insert_all(self):
+        executor = Mock()
+        executor.execute_query.return_value = QueryResult(success=True)
+        handler = OracleLogHandler(executor)
+
+        handler.write_logs([_record(n) for n in range(3)])
+
+        sql, params = executor.execute_query.call_args[0]
+        assert sql.startswith("INSERT ALL") and sql.rstrip().endswith("SELECT 1 FROM DUAL")
+        assert sql.count("INTO HF3J8M01") == 3
+        assert len(params) == 21
+
+    def test_failed_batch_raises_for_retry(self):
+        executor = Mock()
+        executor.execute_query.return_value = QueryResult(success=False, error_message="ORA-00001")
+        handler = OracleLogHandler(executor)
+        with pytest.raises(DatabaseError, match="ORA-00001"):
+            handler.write_logs([_record()])
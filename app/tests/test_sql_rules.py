@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+SQL検証ルールエンジン（SQLRuleEngine）とルールセット設定のテスト
+"""
+from app.sql_rules import (
+    RULE_SET_FORBIDDEN, RULE_SET_PERFORMANCE, RULE_SET_SECURITY, SQLRule, SQLRuleEngine, keyword_rule,
+    literal_rule,
+)
+from app.sql_validator import SQLValidator
+
+LONG_WHERE = "WHERE customer_status = 'active'"
+
+
+def _engine():
+    return SQLRuleEngine([
+        keyword_rule(RULE_SET_FORBIDDEN, "DELETE", "delete"),
+        keyword_rule(RULE_SET_FORBIDDEN, "BULK INSERT", "bulk"),
+        literal_rule(RULE_SET_SECURITY, ";--", "comment"),
+        literal_rule(RULE_SET_SECURITY, "xp_", "xp"),
+        keyword_rule(RULE_SET_PERFORMANCE, "JOIN"),
+        SQLRule(RULE_SET_PERFORMANCE, "star", r"\*(?<=\bSELECT\s\*)"),
+    ])
+
+
+class TestSQLRuleEngine:
+    """1回の走査によるルール照合のテスト"""
+
+    def test_skips_comments_strings_and_quoted_identifiers(self):
+        scan = _engine().scan(
+            "SELECT a -- delete\n, 'delete it' AS \"DELETE\" /* bulk insert ;-- */ FROM t join u join v"
+        )
+        assert scan.counts == {"performance:JOIN": 2}
+
+    def test_keywords_respect_word_boundaries_and_case(self):
+        engine = _engine()
+        assert not engine.scan("SELECT deleted_at, is_delete FROM t").found("forbidden:DELETE")
+        assert engine.scan("select 1; Delete from t").found("forbidden:DELETE")
+        assert engine.scan("bulk\n  insert x").found("forbidden:BULK INSERT")
+        assert engine.scan("SELECT XP_CMDSHELL").found("security:xp_")
+        assert not engine.scan("SELECT EXP_DATE").found("security:xp_")
+
+    def test_reports_earliest_violation_and_positions(self):
+        sql = "SELECT 1 FROM t;-- x\n; DELETE FROM t"
+        scan = _engine().scan(sql)
+        assert scan.first_violation(RULE_SET_FORBIDDEN).message == "delete"
+        assert scan.first_violation(RULE_SET_SECURITY).message == "comment"
+        assert scan.position("forbidden:DELETE") == sql.index("DELETE")
+        assert scan.first_violation(RULE_SET_PERFORMANCE) is None
+
+    def test_positions_match_original_text_when_upper_changes_length(self):
+        sql = "SELECT straße, 'ß' FROM t ; DELETE FROM t"
+        scan = _engine().scan(sql)
+        assert scan.position("forbidden:DELETE") == sql.index("DELETE")
+
+    def test_lookbehind_rule_does_not_conflict_with_keyword_rule(self):
+        engine = SQLRuleEngine([keyword_rule(RULE_SET_PERFORMANCE, "SELECT"),
+                                SQLRule(RULE_SET_PERFORMANCE, "star", r"\*(?<=\bSELECT\s\*)")])
+        assert engine.scan("select * from t").counts == {"performance:SELECT": 1, "star": 1}
+
+
+class TestValidatorRuleSets:
+    """SQLValidator のルールセット設定のテスト"""
+
+    def test_forbidden_keyword_inside_string_or_comment_is_allowed(self):
+        validator = SQLValidator(cache_size=0)
+        result = validator.validate_sql(f"SELECT id FROM t {LONG_WHERE} AND note <> 'DROP' -- UPDATE later\nLIMIT 1")
+        assert result.is_valid, result.errors
+
+    def test_sp_and_xp_prefixed_identifiers_are_allowed(self):
+        result = SQLValidator(cache_size=0).validate_sql(
+            f"SELECT sp_code, xp_total FROM SP_SALES {LONG_WHERE} LIMIT 10"
+        )
+        assert result.is_valid, result.errors
+
+    def test_where_only_in_comment_does_not_satisfy_where_required(self):
+        result = SQLValidator(cache_size=0).validate_sql("SELECT id FROM t -- WHERE customer_status = 'x'")
+        assert not result.is_valid
+        assert "WHERE句が必要です" in result.errors[0]
+
+    def test_rule_sets_can_be_disabled(self):
+        validator = SQLValidator(cache_size=0, rule_sets=[RULE_SET_FORBIDDEN], extra_forbidden_keywords=[])
+        result = validator.validate_sql("SELECT * FROM t")
+        assert result.is_valid
+        assert result.warnings == [] and result.suggestions == []
+        assert validator.rule_engine.rule_sets == [RULE_SET_FORBIDDEN]
+
+    def test_extra_forbidden_keywords(self):
+        validator = SQLValidator(cache_size=0, extra_forbidden_keywords=["CALL"])
+        result = validator.validate_sql(f"SELECT id FROM t {LONG_WHERE} AND x = (CALL proc())")
+        assert result.errors == ["'CALL' は使用できません。データの変更は許可されていません"]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+SQLバリデーションの単一解析パイプラインとLRUキャッシュのテスト
+"""
+import random
+
+import pytest
+import sqlparse
+
+from app.sql_validator import FORMAT_OPTIONS, ParsedSQL, SQLValidator
+
+VALID_SQL = "select o.ID, o.AMOUNT from SALES.ORDERS o where o.STATUS = 'shipped' and o.AMOUNT > 100 limit 10"
+
+
+def _long_query(lines: int) -> str:
+    columns = ",\n".join(f"    o.COL_{i:04d}" for i in range(lines))
+    return f"SELECT\n{columns}\nFROM SALES.ORDERS o\nWHERE o.CREATED_AT >= '2024-01-01' AND o.STATUS = 'shipped'\nLIMIT 100"
+
+
+@pytest.fixture
+def lex_calls(monkeypatch):
+    """sqlparse の字句解析の呼び出し回数（parse / format はどちらもここを通る）"""
+    calls = []
+    original = sqlparse.lexer.tokenize
+
+    def counting(sql, encoding=None):
+        calls.append(len(sql))
+        return original(sql, encoding)
+
+    monkeypatch.setattr(sqlparse.lexer, "tokenize", counting)
+    return calls
+
+
+class TestSingleParse:
+    """1つのSQLの解析が1回で済むことのテスト"""
+
+    def test_long_query_is_parsed_once(self, lex_calls):
+        validator = SQLValidator(cache_size=8)
+        sql = _long_query(2000)
+
+        first = validator.validate_sql(sql)
+        for _ in range(3):
+            assert validator.validate_sql(sql) == first
+        formatted = validator.format_sql(sql)
+
+        assert first.is_valid
+        assert first.formatted_sql == formatted
+        assert lex_calls == [len(sql)]
+
+    def test_invalid_sql_is_still_formatted_from_the_same_parse(self, lex_calls):
+        validator = SQLValidator(cache_size=8)
+        sql = "select * from users"
+
+        assert not validator.validate_sql(sql).is_valid
+        assert validator.format_sql(sql) == sqlparse.format(sql, **FORMAT_OPTIONS)
+        assert len(lex_calls) == 2  # 期待値の sqlparse.format の分を含む
+
+    def test_format_matches_sqlparse_format(self):
+        fragments = ["select", "a", "b.c", "from", "t", "where", "and", "or", "=", "1", "'s'", "(", ")", ",",
+                     "join", "on", "left", "group by", "order by", "case", "when", "then", "end", "--c\n",
+                     "/*k*/", ";", "union", "in", "not", "null", "is", "count(*)", "as", "\n"]
+        rng = random.Random(0)
+        for _ in range(300):
+            sql = " ".join(rng.choice(fragments) for _ in range(rng.randint(1, 30)))
+            assert ParsedSQL(sql).format() == sqlparse.format(sql, **FORMAT_OPTIONS)
+
+
+class TestValidationCache:
+    """バリデーション結果のキャッシュのテスト"""
+
+    def test_cached_results_are_isolated_from_callers(self):
+        validator = SQLValidator(cache_size=8)
+        result = validator.validate_sql(VALID_SQL)
+        result.warnings.append("changed")
+        result.errors.append("changed")
+
+        again = validator.validate_sql(VALID_SQL)
+        assert "changed" not in again.warnings and not again.errors
+
+    def test_least_recently_used_entries_are_evicted(self, lex_calls):
+        validator = SQLValidator(cache_size=2)
+        queries = [VALID_SQL.replace("100", str(n)) for n in range(3)]
+        validator.validate_sql(queries[0])
+        validator.validate_sql(queries[1])
+        validator.validate_sql(queries[0])
+        validator.validate_sql(queries[2])  # queries[1] が追い出される
+
+        lex_calls.clear()
+        validator.validate_sql(queries[0])
+        assert lex_calls == []
+        validator.validate_sql(queries[1])
+        assert len(lex_calls) == 1
+
+    def test_cache_can_be_disabled(self, lex_calls):
+        validator = SQLValidator(cache_size=0)
+        validator.validate_sql(VALID_SQL)
+        validator.validate_sql(VALID_SQL)
+        assert len(lex_calls) == 2
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+表示制御サービスのテスト
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.metadata_cache import MetadataCache
+from app.services.visibility_control_service import VisibilityControlService, VisibilityModel
+
+CATALOG = [
+    {"name": "SALES", "tables": [{"name": "ORDERS"}, {"name": "SECRET"}]},
+    {"name": "HR", "tables": [{"name": "EMPLOYEES"}, {"name": "PUBLIC_HOLIDAYS"}]},
+    {"name": "EMPTY", "tables": []},
+]
+
+
+def _setting(object_name, role_name, is_visible):
+    return Mock(object_name=object_name, role_name=role_name, is_visible=is_visible)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return VisibilityControlService(MetadataCache(db_path=str(tmp_path / "metadata_cache.db")))
+
+
+class TestVisibilityModel:
+    """VisibilityModelのテスト"""
+
+    def test_role_setting_overrides_default(self):
+        model = VisibilityModel({
+            "HR": {"DEFAULT": False, "ADMIN": True},
+            "SALES.SECRET": {"DEFAULT": True, "GUEST": False},
+        }, version=1)
+
+        assert model.is_visible("HR", "ADMIN") is True
+        assert model.is_visible("HR", "GUEST") is False
+        assert model.is_visible("SALES.SECRET", "GUEST") is False
+        assert model.is_visible("SALES.SECRET", "ADMIN") is True
+        assert model.is_visible("UNKNOWN", "GUEST") is True
+
+    def test_hidden_schema_with_visible_table_is_marked(self):
+        model = VisibilityModel({
+            "HR": {"DEFAULT": False},
+            "HR.EMPLOYEES": {"DEFAULT": False},
+        }, version=1)
+
+        result = model.apply(CATALOG, "GUEST")
+
+        hr = next(s for s in result if s["name"] == "HR")
+        assert hr["schema_hidden"] is True
+        assert [t["name"] for t in hr["tables"]] == ["PUBLIC_HOLIDAYS"]
+        assert "schema_hidden" not in CATALOG[1]  # 元データは変更しない
+
+    def test_empty_settings_return_all(self):
+        assert VisibilityModel({}, version=1).apply(CATALOG, "GUEST") == CATALOG
+
+
+class TestVisibilityControlService:
+    """VisibilityControlServiceのテスト"""
+
+    def test_model_is_compiled_once_until_settings_change(self, service):
+        service.save_settings([_setting("SALES.SECRET", "GUEST", False)])
+
+        with patch.object(VisibilityControlService, "_load_settings", autospec=True,
+                          side_effect=VisibilityControlService._load_settings) as load:
+            first = service.get_visibility_model()
+            other = VisibilityControlService(service.cache)
+            assert other.get_visibility_model() is first
+            assert [t["name"] for t in other.filter_metadata(CATALOG, "GUEST")[0]["tables"]] == ["ORDERS"]
+            assert load.call_count == 1
+
+            service.save_settings([_setting("SALES.SECRET", "GUEST", True)])
+            second = other.get_visibility_model()
+            assert second.version > first.version
+            assert load.call_count == 2
+            assert [t["name"] for t in other.filter_metadata(CATALOG, "GUEST")[0]["tables"]] == ["ORDERS", "SECRET"]
+
+    def test_settings_load_failure_is_not_cached(self, service):
+        with patch.object(VisibilityControlService, "_load_settings", side_effect=RuntimeError("locked")):
+            assert service.get_visibility_model().version == 0
+
+        service.save_settings([_setting("HR", "GUEST", False)])
+        assert service.get_visibility_model().is_visible("HR", "GUEST") is False
+
+    def test_saving_settings_clears_result_cache(self, service):
+        result_cache = Mock()
+        service = VisibilityControlService(service.cache, result_cache)
+
+        service.save_settings([_setting("HR", "GUEST", False)])
+
+        # 結果再利用キャッシュのスコープはロール名のみのため、表示設定が変わったら再利用させない
+        result_cache.clear.assert_called_once()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+ワークロード別スレッドプールのテスト
+
+メタデータ更新でスレッドが埋まっても、対話的処理（補完など）が待たされないことを検証する
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.workload_executor import (
+    WorkloadExecutorRegistry, WORKLOAD_INTERACTIVE, WORKLOAD_METADATA, WORKLOAD_EXPORT
+)
+
+
+def _make_registry():
+    return WorkloadExecutorRegistry({
+        WORKLOAD_INTERACTIVE: 2,
+        WORKLOAD_METADATA: 1,
+        WORKLOAD_EXPORT: 1,
+    })
+
+
+class TestWorkloadExecutorRegistry:
+    """WorkloadExecutorRegistryのテスト"""
+
+    def test_metadata_refresh_does_not_starve_interactive(self):
+        registry = _make_registry()
+        release = threading.Event()
+
+        async def scenario():
+            # メタデータ更新を複数投入してプールを埋める
+            refreshes = [asyncio.ensure_future(registry.run(WORKLOAD_METADATA, release.wait, 5)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            result = await registry.run(WORKLOAD_INTERACTIVE, lambda: "completion")
+            elapsed = time.monotonic() - started
+            metrics = registry.get_metrics()
+            release.set()
+            await asyncio.gather(*refreshes)
+            return result, elapsed, metrics
+
+        try:
+            result, elapsed, metrics = asyncio.run(scenario())
+        finally:
+            registry.shutdown(wait=True)
+
+        assert result == "completion"
+        assert elapsed < 0.5
+        assert metrics[WORKLOAD_METADATA]["busy_threads"] == 1
+        assert metrics[WORKLOAD_METADATA]["queue_depth"] == 2
+        assert metrics[WORKLOAD_INTERACTIVE]["queue_depth"] == 0
+
+    def test_metrics_after_completion(self):
+        registry = _make_registry()
+
+        def fail():
+            raise ValueError("boom")
+
+        async def scenario():
+            await registry.run(WORKLOAD_INTERACTIVE, lambda: 1)
+            with pytest.raises(ValueError):
+                await registry.run(WORKLOAD_INTERACTIVE, fail)
+
+        asyncio.run(scenario())
+        metrics = registry.get_metrics()[WORKLOAD_INTERACTIVE]
+        registry.shutdown(wait=True)
+
+        assert metrics["submitted"] == 2
+        assert metrics["completed"] == 2
+        assert metrics["failed"] == 1
+        assert metrics["busy_threads"] == 0
+        assert metrics["max_workers"] == 2
+
+    def test_iterate_runs_generator_in_export_pool_and_closes_it(self):
+        registry = _make_registry()
+        thread_names = []
+        closed = threading.Event()
+
+        def generator():
+            try:
+                for i in range(3):
+                    thread_names.append(threading.current_thread().name)
+                    yield i
+            finally:
+                closed.set()
+
+        async def consume(limit):
+            items = []
+            agen = registry.iterate(WORKLOAD_EXPORT, generator())
+            async for item in agen:
+                items.append(item)
+                if len(items) == limit:
+                    break
+            await agen.aclose()
+            return items
+
+        assert asyncio.run(consume(10)) == [0, 1, 2]
+        assert all(name.startswith("export-worker") for name in thread_names)
+
+        # 途中で打ち切った場合もジェネレーターの後処理（接続解放など）が実行される
+        closed.clear()
+        assert asyncio.run(consume(1)) == [0]
+        assert closed.is_set()
+        registry.shutdown(wait=True)
+
+    def test_unknown_workload_falls_back_to_interactive(self):
+        registry = _make_registry()
+        assert registry.get("unknown") is registry.get(WORKLOAD_INTERACTIVE)
+        registry.shutdown(wait=True)
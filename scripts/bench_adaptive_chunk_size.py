@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+fetchmany 行数の固定値と適応制御の比較ベンチマーク
+
+幅の狭い結果（数値2列）と幅の広い結果（長い文字列多数列）の合成データを、
+呼び出しごとに固定レイテンシがかかるフェイクカーソルから取得し、SQLite に挿入する。
+
+実行例:
+    python scripts/bench_adaptive_chunk_size.py
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.adaptive_chunk_sizer import AdaptiveChunkSizer  # noqa: E402
+
+FETCH_CALL_LATENCY = 0.005      # fetchmany 1回あたりの往復レイテンシ（秒）
+FETCH_BYTE_LATENCY = 1e-9       # 転送1バイトあたりのレイテンシ（秒）
+
+
+class SyntheticCursor:
+    """合成データを返すフェイクカーソル（fetchmany ごとにネットワーク往復を模擬）"""
+
+    def __init__(self, row, total_rows: int):
+        self._row = row
+        self._remaining = total_rows
+        self._row_bytes = AdaptiveChunkSizer.estimate_row_bytes([row])
+        self.description = [(f"C{i}",) for i in range(len(row))]
+        self.calls = 0
+
+    def fetchmany(self, size: int):
+        self.calls += 1
+        count = min(size, self._remaining)
+        self._remaining -= count
+        time.sleep(FETCH_CALL_LATENCY + FETCH_BYTE_LATENCY * self._row_bytes * count)
+        return [self._row] * count
+
+
+def run(row, total_rows: int, adaptive: bool, initial_size: int = 1000):
+    cursor = SyntheticCursor(row, total_rows)
+    sizer = AdaptiveChunkSizer(
+        initial_size=initial_size, min_size=100, max_size=20000,
+        target_chunk_bytes=8 * 1024 * 1024, target_chunk_seconds=1.0, enabled=adaptive,
+    )
+    conn = sqlite3.connect(":memory:")
+    columns = ", ".join(f'"{c[0]}" TEXT' for c in cursor.description)
+    conn.execute(f"CREATE TABLE t ({columns})")
+    placeholders = ", ".join("?" for _ in cursor.description)
+    peak_chunk_bytes = 0
+
+    started = time.perf_counter()
+    while True:
+        fetch_started = time.perf_counter()
+        chunk = cursor.fetchmany(sizer.size)
+        fetch_seconds = time.perf_counter() - fetch_started
+        if not chunk:
+            break
+        insert_started = time.perf_counter()
+        conn.executemany(f"INSERT INTO t VALUES ({placeholders})", chunk)
+        conn.commit()
+        insert_seconds = time.perf_counter() - insert_started
+        peak_chunk_bytes = max(peak_chunk_bytes, AdaptiveChunkSizer.estimate_row_bytes(chunk) * len(chunk))
+        sizer.observe(chunk, fetch_seconds, insert_seconds)
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return {
+        "seconds": elapsed,
+        "fetch_calls": cursor.calls,
+        "peak_chunk_mb": peak_chunk_bytes / 1024 / 1024,
+        "final_chunk_size": sizer.size,
+    }
+
+
+def main():
+    scenarios = {
+        "narrow (2 numeric cols, 300k rows)": ((12345, 67.89), 300_000),
+        "wide (40 text cols x 400 chars, 8k rows)": (tuple("x" * 400 for _ in range(40)), 8_000),
+    }
+    print(f"{'scenario':<44} {'mode':<9} {'seconds':>8} {'calls':>6} {'peak MB':>8} {'final size':>10}")
+    for name, (row, total_rows) in scenarios.items():
+        for adaptive in (False, True):
+            result = run(row, total_rows, adaptive)
+            mode = "adaptive" if adaptive else "fixed"
+            print(f"{name:<44} {mode:<9} {result['seconds']:>8.2f} {result['fetch_calls']:>6} "
+                  f"{result['peak_chunk_mb']:>8.1f} {result['final_chunk_size']:>10}")
+
+
+if __name__ == "__main__":
+    main()
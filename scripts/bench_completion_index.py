@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完候補検索のベンチマーク（全件走査 vs 補完用インデックス）
+
+合成カタログ（200スキーマ × 5,000テーブル × 100,000カラム）に対して、
+- before: 全スキーマ・テーブルを走査して upper().startswith(prefix) で判定（従来の CompletionService）
+- after : CompletionIndex（ソート済み配列 + bisect）
+のキー入力1回あたりの候補検索時間を計測する。インデックス構築はメタデータのバージョンごとに1回。
+
+実行例:
+    python scripts/bench_completion_index.py
+"""
+import os
+import statistics
+import sys
+import time
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.completion_index import CompletionIndex  # noqa: E402
+from app.services.completion_service import CompletionService  # noqa: E402
+from bench_metadata_loader import build_catalog  # noqa: E402
+
+ROUNDS = 50
+# (補完の種類, 入力中の単語, 対象テーブル)
+CASES = [
+    ("table", "T", None),
+    ("table", "TABLE_00", None),
+    ("table", "TABLE_0012", None),
+    ("column", "", "TABLE_0012"),
+    ("column", "COL_01", "TABLE_0012"),
+    ("keyword", "S", None),
+]
+
+
+def scan_tables(all_metadata, prefix):
+    """従来方式: 全テーブルを走査"""
+    return [
+        table["name"]
+        for schema in all_metadata for table in schema["tables"]
+        if table["name"].upper().startswith(prefix)
+    ]
+
+
+def build_table_map(all_metadata):
+    """従来の CompletionService が持っていたテーブル名（大文字）→ テーブル情報のインデックス"""
+    tables_by_name = {}
+    for schema in all_metadata:
+        for table in schema["tables"]:
+            tables_by_name.setdefault(table["name"].upper(), []).append(table)
+    return tables_by_name
+
+
+def scan_columns(tables_by_name, table_name, prefix):
+    """従来方式: 対象テーブルのカラムを走査"""
+    return [
+        column["name"]
+        for table in tables_by_name.get(table_name, []) for column in table["columns"]
+        if not prefix or column["name"].upper().startswith(prefix)
+    ]
+
+
+def measure(func):
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    all_metadata = build_catalog()
+    tables_by_name = build_table_map(all_metadata)
+    service = CompletionService(Mock())
+
+    started = time.perf_counter()
+    index = CompletionIndex(all_metadata, service.sql_keywords, service.sql_functions)
+    print(f"インデックス構築: {(time.perf_counter() - started) * 1000:.1f}ms（メタデータのバージョンごとに1回）")
+
+    print(f"{'kind':<8} {'prefix':<12} {'before ms':>10} {'after ms':>9} {'hits':>6}")
+    for kind, prefix, table_name in CASES:
+        if kind == "table":
+            before = measure(lambda: scan_tables(all_metadata, prefix))
+            after = measure(lambda: index.tables.lookup(prefix))
+            hits = len(index.tables.lookup(prefix))
+        elif kind == "column":
+            before = measure(lambda: scan_columns(tables_by_name, table_name, prefix))
+            after = measure(lambda: index.columns_for(table_name).lookup(prefix))
+            hits = len(index.columns_for(table_name).lookup(prefix))
+        else:
+            before = measure(lambda: [k for k in service.sql_keywords if k.startswith(prefix)])
+            after = measure(lambda: index.keywords.lookup(prefix))
+            hits = len(index.keywords.lookup(prefix))
+        print(f"{kind:<8} {prefix!r:<12} {before:>10.3f} {after:>9.3f} {hits:>6}")
+    print("（before は候補の SQLCompletionItem 生成時間を含まない。after は構築済みの候補を返す）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完の負荷テスト（HTTP POST /sql/suggest vs WebSocket /sql/suggest/ws）
+
+複数の利用者が同時に1文字ずつ SQL を入力し、キー入力のたびに補完を要求する状況を再現する。
+- HTTP     : キー入力ごとに POST（前の応答を待ってから次の入力）
+- WebSocket: キー入力ごとにメッセージを送り、応答を待たずに次の入力へ進む（サーバー側でデバウンス・取り消し）
+
+計測値:
+- req/s          : クライアントが送った補完リクエスト数 / 経過時間
+- computed       : サーバーで実際に計算した補完の回数
+- p95 ms         : 補完結果が返ったリクエストの、送信から結果受信までの時間の95パーセンタイル
+- final ms       : 入力を止めてから最後の入力に対する補完結果が届くまでの時間（中央値）
+
+アプリはプロセス内（TestClient）で動かすため、ネットワーク遅延は含まない。
+
+実行例:
+    python scripts/bench_completion_ws.py --users 8 --interval-ms 15
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.dependencies import get_completion_service_di  # noqa: E402
+from app.metadata_cache import MetadataCache  # noqa: E402
+from app.services.completion_service import CompletionService  # noqa: E402
+from app.services.metadata_service import MetadataService  # noqa: E402
+from app.services.metadata_snapshot import MetadataSnapshotStore  # noqa: E402
+from app.tests.test_main import app  # noqa: E402
+from bench_metadata_loader import build_catalog  # noqa: E402
+from bench_sql_context import build_query  # noqa: E402
+
+TYPED = "LEFT JOIN SCHEMA_001.TABLE_0012 t ON t.COL_001 = b.ORDER_ID AND t."
+
+
+def keystrokes(lines: int):
+    """クエリ末尾に TYPED を1文字ずつ入力した各版の (SQL, カーソル位置)"""
+    base = build_query(lines)
+    return [(base + TYPED[:i], len(base) + i) for i in range(1, len(TYPED) + 1)]
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run_http(client, edits, interval, results):
+    latencies = []
+    for version, (sql, position) in enumerate(edits):
+        started = time.perf_counter()
+        response = client.post("/api/v1/sql/suggest", json={
+            "sql": sql, "position": position, "context": {"session_id": threading.get_ident(), "version": version},
+        })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        time.sleep(max(0.0, interval - latencies[-1]))
+    results.append({"sent": len(edits), "latencies": latencies, "final": latencies[-1]})
+
+
+def run_websocket(client, edits, interval, results):
+    sent_at = {}
+    latencies = []
+    with client.websocket_connect("/api/v1/sql/suggest/ws") as websocket:
+        last_id = len(edits) - 1
+        for request_id, (sql, position) in enumerate(edits):
+            sent_at[request_id] = time.perf_counter()
+            websocket.send_json({"id": request_id, "sql": sql, "position": position, "version": request_id})
+            if request_id < last_id:
+                time.sleep(interval)
+        typing_done = time.perf_counter()
+        while True:
+            reply = websocket.receive_json()
+            if not reply.get("cancelled"):
+                latencies.append(time.perf_counter() - sent_at[reply["id"]])
+            if reply["id"] == last_id:
+                break
+    results.append({"sent": len(edits), "latencies": latencies, "final": time.perf_counter() - typing_done})
+
+
+def run(mode, client, service, users, edits, interval):
+    calls = [0]
+    original = service.get_completions
+
+    def counting(*args, **kwargs):
+        calls[0] += 1
+        return original(*args, **kwargs)
+
+    service.get_completions = counting
+    results = []
+    target = run_http if mode == "http" else run_websocket
+    threads = [threading.Thread(target=target, args=(client, edits, interval, results)) for _ in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    service.get_completions = original
+
+    sent = sum(r["sent"] for r in results)
+    latencies = [latency for r in results for latency in r["latencies"]]
+    final = statistics.median(r["final"] for r in results)
+    print(f"{mode:<10} {sent / elapsed:>8.1f} {calls[0]:>9} {percentile(latencies, 0.95) * 1000:>8.1f} "
+          f"{final * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=8, help="同時に入力する利用者数")
+    parser.add_argument("--interval-ms", type=float, default=15, help="キー入力の間隔（ミリ秒）")
+    parser.add_argument("--lines", type=int, default=200, help="入力対象のクエリの行数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetadataCache(db_path=os.path.join(tmp, "metadata_cache.db"))
+        cache.save_all_metadata_normalized(build_catalog(schemas=20, tables=2000, columns=40000))
+        service = CompletionService(MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore()))
+        service.get_completions("SELECT ", 7)  # インデックスを構築済みにしておく
+        app.dependency_overrides[get_completion_service_di] = lambda: service
+
+        edits = keystrokes(args.lines)
+        print(f"利用者 {args.users}人 × {len(edits)}キー入力（間隔 {args.interval_ms}ms, クエリ {args.lines}行）")
+        print(f"{'mode':<10} {'req/s':>8} {'computed':>9} {'p95 ms':>8} {'final ms':>9}")
+        with TestClient(app) as client:
+            for mode in ("http", "websocket"):
+                run(mode, client, service, args.users, edits, args.interval_ms / 1000)
+        app.dependency_overrides.pop(get_completion_service_di, None)
+
+
+if __name__ == "__main__":
+    main()
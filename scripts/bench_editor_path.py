@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+エディタ操作経路（バリデーション・整形・テーブル抽出・補完の文脈解析）のベンチマーク
+
+生成したSnowflake向けSELECT文のコーパス（短いクエリ・500行・深くネストしたCTE・大きなIN句・コメントの多いクエリ）
+に対して、各処理を最大 ROUNDS 回（1秒を超えたら3回で打ち切り）実行して p50 / p95 / max（ミリ秒）を計測し、
+ベースラインファイル（bench_editor_path_baseline.json）と比較して劣化を表示する。
+- validate       : SQLValidator.validate_sql（キャッシュなし）
+- validate_hit   : SQLValidator.validate_sql（キャッシュ済み）
+- format         : SQLValidator.format_sql（キャッシュなし、/sql/format と同じ処理）
+- tables         : 字句解析 + FROM/JOIN のテーブル参照抽出
+- context_cold   : SqlContextAnalyzer.analyze（セッションなし、末尾カーソル）
+- context_typing : SqlContextAnalyzer.analyze（同じセッションで末尾に1文字ずつ入力）
+
+ベースラインは計測したマシンに依存するため、変更前に手元で --update-baseline を実行してから比較する。
+
+実行例:
+    python scripts/bench_editor_path.py                    # 計測してベースラインと比較
+    python scripts/bench_editor_path.py --update-baseline  # ベースラインを更新
+    python -m pytest scripts/bench_editor_path.py          # コーパスの検証 + 劣化チェック（RUN_BENCHMARKS=1 のとき）
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.sql_context_analyzer import SqlContextAnalyzer, collect_table_references, tokenize  # noqa: E402
+from app.sql_validator import SQLValidator  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_editor_path_baseline.json")
+ROUNDS = 15
+# 1つの処理の計測にかける時間の目安（超えたら MIN_ROUNDS 回以上計測した時点で打ち切る）
+TIME_BUDGET = 1.0
+MIN_ROUNDS = 3
+# p50 がベースラインのこの倍率を超えたら劣化とみなす（小さい値のぶれを吸収するため 1ms の余裕を持たせる）
+TOLERANCE = 1.5
+TOLERANCE_MS = 1.0
+TYPED = " AND o.SHIP_REGION"
+
+
+# ---------------------------------------------------------------- コーパス
+
+def _small(rng: random.Random) -> str:
+    return (
+        "SELECT o.ORDER_ID, o.ORDER_DATE, c.CUSTOMER_NAME, SUM(i.AMOUNT) AS TOTAL_AMOUNT\n"
+        "FROM SALES_DB.SALES.ORDERS o\n"
+        "JOIN SALES_DB.SALES.CUSTOMERS c ON c.CUSTOMER_ID = o.CUSTOMER_ID\n"
+        "LEFT JOIN SALES_DB.SALES.ORDER_ITEMS i ON i.ORDER_ID = o.ORDER_ID\n"
+        f"WHERE o.ORDER_DATE >= DATEADD(day, -{rng.randint(7, 90)}, CURRENT_DATE())\n"
+        "  AND o.STATUS = 'SHIPPED'\n"
+        "GROUP BY o.ORDER_ID, o.ORDER_DATE, c.CUSTOMER_NAME\n"
+        "QUALIFY ROW_NUMBER() OVER (PARTITION BY c.CUSTOMER_NAME ORDER BY TOTAL_AMOUNT DESC) <= 3\n"
+        "LIMIT 100"
+    )
+
+
+def _lines_500(rng: random.Random) -> str:
+    columns = []
+    for i in range(480):
+        kind = i % 4
+        if kind == 0:
+            columns.append(f"    o.ATTR_{i:03d}")
+        elif kind == 1:
+            columns.append(f"    IFF(o.FLAG_{i:03d}, 'Y', 'N') AS FLAG_{i:03d}_YN")
+        elif kind == 2:
+            columns.append(f"    o.PAYLOAD:item_{i}::VARCHAR AS ITEM_{i:03d}")
+        else:
+            columns.append(f"    CASE WHEN o.SCORE_{i:03d} > {rng.randint(1, 99)} THEN 'HIGH' ELSE 'LOW' END AS RANK_{i:03d}")
+    return (
+        "SELECT\n" + ",\n".join(columns) + "\n"
+        "FROM ANALYTICS_DB.MART.ORDER_FACTS o\n"
+        "JOIN ANALYTICS_DB.MART.DIM_CUSTOMER c ON c.CUSTOMER_KEY = o.CUSTOMER_KEY\n"
+        "WHERE o.ORDER_DATE BETWEEN '2024-01-01' AND '2024-12-31'\n"
+        "  AND c.SEGMENT = 'ENTERPRISE'\n"
+        "ORDER BY o.ORDER_DATE DESC\n"
+        "LIMIT 1000"
+    )
+
+
+def _nested_cte(rng: random.Random, depth: int = 25) -> str:
+    ctes = ["STEP_00 AS (\n    SELECT ORDER_ID, CUSTOMER_ID, AMOUNT FROM SALES_DB.SALES.ORDERS\n"
+            "    WHERE ORDER_DATE >= '2024-01-01'\n)"]
+    for level in range(1, depth):
+        ctes.append(
+            f"STEP_{level:02d} AS (\n"
+            f"    SELECT s.ORDER_ID, s.CUSTOMER_ID, s.AMOUNT * {rng.randint(1, 9)} AS AMOUNT\n"
+            f"    FROM STEP_{level - 1:02d} s\n"
+            f"    WHERE s.CUSTOMER_ID IN (\n"
+            f"        SELECT x.CUSTOMER_ID FROM (\n"
+            f"            SELECT CUSTOMER_ID, COUNT(*) AS CNT FROM STEP_{level - 1:02d} GROUP BY CUSTOMER_ID\n"
+            f"        ) x WHERE x.CNT > {rng.randint(1, 5)}\n"
+            f"    )\n)"
+        )
+    return (
+        "WITH " + ",\n".join(ctes) + "\n"
+        f"SELECT f.ORDER_ID, f.AMOUNT FROM STEP_{depth - 1:02d} f\n"
+        "WHERE f.AMOUNT > 1000 AND f.CUSTOMER_ID IS NOT NULL\n"
+        "LIMIT 500"
+    )
+
+
+def _wide_in(rng: random.Random, size: int = 800) -> str:
+    codes = ", ".join(f"'P{rng.randint(0, 999999):06d}'" for _ in range(size))
+    ids = ", ".join(str(rng.randint(1, 10 ** 9)) for _ in range(size))
+    return (
+        "SELECT p.PRODUCT_CODE, p.PRODUCT_NAME, s.QUANTITY\n"
+        "FROM SALES_DB.MASTER.PRODUCTS p\n"
+        "JOIN SALES_DB.SALES.STOCK s ON s.PRODUCT_ID = p.PRODUCT_ID\n"
+        f"WHERE p.PRODUCT_CODE IN ({codes})\n"
+        f"  AND s.WAREHOUSE_ID IN ({ids})\n"
+        "LIMIT 10000"
+    )
+
+
+def _heavy_comments(rng: random.Random, blocks: int = 150) -> str:
+    lines = ["/*", " * 月次売上レポート（UPDATE / DELETE などの文言を含むコメント）", " */", "SELECT"]
+    for i in range(blocks):
+        lines.append(f"    -- 列{i}: 旧仕様では DROP 予定だったが残している（{rng.random():.4f}）")
+        lines.append(f"    /* 計算式: AMOUNT_{i} * RATE; -- 入れ子風の記述 */")
+        lines.append(f"    o.AMOUNT_{i:03d} * o.RATE_{i:03d} AS VALUE_{i:03d},  -- 'quoted' \"text\"")
+    lines += [
+        "    o.ORDER_ID",
+        "FROM SALES_DB.SALES.ORDERS o  -- FROM x JOIN y は無視される",
+        "WHERE o.NOTE NOT LIKE '%DELETE FROM%'  /* WHERE 1 = 1 */",
+        "  AND o.ORDER_DATE >= '2024-01-01'",
+        "LIMIT 100",
+    ]
+    return "\n".join(lines)
+
+
+CORPUS_BUILDERS: Dict[str, Callable[[random.Random], str]] = {
+    "small": _small,
+    "lines_500": _lines_500,
+    "nested_cte": _nested_cte,
+    "wide_in": _wide_in,
+    "heavy_comments": _heavy_comments,
+}
+
+
+def build_corpus(seed: int = 0) -> Dict[str, str]:
+    """ベンチマーク用コーパス（seed が同じなら毎回同じSQL）"""
+    rng = random.Random(seed)
+    return {name: builder(rng) for name, builder in CORPUS_BUILDERS.items()}
+
+
+# ---------------------------------------------------------------- 計測
+
+def _percentiles(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {"p50": statistics.median(ordered) * 1000, "p95": p95 * 1000, "max": ordered[-1] * 1000}
+
+
+def _time(func: Callable[[], object], rounds: int) -> Dict[str, float]:
+    timings = []
+    deadline = time.perf_counter() + TIME_BUDGET
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+        if len(timings) >= MIN_ROUNDS and time.perf_counter() > deadline:
+            break
+    return _percentiles(timings)
+
+
+def _operations(sql: str) -> Dict[str, Callable[[], object]]:
+    uncached = SQLValidator(cache_size=0)
+    cached = SQLValidator(cache_size=4)
+    cached.validate_sql(sql)
+
+    typing_analyzer = SqlContextAnalyzer()
+    typing_analyzer.analyze(sql, len(sql), session_id="bench")
+    keystrokes = [sql + TYPED[:i] for i in range(1, len(TYPED) + 1)]
+    cursor = {"next": 0}
+
+    def type_one_character():
+        text = keystrokes[cursor["next"] % len(keystrokes)]
+        cursor["next"] += 1
+        # 入力し終えたら元のSQLに戻して続ける（削除も差分解析の対象）
+        if cursor["next"] % len(keystrokes) == 0:
+            typing_analyzer.analyze(sql, len(sql), session_id="bench")
+        return typing_analyzer.analyze(text, len(text), session_id="bench")
+
+    return {
+        "validate": lambda: uncached.validate_sql(sql),
+        "validate_hit": lambda: cached.validate_sql(sql),
+        "format": lambda: uncached.format_sql(sql),
+        "tables": lambda: collect_table_references(tokenize(sql)),
+        "context_cold": lambda: SqlContextAnalyzer().analyze(sql, len(sql)),
+        "context_typing": type_one_character,
+    }
+
+
+def run_suite(rounds: int = ROUNDS, corpus: Dict[str, str] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """コーパスの各SQLで全処理を計測し、{ケース: {処理: {p50, p95, max}}} を返す"""
+    corpus = corpus or build_corpus()
+    results = {}
+    # バリデーションのINFOログ（SQLの先頭を出力する）は計測対象外
+    logging.disable(logging.INFO)
+    try:
+        for name, sql in corpus.items():
+            results[name] = {operation: _time(func, rounds) for operation, func in _operations(sql).items()}
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Dict[str, Dict[str, float]]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def save_baseline(results, path: str = BASELINE_PATH) -> None:
+    payload = {"python": sys.version.split()[0], "rounds": ROUNDS, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def find_regressions(results, baseline, tolerance: float = TOLERANCE) -> List[str]:
+    """p50 がベースラインの tolerance 倍（+ TOLERANCE_MS）を超えた処理"""
+    regressions = []
+    for name, operations in results.items():
+        for operation, stats in operations.items():
+            base = baseline.get(name, {}).get(operation)
+            if base and stats["p50"] > base["p50"] * tolerance + TOLERANCE_MS:
+                regressions.append(f"{name}/{operation}: p50 {base['p50']:.2f}ms -> {stats['p50']:.2f}ms")
+    return regressions
+
+
+def print_report(results, baseline, corpus: Dict[str, str]) -> None:
+    print(f"{'case':<15} {'operation':<15} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'base p50':>9} {'ratio':>6}")
+    for name, operations in results.items():
+        sql = corpus[name]
+        print(f"{name} （{sql.count(chr(10)) + 1}行 / {len(sql):,}文字）")
+        for operation, stats in operations.items():
+            base = baseline.get(name, {}).get(operation)
+            ratio = f"{stats['p50'] / base['p50']:.2f}" if base and base["p50"] else "-"
+            base_p50 = f"{base['p50']:.2f}" if base else "-"
+            print(f"{'':<15} {operation:<15} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['max']:>9.2f} "
+                  f"{base_p50:>9} {ratio:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エディタ操作経路のベンチマーク")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="処理ごとの計測回数")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果でベースラインを更新する")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    results = run_suite(args.rounds, corpus)
+    baseline = load_baseline()
+    print_report(results, baseline, corpus)
+    if args.update_baseline:
+        save_baseline(results)
+        print(f"ベースラインを更新しました: {BASELINE_PATH}")
+        return
+    regressions = find_regressions(results, baseline)
+    if regressions:
+        print("劣化の可能性がある処理:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------- pytest
+
+def test_corpus_queries_pass_validation():
+    """コーパスのSQLはすべてバリデーションを通る（エラーで早期終了すると計測が偏るため）"""
+    validator = SQLValidator(cache_size=0)
+    for name, sql in build_corpus().items():
+        result = validator.validate_sql(sql)
+        assert result.is_valid, (name, result.errors)
+        assert result.formatted_sql
+
+
+def test_editor_path_has_no_regression():
+    """ベースラインとの比較（時間がかかるため RUN_BENCHMARKS=1 のときだけ実行）"""
+    import pytest
+
+    if os.environ.get("RUN_BENCHMARKS") != "1":
+        pytest.skip("RUN_BENCHMARKS=1 のときだけ実行します")
+    baseline = load_baseline()
+    if not baseline:
+        pytest.skip("ベースラインがありません（--update-baseline で作成してください）")
+    regressions = find_regressions(run_suite(), baseline)
+    assert not regressions, "\n".join(regressions)
+
+
+if __name__ == "__main__":
+    main()
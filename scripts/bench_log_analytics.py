@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+ログ分析のベンチマーク（SQLiteログストア、30日間の日別件数・実行時間 p50/p95・上位ユーザー）
+
+- before: 生ログ（TOOL_LOG）を期間で読み出し、Python で日別・ユーザー別に集計してパーセンタイルを求める
+- after : 書き込み時に更新したロールアップ（LogAnalyticsService.get_analytics）だけを参照する
+ロールアップの更新にかかる時間（1バッチあたり）も併せて表示する。
+
+実行例:
+    python scripts/bench_log_analytics.py --rows 200000 --users 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.metadata_cache import MetadataCache  # noqa: E402
+from app.services.log_analytics_service import LogAnalyticsService  # noqa: E402
+from app.services.log_handlers import SqliteLogHandler, SQLLogRecord  # noqa: E402
+
+BATCH = 100
+DAYS = 30
+
+
+def make_records(rows: int, users: int):
+    """直近 DAYS 日に均等に散らばったログ"""
+    now = datetime.now()
+    span = DAYS * 24 * 3600
+    records = []
+    for n in range(rows):
+        when = now - timedelta(seconds=span * (rows - n) / rows)
+        records.append(SQLLogRecord(f"user{n % users}", f"SELECT * FROM ORDERS WHERE ID = {n}",
+                                    (n % 97) / 10, when, n % 1000, n % 50 != 0, end_time=when))
+    return records
+
+
+def raw_scan(handler: SqliteLogHandler, since: datetime):
+    """生ログを全件読み出して集計する（ロールアップがない場合の集計方法）"""
+    per_day = defaultdict(list)
+    per_user = defaultdict(int)
+    cursor = None
+    while True:
+        page = handler.get_history(None, since, 1000, cursor)
+        for log in page["logs"]:
+            per_day[log["timestamp"][:10]].append(log["execution_time"])
+            per_user[log["user_id"]] += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    summary = {}
+    for day, times in per_day.items():
+        times.sort()
+        summary[day] = (len(times), times[len(times) // 2], times[int(len(times) * 0.95)])
+    return summary, sorted(per_user.items(), key=lambda item: -item[1])[:20]
+
+
+def timed(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ログ分析のベンチマーク")
+    parser.add_argument("--rows", type=int, default=200000, help="ログの総件数")
+    parser.add_argument("--users", type=int, default=50, help="ユーザー数")
+    args = parser.parse_args()
+    records = make_records(args.rows, args.users)
+    since = datetime.now() - timedelta(days=DAYS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = SqliteLogHandler(os.path.join(tmp, "log.db"))
+        handler.write_logs(records)
+        analytics = LogAnalyticsService(MetadataCache(db_path=os.path.join(tmp, "metadata_cache.db")),
+                                        hourly_retention_days=90, top_n=20)
+        started = time.perf_counter()
+        for offset in range(0, len(records), BATCH):
+            analytics.record_logs(records[offset:offset + BATCH])
+        rollup_per_batch = (time.perf_counter() - started) * 1000 / max(1, len(records) // BATCH)
+
+        end = date.today()
+        before = timed(lambda: raw_scan(handler, since))
+        after = timed(lambda: analytics.get_analytics(end - timedelta(days=DAYS - 1), end, include_users=True))
+
+    print(f"rows={args.rows:,} users={args.users} days={DAYS}")
+    print(f"rollup update: {rollup_per_batch:.2f} ms / {BATCH} logs")
+    print(f"{'before (raw scan)':<20} {before:>10.2f} ms")
+    print(f"{'after (rollups)':<20} {after:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
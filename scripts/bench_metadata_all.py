@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+/metadata/all のサーバー側処理時間ベンチマーク（表示制御の事前計算前後の比較）
+
+- before: リクエストごとにSQLiteから全メタデータと表示設定を読み込み、全テーブルを走査してINFOログを出力
+- after : メタデータスナップショットとコンパイル済み表示制御モデルを使い、ロール別の結果を再利用
+
+合成カタログ（200スキーマ × 5,000テーブル × 100,000カラム）、表示設定は GUEST ロール向けに
+スキーマ20件・テーブル500件を非表示にした状態で計測する（JSONシリアライズは含まない）。
+ログはカレントディレクトリではなく一時ディレクトリの app.log に出力する。
+
+実行例:
+    python scripts/bench_metadata_all.py
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORK_DIR = tempfile.mkdtemp()
+os.chdir(WORK_DIR)  # app.log を一時ディレクトリに出力する
+
+from unittest.mock import Mock  # noqa: E402
+
+from app.logger import get_logger  # noqa: E402
+from app.metadata_cache import MetadataCache  # noqa: E402
+from app.services.metadata_service import MetadataService  # noqa: E402
+from app.services.metadata_snapshot import MetadataSnapshotStore  # noqa: E402
+from app.services.visibility_control_service import VisibilityControlService  # noqa: E402
+from bench_metadata_loader import build_catalog  # noqa: E402
+
+ROUNDS = 5
+ROLES = ("GUEST", "ADMIN")
+
+
+def legacy_filter_metadata(service: VisibilityControlService, metadata, role, logger):
+    """事前計算前の filter_metadata（リクエストごとに設定を読み込み、テーブルごとにINFOログを出力）"""
+    settings = service.get_all_settings()
+    logger.info(f"[DEBUG] filter_metadata: role={role}")
+    logger.info(f"[DEBUG] settings.keys={list(settings.keys())}")
+    if not settings:
+        return metadata
+    filtered_metadata = []
+    for schema_data in metadata:
+        schema_name = schema_data.get("name")
+        schema_settings = settings.get(schema_name, {})
+        logger.info(f"[DEBUG] schema: {schema_name}, schema_settings={schema_settings}")
+        if role in schema_settings:
+            is_schema_visible = schema_settings[role]
+        else:
+            is_schema_visible = schema_settings.get('DEFAULT', True)
+        filtered_tables = []
+        for table_data in schema_data.get("tables", []):
+            table_full_name = f"{schema_name}.{table_data.get('name')}"
+            table_settings = settings.get(table_full_name, {})
+            logger.info(f"[DEBUG] table: {table_full_name}, table_settings={table_settings}")
+            if role in table_settings:
+                is_table_visible = table_settings[role]
+                logger.info(f"[DEBUG] table {table_full_name}: role({role}) found, is_table_visible={is_table_visible}")
+            else:
+                is_table_visible = table_settings.get('DEFAULT', True)
+                logger.info(f"[DEBUG] table {table_full_name}: role({role}) not found, DEFAULT used, is_table_visible={is_table_visible}")
+            if is_table_visible:
+                filtered_tables.append(table_data)
+        if is_schema_visible or filtered_tables:
+            filtered_schema = schema_data.copy()
+            filtered_schema["tables"] = filtered_tables
+            if not is_schema_visible and filtered_tables:
+                filtered_schema["schema_hidden"] = True
+            filtered_metadata.append(filtered_schema)
+    return filtered_metadata
+
+
+def before(cache, visibility, logger, role):
+    all_metadata = cache.get_all_metadata_normalized()
+    return legacy_filter_metadata(visibility, all_metadata, role, logger)
+
+
+def after(metadata_service, visibility, role):
+    snapshot = metadata_service.get_metadata_snapshot()
+    return visibility.filter_metadata(snapshot, role)
+
+
+def measure(func):
+    timings = []
+    result = None
+    for _ in range(ROUNDS):
+        for role in ROLES:
+            started = time.perf_counter()
+            result = func(role)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def main():
+    # コンソール出力は抑止し、ファイル出力のみ残す
+    devnull = open(os.devnull, "w")
+    cache = MetadataCache(db_path=os.path.join(WORK_DIR, "bench_metadata.db"))
+    catalog = build_catalog()
+    cache.save_all_metadata_normalized(catalog)
+    visibility = VisibilityControlService(cache)
+    hidden = [Mock(object_name=schema["name"], role_name="GUEST", is_visible=False) for schema in catalog[:20]]
+    hidden += [Mock(object_name=f"{catalog[-1]['name']}.{table['name']}", role_name="GUEST", is_visible=False)
+               for table in catalog[-1]["tables"]]
+    hidden += [Mock(object_name=f"{schema['name']}.{table['name']}", role_name="GUEST", is_visible=False)
+               for schema in catalog[20:40] for table in schema["tables"][:24]]
+    visibility.save_settings(hidden)
+    for logger in [logging.getLogger()] + [logging.getLogger(name) for name in logging.root.manager.loggerDict]:
+        for handler in getattr(logger, "handlers", []):
+            if type(handler) is logging.StreamHandler:
+                handler.setStream(devnull)
+
+    legacy_logger = get_logger("app.services.visibility_control_service")
+    metadata_service = MetadataService(Mock(), cache, snapshot_store=MetadataSnapshotStore())
+
+    before_ms, before_result = measure(lambda role: before(cache, visibility, legacy_logger, role))
+    after_ms, after_result = measure(lambda role: after(metadata_service, visibility, role))
+    assert before_result == after_result, "フィルタ結果が一致しません"
+
+    print(f"{'mode':<8} {'first ms':>9} {'median ms':>10} {'p95 ms':>8}")
+    for name, timings in (("before", before_ms), ("after", after_ms)):
+        p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+        print(f"{name:<8} {timings[0]:>9.1f} {statistics.median(timings):>10.2f} {p95:>8.2f}")
+    print(f"（{ROUNDS}回 × ロール{len(ROLES)}種、表示設定 {len(hidden)}件）")
+
+
+if __name__ == "__main__":
+    main()
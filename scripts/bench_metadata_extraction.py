@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ全件更新のベンチマーク（INFORMATION_SCHEMA の順次取得 vs 並列取得）
+
+SQLite 上に再現した INFORMATION_SCHEMA に「1クエリあたりの待ち時間 + 1行あたりの転送時間」を
+模した遅延を入れ、refresh_full_metadata_cache 全体（取得 + キャッシュ保存）の時間を計測する。
+- sequential : 1本の接続で SCHEMATA → TABLES → COLUMNS を順に取得
+- parallel   : 3クエリを専用接続で同時に取得
+- split      : COLUMNS をスキーマ単位に分割して並列取得し、揃ったスキーマから保存
+
+実行例:
+    python scripts/bench_metadata_extraction.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.metadata_cache import MetadataCache  # noqa: E402
+from app.services.metadata_service import MetadataService  # noqa: E402
+from app.services.metadata_snapshot import MetadataSnapshotStore  # noqa: E402
+from app.services.query_executor import QueryExecutor  # noqa: E402
+from bench_metadata_loader import build_catalog  # noqa: E402
+
+SCHEMAS = 50
+TABLES = 2_000
+COLUMNS = 40_000
+QUERY_LATENCY = 0.15   # 1クエリあたりの待ち時間（秒）
+ROW_LATENCY = 0.00004  # 1行あたりの転送時間（秒）
+MODES = [
+    ("sequential", {"extraction_workers": 1}),
+    ("parallel", {"extraction_workers": 4}),
+    ("split", {"extraction_workers": 8, "split_columns_by_schema": True}),
+]
+
+
+class _LatencyCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        time.sleep(QUERY_LATENCY)
+        return self.cursor.execute(sql, params)
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        time.sleep(len(rows) * ROW_LATENCY)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class _LatencyConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self):
+        return _LatencyCursor(self.conn.cursor())
+
+    def close(self):
+        self.conn.close()
+
+
+class LatencyWarehouse:
+    """遅延付きの INFORMATION_SCHEMA を持つフェイク接続マネージャー"""
+
+    def __init__(self, directory):
+        self.db_path = os.path.join(directory, "warehouse.db")
+        self.info_path = os.path.join(directory, "information_schema.db")
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("CREATE TABLE INFORMATION_SCHEMA.SCHEMATA (SCHEMA_NAME TEXT, CREATED TEXT, SCHEMA_OWNER TEXT)")
+        conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.TABLES (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, TABLE_TYPE TEXT, "
+            "ROW_COUNT INTEGER, CREATED TEXT, LAST_ALTERED TEXT, COMMENT TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE INFORMATION_SCHEMA.COLUMNS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, "
+            "DATA_TYPE TEXT, IS_NULLABLE TEXT, COLUMN_DEFAULT TEXT, ORDINAL_POSITION INTEGER, COMMENT TEXT)"
+        )
+        for schema in build_catalog(SCHEMAS, TABLES, COLUMNS):
+            conn.execute("INSERT INTO INFORMATION_SCHEMA.SCHEMATA VALUES (?, ?, ?)",
+                         (schema["name"], schema["created_on"], schema["owner"]))
+            for table in schema["tables"]:
+                conn.execute("INSERT INTO INFORMATION_SCHEMA.TABLES VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (schema["name"], table["name"], table["table_type"], table["row_count"],
+                              table["created_on"], table["last_altered"], table["comment"]))
+                conn.executemany(
+                    "INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?, ?, 'YES', NULL, ?, ?)",
+                    [(schema["name"], table["name"], column["name"], column["data_type"], position, column["comment"])
+                     for position, column in enumerate(table["columns"], start=1)],
+                )
+        conn.commit()
+        self.shared = _LatencyConnection(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS INFORMATION_SCHEMA", (self.info_path,))
+        return conn
+
+    def get_connection(self):
+        return "shared", self.shared
+
+    def release_connection(self, conn_id):
+        pass
+
+    def create_dedicated_connection(self):
+        return _LatencyConnection(self._connect())
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        warehouse = LatencyWarehouse(tmp)
+        executor = QueryExecutor(warehouse)
+        print(f"カタログ: {SCHEMAS}スキーマ × {TABLES:,}テーブル × {COLUMNS:,}カラム "
+              f"（待ち時間 {QUERY_LATENCY * 1000:.0f}ms/クエリ, {ROW_LATENCY * 1e6:.0f}µs/行）")
+        print(f"{'mode':<12} {'refresh s':>10} {'schemas':>8}")
+        for name, options in MODES:
+            cache = MetadataCache(db_path=os.path.join(tmp, f"{name}.db"))
+            service = MetadataService(executor, cache, snapshot_store=MetadataSnapshotStore(), **options)
+            started = time.perf_counter()
+            schema_count = service.refresh_full_metadata_cache()
+            print(f"{name:<12} {time.perf_counter() - started:>10.2f} {schema_count:>8}")
+
+
+if __name__ == "__main__":
+    main()
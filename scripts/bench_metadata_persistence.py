@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+メタデータ保存のベンチマーク（行ごとの DELETE + INSERT vs シャドウテーブル一括ロード）
+
+合成カタログ（200スキーマ × 5,000テーブル × 100,000カラム）を保存しながら、
+別スレッドで /metadata/all 相当の読み込みを繰り返し、観測したカラム数の最小値と読み込みエラー数を記録する。
+
+実行例:
+    python scripts/bench_metadata_persistence.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.metadata_cache import MetadataCache  # noqa: E402
+from bench_metadata_loader import build_catalog  # noqa: E402
+
+
+def save_per_row(cache: MetadataCache, all_metadata):
+    """従来方式: 本番テーブルを DELETE し、1行ずつ INSERT する"""
+    with cache._get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM schemas")
+        cursor.execute("DELETE FROM tables")
+        cursor.execute("DELETE FROM columns")
+        for schema_data in all_metadata:
+            cursor.execute("INSERT OR IGNORE INTO schemas (name, owner, created_on) VALUES (?, ?, ?)",
+                           (schema_data.get('name'), schema_data.get('owner'), schema_data.get('created_on')))
+            for table_data in schema_data.get('tables', []):
+                cursor.execute(
+                    "INSERT OR IGNORE INTO tables (name, schema_name, table_type, row_count, created_on, last_altered, comment) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    cache._table_row(schema_data.get('name'), table_data)
+                )
+                for row in cache._column_rows(schema_data.get('name'), table_data):
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO columns (name, table_name, schema_name, data_type, is_nullable, comment) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", row
+                    )
+        conn.commit()
+
+
+def run(cache: MetadataCache, save, all_metadata):
+    stop = threading.Event()
+    observed = []
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with sqlite3.connect(cache.db_path, timeout=0.05) as conn:
+                    observed.append(conn.execute("SELECT COUNT(*) FROM columns").fetchone()[0])
+            except sqlite3.Error:
+                errors.append(1)
+            time.sleep(0.005)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    started = time.perf_counter()
+    save(all_metadata)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    return elapsed, min(observed) if observed else None, len(observed), len(errors)
+
+
+def main():
+    all_metadata = build_catalog()
+    total_columns = sum(len(t["columns"]) for s in all_metadata for t in s["tables"])
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetadataCache(db_path=os.path.join(tmp, "bench_metadata.db"))
+        cache.save_all_metadata_normalized(all_metadata)
+
+        print(f"{'mode':<14} {'seconds':>8} {'min columns seen':>17} {'reads':>6} {'read errors':>12}")
+        for name, save in (("per-row", lambda data: save_per_row(cache, data)),
+                           ("shadow bulk", cache.save_all_metadata_normalized)):
+            elapsed, min_seen, reads, errors = run(cache, save, all_metadata)
+            print(f"{name:<14} {elapsed:>8.2f} {min_seen if min_seen is not None else '-':>17} {reads:>6} {errors:>12}")
+        print(f"（カタログのカラム数: {total_columns:,}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+SQL補完の文脈解析のベンチマーク（毎回 sqlparse で全体解析 vs セッション単位の差分解析）
+
+500行のクエリの途中と末尾で1文字ずつ入力した場合の、補完リクエスト1回あたりの文脈解析時間を計測する。
+- before: 従来の CompletionService と同じく、全文と カーソルまでの部分を sqlparse.parse し、正規表現でエイリアス解決
+- after : SqlContextAnalyzer（前の版のトークン列を流用し、編集範囲だけを再字句解析）
+
+実行例:
+    python scripts/bench_sql_context.py
+"""
+import os
+import re
+import statistics
+import sys
+import time
+
+import sqlparse
+from sqlparse.sql import Identifier, IdentifierList
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.sql_context_analyzer import SqlContextAnalyzer  # noqa: E402
+
+LINES = 500
+KEYSTROKES = 30
+
+
+def build_query(lines: int = LINES) -> str:
+    """CTE とカラム列挙を含む lines 行のクエリを生成"""
+    body = ["WITH base AS (", "    SELECT"]
+    columns = lines - 12
+    body += [f"        o.COL_{i:03d} AS C{i:03d},  -- 列{i}" for i in range(columns)]
+    body += [
+        "        o.ORDER_ID",
+        "    FROM SALES.ORDERS o",
+        "    JOIN SALES.CUSTOMERS c ON c.CUSTOMER_ID = o.CUSTOMER_ID",
+        "    WHERE o.CREATED_AT >= '2024-01-01'",
+        ")",
+        "SELECT b.ORDER_ID, i.ITEM_ID",
+        "FROM base b",
+        "LEFT JOIN SALES.ORDER_ITEMS i ON i.ORDER_ID = b.ORDER_ID",
+        "WHERE b.C001 IS NOT NULL",
+        "ORDER BY b.ORDER_ID",
+    ]
+    return "\n".join(body) + "\n"
+
+
+def legacy_context(sql: str, position: int):
+    """従来方式（sqlparse による全体解析 + 正規表現でのエイリアス解決）"""
+    tables = set()
+    for statement in sqlparse.parse(sql):
+        from_seen = False
+        for token in statement.tokens:
+            if token.is_keyword and token.normalized in ('FROM', 'JOIN'):
+                from_seen = True
+                continue
+            if from_seen:
+                if isinstance(token, Identifier):
+                    tables.add(token.get_real_name())
+                    from_seen = False
+                elif isinstance(token, IdentifierList):
+                    for identifier in token.get_identifiers():
+                        tables.add(identifier.get_real_name())
+                    from_seen = False
+    if position > 0 and sql[position - 1] == '.':
+        start = position - 1
+        while start > 0 and (sql[start - 1].isalnum() or sql[start - 1] == '_'):
+            start -= 1
+        alias = sql[start:position - 1]
+        for pattern in (rf'FROM\s+(\w+)\s+AS\s+{re.escape(alias)}\b', rf'FROM\s+(\w+)\s+{re.escape(alias)}\b',
+                        rf'JOIN\s+(\w+)\s+AS\s+{re.escape(alias)}\b', rf'JOIN\s+(\w+)\s+{re.escape(alias)}\b'):
+            match = re.search(pattern, sql, re.IGNORECASE)
+            if match:
+                return 'COLUMN_SPECIFIC', [match.group(1)]
+        return 'COLUMN_SPECIFIC', [alias]
+    last_keyword = None
+    for token in reversed(list(sqlparse.parse(sql[:position])[0].flatten())):
+        if token.is_keyword:
+            last_keyword = token.normalized
+            break
+    return ('TABLE' if last_keyword in ('FROM', 'JOIN') else 'COLUMN'), list(tables)
+
+
+def keystrokes(sql: str, anchor: str, typed: str):
+    """anchor の直後に typed を1文字ずつ入力した各版の (SQL, カーソル位置) を返す"""
+    position = sql.index(anchor) + len(anchor)
+    for i in range(1, len(typed) + 1):
+        yield sql[:position] + typed[:i] + sql[position:], position + i
+
+
+def measure(func, edits):
+    timings = []
+    for sql, position in edits:
+        started = time.perf_counter()
+        func(sql, position)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    sql = build_query()
+    print(f"クエリ: {sql.count(chr(10))}行 / {len(sql):,}文字")
+    cases = [
+        ("途中（SELECT句）", "        o.COL_250 AS C250,  -- 列250\n", "        b.TOTAL_AMOUNT_WITH_TAX, "[:KEYSTROKES]),
+        ("末尾（WHERE句）", "WHERE b.C001 IS NOT NULL", " AND i.QUANTITY_SHIPPED > 0 AND b."[:KEYSTROKES]),
+    ]
+    print(f"{'case':<18} {'before ms':>10} {'before max':>11} {'after ms':>9} {'after max':>10}")
+    for name, anchor, typed in cases:
+        edits = list(keystrokes(sql, anchor, typed))
+        before, before_max = measure(legacy_context, edits)
+        analyzer = SqlContextAnalyzer()
+        analyzer.analyze(sql, 0, session_id="tab")  # 入力開始前の版を解析済みにしておく
+        after, after_max = measure(lambda s, p: analyzer.analyze(s, p, session_id="tab"), edits)
+        print(f"{name:<18} {before:>10.2f} {before_max:>11.2f} {after:>9.2f} {after_max:>10.2f}")
+
+    started = time.perf_counter()
+    SqlContextAnalyzer().analyze(sql, len(sql))
+    print(f"（参考）セッションなしの全体解析: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
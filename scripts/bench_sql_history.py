@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+SQL履歴取得のベンチマーク（SQLiteログストア、大量のログを持つユーザー）
+
+- before: インデックスなしで get_logs（COUNT + OFFSET）を max_history_logs 件取得し、直近180日を Python で絞り込む
+- after : インデックス付きで get_history（期間をSQLで絞り込み、(MK_DATE, rowid) の keyset でページング）
+先頭ページと、深い位置のページ（before は OFFSET、after は cursor）の取得時間を比較する。
+
+実行例:
+    python scripts/bench_sql_history.py --rows 200000 --users 20
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.log_handlers import SqliteLogHandler, SQLLogRecord  # noqa: E402
+
+HEAVY_USER = "user0"
+PAGE = 1000
+
+
+def populate(handler: SqliteLogHandler, rows: int, users: int):
+    """約2年分のログを作る（user0 に全体の半分を集中させる）"""
+    now = datetime.now()
+    records = []
+    for n in range(rows):
+        user = HEAVY_USER if n % 2 == 0 else f"user{1 + n % (users - 1)}"
+        when = now - timedelta(minutes=(rows - n) * 5)
+        records.append(SQLLogRecord(user, f"SELECT * FROM ORDERS WHERE ID = {n}", 1, when, 1, True, end_time=when))
+    handler.write_logs(records)
+
+
+def drop_indexes(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX IF EXISTS IX_TOOL_LOG_OPE_DATE")
+        conn.execute("DROP INDEX IF EXISTS IX_TOOL_LOG_DATE")
+
+
+def timed(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL履歴取得のベンチマーク")
+    parser.add_argument("--rows", type=int, default=200000, help="ログの総件数")
+    parser.add_argument("--users", type=int, default=20, help="ユーザー数")
+    args = parser.parse_args()
+    since = datetime.now() - timedelta(days=180)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = SqliteLogHandler(os.path.join(tmp, "log.db"))
+        populate(handler, args.rows, args.users)
+
+        # 深い位置のページ用に cursor を進めておく
+        cursor = None
+        for _ in range(10):
+            cursor = handler.get_history(HEAVY_USER, since, PAGE, cursor)["next_cursor"]
+
+        after_first = timed(lambda: handler.get_history(HEAVY_USER, since, PAGE))
+        after_deep = timed(lambda: handler.get_history(HEAVY_USER, since, PAGE, cursor))
+
+        drop_indexes(handler.db_path)
+
+        def before(offset: int):
+            logs = handler.get_logs(HEAVY_USER, PAGE, offset)["logs"]
+            return [log for log in logs if datetime.fromisoformat(log["timestamp"]) >= since]
+
+        before_first = timed(lambda: before(0))
+        before_deep = timed(lambda: before(PAGE * 10))
+
+    print(f"rows={args.rows:,} heavy_user_rows={args.rows // 2:,} page={PAGE}")
+    print(f"{'':<8} {'first ms':>10} {'page 11 ms':>11}")
+    print(f"{'before':<8} {before_first:>10.2f} {before_deep:>11.2f}")
+    print(f"{'after':<8} {after_first:>10.2f} {after_deep:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
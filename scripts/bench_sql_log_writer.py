@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+SQL実行ログ記録のベンチマーク（リクエスト処理中の直接書き込み vs 非同期一括書き込み）
+
+SQLLogService.add_log_to_db の呼び出し時間（= リクエストの処理時間に上乗せされる時間）と、
+全ログがログストアに書き込まれるまでのINSERT文の数を計測する。
+ログストアは一時ディレクトリの SQLite を使い、--rtt-ms で1文ごとの往復遅延（Oracle/Snowflake 相当）を加える。
+- before: 1件ごとに接続を開いて INSERT（従来の add_log）
+- after : キューに積み、ワーカーが executemany でまとめて INSERT（SQLLogWriter）
+
+実行例:
+    python scripts/bench_sql_log_writer.py --logs 500 --rtt-ms 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.logger import get_logger  # noqa: E402
+from app.services.log_handlers import SqliteLogHandler  # noqa: E402
+from app.services.sql_log_service import SQLLogService  # noqa: E402
+from app.services.sql_log_writer import SQLLogWriter  # noqa: E402
+
+
+class RemoteLikeHandler(SqliteLogHandler):
+    """1文ごとに往復遅延を加える SQLite ログハンドラ"""
+
+    def __init__(self, db_path: str, rtt: float):
+        super().__init__(db_path)
+        self.rtt = rtt
+        self.statements = 0
+
+    def write_logs(self, records):
+        self.statements += 1
+        time.sleep(self.rtt)
+        super().write_logs(records)
+
+
+def make_service(handler, writer=None) -> SQLLogService:
+    service = SQLLogService.__new__(SQLLogService)
+    service.log_handler = handler
+    service.log_storage_type = "sqlite"
+    service.logger = get_logger("bench")
+    service.log_writer = writer
+    return service
+
+
+def run(service, logs: int):
+    timings = []
+    for n in range(logs):
+        started = time.perf_counter()
+        service.add_log_to_db(f"user{n % 20}", f"SELECT * FROM ORDERS WHERE ID = {n}", 0.2, datetime.now(), 10, True, None)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(label, timings, elapsed, statements):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<8} {statistics.median(ordered) * 1000:>9.3f} {p95 * 1000:>9.3f} {elapsed:>10.2f} {statements:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL実行ログ記録のベンチマーク")
+    parser.add_argument("--logs", type=int, default=500, help="記録するログの件数")
+    parser.add_argument("--rtt-ms", type=float, default=20, help="ログストアへの1文ごとの往復遅延（ミリ秒）")
+    args = parser.parse_args()
+    rtt = args.rtt_ms / 1000
+
+    print(f"{'':<8} {'p50 ms':>9} {'p95 ms':>9} {'total s':>10} {'statements':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = RemoteLikeHandler(os.path.join(tmp, "before.db"), rtt)
+        started = time.perf_counter()
+        timings = run(make_service(handler), args.logs)
+        report("before", timings, time.perf_counter() - started, handler.statements)
+
+        handler = RemoteLikeHandler(os.path.join(tmp, "after.db"), rtt)
+        writer = SQLLogWriter(handler, max_queue_size=10000, batch_size=100, flush_interval=0.2,
+                              max_retries=3, retry_backoff=0.5)
+        writer.start()
+        started = time.perf_counter()
+        timings = run(make_service(handler, writer), args.logs)
+        writer.stop(timeout=60)
+        report("after", timings, time.perf_counter() - started, handler.statements)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+SQL検証ルールのベンチマーク（チェックごとの正規表現・部分文字列検索 vs 結合ルールエンジン）
+
+生成した大きなクエリに対して、禁止キーワード・セキュリティ・WHERE句必須・パフォーマンスの4つのチェックの
+処理時間とスループットを計測する（sqlparse による構文解析は含まない）。
+- before: 従来の SQLValidator と同じく、禁止キーワードごとに正規表現を作って検索し、
+          他のチェックもそれぞれ SQL 全体を upper() して部分文字列を検索
+- after : SQLRuleEngine（起動時にコンパイルした1つの正規表現で1回走査）
+
+実行例:
+    python scripts/bench_sql_rules.py
+"""
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.sql_validator import SQLValidator  # noqa: E402
+
+ROUNDS = 20
+SIZES = [500, 2000, 10000]
+
+
+def build_query(lines: int) -> str:
+    """コメント・文字列リテラル・JOIN を含む lines 行のクエリを生成（どのチェックにも違反しない）"""
+    body = ["SELECT"]
+    body += [f"    o.COL_{i:05d} AS C{i:05d},  -- 列{i}（コメント）" for i in range(lines - 8)]
+    body += [
+        "    o.ORDER_ID",
+        "FROM SALES.ORDERS o",
+        "JOIN SALES.CUSTOMERS c ON c.CUSTOMER_ID = o.CUSTOMER_ID",
+        "LEFT JOIN SALES.ORDER_ITEMS i ON i.ORDER_ID = o.ORDER_ID",
+        "WHERE o.STATUS = 'PENDING' AND o.CREATED_AT >= '2024-01-01'",
+        "  AND o.NOTE NOT LIKE '%X%'",
+        "ORDER BY o.ORDER_ID",
+        "LIMIT 1000",
+    ]
+    return "\n".join(body)
+
+
+def legacy_checks(validator: SQLValidator, sql: str):
+    """従来方式の4つのチェック"""
+    for keyword in validator.forbidden_keywords:
+        if re.search(r'\b' + re.escape(keyword) + r'\b', sql, re.IGNORECASE):
+            return False
+    sql_upper = sql.upper()
+    for pattern in validator.dangerous_patterns:
+        if pattern in sql_upper:
+            return False
+    sql_upper = sql.upper()
+    if 'SELECT' in sql_upper and 'WHERE' not in sql_upper:
+        return False
+    where_match = re.search(r'WHERE\s+(.*)', sql, re.IGNORECASE | re.DOTALL)
+    if where_match:
+        re.split(r'\s+AND\s+', where_match.group(1).strip(), flags=re.IGNORECASE)
+    sql_upper = sql.upper()
+    return ('SELECT *' in sql_upper, 'LIMIT' in sql_upper or 'TOP' in sql_upper, sql_upper.count('JOIN'))
+
+
+def engine_checks(validator: SQLValidator, sql: str):
+    """ルールエンジンによる4つのチェック"""
+    scan = validator.rule_engine.scan(sql)
+    errors, warnings = [], []
+    if not validator._check_forbidden_keywords(scan, errors) or not validator._check_security(scan, errors):
+        return False
+    if not validator._check_where_clause_required(sql, scan, errors):
+        return False
+    validator._check_performance_warnings(scan, warnings)
+    return warnings
+
+
+def measure(func, sql):
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func(sql)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    started = time.perf_counter()
+    validator = SQLValidator(cache_size=0)
+    print(f"ルールのコンパイル: {(time.perf_counter() - started) * 1000:.2f}ms（{len(validator.rule_engine.rules)}ルール、起動時に1回）")
+    print(f"{'lines':>6} {'size KB':>8} {'before ms':>10} {'after ms':>9} {'before MB/s':>12} {'after MB/s':>11}")
+    for lines in SIZES:
+        sql = build_query(lines)
+        size = len(sql.encode("utf-8"))
+        before = measure(lambda s: legacy_checks(validator, s), sql)
+        after = measure(lambda s: engine_checks(validator, s), sql)
+        print(f"{lines:>6} {size / 1024:>8.0f} {before * 1000:>10.2f} {after * 1000:>9.2f} "
+              f"{size / before / 1e6:>12.1f} {size / after / 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
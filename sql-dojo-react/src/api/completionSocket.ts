@@ -0,0 +1,147 @@
+import type { SqlCompletionResult } from '../types/api';
+import { API_CONFIG } from '../config/api';
+import { getSqlSuggestions } from './sqlService';
+
+// サーバーから返るメッセージ（補完候補 / 取り消し / エラー）
+interface CompletionSocketMessage extends Partial<SqlCompletionResult> {
+  id: number | null;
+  cancelled?: boolean;
+  error?: string;
+}
+
+interface PendingRequest {
+  resolve: (result: SqlCompletionResult) => void;
+  reject: (error: Error) => void;
+}
+
+// 新しい入力で置き換えられたリクエストの結果（Monaco 側も次の呼び出しで上書きされる）
+const CANCELLED_RESULT: SqlCompletionResult = { suggestions: [], is_incomplete: true };
+
+// 接続失敗が続いた場合に HTTP へ切り替えている時間(ms)
+const RECONNECT_DELAY_MS = 5000;
+
+// エディタごとのチャネルID（サーバー側の ws-{uuid} と同じく、利用者・タブ間で衝突しない値にする）
+const newChannelId = (): string => {
+  const random = typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function'
+    ? crypto.randomUUID().replace(/-/g, '')
+    : `${Date.now().toString(16)}${Math.random().toString(16).slice(2)}`;
+  return `editor-${random}`;
+};
+
+const toWebSocketUrl = (path: string): string => {
+  const url = new URL(`${API_CONFIG.BASE_URL}${path}`, window.location.href);
+  url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+  return url.toString();
+};
+
+/**
+ * エディタ1つ分の SQL 補完チャネル（/sql/suggest/ws）
+ *
+ * 同じ接続でエディタのモデルと版が変わらない間は SQL 本文を送らず、カーソル位置だけを送る。
+ * デバウンスと古いリクエストの取り消しはサーバー側で行う。
+ * WebSocket が使えない間は従来の HTTP エンドポイントで補完する。
+ * HTTP の文脈解析セッションIDにはチャネルごとのIDを前置し、他の利用者やエディタのセッションと共有しない。
+ */
+export class CompletionSocket {
+  private socket: WebSocket | null = null;
+  private opening: Promise<WebSocket> | null = null;
+  private readonly channelId = newChannelId();
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 1;
+  // 最後に SQL 本文を送った「セッションID:版」
+  private sentKey: string | null = null;
+  private unavailableUntil = 0;
+  private closed = false;
+
+  async getSuggestions({ sql, position, version, sessionId }: {
+    sql: string;
+    position: number;
+    version: number;
+    // エディタ内でモデルを識別するID（HTTP で補完する場合はチャネルIDを前置してセッションIDにする）
+    sessionId: string;
+  }): Promise<SqlCompletionResult> {
+    let socket: WebSocket;
+    try {
+      if (this.closed || Date.now() < this.unavailableUntil) {
+        throw new Error('WebSocket unavailable');
+      }
+      socket = await this.connect();
+    } catch {
+      return getSqlSuggestions({ sql, position, context: { session_id: `${this.channelId}:${sessionId}`, version } });
+    }
+
+    const id = this.nextId++;
+    const message: Record<string, unknown> = { id, position };
+    const key = `${sessionId}:${version}`;
+    if (this.sentKey !== key) {
+      message.sql = sql;
+      message.version = version;
+      this.sentKey = key;
+    }
+    return new Promise<SqlCompletionResult>((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      socket.send(JSON.stringify(message));
+    });
+  }
+
+  close(): void {
+    this.closed = true;
+    this.socket?.close();
+    this.socket = null;
+  }
+
+  private connect(): Promise<WebSocket> {
+    if (this.socket?.readyState === WebSocket.OPEN) {
+      return Promise.resolve(this.socket);
+    }
+    if (!this.opening) {
+      this.opening = new Promise<WebSocket>((resolve, reject) => {
+        const socket = new WebSocket(toWebSocketUrl('/sql/suggest/ws'));
+        socket.onopen = () => {
+          this.socket = socket;
+          this.sentKey = null;
+          this.opening = null;
+          resolve(socket);
+        };
+        socket.onmessage = (event) => this.handleMessage(event.data);
+        socket.onerror = () => {
+          this.unavailableUntil = Date.now() + RECONNECT_DELAY_MS;
+        };
+        socket.onclose = () => {
+          if (this.socket === socket) {
+            this.socket = null;
+          }
+          this.opening = null;
+          this.rejectAll(new Error('補完チャネルが切断されました'));
+          reject(new Error('補完チャネルに接続できません'));
+        };
+      });
+    }
+    return this.opening;
+  }
+
+  private handleMessage(data: string): void {
+    const message = JSON.parse(data) as CompletionSocketMessage;
+    if (message.id === null) {
+      console.error('補完チャネルのエラー:', message.error);
+      return;
+    }
+    const request = this.pending.get(message.id);
+    if (!request) {
+      return;
+    }
+    this.pending.delete(message.id);
+    if (message.cancelled) {
+      request.resolve(CANCELLED_RESULT);
+    } else if (message.error) {
+      request.reject(new Error(message.error));
+    } else {
+      request.resolve({ suggestions: message.suggestions ?? [], is_incomplete: message.is_incomplete ?? false });
+    }
+  }
+
+  private rejectAll(error: Error): void {
+    this.pending.forEach((request) => request.reject(error));
+    this.pending.clear();
+  }
+}
@@ -5,8 +5,9 @@ import { apiClient } from './apiClient';
 import { API_CONFIG } from '../config/api';
 
 // SQL実行API（非同期版 - プログレスバー対応）
-export const executeSqlOnCache = async ({ sql }: { sql: string }): Promise<ExecuteSqlResponse> => {
-  return apiClient.post<ExecuteSqlResponse>('/sql/cache/execute-async', { sql });
+// confirmed: コストゲートの確認要求（status: 'requires_confirmation'）を承認して再実行する場合に true
+export const executeSqlOnCache = async ({ sql, confirmed = false }: { sql: string; confirmed?: boolean }): Promise<ExecuteSqlResponse> => {
+  return apiClient.post<ExecuteSqlResponse>('/sql/cache/execute-async', { sql, confirmed });
 };
 
 // SQLキャッシュ読み込みAPI
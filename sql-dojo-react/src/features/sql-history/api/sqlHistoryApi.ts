@@ -13,11 +13,13 @@ export const sqlHistoryApi = {
   /**
    * SQL実行履歴を取得
    * 既存の /api/v1/users/history エンドポイントを使用
+   * @param cursor 前回のレスポンスの next_cursor（指定するとその続きを取得）
    * @returns SQL履歴データのPromise
    */
-  async getSqlHistory(): Promise<SqlHistoryResponse> {
+  async getSqlHistory(cursor?: string | null): Promise<SqlHistoryResponse> {
     try {
-      const response = await fetch(`${API_CONFIG.BASE_URL}/users/history`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API_CONFIG.BASE_URL}/users/history${query}`, {
         method: 'GET',
         credentials: 'include', // Cookie認証のために必須
         headers: {
@@ -57,7 +59,8 @@ export const sqlHistoryApi = {
       
       return {
         logs: data.logs,
-        total_count: data.total_count || data.logs.length
+        total_count: data.total_count || data.logs.length,
+        next_cursor: data.next_cursor ?? null
       };
     } catch (error) {
       if (error instanceof Error) {
@@ -31,6 +31,8 @@ export interface SqlHistoryResponse {
   logs: SqlHistoryItem[];
   /** 総件数 */
   total_count: number;
+  /** 続きを取得するためのカーソル（続きがなければ null） */
+  next_cursor?: string | null;
 }
 
 /**
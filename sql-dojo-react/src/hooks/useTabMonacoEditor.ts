@@ -1,6 +1,6 @@
 ﻿import { useCallback } from 'react';
 import type * as monaco from 'monaco-editor';
-import { getSqlSuggestions } from '../api/sqlService';
+import { CompletionSocket } from '../api/completionSocket';
 import type { SqlCompletionItem } from '../types/api';
 import { useAuth } from '../contexts/AuthContext';
 import { MonacoParameterFormatter } from '../utils/monacoParameterFormatter';
@@ -280,6 +280,10 @@ export const useTabMonacoEditor = (tabId: string) => {
     console.log('🔍 useTabMonacoEditor: Registering parameter formatter for tabId:', tabId);
     MonacoParameterFormatter.registerFormattingProvider(monacoApi);
     
+    // エディタ1つにつき補完チャネルを1本持ち、エディタ破棄時に閉じる
+    const completionSocket = new CompletionSocket();
+    editor.onDidDispose(() => completionSocket.close());
+
     monacoApi.languages.registerCompletionItemProvider('sql', {
       provideCompletionItems: async (model: monaco.editor.ITextModel, position: monaco.Position) => {
         
@@ -295,11 +299,12 @@ export const useTabMonacoEditor = (tabId: string) => {
           const sql = model.getValue();
           const offset = model.getOffsetAt(position);
           
-          // SQL補完API呼び出し（元エディタと同じ）
-          const response = await getSqlSuggestions({
+          // エディタごとの WebSocket 補完チャネルで取得（版が変わらない間はカーソル位置だけを送る）
+          const response = await completionSocket.getSuggestions({
             sql,
             position: offset,
-            context: {}
+            version: model.getVersionId(),
+            sessionId: model.id
           });
           
           // Monaco Editorの補完アイテム形式に変換（元エディタと同じロジック）
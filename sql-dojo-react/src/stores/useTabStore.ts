@@ -54,7 +54,11 @@ const startTabProgressPolling = async (sessionId: string, progressStore: { updat
       
       // 段階に応じたメッセージ表示
       let message = statusResponse.message || 'データを取得中...';
-      if (statusResponse.phase === 'executing') {
+      if (statusResponse.phase === 'queued') {
+        message = statusResponse.queue_position
+          ? `実行待ちです（${statusResponse.queue_position}番目）...`
+          : '実行待ちです...';
+      } else if (statusResponse.phase === 'executing') {
         message = 'Snowflakeでクエリを実行中...';
       } else if (statusResponse.phase === 'downloading') {
         message = `データをダウンロード中... (${statusResponse.processed_count || 0}件)`;
@@ -745,8 +749,14 @@ export const useTabStore = create<TabStoreState>((set, get) => ({
       });
 
       // SQL実行（ここで実際に時間がかかる）
-      const execResult = await executeSqlOnCache({ sql });
-      
+      let execResult = await executeSqlOnCache({ sql });
+
+      // コストゲートの確認要求（スキャン量が大きいクエリ）は承認されたら再実行
+      if (execResult.status === 'requires_confirmation' && execResult.cost_estimate?.policy === 'confirm'
+          && window.confirm(`${execResult.message}\n実行しますか？`)) {
+        execResult = await executeSqlOnCache({ sql, confirmed: true });
+      }
+
       // 段階5: SQL実行完了
       progressStore.updateProgress({
         currentCount: 0,
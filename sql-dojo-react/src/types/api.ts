@@ -28,14 +28,28 @@ export interface ExecuteSqlResponse {
   columns?: string[];
   row_count?: number;
   execution_time?: number;
-  status?: 'processing' | 'completed' | 'error' | 'cancelled';  // 非同期実行状態
+  status?: 'processing' | 'completed' | 'error' | 'cancelled' | 'requires_confirmation';  // 非同期実行状態
+  cost_estimate?: QueryCostEstimate | null;  // EXPLAINによるコスト見積もり（コストゲート有効時）
+}
+
+// 実行前コストゲートの見積もりと判定
+export interface QueryCostEstimate {
+  policy: 'allow' | 'warn' | 'bulk' | 'confirm' | 'reject';
+  message?: string | null;
+  partitions_total?: number | null;
+  partitions_assigned?: number | null;
+  bytes_assigned?: number | null;
+  estimated_rows?: number | null;
+  explain_time?: number;
+  cached?: boolean;
 }
 
 // 進捗状態レスポンス型
 export interface SessionStatusResponse {
   session_id: string;
   status: 'streaming' | 'completed' | 'error' | 'cancelled';
-  phase?: 'executing' | 'downloading' | 'completed';  // 処理段階
+  phase?: 'queued' | 'executing' | 'downloading' | 'completed';  // 処理段階
+  queue_position?: number | null;  // 実行待ち順位（0=実行中）
   total_count: number;
   processed_count: number;
   progress_percentage: number;
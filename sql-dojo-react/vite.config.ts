@@ -16,6 +16,7 @@ export default defineConfig(({ mode }) => {
           target: `http://127.0.0.1:${env.APP_PORT || '8001'}`,
           changeOrigin: true,
           secure: false,
+          ws: true,
         }
       }
     }